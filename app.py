@@ -1,8 +1,12 @@
+import hmac
+import logging
 import uuid
-from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, redirect, url_for, flash, session, stream_with_context, abort
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import SQLAlchemyError
 from flask_migrate import Migrate
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
 from urllib.parse import urlparse
 from functools import wraps
@@ -12,25 +16,65 @@ import os
 from dotenv import load_dotenv
 from utils.json_handler import JsonHandler
 from routes.api_routes import api_blueprint
-from models.sql_models import User, Bowser, Location, Maintenance, Deployment, Invoice, Partner
+from models.sql_models import User, Bowser, Location, Maintenance, Deployment, Invoice, Partner, Job
 from database import initialize_database_with_sample_data
 from routes.protected_routes import protected_blueprint
 from config import Config
 from flask_wtf.csrf import CSRFProtect
+from functools import partial
+from utils.scheduler import scheduler
+from utils.jobs import job_queue
+import utils.forecasting  # registers the supply_forecast job
+import utils.timeseries  # registers the level history jobs
+from utils import test_runs
+from utils.metrics import init_metrics, metrics
+from utils.rate_limit import rate_limiter
+from utils.db_pool import engine_options, init_pool
+from utils.read_models import read_all, related_options
+from utils.templating import init_templating, Lazy
+from utils.assets import init_assets, cache_headers, send_precompressed
+from utils.maintenance_planner import refresh_maintenance_plan
+from utils.ledger import OPENING_NOTE, append_entry, scheme_balances
+from utils.search import init_search_index
+from utils.public_snapshot import SNAPSHOT_NAME, load_meta, refresh_public_snapshot, snapshot_dir
+from utils.serialization import json_response, bowser_schema, location_schema, maintenance_schema, deployment_schema
+
+logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Client addresses from the trusted proxies' X-Forwarded-For
+if app.config['PROXY_FIX_HOPS']:
+    hops = app.config['PROXY_FIX_HOPS']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+# Rate limits are checked before any other request handling
+rate_limiter.init_app(app)
+
 # Initialize CSRF protection
 csrf = CSRFProtect(app)
 
+# Route latency and SQL instrumentation
+init_metrics(app)
+
+# Template bytecode cache and fragment caching
+init_templating(app)
+
+# Fingerprinted, precompressed static assets
+init_assets(app)
+
 # Initialize JSON handler
 json_handler = JsonHandler('data/test_db.json' if app.config['TESTING'] else 'data/db.json')
+# Lets the API check mutual aid schemes, which live in the JSON store
+app.extensions['json_handler'] = json_handler
 
 # Database configuration
 if app.config['TESTING']:
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+elif os.environ.get('DATABASE_URL'):
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
 else:
     # Use instance folder for database
     instance_path = os.path.join(app.instance_path, 'aquaalert.db')
@@ -38,10 +82,12 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{instance_path}'
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
 
 # Initialize SQLAlchemy
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+init_pool(app, db)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -65,6 +111,29 @@ with app.app_context():
     except Exception as e:
         print(f"Error creating database tables: {str(e)}")
         raise
+    init_search_index()
+
+# Periodic work is queued once per host, not once per worker or browser tab,
+# and executed by the job pool off the request path
+scheduler.add_periodic('supply_forecast', app.config['FORECAST_INTERVAL'],
+                       partial(job_queue.enqueue, 'supply_forecast', unique=True))
+scheduler.add_periodic('level_retention', 3600, partial(job_queue.enqueue, 'level_retention', unique=True))
+# Jobs left running by a worker that died go back to the queue
+scheduler.add_periodic('job_requeue', app.config['JOB_REQUEUE_INTERVAL'], job_queue.requeue_stale)
+# Opens the ledger of any scheme with a balance recorded before it, then repairs
+# any running balance written outside utils.ledger.append_entry
+scheduler.add_periodic('ledger_check', app.config['LEDGER_CHECK_INTERVAL'],
+                       partial(job_queue.enqueue, 'ledger_rebuild', unique=True), run_at_start=True)
+# Cheap version check; the snapshot is only rebuilt after a relevant write
+scheduler.add_periodic('public_snapshot', app.config['PUBLIC_SNAPSHOT_INTERVAL'], refresh_public_snapshot,
+                       run_at_start=True)
+scheduler.add_periodic('maintenance_plan', app.config['MAINTENANCE_PLAN_INTERVAL'], refresh_maintenance_plan,
+                       run_at_start=True)
+if app.config['SCHEDULER_ENABLED'] and not app.config['TESTING']:
+    scheduler.start(app)
+# Claims are safe across processes, so every worker consumes jobs, not just the scheduler's owner
+if app.config['JOB_WORKERS_ENABLED'] and not app.config['TESTING']:
+    job_queue.start(app)
 
 # Flask-Login User Loader Callback
 @login_manager.user_loader
@@ -173,7 +242,10 @@ def logout():
     session.clear()
     logout_user()
     flash('You have been logged out', 'success')
-    return redirect(url_for('login'))
+    response = redirect(url_for('login'))
+    # Drops the data pages cached in the browser (static/js/store.js), also on pages without the store
+    response.headers['Clear-Site-Data'] = '"storage"'
+    return response
 
 @app.before_request
 def before_request():
@@ -192,12 +264,8 @@ def before_request():
 
 @app.after_request
 def add_header(response):
-    """Add headers to prevent caching."""
-    if 'Cache-Control' not in response.headers:
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '-1'
-    return response
+    """Set Cache-Control; authenticated pages are never stored."""
+    return cache_headers(response)
 
 # Root route to direct users based on authentication status
 @app.route('/')
@@ -213,23 +281,21 @@ def dashboard():
         
     # Get all bowsers and their current status
     bowsers = Bowser.query.all()
+    # Current location of every deployed bowser in one query instead of two per bowser
+    current_locations = {}
+    for deployment in read_all(Deployment, Deployment.status == 'active', fields=('bowser_id',),
+                               related={'location': ('name',)}):
+        if deployment.location:
+            current_locations.setdefault(deployment.bowser_id, deployment.location.name)
+
     bowser_status = {}
     for bowser in bowsers:
         bowser_status[bowser.id] = {
             'number': bowser.number,
             'capacity': bowser.capacity,
             'status': bowser.status,
-            'current_location': None
+            'current_location': current_locations.get(bowser.id)
         }
-        # Get current deployment if any
-        current_deployment = Deployment.query.filter_by(
-            bowser_id=bowser.id,
-            status='active'
-        ).first()
-        if current_deployment:
-            location = Location.query.get(current_deployment.location_id)
-            if location:
-                bowser_status[bowser.id]['current_location'] = location.name
                 
     return render_template('dashboard.html', bowser_status=bowser_status)
 
@@ -237,9 +303,18 @@ def dashboard():
 @app.route('/public_map')
 def public_map():
     """Public view of bowser locations and status"""
-    bowsers = Bowser.query.all()
-    locations = Location.query.all()
-    return render_template('public.html', bowsers=bowsers, locations=locations)
+    return render_template('public.html')
+
+@app.route('/public_map/snapshot.geojson')
+def public_map_snapshot():
+    """Precompressed GeoJSON of active deployments, rebuilt by the scheduler."""
+    meta = load_meta()
+    if meta is None:
+        refresh_public_snapshot()
+        meta = load_meta()
+    return send_precompressed(snapshot_dir(), SNAPSHOT_NAME,
+                              f"public, max-age={app.config['PUBLIC_SNAPSHOT_MAX_AGE']}",
+                              etag=meta['etag'])
 
 # --- Staff Routes ---
 @app.route('/management')
@@ -248,8 +323,10 @@ def management():
     """Management dashboard for staff and admin users."""
     bowsers = Bowser.query.all()
     locations = Location.query.all()
-    deployments = Deployment.query.all()
-    maintenance_records = Maintenance.query.all()
+    deployments = Deployment.query.options(
+        *related_options(Deployment.bowser, Deployment.location)
+    ).all()
+    maintenance_records = Maintenance.query.options(*related_options(Maintenance.bowser)).all()
     
     return render_template('management.html',
                          bowsers=bowsers,
@@ -260,55 +337,58 @@ def management():
 @app.route('/maintenance')
 @staff_required
 def maintenance():
-    """Maintenance management page."""
-    bowsers = Bowser.query.all()
-    maintenance_records = Maintenance.query.order_by(Maintenance.date.desc()).all()
-    
-    return render_template('maintenance.html',
-                         bowsers=bowsers,
-                         maintenance_records=maintenance_records)
+    """Maintenance management page; its records are loaded from /api/maintenance/window."""
+    return render_template('maintenance.html')
 
 @app.route('/locations/manage')
 @staff_required
 def manage_locations():
-    """Location management page."""
-    locations = Location.query.all()
-    return render_template('locations.html', locations=locations)
+    """Location management page; locations.js loads its locations from the API."""
+    return render_template('locations.html')
 
 @app.route('/deployments/manage')
 @staff_required
 def manage_deployments():
     """Deployment management page."""
-    bowsers = Bowser.query.all()
-    locations = Location.query.all()
-    deployments = Deployment.query.order_by(Deployment.start_date.desc()).all()
-    
-    return render_template('deployments.html',
-                         bowsers=bowsers,
-                         locations=locations,
-                         deployments=deployments)
+    deployments = read_all(Deployment, order_by=Deployment.start_date.desc(),
+                           related={'bowser': ('id', 'number'), 'location': ('id', 'name')})
+    return render_template('deployments.html', deployments=deployments)
 
 # --- Admin Routes ---
 @app.route('/admin/users')
 @admin_required
 def admin_users():
     """User management page for admins."""
-    users = User.query.all()
-    return render_template('admin/users.html', users=users)
+    # Lazy so the query is skipped when the users table fragment is cached
+    users = Lazy(lambda: read_all(User, fields=('id', 'username', 'email', 'role', 'last_login', 'created_at')))
+    return render_template('admin_users.html', users=users)
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Prometheus metrics summed over this host's worker processes.
+
+    Scrapers authenticate with 'Authorization: Bearer <METRICS_TOKEN>';
+    logged-in admins can view the page directly.
+    """
+    token = app.config.get('METRICS_TOKEN')
+    if not (token and hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                          f'Bearer {token}'.encode())):
+        if not current_user.is_authenticated or current_user.role != 'admin':
+            abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/finance')
 @admin_required
 def finance():
-    """Finance management page."""
-    invoices = Invoice.query.order_by(Invoice.issue_date.desc()).all()
-    return render_template('finance/index.html', invoices=invoices)
+    """Finance management page; invoices are read in windows from /api/invoices/window."""
+    return render_template('finance.html')
 
 @app.route('/finance/invoices')
 @admin_required
 def manage_invoices():
     """Invoice management page."""
     invoices = Invoice.query.order_by(Invoice.issue_date.desc()).all()
-    return render_template('finance/invoices.html', invoices=invoices)
+    return render_template('manage_invoices.html', invoices=invoices)
 
 @app.route('/finance/invoices/create', methods=['GET', 'POST'])
 @admin_required
@@ -350,6 +430,17 @@ def create_invoice():
 def manage_schemes():
     """Mutual Aid Scheme management interface"""
     schemes = json_handler.get_all('mutual_aid_schemes')
+    # Balances come from the ledger; the JSON balance only stands in for schemes without entries
+    try:
+        balances = scheme_balances()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Error reading ledger balances: {str(e)}")
+        flash('Ledger balances are unavailable; showing recorded scheme balances.', 'warning')
+        balances = {}
+    for scheme in schemes:
+        if scheme['id'] in balances:
+            scheme['balance'] = balances[scheme['id']]['balance']
     # Sort schemes by start_date in descending order
     schemes.sort(key=lambda x: x.get('start_date', ''), reverse=True)
     return render_template('manage_schemes.html', schemes=schemes)
@@ -366,20 +457,23 @@ def create_scheme():
         start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d').date()
         end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d').date() if request.form.get('end_date') else None
         
-        # Create scheme object
+        # Create scheme object; its balance is kept by the ledger
+        initial_balance = float(request.form.get('initial_balance') or 0)
         new_scheme = MutualAidScheme(
             name=request.form['name'],
             start_date=start_date,
             end_date=end_date,
             contribution_amount=float(request.form['contribution_amount']),
-            balance=float(request.form.get('initial_balance', 0)),
+            balance=initial_balance,
             status=request.form.get('status', 'active'),
             notes=request.form.get('notes', '')
         )
         
         try:
-            # Save to JSON storage
+            # Save to JSON storage, then open the scheme's ledger with its initial balance
             json_handler.create('mutual_aid_schemes', new_scheme.to_dict())
+            if initial_balance:
+                append_entry(new_scheme.id, initial_balance, start_date, 'adjustment', notes=OPENING_NOTE)
             flash('Mutual Aid Scheme created successfully!', 'success')
             return redirect(url_for('manage_schemes'))
         except Exception as e:
@@ -429,10 +523,12 @@ def admin_reports():
 def emergency_priority():
     """Emergency priority management interface"""
     # Get all deployments
-    deployments = Deployment.query.filter_by(status='active').order_by(Deployment.priority.desc()).all()
+    deployments = Lazy(lambda: Deployment.query.filter_by(status='active').options(
+        *related_options(Deployment.bowser, Deployment.location)
+    ).order_by(Deployment.priority.desc()).all())
     return render_template('emergency_priority.html', deployments=deployments)
 
-@app.route('/emergency/priority/<int:deployment_id>', methods=['GET', 'POST'])
+@app.route('/emergency/priority/<deployment_id>', methods=['GET', 'POST'])
 @admin_required
 def update_priority(deployment_id):
     """Update emergency priority for a deployment"""
@@ -463,26 +559,22 @@ def update_priority(deployment_id):
 @app.route('/api/bowsers')
 @login_required
 def api_bowsers():
-    bowsers = Bowser.query.all()
-    return jsonify([bowser.to_dict() for bowser in bowsers])
+    return json_response(bowser_schema.all())
 
 @app.route('/api/locations')
 @login_required
 def api_locations():
-    locations = Location.query.all()
-    return jsonify([location.to_dict() for location in locations])
+    return json_response(location_schema.all())
 
 @app.route('/api/maintenance')
 @staff_required
 def api_maintenance():
-    records = Maintenance.query.all()
-    return jsonify([record.to_dict() for record in records])
+    return json_response(maintenance_schema.all())
 
 @app.route('/api/deployments')
 @staff_required
 def api_deployments():
-    deployments = Deployment.query.all()
-    return jsonify([deployment.to_dict() for deployment in deployments])
+    return json_response(deployment_schema.all())
 
 # --- Staff & Admin Routes ---
 
@@ -504,36 +596,64 @@ def testing_guide():
 
 @app.route('/run_tests/<test_type>')
 def run_tests_api(test_type):
-    """API endpoint to run tests and return results as JSON."""
-    import subprocess
-    import sys
-    
-    # Map test types to the appropriate command
-    test_commands = {
-        'core': ['python', 'run_tests.py', 'core'],
-        'financial_api': ['python', '-m', 'unittest', 'test_financial_api.py'],
-        'all': ['python', 'run_tests.py']
-    }
-    
-    if test_type not in test_commands:
-        return jsonify({'success': False, 'output': 'Invalid test type'}), 400
-    
+    """Start a test run in the background and return its run id.
+
+    Runs of an unchanged (clean) git revision return the earlier run.
+    """
     try:
-        # Run the tests and capture output
-        process = subprocess.run(
-            test_commands[test_type],
-            capture_output=True,
-            text=True
-        )
-        
-        # Return the results
-        return jsonify({
-            'success': process.returncode == 0,
-            'output': process.stdout + process.stderr
-        })
+        job, cached = test_runs.start_run(test_type)
+    except ValueError as e:
+        return jsonify({'success': False, 'output': str(e)}), 400
+    except test_runs.TooManyRuns as e:
+        return jsonify({'success': False, 'output': str(e)}), 429
     except Exception as e:
         return jsonify({'success': False, 'output': str(e)}), 500
 
+    return jsonify({
+        'success': True,
+        'run_id': job.id,
+        'status': job.status,
+        'cached': cached,
+        'status_url': url_for('test_run_status', run_id=job.id),
+        'stream_url': url_for('stream_test_run', run_id=job.id)
+    }), 202
+
+@app.route('/run_tests/runs/<run_id>')
+def test_run_status(run_id):
+    """Return a test run's status and its output from the given byte offset."""
+    job = Job.query.get(run_id)
+    if not job or job.name != 'test_run':
+        return jsonify({'success': False, 'output': 'Test run not found'}), 404
+    output, offset = test_runs.read_output(run_id, request.args.get('offset', 0, type=int))
+    result = job.to_dict()['result'] or {}
+    return jsonify({
+        'run_id': job.id,
+        'status': job.status,
+        'success': result.get('success', False),
+        'output': output,
+        'offset': offset
+    })
+
+@app.route('/run_tests/runs/<run_id>/stream')
+def stream_test_run(run_id):
+    """Stream a test run's output as server-sent events, for a limited time per connection.
+
+    The dashboard polls test_run_status instead; a reconnecting stream
+    resumes from its Last-Event-ID.
+    """
+    job = Job.query.get(run_id)
+    if not job or job.name != 'test_run':
+        return jsonify({'success': False, 'output': 'Test run not found'}), 404
+    try:
+        offset = max(int(request.headers.get('Last-Event-ID') or request.args.get('offset', 0)), 0)
+    except ValueError:
+        offset = 0
+    return Response(
+        stream_with_context(test_runs.stream_events(run_id, offset)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # === Main Routes ===
 
 # === User Management Routes ===
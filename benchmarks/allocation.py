@@ -0,0 +1,71 @@
+"""Times the bowser allocation solver on a synthetic fleet.
+
+Loads the problem from an in-memory SQLite database, solves it from
+scratch, then applies single-bowser level changes through the incremental
+path and compares the result with a fresh solve:
+
+    python -m benchmarks.allocation --bowsers 5000 --locations 800
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_data import create_app, generate
+from database import db
+from utils.allocation import Allocator, load_problem
+
+def run(bowsers, locations, updates, seed):
+    app = create_app('sqlite://')
+    with app.app_context():
+        db.create_all()
+        generate({'bowsers': bowsers, 'locations': locations, 'deployments': bowsers, 'maintenance': 0,
+                  'invoices': 0, 'alerts': 0, 'users': 2}, seed=seed)
+
+        started = time.perf_counter()
+        fleet, sites = load_problem()
+        loaded = time.perf_counter()
+        allocator = Allocator()
+        allocator.load(fleet, sites)
+        built = time.perf_counter()
+        summary = allocator.solve()
+        print(f"{bowsers} bowsers, {locations} locations")
+        print(f"  load queries {(loaded - started) * 1000:8.1f} ms")
+        print(f"  build index  {(built - loaded) * 1000:8.1f} ms")
+        print(f"  solve        {summary['solve_ms']:8.1f} ms  {summary}")
+
+        rng = random.Random(seed)
+        timings = []
+        for _ in range(updates):
+            bowser = rng.choice(fleet)
+            capacity = bowser['capacity'] or 1000.0
+            summary = allocator.update_bowser(bowser['id'], current_level=rng.uniform(0, capacity))
+            timings.append(summary['solve_ms'])
+        print(f"  incremental  {statistics.mean(timings):8.2f} ms mean, {max(timings):.2f} ms max "
+              f"over {updates} single-bowser updates")
+
+        fresh = Allocator()
+        fresh.load(list(allocator.bowsers.values()),
+                   [{key: site[key] for key in ('id', 'name', 'type', 'latitude', 'longitude')}
+                    for site in allocator.locations.values()])
+        fresh.solve()
+        print(f"  weighted unmet after updates: incremental {allocator.summary()['weighted_unmet_after']:.0f}, "
+              f"fresh solve {fresh.summary()['weighted_unmet_after']:.0f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the bowser allocation solver.')
+    parser.add_argument('--bowsers', type=int, default=5000)
+    parser.add_argument('--locations', type=int, default=800)
+    parser.add_argument('--updates', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    run(args.bowsers, args.locations, args.updates, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Times the shared location distance matrix.
+
+Builds the memory-mapped matrix from --locations points to --positions
+of them (where bowsers stand) from scratch, then adds and moves single
+locations and positions through the incremental update, reopens it as
+another worker would, and times the lookups allocation and the
+nearest-bowser endpoint make:
+
+    python -m benchmarks.distances --locations 50000 --positions 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+
+from utils.distances import DistanceMatrix
+from utils.geo import haversine_km
+
+def run(locations, positions, updates, seed):
+    rng = random.Random(seed)
+    points = {f'loc-{i}': (51.3 + rng.random() * 0.4, -0.5 + rng.random() * 0.7) for i in range(locations)}
+    stands = {point_id: points[point_id] for point_id in rng.sample(list(points), min(positions, locations))}
+    directory = tempfile.mkdtemp()
+
+    matrix = DistanceMatrix(directory)
+    started = time.perf_counter()
+    matrix.update(points, stands)
+    rows, columns = matrix.shape
+    print(f"{locations} locations x {len(stands)} positions, {rows}x{columns} float32 "
+          f"({os.path.getsize(matrix.matrix_path) / 2 ** 20:.0f} MiB)")
+    print(f"  full build       {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+    timings = {'add': [], 'move': [], 'position': []}
+    for n in range(updates):
+        kind = ('add', 'move', 'position')[n % 3]
+        if kind == 'position':
+            # A bowser deployed somewhere no other bowser stands
+            point_id = rng.choice([point_id for point_id in points if point_id not in stands])
+            stands[point_id] = points[point_id]
+        else:
+            point_id = f'new-{n}' if kind == 'add' else rng.choice(list(points))
+            points[point_id] = (51.3 + rng.random() * 0.4, -0.5 + rng.random() * 0.7)
+            if point_id in stands:
+                stands[point_id] = points[point_id]
+        started = time.perf_counter()
+        matrix.update(points, stands)
+        timings[kind].append((time.perf_counter() - started) * 1000)
+    for kind, values in timings.items():
+        print(f"  {kind:<8} one     {statistics.mean(values):9.2f} ms mean, {max(values):.2f} ms max")
+
+    started = time.perf_counter()
+    reopened = DistanceMatrix(directory)
+    reopened.reload()
+    print(f"  reopen           {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+    ids, stand_ids = list(points), list(stands)
+    sample = rng.sample(ids, min(800, len(ids)))
+    expected = haversine_km(*np.array([points[i] for i in sample]).T[:, :, None],
+                            *np.array([stands[i] for i in stand_ids]).T[:, None, :])
+    started = time.perf_counter()
+    error = np.abs(reopened.between(sample, stand_ids) - expected).max()
+    print(f"  800 x positions  {(time.perf_counter() - started) * 1000:9.1f} ms (max error {error * 1000:.2f} m)")
+    started = time.perf_counter()
+    reopened.nearest(stand_ids, ids, 8)
+    print(f"  positions x 8-nearest {(time.perf_counter() - started) * 1000:4.1f} ms among {len(ids)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the shared location distance matrix.')
+    parser.add_argument('--locations', type=int, default=5000)
+    parser.add_argument('--positions', type=int, default=500, help='locations bowsers stand at')
+    parser.add_argument('--updates', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    run(args.locations, args.positions, args.updates, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Times the management grid's faceted bowser filtering.
+
+Generates a fleet, then times the grouped facet query cold and from its
+cache, a filtered page, and a search plus filters, against serializing
+every bowser as GET /api/bowsers does:
+
+    python -m benchmarks.facets --bowsers 50000 --deployments 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_data import create_app, generate
+from database import db
+from utils import bowser_facets as facets_module
+from utils.bowser_facets import bowser_facets, facet_cube
+from utils.serialization import bowser_schema, dumps
+
+def _median_ms(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def run(counts, repeats, seed):
+    app = create_app('sqlite://')
+    with app.test_request_context():
+        db.create_all()
+        generate(counts, seed=seed)
+
+        def cold_cube():
+            facets_module._cubes.clear()
+            facet_cube()
+
+        cube = facet_cube()
+        print(f"{counts['bowsers']} bowsers, {counts['deployments']} deployments: {len(cube)} facet cells")
+        print(f"  grouped query (cold)     {_median_ms(cold_cube, repeats):8.2f} ms")
+        filters = {'status': ['active', 'available'], 'capacity': ['medium']}
+        print(f"  facets + page (cached)   {_median_ms(lambda: bowser_facets('', filters, 3, 24), repeats):8.2f} ms")
+        print(f"  deep page 1000           {_median_ms(lambda: bowser_facets('', {}, 1000, 24), repeats):8.2f} ms")
+        print(f"  search + filters (cold)  "
+              f"{_median_ms(lambda: (facets_module._cubes.clear(), bowser_facets('owner 7', filters, 1, 24)), repeats):8.2f} ms")
+        result = bowser_facets('', filters, 1, 24)
+        print(f"  page payload             {len(dumps(result)) / 1024:8.1f} KiB ({result['total']} matching)")
+        print(f"  all bowsers (baseline)   {_median_ms(lambda: dumps(bowser_schema.all()), repeats):8.2f} ms, "
+              f"{len(dumps(bowser_schema.all())) / 1024:.0f} KiB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark faceted bowser filtering.')
+    parser.add_argument('--bowsers', type=int, default=50000)
+    parser.add_argument('--deployments', type=int, default=100000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    counts = {'bowsers': args.bowsers, 'locations': 500, 'deployments': args.deployments,
+              'maintenance': 0, 'invoices': 0, 'alerts': 0, 'users': 1}
+    run(counts, args.repeats, args.seed)
+
+if __name__ == '__main__':
+    main()
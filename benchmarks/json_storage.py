@@ -0,0 +1,281 @@
+"""Microbenchmarks for the JSON storage layer.
+
+Measures throughput and peak memory of utils.json_handler.JsonHandler and
+models.json_models.JSONDataHandler for create, get_by_id, update, query
+and (JsonHandler only) the bulk operations at several collection sizes,
+plus concurrent writers from multiple processes. Each size is seeded in
+one write, then every operation is repeated until it has run --rounds
+times or used --min-time seconds, whichever comes first.
+
+A baseline measured on the current engines is checked in at
+benchmarks/baselines/json_storage.json. Storage changes should show
+their speedup against it:
+
+    python -m benchmarks.json_storage                      # compare with the baseline
+    python -m benchmarks.json_storage --sizes 1000,10000   # quicker run
+    python -m benchmarks.json_storage --save-baseline      # after an accepted change
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from models.json_models import JSONDataHandler
+from utils.json_handler import JsonHandler
+
+BASELINE_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'baselines', 'json_storage.json')
+COLLECTION = 'mutual_aid_schemes'
+BULK_SIZE = 100
+
+def make_doc(i):
+    """A document shaped like MutualAidScheme.to_dict()."""
+    return {
+        'id': f'doc-{i}',
+        'name': f'Scheme {i}',
+        'start_date': '2025-01-01',
+        'end_date': '2025-12-31',
+        'contribution_amount': float(i % 500),
+        'balance': float(i % 10000),
+        'status': 'active' if i % 3 else 'closed',
+        'notes': 'Synthetic benchmark document',
+    }
+
+def seed(path, size):
+    with open(path, 'w') as f:
+        json.dump({COLLECTION: [make_doc(i) for i in range(size)]}, f)
+
+class Engine:
+    """Uniform interface over the two JSON handlers."""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.handler = JsonHandler(path) if name == 'JsonHandler' else JSONDataHandler(path)
+
+    def create(self, doc):
+        return self.handler.create(COLLECTION, doc)
+
+    def get_by_id(self, doc_id):
+        return self.handler.get_by_id(COLLECTION, doc_id)
+
+    def update(self, doc_id, updates):
+        return self.handler.update(COLLECTION, doc_id, updates)
+
+    def query(self, filters):
+        return self.handler.query(COLLECTION, filters)
+
+    @property
+    def supports_bulk(self):
+        return hasattr(self.handler, 'bulk_create')
+
+    def bulk_create(self, docs):
+        return self.handler.bulk_create(COLLECTION, docs)
+
+    def bulk_update(self, updates):
+        return self.handler.bulk_update(COLLECTION, updates)
+
+    def bulk_delete(self, doc_ids):
+        return self.handler.bulk_delete(COLLECTION, doc_ids)
+
+def measure(func, rounds, min_time):
+    """Run func repeatedly; return ops/s, mean latency and peak traced memory.
+
+    The first call is a warm-up traced for memory; tracemalloc slows
+    allocation-heavy code too much to leave it on for the timed rounds.
+    """
+    tracemalloc.start()
+    func(0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < rounds and (len(timings) < 3 or time.perf_counter() - started < min_time):
+        op_started = time.perf_counter()
+        func(len(timings) + 1)
+        timings.append(time.perf_counter() - op_started)
+    total = sum(timings)
+    return {
+        'rounds': len(timings),
+        'ops_per_sec': len(timings) / total if total else None,
+        'mean_ms': total / len(timings) * 1000,
+        'min_ms': min(timings) * 1000,
+        'peak_memory_kb': peak / 1024,
+    }
+
+def bench_engine(engine_name, size, workdir, rounds, min_time):
+    path = os.path.join(workdir, f'{engine_name}-{size}.json')
+    seed(path, size)
+    engine = Engine(engine_name, path)
+    results = {'file_kb': os.path.getsize(path) / 1024}
+
+    results['get_by_id'] = measure(lambda i: engine.get_by_id(f'doc-{(i * 7919) % size}'), rounds, min_time)
+    results['query'] = measure(lambda i: engine.query({'status': 'closed', 'contribution_amount': float(i % 500)}),
+                               rounds, min_time)
+    results['update'] = measure(lambda i: engine.update(f'doc-{(i * 104729) % size}', {'balance': float(i)}),
+                                rounds, min_time)
+    results['create'] = measure(lambda i: engine.create(make_doc(size + i)), rounds, min_time)
+
+    # JSONDataHandler has no bulk API; looping single writes over it would
+    # only measure create/update again, BULK_SIZE times slower
+    if not engine.supports_bulk:
+        return results
+
+    bulk_ids = []
+
+    def bulk_create(i):
+        # Ids above the seeded and singly created ranges so deletes hit only bulk documents
+        docs = [make_doc(2 * size + rounds + 1 + i * BULK_SIZE + n) for n in range(BULK_SIZE)]
+        bulk_ids.extend(doc['id'] for doc in engine.bulk_create(docs))
+
+    results['bulk_create'] = measure(bulk_create, rounds, min_time)
+    results['bulk_update'] = measure(
+        lambda i: engine.bulk_update([{'id': f'doc-{(i * BULK_SIZE + n) % size}', 'balance': 1.0}
+                                      for n in range(BULK_SIZE)]),
+        rounds, min_time)
+    results['bulk_delete'] = measure(
+        lambda i: engine.bulk_delete(bulk_ids[i * BULK_SIZE:(i + 1) * BULK_SIZE]),
+        results['bulk_create']['rounds'], min_time)
+
+    # Bulk operations handle BULK_SIZE documents per call
+    for op in ('bulk_create', 'bulk_update', 'bulk_delete'):
+        results[op]['docs_per_sec'] = results[op]['ops_per_sec'] * BULK_SIZE
+    return results
+
+def _concurrent_writer(engine_name, path, writer, count, start_event):
+    engine = Engine(engine_name, path)
+    start_event.wait()
+    for n in range(count):
+        engine.create({'id': f'w{writer}-{n}', 'name': f'writer {writer}', 'status': 'active'})
+
+def bench_concurrent(engine_name, size, workdir, processes, writes):
+    """Several processes create documents in one file at once.
+
+    Neither handler locks the file, so writers overwrite each other's
+    read-modify-write cycles, and a reader that catches a half-written
+    file sees an empty store and can write back only its own documents.
+    Reports throughput and how many documents are missing afterwards.
+    """
+    path = os.path.join(workdir, f'{engine_name}-{size}-concurrent.json')
+    seed(path, size)
+    context = multiprocessing.get_context('spawn')
+    start_event = context.Event()
+    workers = [context.Process(target=_concurrent_writer, args=(engine_name, path, w, writes, start_event))
+               for w in range(processes)]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.5)
+    started = time.perf_counter()
+    start_event.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    if any(worker.exitcode for worker in workers):
+        raise RuntimeError(f'{engine_name} concurrent writer failed')
+
+    try:
+        with open(path) as f:
+            stored = len(json.load(f).get(COLLECTION, []))
+        corrupted = False
+    except json.JSONDecodeError:
+        stored, corrupted = 0, True
+    expected = size + processes * writes
+    return {
+        'processes': processes,
+        'writes': processes * writes,
+        'writes_per_sec': processes * writes / elapsed,
+        'lost_documents': expected - stored,
+        'corrupted': corrupted,
+    }
+
+def run(sizes, rounds, min_time, processes, writes):
+    workdir = tempfile.mkdtemp(prefix='json-bench-')
+    report = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': {},
+    }
+    try:
+        for engine_name in ('JsonHandler', 'JSONDataHandler'):
+            report['results'][engine_name] = {}
+            for size in sizes:
+                print(f"{engine_name} @ {size} documents")
+                results = bench_engine(engine_name, size, workdir, rounds, min_time)
+                results['concurrent'] = bench_concurrent(engine_name, size, workdir, processes, writes)
+                report['results'][engine_name][str(size)] = results
+                for op, stats in results.items():
+                    if isinstance(stats, dict) and 'ops_per_sec' in stats:
+                        print(f"  {op:<12} {stats['ops_per_sec']:>10.1f} ops/s  {stats['mean_ms']:>9.2f} ms  "
+                              f"peak {stats['peak_memory_kb']:>9.0f} KB")
+                concurrent = results['concurrent']
+                print(f"  concurrent   {concurrent['writes_per_sec']:>10.1f} writes/s  "
+                      f"lost {concurrent['lost_documents']} documents"
+                      f"{'  CORRUPTED' if concurrent['corrupted'] else ''}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+def compare(report, baseline, threshold):
+    """Print speedups against the baseline; return the regressed operations."""
+    regressions = []
+    print(f"\nSpeedup vs baseline ({baseline.get('timestamp', 'unknown')}):")
+    for engine_name, sizes in report['results'].items():
+        for size, results in sizes.items():
+            base = baseline.get('results', {}).get(engine_name, {}).get(size)
+            if not base:
+                continue
+            for op, stats in results.items():
+                if not isinstance(stats, dict) or 'ops_per_sec' not in stats or op not in base:
+                    continue
+                speedup = stats['ops_per_sec'] / base[op]['ops_per_sec']
+                flag = ''
+                if speedup < 1 - threshold:
+                    regressions.append(f'{engine_name}/{size}/{op}')
+                    flag = '  REGRESSION'
+                print(f"  {engine_name:<16} {size:>7} {op:<12} {speedup:>6.2f}x{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the JSON storage engines.')
+    parser.add_argument('--sizes', type=lambda v: [int(s) for s in v.split(',')], default=[1000, 10000, 100000])
+    parser.add_argument('--rounds', type=int, default=100, help='maximum repetitions per operation')
+    parser.add_argument('--min-time', type=float, default=2.0, help='seconds per operation before stopping early')
+    parser.add_argument('--processes', type=int, default=4, help='concurrent writer processes')
+    parser.add_argument('--writes', type=int, default=10, help='creates per concurrent writer')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--output', help='also write the report to this file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before failing')
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.rounds, args.min_time, args.processes, args.writes)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} operations slower than the baseline")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Times mutual aid ledger balances and appends.
+
+Fills the ledger with entries spread over a number of schemes, then times
+a scheme's balance as of random dates against summing its full entry list,
+appends in date order and backdated, and windows of the transaction list:
+
+    python -m benchmarks.ledger --entries 1000000 --schemes 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_data import _insert, create_app
+from database import db
+from models.sql_models import LedgerBalance, LedgerEntry
+from utils.ledger import append_entry, balance_as_of, ledger_window
+
+def _median_ms(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def generate_ledger(entries, schemes, seed, start=datetime(2020, 1, 1)):
+    """Bulk insert entries in date order with their running balances, as append_entry leaves them."""
+    rng = random.Random(seed)
+    balances = {f'scheme-{i}': 0 for i in range(schemes)}
+    step = timedelta(days=5 * 365) / max(entries, 1)
+    rows = []
+    for i in range(entries):
+        scheme_id = rng.choice(list(balances))
+        amount = rng.randint(100, 50000) * (1 if rng.random() < 0.7 else -1)
+        balances[scheme_id] += amount
+        rows.append({'id': i + 1, 'scheme_id': scheme_id, 'entry_type': 'contribution' if amount > 0 else 'payout',
+                     'amount': amount, 'running_balance': balances[scheme_id], 'entry_date': start + step * i,
+                     'created_at': start + step * i})
+    _insert(LedgerEntry, rows)
+    _insert(LedgerBalance, [{'scheme_id': scheme_id, 'balance': balance,
+                             'entry_count': sum(1 for row in rows if row['scheme_id'] == scheme_id),
+                             'last_entry_date': start + step * (entries - 1)}
+                            for scheme_id, balance in balances.items()])
+    return start, start + step * entries
+
+def run(entries, schemes, repeats, seed):
+    app = create_app('sqlite://')
+    with app.test_request_context():
+        db.create_all()
+        first, last = generate_ledger(entries, schemes, seed)
+        rng = random.Random(seed)
+        days = (last - first).days
+        dates = [(first + timedelta(days=rng.randint(0, days))).date() for _ in range(repeats)]
+        dates_iter = iter(dates * 3)
+
+        def summed(scheme_id, as_of):
+            # The previous approach: every contribution of the scheme, summed up to the date
+            cutoff = datetime.combine(as_of + timedelta(days=1), datetime.min.time())
+            return sum(amount for amount, entry_date in db.session.query(LedgerEntry.amount, LedgerEntry.entry_date)
+                       .filter(LedgerEntry.scheme_id == scheme_id).all() if entry_date < cutoff) / 100
+
+        print(f"{entries} ledger entries over {schemes} schemes")
+        cases = [
+            ('balance as of a date', lambda: balance_as_of('scheme-0', next(dates_iter))),
+            ('summing the entry list', lambda: summed('scheme-0', next(dates_iter))),
+            ('append in date order', lambda: append_entry('scheme-1', 25, last + timedelta(days=1))),
+            ('append 30 days back', lambda: append_entry('scheme-1', 25, last - timedelta(days=30))),
+            ('transactions, first window', lambda: ledger_window(limit=50)),
+            ('transactions, deep window', lambda: ledger_window(offset=entries * 3 // 4, limit=50)),
+            ('scheme transactions', lambda: ledger_window('scheme-2', limit=50)),
+        ]
+        for label, func in cases:
+            print(f"  {label:<30} {_median_ms(func, repeats):8.2f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark mutual aid ledger balances.')
+    parser.add_argument('--entries', type=int, default=500000)
+    parser.add_argument('--schemes', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    run(args.entries, args.schemes, args.repeats, args.seed)
+
+if __name__ == '__main__':
+    main()
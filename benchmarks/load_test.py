@@ -0,0 +1,367 @@
+"""Load driver for AquaAlert routes.
+
+Starts the app under gunicorn (or targets a running server with --url),
+drives every page and GET /api endpoint at increasing concurrency and records
+p50/p95/p99 latency and throughput. Results are written to
+benchmarks/results/ named after the git revision so runs from different
+commits can be compared:
+
+    python -m benchmarks.synthetic_data --database sqlite:///instance/bench.db --reset
+    python -m benchmarks.load_test --database sqlite:///instance/bench.db --concurrency 1,4,16
+    python -m benchmarks.load_test --compare benchmarks/results/load-<old>.json benchmarks/results/load-<new>.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlencode, urlparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+# (name, path, needs login). Every GET /api endpoint is driven; {placeholders}
+# are filled with an id read from the endpoint in PATH_SOURCES before the run.
+ROUTES = [
+    ('public_map', '/public_map', False),
+    ('public_snapshot', '/public_map/snapshot.geojson', False),
+    ('dashboard', '/dashboard', True),
+    ('management', '/management', True),
+    ('finance', '/finance', True),
+    ('api_bowsers', '/api/bowsers', True),
+    ('api_bowser_facets', '/api/bowsers/facets?status=active', True),
+    ('api_bowser_levels', '/api/bowsers/{bowser_id}/levels', True),
+    ('api_locations', '/api/locations', True),
+    ('api_nearest_bowsers', '/api/locations/{location_id}/nearest-bowsers', True),
+    ('api_deployments', '/api/deployments', True),
+    ('api_maintenance', '/api/maintenance', True),
+    ('api_maintenance_window', '/api/maintenance/window?status=scheduled', True),
+    ('api_maintenance_calendar', '/api/maintenance/calendar', True),
+    ('api_invoice_window', '/api/invoices/window', True),
+    ('api_search', '/api/search?q=main', True),
+    ('api_allocation', '/api/allocation', True),
+    ('api_refills', '/api/refills', True),
+    ('api_schedule', '/api/schedule', True),
+    ('api_alerts', '/api/alerts', True),
+    ('api_users', '/api/users', True),
+    ('api_jobs', '/api/jobs', True),
+    ('api_job', '/api/jobs/{job_id}', True),
+    ('api_mutual_aid_transactions', '/api/mutual-aid/transactions', True),
+    ('api_mutual_aid_balances', '/api/mutual-aid/balances', True),
+    ('api_mutual_aid_scheme_balance', '/api/mutual-aid/schemes/{scheme_id}/balance', True),
+]
+
+# Placeholder -> (list endpoint, id of one of its records)
+PATH_SOURCES = {
+    'bowser_id': ('/api/bowsers', lambda data: data[0]['id']),
+    'location_id': ('/api/locations', lambda data: data[0]['id']),
+    'job_id': ('/api/jobs', lambda data: data[0]['id']),
+    'scheme_id': ('/api/mutual-aid/balances', lambda data: next(iter(data['balances']))),
+}
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
+CSRF_PATTERN = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+class Client:
+    """Keep-alive HTTP client with a minimal cookie jar.
+
+    Cookies are sent regardless of the Secure flag because the benchmark
+    talks plain HTTP to a local server.
+    """
+
+    def __init__(self, host, port, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookies: Dict[str, str] = {}
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The server may close idle keep-alive connections; retry once on a fresh one
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                cookie_value = rest.split(';', 1)[0]
+                if cookie_value:
+                    self.cookies[name.strip()] = cookie_value
+                else:
+                    self.cookies.pop(name.strip(), None)
+        return response.status, response.getheader('Location', ''), data
+
+    def login(self, username, password):
+        status, _, body = self.request('GET', '/login')
+        match = CSRF_PATTERN.search(body.decode('utf-8', errors='replace'))
+        form = {'username': username, 'password': password}
+        if match:
+            form['csrf_token'] = match.group(1)
+        status, location, _ = self.request(
+            'POST', '/login', body=urlencode(form),
+            headers={'Content-Type': 'application/x-www-form-urlencoded'}
+        )
+        return status in (200, 302) and '/login' not in location
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def start_gunicorn(port, workers, database_url, threads=1):
+    # Every load client shares one login and one address, so rate limits would measure the limiter
+    env = dict(os.environ, SCHEDULER_ENABLED='0', JOB_WORKERS_ENABLED='0', RATELIMIT_ENABLED='0')
+    # Refill routes need a depot; this one is central to the synthetic fleet
+    env.setdefault('DEPOT_LATITUDE', '51.5')
+    env.setdefault('DEPOT_LONGITUDE', '-0.15')
+    if database_url:
+        env['DATABASE_URL'] = database_url
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=REPO_ROOT, env=env
+    )
+    if not wait_for_port('127.0.0.1', port):
+        process.terminate()
+        raise RuntimeError('gunicorn did not start')
+    return process
+
+def prepare_clients(host, port, count, credentials, needs_login, workers):
+    """Create logged-in clients.
+
+    app.py logs everyone out on the first request each worker process
+    sees, so clients are warmed up until a protected page stays reachable.
+    """
+    clients = []
+    for _ in range(count):
+        client = Client(host, port)
+        if needs_login:
+            for _ in range(workers * 3 + 1):
+                if not client.login(*credentials):
+                    continue
+                status, location, _ = client.request('GET', '/api/alerts')
+                if status == 200:
+                    break
+            else:
+                raise RuntimeError('Could not establish a logged-in session')
+        clients.append(client)
+    return clients
+
+def resolve_routes(client, routes):
+    """Fill path placeholders with ids read through client; routes whose ids are missing are skipped."""
+    ids, resolved = {}, []
+    for name, path, needs_login in routes:
+        for placeholder in PLACEHOLDER_PATTERN.findall(path):
+            if placeholder not in ids:
+                source, pick = PATH_SOURCES[placeholder]
+                status, _, body = client.request('GET', source)
+                try:
+                    data = json.loads(body) if status == 200 else None
+                    data = data['data'] if isinstance(data, dict) and 'data' in data else data
+                    ids[placeholder] = str(pick(data)) if data else None
+                except (ValueError, KeyError, IndexError, TypeError, StopIteration):
+                    ids[placeholder] = None
+        missing = [placeholder for placeholder in PLACEHOLDER_PATTERN.findall(path) if not ids[placeholder]]
+        if missing:
+            print(f"{name:<30} skipped: no {', '.join(missing)} to request")
+            continue
+        resolved.append((name, PLACEHOLDER_PATTERN.sub(lambda match: ids[match.group(1)], path), needs_login))
+    return resolved
+
+def drive(clients, path, duration, credentials, needs_login):
+    """Hit path from every client in parallel for duration seconds."""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(client):
+        local, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status, location, _ = client.request('GET', path)
+            except (http.client.HTTPException, OSError):
+                local_errors += 1
+                continue
+            elapsed = time.perf_counter() - started
+            if status >= 400 or (needs_login and '/login' in location):
+                local_errors += 1
+                if needs_login and '/login' in location:
+                    client.login(*credentials)
+                continue
+            local.append(elapsed)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    to_ms = lambda value: value * 1000 if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else None,
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+    }
+
+def run(args):
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+        server = None
+    else:
+        host, port = '127.0.0.1', args.port
+        server = start_gunicorn(port, args.workers, args.database, args.threads)
+
+    credentials = (args.username, args.password)
+    routes = [route for route in ROUTES if not args.routes or route[0] in args.routes]
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            anonymous = prepare_clients(host, port, concurrency, credentials, False, args.workers)
+            logged_in = prepare_clients(host, port, concurrency, credentials, True, args.workers)
+            if concurrency == args.concurrency[0]:
+                routes = resolve_routes(logged_in[0], routes)
+            for name, path, needs_login in routes:
+                clients = logged_in if needs_login else anonymous
+                stats = drive(clients, path, args.duration, credentials, needs_login)
+                stats.update({'route': name, 'path': path, 'concurrency': concurrency})
+                results.append(stats)
+                print(f"{name:<30} c={concurrency:<4} {stats['throughput']:8.1f} req/s  "
+                      f"p50={_fmt(stats['p50_ms'])} p95={_fmt(stats['p95_ms'])} p99={_fmt(stats['p99_ms'])}  "
+                      f"errors={stats['errors']}")
+            for client in anonymous + logged_in:
+                client.close()
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+    revision = git_revision()
+    report = {
+        'revision': revision,
+        'timestamp': datetime.utcnow().isoformat(),
+        'config': {
+            'workers': args.workers,
+            'threads': args.threads,
+            'duration': args.duration,
+            'concurrency': args.concurrency,
+            'database': args.database,
+            'url': args.url,
+        },
+        'results': results,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"load-{revision}-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {path}")
+    return path
+
+def _fmt(value):
+    return f'{value:7.1f}ms' if value is not None else '    n/a'
+
+def compare(baseline_path, current_path, threshold=0.10):
+    """Print per-route deltas between two result files; return the regressions."""
+    with open(baseline_path) as f:
+        baseline = {(r['route'], r['concurrency']): r for r in json.load(f)['results']}
+    with open(current_path) as f:
+        current = json.load(f)['results']
+
+    regressions = []
+    print(f"{'route':<30} {'c':>4} {'p95 base':>10} {'p95 now':>10} {'Δp95':>8} {'rps base':>9} {'rps now':>9} {'Δrps':>8}")
+    for row in current:
+        base = baseline.get((row['route'], row['concurrency']))
+        if not base or not base['p95_ms'] or not row['p95_ms']:
+            continue
+        p95_delta = row['p95_ms'] / base['p95_ms'] - 1
+        rps_delta = row['throughput'] / base['throughput'] - 1 if base['throughput'] else 0.0
+        flag = ''
+        if p95_delta > threshold or rps_delta < -threshold:
+            regressions.append(row['route'])
+            flag = '  REGRESSION'
+        print(f"{row['route']:<30} {row['concurrency']:>4} {base['p95_ms']:>8.1f}ms {row['p95_ms']:>8.1f}ms "
+              f"{p95_delta:>+7.0%} {base['throughput']:>9.1f} {row['throughput']:>9.1f} {rps_delta:>+7.0%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test AquaAlert routes under gunicorn.')
+    parser.add_argument('--url', help='target a running server instead of starting gunicorn')
+    parser.add_argument('--database', default=os.environ.get('DATABASE_URL', 'sqlite:///instance/bench.db'))
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--concurrency', type=lambda v: [int(c) for c in v.split(',')], default=[1, 4, 16, 64])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per route and concurrency level')
+    parser.add_argument('--routes', type=lambda v: v.split(','), help='comma-separated route names')
+    parser.add_argument('--username', default='bench_admin')
+    parser.add_argument('--password', default='Bench@Admin1')
+    parser.add_argument('--output-dir', default=RESULTS_DIR)
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'))
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed p95/throughput change')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare(*args.compare, threshold=args.threshold)
+        sys.exit(1 if regressions else 0)
+    run(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Times the refill route planner on a synthetic fleet.
+
+Loads the deployed bowsers from an in-memory SQLite database, plans
+routes from scratch, then applies single-bowser level changes through the
+incremental repair and compares the result with a fresh plan:
+
+    python -m benchmarks.routing --bowsers 2000 --locations 500 --vehicles 20
+
+The depot sits in the middle of the synthetic area. No level history is
+generated, so stops are the bowsers below REFILL_TRIGGER_PERCENT and
+every due time is the end of the shift.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_data import create_app, generate
+from database import db
+from utils.routing import RoutePlanner, build_distances, load_problem, location_set
+
+DEPOT = (51.5, -0.15)
+
+def run(bowsers, locations, vehicles, capacity, updates, seed):
+    app = create_app('sqlite://')
+    with app.app_context():
+        db.create_all()
+        generate({'bowsers': bowsers, 'locations': locations, 'deployments': bowsers, 'maintenance': 0,
+                  'invoices': 0, 'alerts': 0, 'users': 2}, seed=seed)
+
+        started = time.perf_counter()
+        fleet = load_problem()
+        loaded = time.perf_counter()
+        nodes, km = build_distances(DEPOT, location_set(fleet))
+        built = time.perf_counter()
+        now = datetime.utcnow()
+        planner = RoutePlanner(vehicles=vehicles, vehicle_capacity=capacity)
+        planner.load(fleet, {}, nodes, km, now)
+        summary = planner.solve()
+        print(f"{len(fleet)} deployed bowsers at {len(nodes)} locations, {vehicles} vehicles of {capacity:.0f} l")
+        print(f"  load query      {(loaded - started) * 1000:8.1f} ms")
+        print(f"  distance matrix {(built - loaded) * 1000:8.1f} ms")
+        print(f"  solve           {summary['solve_ms']:8.1f} ms  {summary}")
+
+        rng = random.Random(seed)
+        timings = []
+        for _ in range(updates):
+            bowser = rng.choice(fleet)
+            level = rng.uniform(0, bowser['capacity'] or 1000.0)
+            timings.append(planner.update_bowser(bowser['id'], now, current_level=level)['solve_ms'])
+        print(f"  incremental     {statistics.mean(timings):8.2f} ms mean, {max(timings):.2f} ms max "
+              f"over {updates} single-bowser updates")
+
+        fresh = RoutePlanner(vehicles=vehicles, vehicle_capacity=capacity)
+        fresh.load(list(planner.bowsers.values()), {}, nodes, km, now)
+        fresh.solve()
+        repaired, rebuilt = planner.summary(), fresh.summary()
+        print(f"  after updates: incremental {repaired['served']} served, {repaired['distance_km']} km; "
+              f"fresh plan {rebuilt['served']} served, {rebuilt['distance_km']} km")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the refill route planner.')
+    parser.add_argument('--bowsers', type=int, default=2000)
+    parser.add_argument('--locations', type=int, default=500)
+    parser.add_argument('--vehicles', type=int, default=20)
+    parser.add_argument('--capacity', type=float, default=20000.0, help='litres per vehicle')
+    parser.add_argument('--updates', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    run(args.bowsers, args.locations, args.vehicles, args.capacity, args.updates, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Times full-text search over a synthetic fleet.
+
+Generates the fleet (the FTS5 indexes fill through their triggers as rows
+are inserted), rebuilds the indexes from scratch, then times search pages
+for a mix of short prefixes, whole words and multi-word queries against
+the LIKE scan used on backends without FTS5:
+
+    python -m benchmarks.search --bowsers 50000 --maintenance 200000 --invoices 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_data import create_app, generate
+from database import db
+from utils import search as search_module
+from utils.search import rebuild_search_index, search, search_terms
+
+QUERIES = ['sb', 'sb0001', 'owner 7', 'pump', 'tank clean', 'client 12', 'inv bench 00042', 'synthetic road 4', 'zzz']
+
+def _time(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, timings
+
+def run(counts, repeats, seed):
+    app = create_app('sqlite://')
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        generate(counts, seed=seed)
+        print(f"Generated {sum(counts.values())} rows in {time.perf_counter() - started:.1f} s (indexed by triggers)")
+
+        started = time.perf_counter()
+        rebuilt = rebuild_search_index()
+        print(f"Rebuilt indexes over {sum(rebuilt.values())} rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        print(f"{'query':<20} {'hits':>8} {'fts5 ms':>9} {'like ms':>9}")
+        for query in QUERIES:
+            page, timings = _time(lambda: search(query, per_page=20), repeats)
+            terms = search_terms(query)
+            _, like_timings = _time(lambda: search_module._search_like(list(search_module.SEARCH_SOURCES), terms, 20), 1)
+            print(f"{query:<20} {page['total']:>8} {statistics.median(timings):>9.2f} {like_timings[0]:>9.1f}")
+
+        _, timings = _time(lambda: search('client', page=50, per_page=20), repeats)
+        print(f"{'client (page 50)':<20} {'':>8} {statistics.median(timings):>9.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark full-text search.')
+    parser.add_argument('--bowsers', type=int, default=50000)
+    parser.add_argument('--locations', type=int, default=20000)
+    parser.add_argument('--maintenance', type=int, default=200000)
+    parser.add_argument('--invoices', type=int, default=100000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    counts = {'bowsers': args.bowsers, 'locations': args.locations, 'deployments': 0,
+              'maintenance': args.maintenance, 'invoices': args.invoices, 'alerts': 0, 'users': 1}
+    run(counts, args.repeats, args.seed)
+
+if __name__ == '__main__':
+    main()
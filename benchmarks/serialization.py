@@ -0,0 +1,86 @@
+"""Compares list endpoint serialization paths on large responses.
+
+Builds a synthetic fleet in an in-memory SQLite database and times, for
+each table, the old path (Model.query.all(), to_dict() per row, jsonify)
+against utils.serialization row schemas with the stdlib encoder and, if
+installed, orjson:
+
+    python -m benchmarks.serialization --rows 50000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from flask import jsonify
+
+from benchmarks.synthetic_data import create_app, generate
+from database import db
+from models.sql_models import Bowser, Maintenance, Deployment, Invoice, Alert
+from utils import serialization
+from utils.serialization import (bowser_schema, maintenance_schema, deployment_schema, invoice_schema,
+                                 alert_schema)
+
+TABLES = [
+    ('bowsers', Bowser, bowser_schema),
+    ('maintenance', Maintenance, maintenance_schema),
+    ('deployments', Deployment, deployment_schema),
+    ('invoices', Invoice, invoice_schema),
+    ('alerts', Alert, alert_schema),
+]
+
+def timed(func, repeat):
+    """Best wall time of func over repeat runs, plus peak traced memory of one extra run."""
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        size = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    db.session.expunge_all()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, size
+
+def run(rows, repeat):
+    app = create_app('sqlite://')
+    with app.app_context():
+        db.create_all()
+        generate({'bowsers': rows, 'locations': 200, 'deployments': rows, 'maintenance': rows,
+                  'invoices': rows, 'alerts': rows, 'users': 5})
+
+        for name, model, schema in TABLES:
+            paths = [
+                ('to_dict + jsonify', lambda: len(jsonify([obj.to_dict() for obj in model.query.all()]).get_data()), True),
+                ('schema + json', lambda: len(serialization.dumps(schema.all())), False),
+            ]
+            if serialization.orjson is not None:
+                paths.append(('schema + orjson', lambda: len(serialization.dumps(schema.all())), True))
+
+            print(f"{name} ({rows} rows)")
+            baseline = None
+            for label, func, fast_json in paths:
+                app.config['FAST_JSON'] = fast_json
+                elapsed, peak, size = timed(func, repeat)
+                baseline = baseline or elapsed
+                print(f"  {label:<20} {elapsed * 1000:>9.1f} ms  {baseline / elapsed:>5.1f}x  "
+                      f"peak {peak / 1024 / 1024:>7.1f} MB  {size / 1024 / 1024:>6.1f} MB JSON")
+            app.config['FAST_JSON'] = True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark list endpoint serialization.')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    run(args.rows, args.repeat)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""Synthetic fleet generator for benchmarks.
+
+Fills a database with a configurable number of bowsers, locations,
+deployments, maintenance records, invoices, alerts and users using bulk
+inserts, so large fleets can be generated in seconds. Output is
+deterministic for a given seed.
+
+    python -m benchmarks.synthetic_data --database sqlite:///instance/bench.db --bowsers 5000
+"""
+import argparse
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from flask import Flask
+from werkzeug.security import generate_password_hash
+
+from config import Config
+from database import db
+from models.sql_models import User, Bowser, Location, Maintenance, Deployment, Invoice, Alert
+
+BENCH_ADMIN = ('bench_admin', 'Bench@Admin1')
+BENCH_STAFF = ('bench_staff', 'Bench@Staff1')
+
+DEFAULT_COUNTS = {
+    'bowsers': 1000,
+    'locations': 200,
+    'deployments': 2000,
+    'maintenance': 5000,
+    'invoices': 5000,
+    'alerts': 500,
+    'users': 50,
+}
+
+LOCATION_TYPES = ['hospital', 'clinic', 'fireStation', 'residential', 'apartment', 'office', 'retail', 'community']
+BOWSER_STATUSES = ['active', 'available', 'maintenance', 'deployed']
+MAINTENANCE_TYPES = ['routine', 'repair', 'inspection', 'cleaning']
+CAPACITIES = [1000.0, 2000.0, 3000.0, 5000.0, 10000.0]
+
+def _batches(rows, size=5000):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def _insert(model, rows):
+    for batch in _batches(rows):
+        db.session.bulk_insert_mappings(model, batch)
+    db.session.commit()
+
+def generate(counts=None, seed=42, now=None):
+    """Insert a synthetic fleet into the current app's database.
+
+    Must be called inside an app context. Returns the number of rows
+    created per table.
+    """
+    counts = {**DEFAULT_COUNTS, **(counts or {})}
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+
+    def uid():
+        return str(uuid.UUID(int=rng.getrandbits(128)))
+
+    # Hashing is deliberately slow, so every synthetic user shares one hash
+    shared_hash = generate_password_hash('Bench@User1')
+    users = [
+        {'username': BENCH_ADMIN[0], 'email': 'bench_admin@bench.local', 'role': 'admin',
+         'password_hash': generate_password_hash(BENCH_ADMIN[1]), 'failed_login_attempts': 0},
+        {'username': BENCH_STAFF[0], 'email': 'bench_staff@bench.local', 'role': 'staff',
+         'password_hash': generate_password_hash(BENCH_STAFF[1]), 'failed_login_attempts': 0},
+    ]
+    users += [
+        {'username': f'bench_user_{i}', 'email': f'bench_user_{i}@bench.local',
+         'role': rng.choice(['staff', 'admin']), 'password_hash': shared_hash, 'failed_login_attempts': 0}
+        for i in range(max(counts['users'] - 2, 0))
+    ]
+
+    bowsers = []
+    for i in range(counts['bowsers']):
+        capacity = rng.choice(CAPACITIES)
+        bowsers.append({
+            'id': uid(),
+            'number': f'SB{i:06d}',
+            'capacity': capacity,
+            'current_level': round(capacity * rng.random(), 1),
+            'status': rng.choice(BOWSER_STATUSES),
+            'owner': f'Owner {rng.randint(1, 25)}',
+            'last_maintenance': now - timedelta(days=rng.randint(0, 180)),
+            'notes': rng.choice(['', 'Filters replaced', 'Valve inspected', 'New tyres fitted']),
+        })
+
+    locations = [
+        {
+            'id': uid(),
+            'name': f'Site {i}',
+            'address': f'{rng.randint(1, 999)} Synthetic Road',
+            'latitude': 51.3 + rng.random() * 0.4,
+            'longitude': -0.5 + rng.random() * 0.7,
+            'type': rng.choice(LOCATION_TYPES),
+            'status': rng.choice(['active', 'active', 'inactive']),
+        }
+        for i in range(counts['locations'])
+    ]
+
+    deployments = []
+    if bowsers and locations:
+        for _ in range(counts['deployments']):
+            start = now - timedelta(days=rng.randint(-30, 365))
+            deployments.append({
+                'id': uid(),
+                'bowser_id': rng.choice(bowsers)['id'],
+                'location_id': rng.choice(locations)['id'],
+                'start_date': start,
+                'end_date': start + timedelta(days=rng.randint(1, 60)),
+                'status': rng.choice(['active', 'scheduled', 'completed']),
+                'priority': rng.choice(['high', 'medium', 'low']),
+                'notes': '',
+            })
+
+    maintenance = []
+    if bowsers:
+        for _ in range(counts['maintenance']):
+            maintenance.append({
+                'id': uid(),
+                'bowser_id': rng.choice(bowsers)['id'],
+                'maintenance_type': rng.choice(MAINTENANCE_TYPES),
+                'description': rng.choice(['Routine check', 'Pump repair', 'Tank cleaning', 'Leak fixed']),
+                'date': now - timedelta(days=rng.randint(-30, 730)),
+                'status': rng.choice(['scheduled', 'in_progress', 'completed']),
+            })
+
+    invoices = []
+    for i in range(counts['invoices']):
+        issued = now - timedelta(days=rng.randint(0, 730))
+        invoices.append({
+            'id': uid(),
+            'invoice_number': f'INV-BENCH-{i:07d}',
+            'client_name': f'Client {rng.randint(1, 400)}',
+            'issue_date': issued,
+            'due_date': issued + timedelta(days=30),
+            'amount': round(rng.uniform(100, 20000), 2),
+            'status': rng.choice(['pending', 'paid', 'overdue']),
+            'notes': '',
+        })
+
+    alerts = [
+        {
+            'id': uid(),
+            'title': f'Synthetic alert {i}',
+            'message': 'Generated for benchmarking',
+            'alert_type': rng.choice(['low_level', 'depletion', 'maintenance']),
+            'priority': rng.choice(['high', 'medium', 'low']),
+            'status': rng.choice(['active', 'resolved']),
+            'bowser_id': rng.choice(bowsers)['id'] if bowsers else None,
+            'created_at': now - timedelta(hours=rng.randint(0, 24 * 90)),
+        }
+        for i in range(counts['alerts'])
+    ]
+
+    # Insert parents before children so foreign keys hold
+    _insert(User, users)
+    _insert(Bowser, bowsers)
+    _insert(Location, locations)
+    _insert(Deployment, deployments)
+    _insert(Maintenance, maintenance)
+    _insert(Invoice, invoices)
+    _insert(Alert, alerts)
+
+    return {
+        'users': len(users),
+        'bowsers': len(bowsers),
+        'locations': len(locations),
+        'deployments': len(deployments),
+        'maintenance': len(maintenance),
+        'invoices': len(invoices),
+        'alerts': len(alerts),
+    }
+
+def create_app(database_url):
+    # Relative SQLite paths resolve against the repo root, as they do for app.py
+    app = Flask(__name__, root_path=REPO_ROOT)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic AquaAlert fleet for benchmarks.')
+    parser.add_argument('--database', default=os.environ.get('DATABASE_URL', 'sqlite:///instance/bench.db'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='drop and recreate all tables first')
+    for name, default in DEFAULT_COUNTS.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    args = parser.parse_args(argv)
+
+    if args.database.startswith('sqlite:///'):
+        path = os.path.join(REPO_ROOT, args.database[len('sqlite:///'):])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    app = create_app(args.database)
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        created = generate({name: getattr(args, name) for name in DEFAULT_COUNTS}, seed=args.seed)
+
+    print(f"Generated synthetic fleet in {args.database}:")
+    for table, count in created.items():
+        print(f"  {table}: {count}")
+    print(f"Benchmark logins: {BENCH_ADMIN[0]}/{BENCH_ADMIN[1]}, {BENCH_STAFF[0]}/{BENCH_STAFF[1]}")
+
+if __name__ == '__main__':
+    main()
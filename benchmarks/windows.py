@@ -0,0 +1,73 @@
+"""Times the windowed maintenance and invoice list endpoints.
+
+Generates the records, then times the first window, a window deep into
+the list, filtered and searched windows, against serializing every record
+as GET /api/maintenance does:
+
+    python -m benchmarks.windows --maintenance 200000 --invoices 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_data import create_app, generate
+from database import db
+from utils.serialization import dumps, invoice_schema, maintenance_schema
+from utils.windows import invoice_window, maintenance_window
+
+def _median_ms(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def run(counts, limit, repeats, seed):
+    app = create_app('sqlite://')
+    with app.test_request_context():
+        db.create_all()
+        generate(counts, seed=seed)
+        deep = counts['maintenance'] * 3 // 4
+
+        print(f"{counts['maintenance']} maintenance records, {counts['invoices']} invoices, windows of {limit}")
+        cases = [
+            ('maintenance, first window', lambda: maintenance_window(limit=limit)),
+            (f'maintenance, offset {deep}', lambda: maintenance_window(offset=deep, limit=limit)),
+            ('maintenance, overdue', lambda: maintenance_window(filters={'status': ['overdue']}, limit=limit)),
+            ('maintenance, status + type', lambda: maintenance_window(
+                filters={'status': ['scheduled'], 'type': ['repair']}, limit=limit)),
+            ("maintenance, search 'pump'", lambda: maintenance_window('pump', limit=limit)),
+            ('invoices, first window', lambda: invoice_window(limit=limit)),
+            ('invoices, paid by amount', lambda: invoice_window(statuses=['paid'], limit=limit, sort='-amount')),
+        ]
+        for label, func in cases:
+            print(f"  {label:<30} {_median_ms(func, repeats):8.2f} ms")
+        window = maintenance_window(limit=limit)
+        print(f"  {'window payload':<30} {len(dumps(window)) / 1024:8.1f} KiB")
+        print(f"  {'all maintenance (baseline)':<30} {_median_ms(lambda: dumps(maintenance_schema.all()), 1):8.2f} ms, "
+              f"{len(dumps(maintenance_schema.all())) / 1024:.0f} KiB")
+        print(f"  {'all invoices (baseline)':<30} {_median_ms(lambda: dumps(invoice_schema.all()), 1):8.2f} ms, "
+              f"{len(dumps(invoice_schema.all())) / 1024:.0f} KiB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark windowed list endpoints.')
+    parser.add_argument('--bowsers', type=int, default=5000)
+    parser.add_argument('--maintenance', type=int, default=200000)
+    parser.add_argument('--invoices', type=int, default=100000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    counts = {'bowsers': args.bowsers, 'locations': 100, 'deployments': 0,
+              'maintenance': args.maintenance, 'invoices': args.invoices, 'alerts': 0, 'users': 1}
+    run(counts, args.limit, args.repeats, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -15,20 +15,148 @@ class Config:
     # Database settings
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{os.path.join("instance", "aquaalert.db")}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-    }
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # extra create_engine() options, applied over the pool settings
+    
+    # Connection pool for server databases, per worker process: a host opens up
+    # to workers * (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW) connections. Size it to
+    # the worker's threads (gunicorn --threads plus JOB_THREAD_WORKERS); see
+    # python -m benchmarks.db_pool. SQLite ignores these settings.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = 10  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = 1800  # seconds before a connection is replaced
+    DB_POOL_LIFO = True  # reuse the most recent connection so surplus ones age out
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'idle')  # 'always', 'idle' or 'never'
+    DB_POOL_PING_IDLE = 30  # seconds unused before an 'idle' connection is pinged
     
     # Security headers
     SESSION_TYPE = 'filesystem'
     JSON_SORT_KEYS = False
+    FAST_JSON = os.environ.get('FAST_JSON', '1') == '1'  # use orjson for API responses when installed
+    RELATIONSHIP_LOADING = 'selectin'  # eager loading for list views: 'selectin' or 'joined'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    TEMPLATES_AUTO_RELOAD = True
+    TEMPLATES_AUTO_RELOAD = None  # None reloads templates only in debug mode
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')  # defaults to instance/jinja_cache
+    FRAGMENT_CACHE_ENABLED = True
+    FRAGMENT_CACHE_SIZE = 500  # rendered fragments kept per worker
+    FRAGMENT_CACHE_TIMEOUT = 300  # seconds
+    USE_BUILT_ASSETS = os.environ.get('USE_BUILT_ASSETS', '1') == '1'  # serve static/dist when built
+    
+    # Proxies in front of the app whose X-Forwarded-* headers are trusted, so
+    # rate limits see the client's address; leave 0 when clients connect directly
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+    
+    # Rate limiting (token buckets per user, known bearer token or IP)
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+    RATELIMIT_DEFAULT = "60 per minute;1000 per hour"  # per user, or per address when logged out
+    RATELIMIT_ROUTES = {  # longest matching path prefix wins; "" leaves a prefix unlimited
+        '/login': "10 per minute;50 per hour",
+        '/api/': "120 per minute",
+        # The public map page and its snapshot are static and cacheable, and in an
+        # outage many residents reach them from one carrier-NAT address
+        '/public_map': "",
+    }
+    # shm:// shares counters between the workers on a host; memory:// is per process
+    RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL', 'shm://')
+    
+    # Bowser level history (None keeps a resolution forever)
+    LEVEL_HISTORY_RETENTION = {
+        'raw': timedelta(days=7),
+        '1m': timedelta(days=30),
+        '1h': timedelta(days=400),
+        '1d': None,
+    }
+    LEVEL_HISTORY_MAX_POINTS = 1000
+    
+    # Background scheduler and supply forecasting
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') == '1'
+    FORECAST_INTERVAL = 300  # seconds
+    FORECAST_WINDOW_HOURS = 6
+    FORECAST_LOW_LEVEL_PERCENT = 20
+    FORECAST_DEPLETION_HOURS = 12
+    
+    # Depot bowsers start from when they have no deployment history
+    DEPOT_LATITUDE = float(os.environ['DEPOT_LATITUDE']) if os.environ.get('DEPOT_LATITUDE') else None
+    DEPOT_LONGITUDE = float(os.environ['DEPOT_LONGITUDE']) if os.environ.get('DEPOT_LONGITUDE') else None
+    
+    # Maintenance planning (see utils.maintenance_planner)
+    MAINTENANCE_INTERVALS = {  # days between maintenance of each recurring type
+        'inspection': 30,
+        'cleaning': 60,
+        'routine': 90,
+        'service': 180,
+    }
+    MAINTENANCE_BATCH_DAYS = 14  # work due this soon after a visit is done on that visit
+    MAINTENANCE_PLAN_WEEKS = 12
+    MAINTENANCE_PLAN_INTERVAL = 60  # seconds between data version checks
+    
+    # Mutual aid ledger (see utils.ledger)
+    LEDGER_CHECK_INTERVAL = 86400  # seconds between running balance checks
+    
+    # Management bowser grid (see utils.bowser_facets)
+    FACET_MAX_PER_PAGE = 200
+    
+    # Windowed list endpoints (see utils.windows)
+    WINDOW_MAX_LIMIT = 500
+    
+    # Full-text search (see utils.search)
+    SEARCH_MAX_PER_PAGE = 500
+    SEARCH_RANK_WINDOW = 5000  # matches of one type ranked per query; broader prefixes rank the first ones
+    
+    # Server-side exports (see utils.exports)
+    EXPORT_DIR = os.environ.get('EXPORT_DIR')  # defaults to instance/exports
+    EXPORT_CHUNK_SIZE = 2000  # rows read per query
+    EXPORT_MAX_AGE = 86400  # seconds before export files are deleted
+
+    # Shared location distance matrix (see utils.distances)
+    DISTANCE_MATRIX_DIR = os.environ.get('DISTANCE_MATRIX_DIR')  # defaults to instance/distances
+    # Locations x bowser positions float32; growing past this raises instead (10k x 500 needs about 32 MiB)
+    DISTANCE_MATRIX_MAX_MB = int(os.environ.get('DISTANCE_MATRIX_MAX_MB', 512))
+    
+    # Bowser allocation (see utils.allocation)
+    ALLOCATION_BASE_DEMAND = 5000.0  # litres a commercial site needs; higher priorities need more
+    ALLOCATION_DISTANCE_COST = 50.0  # priority-weighted litres one km of travel is worth
+    ALLOCATION_CANDIDATES = 8  # nearest demanding locations offered to each bowser
+    ALLOCATION_MAX_KM = 50.0
+    
+    # Refill route planning (see utils.routing); tankers leave from the depot
+    REFILL_VEHICLES = int(os.environ.get('REFILL_VEHICLES', 4))
+    REFILL_VEHICLE_CAPACITY = 20000.0  # litres per tanker
+    REFILL_SPEED_KMH = 40.0
+    REFILL_ROAD_FACTOR = 1.3  # road distance per km of great-circle distance
+    REFILL_SERVICE_MINUTES = 15.0  # time to top up one bowser
+    REFILL_SHIFT_HOURS = 10.0  # tankers must be back at the depot within this
+    REFILL_TRIGGER_PERCENT = 50.0  # bowsers below this level are refilled
+    REFILL_HORIZON_HOURS = 24.0  # as are bowsers forecast to run dry within this
+    REFILL_PLAN_TTL = 300  # seconds before the plan is rebuilt with fresh forecasts
+    
+    # Public map snapshot (served from files so traffic spikes skip the database)
+    PUBLIC_SNAPSHOT_DIR = os.environ.get('PUBLIC_SNAPSHOT_DIR')  # defaults to instance/public
+    PUBLIC_SNAPSHOT_INTERVAL = 30  # seconds between data version checks
+    PUBLIC_SNAPSHOT_MAX_AGE = 30  # seconds clients and proxies may reuse it
+    
+    # Persistent job queue; every process with JOB_WORKERS_ENABLED claims jobs
+    JOB_WORKERS_ENABLED = os.environ.get('JOB_WORKERS_ENABLED', '1') == '1'
+    JOB_THREAD_WORKERS = int(os.environ.get('JOB_THREAD_WORKERS', 4))
+    JOB_PROCESS_WORKERS = int(os.environ.get('JOB_PROCESS_WORKERS', 2))
+    JOB_POLL_INTERVAL = 1.0  # seconds
+    JOB_RETRY_BACKOFF = 30  # seconds, doubled on each retry
+    JOB_TIMEOUT = 3600  # seconds before a running job is considered stale
+    JOB_REQUEUE_INTERVAL = 300  # seconds between checks for stale jobs
+    
+    # Test dashboard runs
+    TEST_RUN_MAX_CONCURRENT = 2
+    TEST_RUN_TIMEOUT = 1800  # seconds
+    TEST_RUN_STREAM_MAX_AGE = 30  # seconds an event stream stays open before the client reconnects
     
-    # Rate limiting
-    RATELIMIT_DEFAULT = "200 per day;50 per hour"
-    RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL', 'memory://')
+    # Instrumentation
+    SLOW_QUERY_THRESHOLD = 0.1  # seconds
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')
+    N_PLUS_ONE_THRESHOLD = 10  # repeats of one statement in a request
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Each worker writes its metrics here and a scrape merges them; defaults to instance/metrics
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = 1.0  # seconds between a worker's snapshot writes
     
     # Password policy
     PASSWORD_MIN_LENGTH = 8
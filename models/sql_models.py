@@ -2,6 +2,7 @@ from database import db
 from datetime import datetime, timedelta
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+import json
 import re
 from flask import current_app
 
@@ -91,6 +92,9 @@ class User(UserMixin, db.Model):
         return f'<User {self.username} ({self.role})>'
 
 class Bowser(db.Model):
+    # Covering index for the management grid's facet counts (utils.bowser_facets)
+    __table_args__ = (db.Index('ix_bowser_facets', 'status', 'capacity', 'owner'),)
+
     id = db.Column(db.String(36), primary_key=True)
     number = db.Column(db.String(20), unique=True, nullable=False)
     capacity = db.Column(db.Float, nullable=False)
@@ -117,6 +121,46 @@ class Bowser(db.Model):
             if hasattr(self, key):
                 setattr(self, key, value)
 
+class BowserLevelBlock(db.Model):
+    """Raw level readings for one bowser and one UTC day, stored as packed arrays."""
+    __tablename__ = 'bowser_level_block'
+
+    bowser_id = db.Column(db.String(36), db.ForeignKey('bowser.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    timestamps = db.Column(db.LargeBinary, nullable=False, default=b'')
+    levels = db.Column(db.LargeBinary, nullable=False, default=b'')
+
+class BowserLevelRollup(db.Model):
+    """Downsampled level statistics for one bowser, resolution and time bucket."""
+    __tablename__ = 'bowser_level_rollup'
+
+    bowser_id = db.Column(db.String(36), db.ForeignKey('bowser.id'), primary_key=True)
+    resolution = db.Column(db.String(3), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    min_level = db.Column(db.Float, nullable=False)
+    max_level = db.Column(db.Float, nullable=False)
+    sum_level = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    last_level = db.Column(db.Float, nullable=False)
+    last_at = db.Column(db.DateTime, nullable=False)
+
+    @property
+    def avg_level(self):
+        return self.sum_level / self.count if self.count else None
+
+    def to_dict(self):
+        return {
+            'bowser_id': self.bowser_id,
+            'resolution': self.resolution,
+            'bucket_start': self.bucket_start.isoformat(),
+            'min': self.min_level,
+            'max': self.max_level,
+            'avg': self.avg_level,
+            'last': self.last_level,
+            'count': self.count
+        }
+
 class Location(db.Model):
     id = db.Column(db.String(36), primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -143,6 +187,11 @@ class Location(db.Model):
                 setattr(self, key, value)
 
 class Maintenance(db.Model):
+    # Windowed lists order by (date, id), optionally within one status; the type
+    # makes the status index cover counts filtered on both
+    __table_args__ = (db.Index('ix_maintenance_date', 'date', 'id'),
+                      db.Index('ix_maintenance_status_date', 'status', 'date', 'id', 'maintenance_type'))
+
     id = db.Column(db.String(36), primary_key=True)
     bowser_id = db.Column(db.String(36), db.ForeignKey('bowser.id'), nullable=False)
     maintenance_type = db.Column(db.String(50), nullable=False)
@@ -150,6 +199,8 @@ class Maintenance(db.Model):
     date = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), nullable=False)
 
+    bowser = db.relationship('Bowser', backref=db.backref('maintenance_records', lazy='dynamic'))
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -165,7 +216,40 @@ class Maintenance(db.Model):
             if hasattr(self, key):
                 setattr(self, key, value)
 
+class MaintenancePlan(db.Model):
+    """One day's maintenance for one bowser, precomputed for the calendar by utils.maintenance_planner."""
+    __tablename__ = 'maintenance_plan'
+
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    bowser_id = db.Column(db.String(36), db.ForeignKey('bowser.id'), nullable=False)
+    bowser_number = db.Column(db.String(20), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'planned' or 'scheduled'
+    maintenance_id = db.Column(db.String(36), nullable=True)
+    types = db.Column(db.String(200), nullable=False)  # comma separated maintenance types
+    due_date = db.Column(db.Date, nullable=False)
+    overdue = db.Column(db.Boolean, nullable=False, default=False)
+    moved = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        return {
+            'date': self.date.isoformat(),
+            'bowser_id': self.bowser_id,
+            'bowser_number': self.bowser_number,
+            'kind': self.kind,
+            'maintenance_id': self.maintenance_id,
+            'types': self.types.split(','),
+            'due_date': self.due_date.isoformat(),
+            'overdue': self.overdue,
+            'moved': self.moved
+        }
+
 class Deployment(db.Model):
+    # Covers the open deployments of each bowser (utils.bowser_facets) and
+    # deployment exports in date order (utils.exports)
+    __table_args__ = (db.Index('ix_deployment_status_bowser', 'status', 'bowser_id'),
+                      db.Index('ix_deployment_start_date', 'start_date', 'id'))
+
     id = db.Column(db.String(36), primary_key=True)
     bowser_id = db.Column(db.String(36), db.ForeignKey('bowser.id'), nullable=False)
     location_id = db.Column(db.String(36), db.ForeignKey('location.id'), nullable=False)
@@ -175,6 +259,10 @@ class Deployment(db.Model):
     priority = db.Column(db.String(20), nullable=False)
     notes = db.Column(db.Text, nullable=True)
 
+    # Lazy by default; list views choose a strategy with utils.read_models.related_options
+    bowser = db.relationship('Bowser', backref=db.backref('deployments', lazy='dynamic'))
+    location = db.relationship('Location', backref=db.backref('deployments', lazy='dynamic'))
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -193,6 +281,9 @@ class Deployment(db.Model):
                 setattr(self, key, value)
 
 class Invoice(db.Model):
+    __table_args__ = (db.Index('ix_invoice_issue_date', 'issue_date', 'id'),
+                      db.Index('ix_invoice_status_issue_date', 'status', 'issue_date', 'id'))
+
     id = db.Column(db.String(36), primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
     client_name = db.Column(db.String(100), nullable=False)
@@ -244,6 +335,51 @@ class Partner(db.Model):
             if hasattr(self, key):
                 setattr(self, key, value)
 
+class LedgerEntry(db.Model):
+    """A mutual aid ledger entry. Entries are only appended, never changed (see utils.ledger).
+
+    Amounts are whole pence so balances add up exactly; running_balance is
+    the scheme's balance after this entry, in (entry_date, id) order.
+    """
+    __tablename__ = 'ledger_entry'
+    # A scheme's balance as of a date is one seek on the scheme index; the date index orders the listing
+    __table_args__ = (db.Index('ix_ledger_entry_scheme_date', 'scheme_id', 'entry_date', 'id', 'running_balance'),
+                      db.Index('ix_ledger_entry_date', 'entry_date', 'id'))
+
+    id = db.Column(db.Integer, primary_key=True)
+    scheme_id = db.Column(db.String(36), nullable=False)
+    entry_type = db.Column(db.String(20), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)
+    running_balance = db.Column(db.Integer, nullable=False)
+    entry_date = db.Column(db.DateTime, nullable=False)
+    counterparty = db.Column(db.String(100), nullable=True)
+    reference = db.Column(db.String(50), nullable=True)
+    notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'scheme_id': self.scheme_id,
+            'entry_type': self.entry_type,
+            'amount': self.amount / 100,
+            'running_balance': self.running_balance / 100,
+            'entry_date': self.entry_date.isoformat(),
+            'counterparty': self.counterparty,
+            'reference': self.reference,
+            'notes': self.notes,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class LedgerBalance(db.Model):
+    """Current balance of each mutual aid scheme, kept up to date as entries are appended."""
+    __tablename__ = 'ledger_balance'
+
+    scheme_id = db.Column(db.String(36), primary_key=True)
+    balance = db.Column(db.Integer, nullable=False, default=0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    last_entry_date = db.Column(db.DateTime, nullable=True)
+
 class Alert(db.Model):
     id = db.Column(db.String(36), primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -251,12 +387,14 @@ class Alert(db.Model):
     alert_type = db.Column(db.String(50), nullable=False)
     priority = db.Column(db.String(20), nullable=False)
     status = db.Column(db.String(20), nullable=False)
+    bowser_id = db.Column(db.String(36), db.ForeignKey('bowser.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     resolved_at = db.Column(db.DateTime, nullable=True)
 
     def to_dict(self):
         return {
             'id': self.id,
+            'bowser_id': self.bowser_id,
             'title': self.title,
             'message': self.message,
             'alert_type': self.alert_type,
@@ -271,6 +409,51 @@ class Alert(db.Model):
             if hasattr(self, key):
                 setattr(self, key, value)
 
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (db.Index('ix_job_status_run_after', 'status', 'run_after'),
+                      db.Index('ix_job_unique_key', 'unique_key', unique=True))
+
+    id = db.Column(db.String(36), primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Set while a job queued with unique=True is queued or running, cleared once it finishes
+    unique_key = db.Column(db.String(64), nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'payload': json.loads(self.payload) if self.payload else {},
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'worker': self.worker,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class DataVersion(db.Model):
+    """Change counter per table, bumped on every write; keys cached fragments."""
+    __tablename__ = 'data_version'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
 class Scheme(db.Model):
     __tablename__ = 'schemes'
     
@@ -1,10 +1,28 @@
-from flask import Blueprint, jsonify, request, current_app, session
+from flask import Blueprint, jsonify, request, current_app, session, send_file
 from flask_login import current_user, login_required
 from functools import wraps
-from models.sql_models import User, Bowser, Location, Maintenance, Deployment, Invoice, Partner, Alert
+from models.sql_models import Bowser, Location, Maintenance, Deployment, Invoice, Partner, Alert, Job
+from models.mutual_aid_models import MutualAidContribution
 from database import db
-from datetime import datetime
+from utils.timeseries import level_store
+from utils.jobs import job_queue
+from utils.bowser_facets import CAPACITY_BUCKETS, DEPLOYMENT_STATES, FACETS, SORT_KEYS, bowser_facets
+from utils.allocation import ALLOCATION_TABLES, allocation_service, nearest_bowsers
+from utils.maintenance_planner import calendar_week, week_start
+from utils.routing import ROUTING_TABLES, refill_service
+from utils.search import SEARCH_SOURCES, search
+from utils.ledger import (ENTRY_SIGNS, LEDGER_SORT_KEYS, append_entry, balance_as_of, ledger_window,
+                          record_contribution, scheme_balances)
+from utils.exports import EXPORT_FORMATS, EXPORT_REPORTS, export_path, parse_export_params, start_export
+from utils.windows import (INVOICE_SORT_KEYS, MAINTENANCE_SORT_KEYS, MAINTENANCE_STATUSES, invoice_window,
+                           maintenance_window, parse_window)
+from utils.data_versions import data_version
+from utils.serialization import (json_response, bowser_schema, location_schema, deployment_schema,
+                                 maintenance_schema, user_schema, alert_schema)
+from datetime import datetime, timedelta
+import json
 import logging
+import os
 
 api_blueprint = Blueprint('api', __name__)
 logger = logging.getLogger(__name__)
@@ -48,7 +66,7 @@ def success_response(data=None, message=None):
         response['data'] = data
     if message is not None:
         response['message'] = message
-    return jsonify(response), 200
+    return json_response(response)
 
 def error_response(message, status_code=400):
     """Helper function to create an error response."""
@@ -113,15 +131,36 @@ def before_request():
 def get_bowsers():
     """Get all bowsers."""
     try:
-        bowsers = Bowser.query.all()
         return success_response(
-            data=[bowser.to_dict() for bowser in bowsers],
+            data=bowser_schema.all(),
             message="Bowsers retrieved successfully"
         )
     except Exception as e:
         logger.error(f"Error retrieving bowsers: {str(e)}")
         return error_response(f"Error retrieving bowsers: {str(e)}", 500)
 
+@api_blueprint.route('/bowsers/facets', methods=['GET'])
+@api_login_required
+@handle_api_error
+def get_bowser_facets():
+    """Get bowser counts per status, capacity, owner and deployment state, and one filtered page."""
+    filters = {facet: [value for value in request.args.get(facet, '').split(',') if value] for facet in FACETS}
+    for facet, allowed in (('capacity', CAPACITY_BUCKETS), ('deployment', DEPLOYMENT_STATES)):
+        if any(value not in allowed for value in filters[facet]):
+            return error_response(f"'{facet}' must be a comma-separated list of: {', '.join(allowed)}")
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 24, type=int)
+    max_per_page = current_app.config.get('FACET_MAX_PER_PAGE', 200)
+    if page < 1 or not 1 <= per_page <= max_per_page:
+        return error_response(f"'page' must be positive and 'per_page' between 1 and {max_per_page}")
+    sort = request.args.get('sort', 'number')
+    if sort.lstrip('-') not in SORT_KEYS:
+        return error_response(f"'sort' must be one of: {', '.join(SORT_KEYS)}, optionally prefixed with '-'")
+    return success_response(
+        data=bowser_facets(request.args.get('q', ''), filters, page, per_page, sort),
+        message="Bowser facets retrieved successfully"
+    )
+
 @api_blueprint.route('/bowsers/<int:bowser_id>', methods=['GET'])
 @login_required
 def get_bowser(bowser_id):
@@ -153,6 +192,100 @@ def create_bowser():
         db.session.rollback()
         return error_response(f"Error creating bowser: {str(e)}")
 
+def parse_datetime_arg(name, default=None):
+    """Parse an ISO-8601 query string argument into a datetime."""
+    value = request.args.get(name)
+    if not value:
+        return default
+    return datetime.fromisoformat(value.replace('Z', ''))
+
+@api_blueprint.route('/bowsers/<bowser_id>/levels', methods=['GET'])
+@api_login_required
+@handle_api_error
+def get_bowser_levels(bowser_id):
+    """Get level history for a bowser from the rollup matching the requested range."""
+    bowser = Bowser.query.get(bowser_id)
+    if not bowser:
+        return error_response('Bowser not found', 404)
+    try:
+        end = parse_datetime_arg('to', datetime.utcnow())
+        start = parse_datetime_arg('from', end - timedelta(days=1))
+        if start >= end:
+            return error_response("'from' must be before 'to'")
+        series = level_store.query(bowser.id, start, end, request.args.get('resolution'))
+    except ValueError as e:
+        return error_response(str(e))
+    return success_response(data=series, message="Bowser levels retrieved successfully")
+
+@api_blueprint.route('/bowsers/<bowser_id>/levels', methods=['POST'])
+@api_staff_required
+@handle_malformed_json
+def record_bowser_levels(bowser_id):
+    """Record one level reading, or a batch under 'readings', for a bowser."""
+    bowser = Bowser.query.get(bowser_id)
+    if not bowser:
+        return error_response('Bowser not found', 404)
+    versions_before = data_version(*ALLOCATION_TABLES)
+    routing_versions_before = data_version(*ROUTING_TABLES)
+    try:
+        data = request.get_json()
+        readings = data.get('readings') or [data]
+        if not all('level' in reading for reading in readings):
+            return error_response('Missing required fields')
+
+        parsed = []
+        for reading in readings:
+            timestamp = reading.get('timestamp')
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '')) if timestamp else datetime.utcnow()
+            parsed.append((bowser.id, float(reading['level']), timestamp))
+
+        latest = max(parsed, key=lambda reading: reading[2])
+        bowser.current_level = latest[1]
+        count = level_store.record_many(parsed)
+        allocation_service.bowser_changed(bowser.id, versions_before, current_level=bowser.current_level)
+        refill_service.bowser_changed(bowser.id, routing_versions_before, current_level=bowser.current_level)
+        return success_response(
+            data={'bowser_id': bowser.id, 'recorded': count, 'current_level': bowser.current_level},
+            message="Bowser levels recorded successfully"
+        )
+    except ValueError as e:
+        db.session.rollback()
+        return error_response(f"Invalid reading: {str(e)}")
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"Error recording bowser levels: {str(e)}")
+
+# Allocation routes
+@api_blueprint.route('/allocation', methods=['GET'])
+@api_staff_required
+@handle_api_error
+def get_allocation():
+    """Get the current assignment of available bowsers to locations with unmet demand."""
+    return success_response(data=allocation_service.plan(), message="Allocation plan retrieved successfully")
+
+# Refill routing routes
+@api_blueprint.route('/refills', methods=['GET'])
+@api_staff_required
+@handle_api_error
+def get_refills():
+    """Get the bowsers due a refill, most urgent first, with their planned vehicle."""
+    try:
+        data = refill_service.refills()
+    except ValueError as e:
+        return error_response(str(e), 409)
+    return success_response(data=data, message="Refills retrieved successfully")
+
+@api_blueprint.route('/schedule', methods=['GET'])
+@api_staff_required
+@handle_api_error
+def get_refill_schedule():
+    """Get the refill route of each tanker, stops in visiting order."""
+    try:
+        data = refill_service.schedule()
+    except ValueError as e:
+        return error_response(str(e), 409)
+    return success_response(data=data, message="Refill schedule retrieved successfully")
+
 # Location routes
 @api_blueprint.route('/locations', methods=['GET'])
 @api_login_required
@@ -160,9 +293,8 @@ def create_bowser():
 def get_locations():
     """Get all locations."""
     try:
-        locations = Location.query.all()
         return success_response(
-            data=[location.to_dict() for location in locations],
+            data=location_schema.all(),
             message="Locations retrieved successfully"
         )
     except Exception as e:
@@ -198,6 +330,21 @@ def create_location():
         logger.error(f"Error creating location: {str(e)}")
         return error_response(f"Error creating location: {str(e)}", 500)
 
+@api_blueprint.route('/locations/<location_id>/nearest-bowsers', methods=['GET'])
+@api_login_required
+@handle_api_error
+def get_nearest_bowsers(location_id):
+    """Get the bowsers nearest a location, optionally filtered by status."""
+    if not Location.query.get(location_id):
+        return error_response('Location not found', 404)
+    k = request.args.get('k', 5, type=int)
+    if not 1 <= k <= 100:
+        return error_response("'k' must be between 1 and 100")
+    return success_response(
+        data=nearest_bowsers(location_id, k, request.args.get('status')),
+        message="Nearest bowsers retrieved successfully"
+    )
+
 # Deployment routes
 @api_blueprint.route('/deployments', methods=['GET'])
 @api_login_required
@@ -205,9 +352,8 @@ def create_location():
 def get_deployments():
     """Get all deployments."""
     try:
-        deployments = Deployment.query.all()
         return success_response(
-            data=[deployment.to_dict() for deployment in deployments],
+            data=deployment_schema.all(),
             message="Deployments retrieved successfully"
         )
     except Exception as e:
@@ -247,9 +393,8 @@ def create_deployment():
 def get_maintenance():
     """Get all maintenance records."""
     try:
-        maintenance = Maintenance.query.all()
         return success_response(
-            data=[record.to_dict() for record in maintenance],
+            data=maintenance_schema.all(),
             message="Maintenance records retrieved successfully"
         )
     except Exception as e:
@@ -282,6 +427,201 @@ def create_maintenance():
         db.session.rollback()
         return error_response(f"Error creating maintenance record: {str(e)}")
 
+@api_blueprint.route('/maintenance/calendar', methods=['GET'])
+@api_login_required
+@handle_api_error
+def get_maintenance_calendar():
+    """Get open and planned maintenance for one week from the precomputed plan."""
+    try:
+        start = week_start(request.args.get('week'))
+    except ValueError:
+        return error_response("'week' must be an ISO week (2024-W07) or a date (2024-02-11)")
+    return success_response(data=calendar_week(start), message="Maintenance calendar retrieved successfully")
+
+@api_blueprint.route('/maintenance/window', methods=['GET'])
+@api_login_required
+@handle_api_error
+def get_maintenance_window():
+    """Get one stably sorted window of maintenance records and the number matching."""
+    try:
+        offset, limit, sort = parse_window(request.args, MAINTENANCE_SORT_KEYS, '-date',
+                                           current_app.config.get('WINDOW_MAX_LIMIT', 500))
+    except ValueError as e:
+        return error_response(str(e))
+    filters = {name: [value for value in request.args.get(name, '').split(',') if value]
+               for name in ('status', 'type', 'bowser_id')}
+    if any(status not in MAINTENANCE_STATUSES for status in filters['status']):
+        return error_response(f"'status' must be a comma-separated list of: {', '.join(MAINTENANCE_STATUSES)}")
+    return success_response(
+        data=maintenance_window(request.args.get('q', ''), filters, offset, limit, sort),
+        message="Maintenance records retrieved successfully"
+    )
+
+# Invoice routes
+@api_blueprint.route('/invoices/window', methods=['GET'])
+@api_admin_required
+@handle_api_error
+def get_invoice_window():
+    """Get one stably sorted window of invoices and the number matching."""
+    try:
+        offset, limit, sort = parse_window(request.args, INVOICE_SORT_KEYS, '-issue_date',
+                                           current_app.config.get('WINDOW_MAX_LIMIT', 500))
+    except ValueError as e:
+        return error_response(str(e))
+    statuses = [value for value in request.args.get('status', '').split(',') if value]
+    return success_response(
+        data=invoice_window(request.args.get('q', ''), statuses, offset, limit, sort),
+        message="Invoices retrieved successfully"
+    )
+
+# Mutual aid routes
+def _scheme_exists(scheme_id):
+    # Schemes are kept in the JSON store, which the app registers when it has one
+    schemes = current_app.extensions.get('json_handler')
+    return schemes is None or schemes.get_by_id('mutual_aid_schemes', scheme_id) is not None
+
+def _parse_date(value, name):
+    try:
+        return datetime.fromisoformat(value) if 'T' in value else datetime.fromisoformat(value[:10]).date()
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date (2024-02-11) or date and time (2024-02-11T09:30)")
+
+@api_blueprint.route('/mutual-aid/transactions', methods=['GET'])
+@api_admin_required
+@handle_api_error
+def get_mutual_aid_transactions():
+    """Get one window of mutual aid ledger entries, optionally of one scheme and some entry types."""
+    try:
+        offset, limit, sort = parse_window(request.args, LEDGER_SORT_KEYS, '-date',
+                                           current_app.config.get('WINDOW_MAX_LIMIT', 500))
+    except ValueError as e:
+        return error_response(str(e))
+    entry_types = [value for value in request.args.get('type', '').split(',') if value]
+    if any(entry_type not in ENTRY_SIGNS for entry_type in entry_types):
+        return error_response(f"'type' must be a comma-separated list of: {', '.join(ENTRY_SIGNS)}")
+    return success_response(
+        data=ledger_window(request.args.get('scheme_id'), entry_types, offset, limit, sort),
+        message="Mutual aid transactions retrieved successfully"
+    )
+
+@api_blueprint.route('/mutual-aid/transactions', methods=['POST'])
+@api_admin_required
+@handle_malformed_json
+def create_mutual_aid_transaction():
+    """Append a contribution, payout or adjustment to a scheme's ledger."""
+    data = request.get_json() or {}
+    if not data.get('scheme_id') or data.get('amount') is None or not data.get('date'):
+        return error_response('Missing required fields')
+    if not _scheme_exists(data['scheme_id']):
+        return error_response('Scheme not found', 404)
+    try:
+        entry_date = _parse_date(str(data['date']), 'date')
+        if data.get('type', 'contribution') == 'contribution':
+            entry = record_contribution(MutualAidContribution(
+                contributor_name=data.get('counterparty'), scheme_id=data['scheme_id'], amount=data['amount'],
+                contribution_date=entry_date, receipt_number=data.get('reference'), notes=data.get('notes')))
+        else:
+            entry = append_entry(data['scheme_id'], data['amount'], entry_date, data['type'],
+                                 counterparty=data.get('counterparty'), reference=data.get('reference'),
+                                 notes=data.get('notes'))
+    except ValueError as e:
+        return error_response(str(e))
+    except Exception as e:
+        return error_response(f"Error recording transaction: {str(e)}", 500)
+    return success_response(data=entry.to_dict(), message="Mutual aid transaction recorded successfully")
+
+@api_blueprint.route('/mutual-aid/balances', methods=['GET'])
+@api_admin_required
+@handle_api_error
+def get_mutual_aid_balances():
+    """Get every scheme's balance, now or at the end of the 'as_of' date."""
+    as_of = None
+    if request.args.get('as_of'):
+        try:
+            as_of = _parse_date(request.args['as_of'], 'as_of')
+        except ValueError as e:
+            return error_response(str(e))
+    balances = scheme_balances(as_of)
+    return success_response(
+        data={'balances': balances, 'total': round(sum(item['balance'] for item in balances.values()), 2),
+              'as_of': as_of},
+        message="Mutual aid balances retrieved successfully"
+    )
+
+@api_blueprint.route('/mutual-aid/schemes/<scheme_id>/balance', methods=['GET'])
+@api_admin_required
+@handle_api_error
+def get_mutual_aid_scheme_balance(scheme_id):
+    """Get one scheme's balance at the end of the 'as_of' date, today by default."""
+    try:
+        as_of = _parse_date(request.args['as_of'], 'as_of') if request.args.get('as_of') else datetime.utcnow()
+    except ValueError as e:
+        return error_response(str(e))
+    return success_response(data={'scheme_id': scheme_id, 'balance': balance_as_of(scheme_id, as_of), 'as_of': as_of})
+
+# Export routes
+@api_blueprint.route('/exports', methods=['POST'])
+@api_staff_required
+@handle_malformed_json
+def create_export():
+    """Queue a CSV, XLSX or PDF export, or return the one already built for unchanged data."""
+    data = request.get_json() or {}
+    report, fmt = data.get('report'), data.get('format')
+    if report not in EXPORT_REPORTS:
+        return error_response(f"'report' must be one of: {', '.join(EXPORT_REPORTS)}")
+    if fmt not in EXPORT_FORMATS:
+        return error_response(f"'format' must be one of: {', '.join(EXPORT_FORMATS)}")
+    if EXPORT_REPORTS[report]['admin'] and current_user.role != 'admin':
+        return error_response('Admin access required', 403)
+    try:
+        params = parse_export_params(report, data.get('params') or {})
+    except ValueError as e:
+        return error_response(str(e))
+    try:
+        job, cached = start_export(report, fmt, params)
+    except Exception as e:
+        return error_response(f"Error queueing export: {str(e)}", 500)
+    return success_response(data=dict(job.to_dict(), cached=cached), message="Export queued successfully")
+
+@api_blueprint.route('/exports/<job_id>/file', methods=['GET'])
+@api_staff_required
+@handle_api_error
+def download_export(job_id):
+    """Download the file of a finished export."""
+    job = Job.query.get(job_id)
+    if not job or job.name != 'export':
+        return error_response('Export not found', 404)
+    payload = json.loads(job.payload)
+    if EXPORT_REPORTS[payload['report']]['admin'] and current_user.role != 'admin':
+        return error_response('Admin access required', 403)
+    if job.status != 'succeeded':
+        return error_response('Export is not ready', 409)
+    path = export_path(payload['key'], payload['format'])
+    if not os.path.isfile(path):
+        return error_response('Export has expired; request it again', 410)
+    return send_file(path, mimetype=EXPORT_FORMATS[payload['format']][1], as_attachment=True,
+                     download_name=json.loads(job.result)['filename'])
+
+# Search routes
+@api_blueprint.route('/search', methods=['GET'])
+@api_login_required
+@handle_api_error
+def search_records():
+    """Search bowsers, locations, maintenance and, for admins, invoices by word prefix."""
+    allowed = [kind for kind in SEARCH_SOURCES if kind != 'invoice' or current_user.role == 'admin']
+    kinds = [kind for kind in request.args.get('types', '').split(',') if kind] or allowed
+    if any(kind not in allowed for kind in kinds):
+        return error_response(f"'types' must be a comma-separated list of: {', '.join(allowed)}")
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    if page < 1 or not 1 <= per_page <= current_app.config.get('SEARCH_MAX_PER_PAGE', 500):
+        return error_response("'page' must be positive and 'per_page' between 1 and "
+                              f"{current_app.config.get('SEARCH_MAX_PER_PAGE', 500)}")
+    return success_response(
+        data=search(request.args.get('q', ''), kinds, page, per_page),
+        message="Search results retrieved successfully"
+    )
+
 # User routes
 @api_blueprint.route('/users', methods=['GET'])
 @api_admin_required
@@ -289,9 +629,8 @@ def create_maintenance():
 def api_users():
     """Get all users."""
     try:
-        users = User.query.all()
         return success_response(
-            data=[user.to_dict() for user in users],
+            data=user_schema.all(),
             message="Users retrieved successfully"
         )
     except Exception as e:
@@ -303,13 +642,70 @@ def api_users():
 @api_staff_required
 @handle_api_error
 def api_alerts():
-    """Get all alerts."""
+    """Get alerts, optionally filtered by status and comma-separated alert types."""
     try:
-        alerts = Alert.query.all()
+        query = alert_schema.query()
+        if request.args.get('status'):
+            query = query.filter(Alert.status == request.args['status'])
+        if request.args.get('type'):
+            query = query.filter(Alert.alert_type.in_(request.args['type'].split(',')))
         return success_response(
-            data=[alert.to_dict() for alert in alerts],
+            data=alert_schema.all(query.order_by(Alert.created_at.desc())),
             message="Alerts retrieved successfully"
         )
     except Exception as e:
         logger.error(f"Error retrieving alerts: {str(e)}")
-        return error_response(f"Error retrieving alerts: {str(e)}", 500)
\ No newline at end of file
+        return error_response(f"Error retrieving alerts: {str(e)}", 500)
+
+# Job routes
+@api_blueprint.route('/jobs', methods=['GET'])
+@api_admin_required
+@handle_api_error
+def get_jobs():
+    """Get recent background jobs, optionally filtered by status and name."""
+    query = Job.query
+    if request.args.get('status'):
+        query = query.filter(Job.status == request.args['status'])
+    if request.args.get('name'):
+        query = query.filter(Job.name == request.args['name'])
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    jobs = query.order_by(Job.created_at.desc()).limit(limit).all()
+    return success_response(
+        data=[job.to_dict() for job in jobs],
+        message="Jobs retrieved successfully"
+    )
+
+@api_blueprint.route('/jobs/<job_id>', methods=['GET'])
+@api_staff_required
+@handle_api_error
+def get_job(job_id):
+    """Get the status and result of a background job.
+
+    Staff may only poll the exports they are allowed to create; every other
+    job, and its payload and result, is visible to admins only.
+    """
+    job = Job.query.get(job_id)
+    if not job:
+        return error_response('Job not found', 404)
+    if current_user.role != 'admin':
+        if job.name != 'export':
+            return error_response('Admin access required', 403)
+        if EXPORT_REPORTS[json.loads(job.payload)['report']]['admin']:
+            return error_response('Admin access required', 403)
+    return success_response(data=job.to_dict())
+
+@api_blueprint.route('/jobs', methods=['POST'])
+@api_admin_required
+@handle_malformed_json
+def create_job():
+    """Queue a registered background job."""
+    data = request.get_json()
+    if not data.get('name'):
+        return error_response('Missing required fields')
+    try:
+        job = job_queue.enqueue(data['name'], data.get('payload'), unique=data.get('unique', False))
+    except ValueError as e:
+        return error_response(str(e))
+    except Exception as e:
+        return error_response(f"Error queueing job: {str(e)}", 500)
+    return success_response(data=job.to_dict(), message="Job queued successfully")
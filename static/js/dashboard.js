@@ -10,6 +10,7 @@ export class Dashboard {
         this.markers = [];
         this.performanceChart = null;
         this.refreshInterval = null;
+        this.stopWatching = null;
         this.initialize();
     }
 
@@ -462,8 +463,12 @@ export class Dashboard {
      * Set up refresh intervals
      */
     startRefreshInterval() {
-        // Refresh every 30 seconds
-        this.refreshInterval = setInterval(() => this.updateDashboard(), 30000);
+        // Collections are refreshed every 30 seconds by the store, once for all open tabs;
+        // the updates that arrive together are rendered once
+        this.stopWatching = this.dataManager.watch(30000, () => {
+            clearTimeout(this.refreshInterval);
+            this.refreshInterval = setTimeout(() => this.updateDashboard(), 100);
+        });
     }
     
     /**
@@ -642,6 +647,8 @@ export class Dashboard {
             }
 
             const result = await response.json();
+            await dataStore.invalidate('locations');
+            await this.dataManager.refreshData();
             await this.updateDashboard();
             const modal = bootstrap.Modal.getInstance(document.getElementById('locationModal'));
             modal.hide();
@@ -675,6 +682,8 @@ export class Dashboard {
             }
 
             const result = await response.json();
+            await dataStore.invalidate('bowsers');
+            await this.dataManager.refreshData();
             await this.updateDashboard();
             const modal = bootstrap.Modal.getInstance(document.getElementById('bowserModal'));
             modal.hide();
@@ -708,6 +717,8 @@ export class Dashboard {
             }
 
             const result = await response.json();
+            await dataStore.invalidate('users');
+            await this.dataManager.refreshData();
             await this.updateDashboard();
             const modal = bootstrap.Modal.getInstance(document.getElementById('userModal'));
             modal.hide();
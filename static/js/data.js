@@ -49,6 +49,12 @@ export class DataManager {
         }
     }
 
+    // Locations only, for pages that page their bowsers from the server
+    async initializeLocations() {
+        this.data.locations = await this.loadLocations();
+        return this.data.locations;
+    }
+
     async loadLocations() {
         try {
             console.log('Loading locations...');
@@ -146,8 +152,39 @@ export class DataManager {
         return this.data.alerts.filter(a => a.priority === 'high');
     }
 
+    // Server-side full-text search
+    async search(query, options) {
+        return this.dbHandler.search(query, options);
+    }
+
+    // One filtered page of bowsers with facet counts
+    async getBowserFacets(params) {
+        return this.dbHandler.getBowserFacets(params);
+    }
+
     // Refresh data
     async refreshData() {
         await this.initializeData();
     }
+
+    /**
+     * Keep every collection current through the shared store's polling, which one
+     * tab runs for all open tabs, and call onChange with each collection that changed
+     * @param {number} interval - Milliseconds between refreshes
+     * @param {Function} onChange - (name) => void
+     * @returns {Function} Stops watching
+     */
+    watch(interval, onChange) {
+        const names = Object.keys(this.data);
+        const unsubscribers = names.map(name => dataStore.subscribe(name, data => {
+            this.data[name] = Array.isArray(data) ? data : [];
+            this.dbHandler.data[name] = this.data[name];
+            onChange(name);
+        }));
+        const unwatch = dataStore.watch(names, interval);
+        return () => {
+            unwatch();
+            unsubscribers.forEach(unsubscribe => unsubscribe());
+        };
+    }
 }
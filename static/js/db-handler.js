@@ -56,15 +56,37 @@ export class DBHandler {
         }
     }
 
+    /**
+     * Load a collection through the shared store (static/js/store.js), which caches it
+     * and shares one request between every caller on the page and other open tabs
+     * @param {string} name - Collection name, the path under /api
+     * @returns {Array} The collection
+     */
+    async loadCollection(name) {
+        if (typeof dataStore !== 'undefined') {
+            return dataStore.get(name);
+        }
+        const response = await this.request(`/${name}`);
+        return Array.isArray(response) ? response : response.data;
+    }
+
+    /**
+     * Mark the store's copy of the collection an endpoint writes to as stale, in every tab
+     * @param {string} endpoint - API path written to, such as /bowsers/12
+     */
+    async invalidateCollection(endpoint) {
+        if (typeof dataStore !== 'undefined') {
+            await dataStore.invalidatePath(endpoint);
+        }
+    }
+
     /**
      * Load bowsers from API
      */
     async loadBowsers() {
         try {
             console.log('Loading bowsers from API...');
-            const response = await this.request('/bowsers');
-            // Handle both array and { data: [...] } formats
-            const data = Array.isArray(response) ? response : response.data;
+            const data = await this.loadCollection('bowsers');
             console.log('Bowsers loaded successfully:', data);
             return data;
         } catch (error) {
@@ -79,8 +101,7 @@ export class DBHandler {
     async loadLocations() {
         try {
             console.log('Loading locations from API...');
-            const response = await this.request('/locations');
-            const data = Array.isArray(response) ? response : response.data;
+            const data = await this.loadCollection('locations');
             console.log('Locations loaded successfully:', data);
             return data;
         } catch (error) {
@@ -95,8 +116,7 @@ export class DBHandler {
     async loadMaintenance() {
         try {
             console.log('Loading maintenance from API...');
-            const response = await this.request('/maintenance');
-            const data = Array.isArray(response) ? response : response.data;
+            const data = await this.loadCollection('maintenance');
             console.log('Maintenance loaded successfully:', data);
             return data;
         } catch (error) {
@@ -111,8 +131,7 @@ export class DBHandler {
     async loadDeployments() {
         try {
             console.log('Loading deployments from API...');
-            const response = await this.request('/deployments');
-            const data = Array.isArray(response) ? response : response.data;
+            const data = await this.loadCollection('deployments');
             console.log('Deployments loaded successfully:', data);
             return data;
         } catch (error) {
@@ -127,8 +146,7 @@ export class DBHandler {
     async loadUsers() {
         try {
             console.log('Loading users from API...');
-            const response = await this.request('/users');
-            const data = Array.isArray(response) ? response : response.data;
+            const data = await this.loadCollection('users');
             console.log('Users loaded successfully:', data);
             return data;
         } catch (error) {
@@ -143,8 +161,7 @@ export class DBHandler {
     async loadAlerts() {
         try {
             console.log('Loading alerts from API...');
-            const response = await this.request('/alerts');
-            const data = Array.isArray(response) ? response : response.data;
+            const data = await this.loadCollection('alerts');
             console.log('Alerts loaded successfully:', data);
             return data;
         } catch (error) {
@@ -164,6 +181,16 @@ export class DBHandler {
         return this.data.bowsers || [];
     }
 
+    /**
+     * Get one page of bowsers with counts per status, capacity, owner and deployment state
+     * @param {Object} params q, status, capacity, owner, deployment, page, per_page and sort
+     * @returns {Object} Facet counts, the total matching and the page's bowsers
+     */
+    async getBowserFacets(params = {}) {
+        const result = await this.request(`/bowsers/facets?${new URLSearchParams(params)}`);
+        return result.data;
+    }
+
     /**
      * Get bowser by ID
      * @param {string} id Bowser ID
@@ -198,6 +225,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to add bowser: ${response.statusText}`);
             }
+            await this.invalidateCollection('/bowsers');
             
             const result = await response.json();
             
@@ -237,6 +265,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to update bowser: ${response.statusText}`);
             }
+            await this.invalidateCollection(`/bowsers/${id}`);
             
             // Update local cache
             const index = this.data.bowsers.findIndex(bowser => bowser.id == id);
@@ -269,6 +298,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to delete bowser: ${response.statusText}`);
             }
+            await this.invalidateCollection(`/bowsers/${id}`);
             
             // Update local cache
             const index = this.data.bowsers.findIndex(bowser => bowser.id == id);
@@ -340,6 +370,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to add location: ${response.statusText}`);
             }
+            await this.invalidateCollection('/locations');
             
             const result = await response.json();
             
@@ -379,6 +410,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to update location: ${response.statusText}`);
             }
+            await this.invalidateCollection(`/locations/${id}`);
             
             // Update local cache
             const index = this.data.locations.findIndex(location => location.id == id);
@@ -411,6 +443,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to delete location: ${response.statusText}`);
             }
+            await this.invalidateCollection(`/locations/${id}`);
             
             // Update local cache
             const index = this.data.locations.findIndex(location => location.id == id);
@@ -448,6 +481,55 @@ export class DBHandler {
         return this.data.maintenance.filter(record => record.bowserId === bowserId);
     }
     
+    /**
+     * Get one week of open and planned maintenance from the server's precomputed plan
+     * @param {Date} startDate First day of the week
+     * @returns {Object} Calendar with a days array of {date, events}
+     */
+    async getMaintenanceCalendar(startDate) {
+        const pad = value => String(value).padStart(2, '0');
+        const week = `${startDate.getFullYear()}-${pad(startDate.getMonth() + 1)}-${pad(startDate.getDate())}`;
+        const response = await fetch(`${this.baseUrl}/maintenance/calendar?week=${week}`);
+        if (!response.ok) {
+            throw new Error(`Calendar request failed with status ${response.status}`);
+        }
+        const result = await response.json();
+        return result.data;
+    }
+    
+    /**
+     * Get one window of maintenance records in a stable order, each with its bowser's number
+     * @param {Object} params q, status, type, bowser_id, offset, limit and sort
+     * @returns {Object} The window's items, the total matching and the data version
+     */
+    async getMaintenanceWindow(params = {}) {
+        const result = await this.request(`/maintenance/window?${new URLSearchParams(params)}`);
+        return result.data;
+    }
+    
+    /**
+     * Get one window of invoices in a stable order
+     * @param {Object} params q, status, offset, limit and sort
+     * @returns {Object} The window's items, the total matching and the data version
+     */
+    async getInvoiceWindow(params = {}) {
+        const result = await this.request(`/invoices/window?${new URLSearchParams(params)}`);
+        return result.data;
+    }
+    
+    /**
+     * Search bowsers, locations, maintenance and invoices on the server's full-text index
+     * @param {string} query Words to match; each matches the start of a word
+     * @param {Object} options types (comma-separated), page and perPage
+     * @returns {Object} Page of ranked results with per-type counts and the total
+     */
+    async search(query, { types = '', page = 1, perPage = 20 } = {}) {
+        const params = new URLSearchParams({ q: query, page, per_page: perPage });
+        if (types) params.set('types', types);
+        const result = await this.request(`/search?${params}`);
+        return result.data;
+    }
+    
     /**
      * Get maintenance record by ID
      * @param {string} id Maintenance record ID
@@ -495,6 +577,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to update maintenance record: ${response.statusText}`);
             }
+            await this.invalidateCollection(`/maintenance/${id}`);
             
             // Update local cache
             const index = this.data.maintenance.findIndex(record => record.id === id);
@@ -527,6 +610,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to delete maintenance record: ${response.statusText}`);
             }
+            await this.invalidateCollection(`/maintenance/${id}`);
             
             // Remove from local cache
             this.data.maintenance = this.data.maintenance.filter(record => record.id !== id);
@@ -560,10 +644,9 @@ export class DBHandler {
         }
         
         try {
-            // Try to get deployment from API first
-            const response = await fetch(`${this.baseUrl}/deployments`);
-            if (response.ok) {
-                const deployments = await response.json();
+            // Deployments come from the shared store, fetched at most once per ttl
+            const deployments = await this.loadCollection('deployments');
+            if (Array.isArray(deployments)) {
                 return deployments.find(dep => dep.bowserId === bowserId);
             }
             
@@ -615,6 +698,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to create deployment: ${response.statusText}`);
             }
+            await this.invalidateCollection('/deployments');
             
             const result = await response.json();
             return result;
@@ -675,6 +759,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to update deployment: ${response.statusText}`);
             }
+            await this.invalidateCollection(`/deployments/${id}`);
             
             const result = await response.json();
             return result;
@@ -746,6 +831,7 @@ export class DBHandler {
             if (!response.ok) {
                 throw new Error(`Failed to add maintenance record: ${response.statusText}`);
             }
+            await this.invalidateCollection('/maintenance');
             
             const result = await response.json();
             
@@ -810,6 +896,10 @@ export class DBHandler {
                 throw new Error(result.message);
             }
 
+            if (method !== 'GET') {
+                await this.invalidateCollection(endpoint);
+            }
+
             return result;
         } catch (error) {
             console.error(`Error in ${method} request to ${endpoint}:`, error);
@@ -7,9 +7,14 @@ class FinanceManager {
     constructor() {
         this.invoices = [];
         this.mutualAidTransactions = [];
+        this.mutualAidBalance = null;
         this.partners = [];
+        this.invoiceList = null;
         this.initializeData();
         this.initializeEventListeners();
+        // Invoices are windowed from the server rather than loaded with the rest
+        this.updateInvoicesList();
+        this.loadMutualAid();
     }
 
     async initializeData() {
@@ -44,15 +49,6 @@ class FinanceManager {
             this.invoices = await invoiceResponse.json();
             console.log('Invoices loaded:', this.invoices);
             
-            // Load mutual aid transactions data from API
-            console.log('Fetching mutual aid transactions data...');
-            const transactionResponse = await fetch('/api/mutual-aid/transactions');
-            if (!transactionResponse.ok) {
-                throw new Error(`Failed to fetch mutual aid transactions: ${transactionResponse.status}`);
-            }
-            this.mutualAidTransactions = await transactionResponse.json();
-            console.log('Mutual aid transactions loaded:', this.mutualAidTransactions);
-            
             // Update UI with data
             this.updateDisplay();
             
@@ -125,30 +121,46 @@ class FinanceManager {
         
         const invoiceSearchInput = document.getElementById('invoiceSearchInput');
         if (invoiceSearchInput) {
-            invoiceSearchInput.addEventListener('input', () => this.updateInvoicesList());
+            // The list debounces typing and matches on the server
+            invoiceSearchInput.addEventListener('input', () => this.invoiceList?.refresh());
         }
-        
-        // Export data buttons
-        document.querySelectorAll('button[data-format]').forEach(button => {
-            button.addEventListener('click', () => {
-                const format = button.getAttribute('data-format');
-                this.exportData(format);
-            });
-        });
-        
-        // If export buttons are added dynamically after page load
-        document.addEventListener('click', (e) => {
-            if (e.target.matches('button[data-format]') || e.target.closest('button[data-format]')) {
-                const button = e.target.matches('button[data-format]') ? e.target : e.target.closest('button[data-format]');
-                const format = button.getAttribute('data-format');
-                this.exportData(format);
+
+    }
+
+    /**
+     * Load the latest mutual aid ledger entries and the schemes' balances, which the
+     * server keeps as entries are recorded rather than summing them here
+     */
+    async loadMutualAid() {
+        try {
+            const [transactionResponse, balanceResponse] = await Promise.all([
+                fetch('/api/mutual-aid/transactions?limit=50'),
+                fetch('/api/mutual-aid/balances')
+            ]);
+            if (!transactionResponse.ok || !balanceResponse.ok) {
+                throw new Error(`Failed to fetch mutual aid data: ${transactionResponse.status}`);
             }
-        });
+            const transactions = (await transactionResponse.json()).data;
+            this.mutualAidTransactions = transactions.items.map(entry => ({
+                id: entry.id,
+                date: entry.entry_date.split('T')[0],
+                partner: entry.counterparty || '',
+                type: entry.entry_type,
+                resources: 'Financial',
+                amount: entry.amount,
+                balance: entry.running_balance,
+                status: 'completed'
+            }));
+            this.mutualAidBalance = (await balanceResponse.json()).data.total;
+            this.updateTransactionsList();
+            this.updateFinancialOverview();
+        } catch (error) {
+            console.error('Error loading mutual aid data:', error);
+        }
     }
 
     updateDisplay() {
         this.updateFinancialOverview();
-        this.updateInvoicesList();
         this.updatePartnersList();
         this.updateTransactionsList();
     }
@@ -175,8 +187,8 @@ class FinanceManager {
                 .filter(invoice => invoice.status === 'pending' || invoice.status === 'overdue')
                 .reduce((sum, invoice) => sum + invoice.amount, 0);
             
-            // Calculate mutual aid balance
-            const mutualAidBalance = this.partners.reduce((sum, partner) => sum + partner.balance, 0);
+            // The ledger's balance across schemes, once loaded
+            const mutualAidBalance = this.mutualAidBalance ?? 0;
             
             // Update UI with calculations
             if (document.getElementById('totalRevenue')) {
@@ -210,57 +222,92 @@ class FinanceManager {
         }
     }
 
-    updateInvoicesList() {
-        const tbody = document.getElementById('invoicesList');
-        if (!tbody) return;
-        
-        tbody.innerHTML = '';
-
-        // Get filter values
+    /**
+     * Fetch one window of invoices matching the search box and status filter
+     * @param {number} offset - Index of the first invoice
+     * @param {number} limit - Number of invoices
+     * @returns {Object} Items in this page's invoice shape, the total and the data version
+     */
+    async fetchInvoiceWindow(offset, limit) {
+        const params = new URLSearchParams({
+            q: document.getElementById('invoiceSearchInput')?.value.trim() || '',
+            offset,
+            limit
+        });
         const statusFilter = document.getElementById('invoiceStatusFilter')?.value || 'all';
-        const searchTerm = document.getElementById('invoiceSearchInput')?.value?.toLowerCase() || '';
+        if (statusFilter !== 'all') params.set('status', statusFilter);
         
-        // Filter invoices
-        const filteredInvoices = this.invoices.filter(invoice => {
-            const matchesStatus = statusFilter === 'all' || invoice.status === statusFilter;
-            const matchesSearch = 
-                invoice.client.toLowerCase().includes(searchTerm) || 
-                invoice.invoiceNumber.toLowerCase().includes(searchTerm);
-            return matchesStatus && matchesSearch;
-        });
+        const response = await fetch(`/api/invoices/window?${params}`);
+        if (!response.ok) {
+            throw new Error(`Failed to fetch invoices: ${response.status}`);
+        }
+        const result = await response.json();
+        return {
+            ...result.data,
+            items: result.data.items.map(invoice => ({
+                id: invoice.id,
+                invoiceNumber: invoice.invoice_number,
+                client: invoice.client_name,
+                amount: invoice.amount,
+                issueDate: invoice.issue_date.slice(0, 10),
+                dueDate: invoice.due_date.slice(0, 10),
+                status: invoice.status,
+                notes: invoice.notes
+            }))
+        };
+    }
 
-        filteredInvoices.forEach(invoice => {
-            const tr = document.createElement('tr');
-            tr.innerHTML = `
-                <td>${invoice.invoiceNumber}</td>
-                <td>${invoice.client}</td>
-                <td>£${invoice.amount.toLocaleString()}</td>
-                <td>${invoice.issueDate}</td>
-                <td>${invoice.dueDate}</td>
-                <td>
-                    <span class="status-badge status-${invoice.status}">
-                        ${invoice.status.charAt(0).toUpperCase() + invoice.status.slice(1)}
-                    </span>
-                </td>
-                <td>
-                    <button class="btn btn-sm btn-primary view-invoice" data-id="${invoice.id}">
-                        <i class="fas fa-eye"></i>
-                    </button>
-                    <button class="btn btn-sm btn-secondary download-invoice" data-id="${invoice.id}">
-                        <i class="fas fa-download"></i>
-                    </button>
-                </td>
-            `;
-            tbody.appendChild(tr);
-        });
-        
-        // Add event listeners to the new buttons
-        document.querySelectorAll('.view-invoice').forEach(button => {
-            button.addEventListener('click', () => {
-                const invoiceId = button.getAttribute('data-id');
-                this.viewInvoiceDetails(invoiceId);
+    createInvoiceRow(invoice) {
+        const tr = document.createElement('tr');
+        tr.innerHTML = `
+            <td>${invoice.invoiceNumber}</td>
+            <td>${invoice.client}</td>
+            <td>£${invoice.amount.toLocaleString()}</td>
+            <td>${invoice.issueDate}</td>
+            <td>${invoice.dueDate}</td>
+            <td>
+                <span class="status-badge status-${invoice.status}">
+                    ${invoice.status.charAt(0).toUpperCase() + invoice.status.slice(1)}
+                </span>
+            </td>
+            <td>
+                <button class="btn btn-sm btn-primary view-invoice" data-id="${invoice.id}">
+                    <i class="fas fa-eye"></i>
+                </button>
+                <button class="btn btn-sm btn-secondary download-invoice" data-id="${invoice.id}">
+                    <i class="fas fa-download"></i>
+                </button>
+            </td>
+        `;
+        tr.querySelector('.view-invoice').addEventListener('click', () => this.viewInvoiceDetails(invoice.id));
+        return tr;
+    }
+
+    /**
+     * Reload the invoice table from the top; only the rows scrolled into view are fetched and rendered
+     */
+    updateInvoicesList() {
+        const tbody = document.getElementById('invoicesList');
+        const viewport = document.getElementById('invoicesViewport');
+        if (!tbody || !viewport) return;
+        
+        if (!this.invoiceList) {
+            this.invoiceList = new VirtualList({
+                viewport,
+                content: tbody,
+                rowTag: 'tr',
+                blockSize: 100,
+                fetchWindow: (offset, limit) => this.fetchInvoiceWindow(offset, limit),
+                renderItem: invoice => this.createInvoiceRow(invoice),
+                onWindow: result => {
+                    document.getElementById('noInvoices').style.display = result.total === 0 ? 'block' : 'none';
+                    document.getElementById('invoicesPagination').textContent =
+                        `${result.total.toLocaleString()} invoices`;
+                },
+                onError: () => this.showNotification('Failed to load invoices', 'error')
             });
-        });
+        }
+        this.invoiceList.reset();
     }
 
     updatePartnersList() {
@@ -320,7 +367,8 @@ class FinanceManager {
     }
 
     viewInvoiceDetails(invoiceId) {
-        const invoice = this.invoices.find(inv => inv.id == invoiceId);
+        const invoice = this.invoices.find(inv => inv.id == invoiceId) ||
+            this.invoiceList?.find(inv => inv.id == invoiceId);
         if (!invoice) return;
         
         // Populate modal with invoice details
@@ -440,181 +488,36 @@ class FinanceManager {
     }
     
     async exportData(format) {
+        // Exports are built on the server from the whole table, not from the rows loaded here
+        const reports = {
+            invoices: () => {
+                const status = document.getElementById('invoiceStatusFilter')?.value || 'all';
+                return status !== 'all' ? { status: [status] } : {};
+            },
+            partners: () => ({}),
+            transactions: () => ({})
+        };
         try {
-            let data;
-            let filename;
-            
-            // Get data based on active tab
             const activeTab = document.querySelector('.nav-link.active');
             if (!activeTab) {
                 throw new Error('No active tab found');
             }
-
-            const tabId = activeTab.getAttribute('href');
-            if (!tabId) {
-                throw new Error('Tab ID not found');
-            }
-
-            // Remove the # from href
-            const cleanTabId = tabId.replace('#', '');
-            
-            // Get current date for filename
-            const currentDate = new Date().toISOString().split('T')[0];
-
-            switch (cleanTabId) {
-                case 'invoices':
-                    if (!this.invoices || !this.invoices.length) {
-                        throw new Error('No invoice data available');
-                    }
-                    data = this.invoices;
-                    filename = `aquaalert_invoices_${currentDate}`;
-                    break;
-                case 'partners':
-                    if (!this.partners || !this.partners.length) {
-                        throw new Error('No partner data available');
-                    }
-                    data = this.partners;
-                    filename = `aquaalert_partners_${currentDate}`;
-                    break;
-                case 'transactions':
-                    if (!this.mutualAidTransactions || !this.mutualAidTransactions.length) {
-                        throw new Error('No transaction data available');
-                    }
-                    data = this.mutualAidTransactions;
-                    filename = `aquaalert_transactions_${currentDate}`;
-                    break;
-                default:
-                    throw new Error(`Invalid tab selected: ${cleanTabId}`);
+            const target = activeTab.getAttribute('data-bs-target') || activeTab.getAttribute('href') || '';
+            const tabId = target.replace('#', '');
+            if (!reports[tabId]) {
+                throw new Error(`Exports are not available for ${tabId || 'this tab'}`);
             }
 
-            console.log(`Exporting ${filename} in ${format} format...`);
-            console.log('Data to export:', data);
-
-            // Use the Utils.exportData function
-            await Utils.exportData(data, format, filename);
+            // The transactions tab lists the mutual aid ledger
+            const report = tabId === 'transactions' ? 'mutual_aid' : tabId;
+            this.showNotification(`Preparing ${tabId} export...`);
+            await Utils.exportData(report, format, reports[tabId]());
         } catch (error) {
             const errorMessage = error.message || 'Unknown error occurred';
             console.error('Export failed:', error);
             this.showNotification(`Export failed: ${errorMessage}`, 'danger');
         }
     }
-    
-    exportAsPDF(data, filename) {
-        // In a real application, you would use a library like jsPDF or pdfmake
-        // For demo purposes, we'll create a simple HTML-based PDF export
-        
-        // Create a new window with formatted data
-        const printWindow = window.open('', '_blank');
-        
-        // Determine which table structure to use based on data type
-        const headers = Object.keys(data[0]).map(key => 
-            key.replace(/([A-Z])/g, ' $1').replace(/^./, str => str.toUpperCase())
-        );
-        
-        // Create HTML content
-        printWindow.document.write(`
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>${filename}</title>
-                <style>
-                    body { font-family: Arial, sans-serif; margin: 20px; }
-                    h1 { color: #2c3e50; }
-                    table { width: 100%; border-collapse: collapse; margin-top: 20px; }
-                    th, td { padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }
-                    th { background-color: #3498db; color: white; }
-                    tr:nth-child(even) { background-color: #f2f2f2; }
-                    .logo { text-align: center; margin-bottom: 20px; }
-                    .header { display: flex; justify-content: space-between; }
-                    .footer { margin-top: 30px; text-align: center; font-size: 0.8em; color: #7f8c8d; }
-                </style>
-            </head>
-            <body>
-                <div class="logo">
-                    <h1>AquaAlert Financial Report</h1>
-                    <p>Generated on ${new Date().toLocaleDateString()} at ${new Date().toLocaleTimeString()}</p>
-                </div>
-                
-                <table>
-                    <thead>
-                        <tr>
-                            ${headers.map(header => `<th>${header}</th>`).join('')}
-                        </tr>
-                    </thead>
-                    <tbody>
-                        ${data.map(item => `
-                            <tr>
-                                ${Object.values(item).map(value => `<td>${value}</td>`).join('')}
-                            </tr>
-                        `).join('')}
-                    </tbody>
-                </table>
-                
-                <div class="footer">
-                    <p>AquaAlert &copy; 2025 | Confidential Financial Information</p>
-                </div>
-                
-                <script>
-                    window.onload = function() {
-                        window.print();
-                    }
-                </script>
-            </body>
-            </html>
-        `);
-        
-        printWindow.document.close();
-    }
-    
-    exportAsExcel(data, filename) {
-        // In a real application, you would use a library like SheetJS (xlsx)
-        // For this demo, we'll create a CSV and suggest opening it in Excel
-        this.exportAsCSV(data, filename, true);
-    }
-    
-    exportAsCSV(data, filename, isExcel = false) {
-        // Convert the data array to CSV format
-        const headers = Object.keys(data[0]);
-        
-        // Create CSV content
-        let csvContent = headers.join(',') + '\n';
-        
-        // Add data rows
-        data.forEach(item => {
-            const row = headers.map(header => {
-                // Handle values that might contain commas or quotes
-                let value = item[header];
-                if (value === null || value === undefined) {
-                    return '';
-                }
-                value = String(value);
-                if (value.includes(',') || value.includes('"') || value.includes('\n')) {
-                    return `"${value.replace(/"/g, '""')}"`;
-                }
-                return value;
-            });
-            csvContent += row.join(',') + '\n';
-        });
-        
-        // Create a blob and download link
-        const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-        const url = URL.createObjectURL(blob);
-        
-        // Create download link
-        const link = document.createElement('a');
-        link.href = url;
-        link.setAttribute('download', `${filename}.csv`);
-        link.style.display = 'none';
-        
-        // Add to DOM, trigger download and clean up
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
-        
-        if (isExcel) {
-            this.showNotification('CSV file created. Open it with Excel to view as a spreadsheet.');
-        }
-    }
 
     initializeCharts() {
         console.log('Initializing charts with real data...');
@@ -71,12 +71,8 @@ class LocationManager {
 
     async loadLocations() {
         try {
-            // Fetch locations from API endpoint
-            const response = await fetch('/api/locations');
-            if (!response.ok) {
-                throw new Error('Failed to fetch locations');
-            }
-            const locations = await response.json();
+            // Read locations through the shared store, which fetches them at most once per ttl
+            const locations = await dataStore.get('locations');
             console.log('Loaded locations from API:', locations);
             
             // Display locations in the list and on the map
@@ -188,13 +184,8 @@ class LocationManager {
         const statusFilter = document.getElementById('statusFilter').value;
 
         try {
-            // Fetch all locations from API
-            const response = await fetch('/api/locations');
-            if (!response.ok) {
-                throw new Error('Failed to fetch locations for filtering');
-            }
-            
-            const locations = await response.json();
+            // Filter the store's copy rather than fetching every location on each keystroke
+            const locations = await dataStore.get('locations');
             
             // Filter locations based on search criteria
             const filteredLocations = locations.filter(location => {
@@ -273,6 +264,7 @@ class LocationManager {
             const result = await response.json();
             
             // Update UI
+            await dataStore.invalidate('locations');
             await this.loadLocations();
             const modal = bootstrap.Modal.getInstance(document.getElementById('addLocationModal'));
             modal.hide();
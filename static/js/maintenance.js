@@ -5,13 +5,16 @@ class MaintenanceManager {
     constructor() {
         this.currentView = 'list';
         this.currentWeek = new Date();
-        this.dbHandler = new DatabaseHandler();
+        // The page's one DBHandler, whose collections come from the shared store
+        this.dbHandler = window.dbHandler;
+        this.recordLists = [];
         this.initializeEventListeners();
         this.loadMaintenanceData();
     }
 
     initializeEventListeners() {
         // Search and filter handlers
+        // Records are filtered on the server; the lists debounce typing (see VirtualList.refresh)
         document.getElementById('searchMaintenance').addEventListener('input', () => this.filterRecords());
         document.getElementById('typeFilter').addEventListener('change', () => this.filterRecords());
         document.getElementById('statusFilter').addEventListener('change', () => this.filterRecords());
@@ -33,8 +36,9 @@ class MaintenanceManager {
         const addMaintenanceModal = document.getElementById('addMaintenanceModal');
         const closeModalBtns = document.querySelectorAll('.close-modal, .cancel-btn');
 
-        addMaintenanceBtn.addEventListener('click', () => {
-            this.populateBowserSelect();
+        addMaintenanceBtn.addEventListener('click', async () => {
+            // The bowser list is only needed here, so it is loaded on first use
+            await this.populateBowserSelect();
             addMaintenanceModal.style.display = 'block';
         });
 
@@ -54,15 +58,9 @@ class MaintenanceManager {
 
     async loadMaintenanceData() {
         try {
-            // Load data from the database if not already loaded
-            if (!this.dbHandler.dataLoaded) {
-                await this.dbHandler.loadData();
-            }
-            
-            // Get maintenance records from the database
-            const records = this.dbHandler.getMaintenanceRecords();
+            // Records are read a window at a time as they scroll into view
             this.updateCalendar();
-            this.displayMaintenanceRecords(records);
+            this.displayMaintenanceRecords();
         } catch (error) {
             console.error('Error loading maintenance records:', error);
             this.showNotification('Error loading maintenance records', 'error');
@@ -95,7 +93,7 @@ class MaintenanceManager {
         this.populateCalendarEvents(startDate);
     }
 
-    populateCalendarEvents(startDate) {
+    async populateCalendarEvents(startDate) {
         const days = document.querySelectorAll('.calendar-day');
         const today = new Date();
         
@@ -112,9 +110,42 @@ class MaintenanceManager {
             const dateHeader = days[i].querySelector('.day-header');
             dateHeader.textContent = `${days[i].querySelector('.day-header').textContent}\n${
                 currentDate.getDate()}`;
+        }
+
+        let calendar;
+        try {
+            calendar = await this.dbHandler.getMaintenanceCalendar(startDate);
+        } catch (error) {
+            console.warn('Maintenance calendar unavailable, using loaded records:', error);
+            this.populateCalendarFromRecords(startDate, days);
+            return;
+        }
+
+        // Open records and planned visits for the week, already grouped by day
+        calendar.days.forEach((day, i) => {
+            day.events.forEach(event => {
+                const eventElement = document.createElement('div');
+                const priority = event.overdue ? 'high' : (event.kind === 'scheduled' ? 'medium' : 'low');
+                eventElement.className = `maintenance-event event-${priority} event-${event.kind}`;
+                eventElement.textContent = `${event.types.join(', ')}: Bowser ${event.bowser_number}`;
+                if (event.moved) {
+                    eventElement.title = `Moved from ${event.due_date} to avoid a deployment`;
+                }
+                if (event.maintenance_id) {
+                    eventElement.addEventListener('click', () => this.viewMaintenanceDetails(event.maintenance_id));
+                }
+                days[i].appendChild(eventElement);
+            });
+        });
+    }
+
+    populateCalendarFromRecords(startDate, days) {
+        for (let i = 0; i < 7; i++) {
+            const currentDate = new Date(startDate);
+            currentDate.setDate(currentDate.getDate() + i);
 
             // Find maintenance events for this day
-            const events = this.dbHandler.getMaintenanceRecords().filter(record => {
+            const events = this.dbHandler.data.maintenance.filter(record => {
                 const scheduledDate = new Date(record.scheduled_date);
                 return scheduledDate.toDateString() === currentDate.toDateString();
             });
@@ -131,22 +162,61 @@ class MaintenanceManager {
         }
     }
 
-    displayMaintenanceRecords(records) {
+    /**
+     * Query parameters for the search box and filters; the kanban columns set their own status
+     * @param {boolean} withStatus - Whether to apply the status filter
+     * @returns {Object} Parameters for /api/maintenance/window
+     */
+    windowParams(withStatus = true) {
+        const params = { q: document.getElementById('searchMaintenance').value.trim() };
+        const typeFilter = document.getElementById('typeFilter').value;
+        const statusFilter = document.getElementById('statusFilter').value;
+        if (typeFilter !== 'all') params.type = typeFilter;
+        if (withStatus && statusFilter !== 'all') params.status = statusFilter.replace('-', '_');
+        // Records carry no priority, so the priority filter has nothing to match on the server
+        return params;
+    }
+
+    /**
+     * A scrolling list of records matching params, rendering only the cards in view
+     * @param {Element} viewport - Scrolling element to render into
+     * @param {Function} params - Returns the current query parameters
+     * @param {Function} onWindow - Called with each window response
+     * @returns {VirtualList} The list, loading its first window
+     */
+    createRecordList(viewport, params, onWindow = null) {
+        const content = document.createElement('div');
+        content.className = 'list-view';
+        viewport.appendChild(content);
+        const list = new VirtualList({
+            viewport,
+            content,
+            blockSize: 50,
+            fetchWindow: (offset, limit) => this.dbHandler.getMaintenanceWindow({ ...params(), offset, limit }),
+            renderItem: record => this.createMaintenanceCard(record),
+            onWindow,
+            onError: () => this.showNotification('Error loading maintenance records', 'error')
+        });
+        list.reset();
+        this.recordLists.push(list);
+        return list;
+    }
+
+    displayMaintenanceRecords() {
         const container = document.getElementById('maintenanceRecords');
+        this.recordLists.forEach(list => list.destroy());
+        this.recordLists = [];
         container.innerHTML = '';
 
         if (this.currentView === 'list') {
-            records.forEach(record => {
-                const card = this.createMaintenanceCard(record);
-                container.appendChild(card);
-            });
+            container.className = 'card-body virtual-viewport';
+            this.createRecordList(container, () => this.windowParams());
         } else {
-            this.displayKanbanView(records);
+            this.displayKanbanView();
         }
     }
 
     createMaintenanceCard(record) {
-        const bowser = this.dbHandler.getBowserById(record.bowser_id);
         const card = document.createElement('div');
         card.className = 'maintenance-card';
         
@@ -156,7 +226,7 @@ class MaintenanceManager {
         card.innerHTML = `
             <div class="maintenance-info">
                 <div>
-                    <h3>Bowser ${bowser?.number || 'Unknown'}</h3>
+                    <h3>Bowser ${record.bowser_number || 'Unknown'}</h3>
                     <p>${record.description}</p>
                     <div class="maintenance-status status-${status}">
                         ${status.charAt(0).toUpperCase() + status.slice(1)}
@@ -167,8 +237,8 @@ class MaintenanceManager {
                     </div>
                 </div>
                 <div>
-                    <p><i class="fas fa-calendar"></i> ${new Date(record.scheduled_date).toLocaleDateString()}</p>
-                    <p><i class="fas fa-user-cog"></i> ${record.assigned_to}</p>
+                    <p><i class="fas fa-calendar"></i> ${new Date(record.date).toLocaleDateString()}</p>
+                    <p><i class="fas fa-wrench"></i> ${record.maintenance_type}</p>
                 </div>
             </div>
         `;
@@ -177,46 +247,40 @@ class MaintenanceManager {
         return card;
     }
 
-    displayKanbanView(records) {
+    displayKanbanView() {
         const container = document.getElementById('maintenanceRecords');
         container.className = 'kanban-view';
         
-        const columns = {
-            scheduled: [],
-            'in-progress': [],
-            completed: [],
-            overdue: []
-        };
-
-        // Sort records into columns
-        records.forEach(record => {
-            columns[record.status].push(record);
-        });
-
-        // Create columns
-        Object.entries(columns).forEach(([status, statusRecords]) => {
+        // Each column is its own server-side list of one status
+        ['scheduled', 'in-progress', 'completed', 'overdue'].forEach(status => {
+            const title = status.charAt(0).toUpperCase() + status.slice(1);
             const column = document.createElement('div');
             column.className = 'kanban-column';
             column.innerHTML = `
-                <h3>${status.charAt(0).toUpperCase() + status.slice(1)}</h3>
-                <div class="kanban-cards"></div>
+                <h3>${title}</h3>
+                <div class="kanban-cards virtual-viewport"></div>
             `;
-
-            const cardsContainer = column.querySelector('.kanban-cards');
-            statusRecords.forEach(record => {
-                cardsContainer.appendChild(this.createMaintenanceCard(record));
-            });
-
             container.appendChild(column);
+
+            const heading = column.querySelector('h3');
+            this.createRecordList(
+                column.querySelector('.kanban-cards'),
+                () => ({ ...this.windowParams(false), status: status.replace('-', '_') }),
+                result => { heading.textContent = `${title} (${result.total.toLocaleString()})`; }
+            );
         });
     }
 
     async viewMaintenanceDetails(id) {
-        // Get the maintenance record by ID
-        const record = await this.dbHandler.getMaintenanceRecordById(id);
+        // Records on screen are in a list's loaded windows; others are fetched
+        let record;
+        for (const list of this.recordLists) {
+            record = list.find(item => item.id === id);
+            if (record) break;
+        }
+        record = record || await this.dbHandler.getMaintenanceRecordById(id);
         if (!record) return;
 
-        const bowser = this.dbHandler.getBowserById(record.bowser_id);
         const modal = document.getElementById('maintenanceDetailsModal');
         const content = document.getElementById('maintenanceDetailsContent');
         
@@ -227,11 +291,11 @@ class MaintenanceManager {
             <div class="details-grid">
                 <div class="detail-item">
                     <label>Bowser</label>
-                    <span>${bowser?.number || 'Unknown'}</span>
+                    <span>${record.bowser_number || 'Unknown'}</span>
                 </div>
                 <div class="detail-item">
                     <label>Type</label>
-                    <span>${record.type}</span>
+                    <span>${record.maintenance_type || record.type}</span>
                 </div>
                 <div class="detail-item">
                     <label>Status</label>
@@ -243,11 +307,11 @@ class MaintenanceManager {
                 </div>
                 <div class="detail-item">
                     <label>Scheduled Date</label>
-                    <span>${new Date(record.scheduled_date).toLocaleString()}</span>
+                    <span>${new Date(record.date || record.scheduled_date).toLocaleString()}</span>
                 </div>
                 <div class="detail-item">
                     <label>Assigned To</label>
-                    <span>${record.assigned_to}</span>
+                    <span>${record.assigned_to || 'Unassigned'}</span>
                 </div>
                 <div class="detail-item full-width">
                     <label>Description</label>
@@ -273,13 +337,8 @@ class MaintenanceManager {
 
         try {
             // Add to database
-            await fetch(`${this.dbHandler.API_BASE_URL}/maintenance`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify(formData)
-            });
+            // request() drops the store's cached maintenance in every tab
+            await this.dbHandler.request('/maintenance', 'POST', formData);
 
             // Update UI
             await this.loadMaintenanceData();
@@ -291,11 +350,11 @@ class MaintenanceManager {
         }
     }
 
-    populateBowserSelect() {
+    async populateBowserSelect() {
         const select = document.getElementById('bowserId');
         select.innerHTML = '';
         
-        this.dbHandler.getBowsers().forEach(bowser => {
+        (await this.dbHandler.getBowsers()).forEach(bowser => {
             const option = document.createElement('option');
             option.value = bowser.id;
             option.textContent = `Bowser ${bowser.number}`;
@@ -304,28 +363,7 @@ class MaintenanceManager {
     }
 
     filterRecords() {
-        const searchTerm = document.getElementById('searchMaintenance').value.toLowerCase();
-        const typeFilter = document.getElementById('typeFilter').value;
-        const statusFilter = document.getElementById('statusFilter').value;
-        const priorityFilter = document.getElementById('priorityFilter').value;
-
-        let records = this.dbHandler.getMaintenanceRecords();
-
-        // Apply filters
-        records = records.filter(record => {
-            const matchesSearch = record.description.toLowerCase().includes(searchTerm);
-            const matchesType = typeFilter === 'all' || record.type === typeFilter;
-            
-            // Convert status format for comparison (e.g., in_progress to in-progress)
-            const recordStatus = record.status.replace('_', '-');
-            const matchesStatus = statusFilter === 'all' || recordStatus === statusFilter;
-            
-            const matchesPriority = priorityFilter === 'all' || record.priority === priorityFilter;
-
-            return matchesSearch && matchesType && matchesStatus && matchesPriority;
-        });
-
-        this.displayMaintenanceRecords(records);
+        this.recordLists.forEach(list => list.refresh());
     }
 
     navigateWeek(direction) {
@@ -9,8 +9,10 @@ import { DataManager } from './data.js';
 class BowserManagement {
     constructor() {
         this.currentTab = 'all';
-        this.bowsers = [];
-        this.filteredBowsers = [];
+        this.facets = null;
+        this.perPage = 48;
+        this.totalBowsers = 0;
+        this.bowserList = null;
         this.isLoading = false;
         this.currentBowser = null;
         this.dataManager = new DataManager();
@@ -26,18 +28,14 @@ class BowserManagement {
         try {
             this.showLoading(true);
             
-            // Load data from the database
-            await this.dataManager.initializeData();
-            
-            // Get bowsers from the database handler
-            this.bowsers = await this.dataManager.getBowsers();
-            this.filteredBowsers = [...this.bowsers];
+            // Bowsers are paged from the server; only locations are loaded up front
+            await this.dataManager.initializeLocations();
             
             // Set up event listeners
             this.setupEventListeners();
             
             // Initial render
-            this.renderBowserGrid();
+            await this.createBowserList();
             
             this.showLoading(false);
             
@@ -57,19 +55,14 @@ class BowserManagement {
         // Search functionality
         const searchInput = document.getElementById('searchBowser');
         if (searchInput) {
-            searchInput.addEventListener('input', () => {
-                this.filterBowsers();
-            });
+            searchInput.addEventListener('input', () => this.bowserList?.refresh());
         }
         
         // Filter dropdowns
-        const statusFilter = document.getElementById('statusFilter');
-        const locationFilter = document.getElementById('locationFilter');
-        const capacityFilter = document.getElementById('capacityFilter');
-        
-        if (statusFilter) statusFilter.addEventListener('change', () => this.filterBowsers());
-        if (locationFilter) locationFilter.addEventListener('change', () => this.filterBowsers());
-        if (capacityFilter) capacityFilter.addEventListener('change', () => this.filterBowsers());
+        Object.keys(this.facetFilters).forEach(id => {
+            const filter = document.getElementById(id);
+            if (filter) filter.addEventListener('change', () => this.filterBowsers());
+        });
         
         // Add bowser button
         const addBowserBtn = document.getElementById('addBowserBtn');
@@ -181,80 +174,99 @@ class BowserManagement {
     }
     
     /**
-     * Filter bowsers based on current filters
+     * Filter select ids and the facet each one filters
+     */
+    get facetFilters() {
+        return {
+            statusFilter: 'status',
+            capacityFilter: 'capacity',
+            ownerFilter: 'owner',
+            deploymentFilter: 'deployment'
+        };
+    }
+    
+    /**
+     * Filter bowsers based on current filters, from the top of the grid
      */
     filterBowsers() {
-        const searchTerm = document.getElementById('searchBowser')?.value.toLowerCase() || '';
-        const statusFilter = document.getElementById('statusFilter')?.value || '';
-        const locationFilter = document.getElementById('locationFilter')?.value || '';
-        const capacityFilter = document.getElementById('capacityFilter')?.value || '';
-        
-        this.filteredBowsers = this.bowsers.filter(bowser => {
-            // Apply search filter
-            if (searchTerm && !this.bowserMatchesSearch(bowser, searchTerm)) {
-                return false;
-            }
-            
-            // Apply status filter
-            if (statusFilter && bowser.status !== statusFilter) {
-                return false;
-            }
-            
-            // Apply location filter
-            if (locationFilter && (!bowser.location || bowser.location !== locationFilter)) {
-                return false;
-            }
-            
-            // Apply capacity filter
-            if (capacityFilter) {
-                const capacity = bowser.capacity;
-                if (capacityFilter === 'small' && capacity >= 5000) {
-                    return false;
-                } else if (capacityFilter === 'medium' && (capacity < 5000 || capacity > 10000)) {
-                    return false;
-                } else if (capacityFilter === 'large' && capacity <= 10000) {
-                    return false;
-                }
-            }
-            
-            // Bowser passed all filters
-            return true;
+        this.bowserList?.reset();
+    }
+    
+    /**
+     * Query parameters for the search box and filters
+     * @returns {Object} Parameters for /api/bowsers/facets
+     */
+    bowserParams() {
+        const params = { q: document.getElementById('searchBowser')?.value.trim() || '' };
+        Object.entries(this.facetFilters).forEach(([id, facet]) => {
+            const value = document.getElementById(id)?.value;
+            if (value) params[facet] = value;
         });
-        
-        // Update grid and show empty state if needed
-        this.renderBowserGrid();
-        
-        // Show or hide empty state
-        const emptyState = document.getElementById('emptyState');
-        if (emptyState) {
-            emptyState.style.display = this.filteredBowsers.length === 0 ? 'flex' : 'none';
-        }
+        return params;
+    }
+    
+    /**
+     * Set up the bowser grid, which fetches pages from the server as they scroll into view
+     * and keeps only the cards in view in the page
+     * @returns {Promise} Resolves when the first page has been rendered
+     */
+    createBowserList() {
+        const container = document.getElementById('bowserGrid');
+        if (!container) return Promise.resolve();
+        
+        // initialize() runs again after every change; the old list stops listening first
+        this.bowserList?.destroy();
+        this.bowserList = new VirtualList({
+            content: container,
+            blockSize: this.perPage,
+            fetchWindow: async (offset, limit) => {
+                const result = await this.dataManager.getBowserFacets({
+                    ...this.bowserParams(),
+                    page: offset / limit + 1,
+                    per_page: limit
+                });
+                return { ...result, items: result.results };
+            },
+            renderItem: bowser => this.createBowserCard(bowser),
+            onWindow: result => {
+                if (result.page !== 1) return;
+                this.totalBowsers = result.total;
+                this.facets = result.facets;
+                this.renderFacetCounts();
+                this.renderBowserGrid();
+            },
+            onError: () => this.showToast('Error loading bowser data', 'error')
+        });
+        return this.bowserList.reset();
     }
     
     /**
-     * Check if bowser matches the search term
-     * @param {Object} bowser - Bowser object
-     * @param {string} searchTerm - Search term
-     * @returns {boolean} True if bowser matches search term
+     * Show each filter option's bowser count, adding options for values the server reports
      */
-    bowserMatchesSearch(bowser, searchTerm) {
-        const searchableFields = [
-            bowser.id,
-            bowser.number,
-            bowser.owner,
-            bowser.manufacturer,
-            bowser.model,
-            bowser.notes,
-            this.formatStatus(bowser.status)
-        ];
-        
-        return searchableFields.some(field => {
-            return field && field.toString().toLowerCase().includes(searchTerm);
+    renderFacetCounts() {
+        Object.entries(this.facetFilters).forEach(([id, facet]) => {
+            const select = document.getElementById(id);
+            const counts = this.facets?.[facet];
+            if (!select || !counts) return;
+            
+            Object.keys(counts).forEach(value => {
+                if (!Array.from(select.options).some(option => option.value === value)) {
+                    const option = document.createElement('option');
+                    option.value = value;
+                    option.textContent = facet === 'owner' ? value : this.formatStatus(value);
+                    select.appendChild(option);
+                }
+            });
+            Array.from(select.options).forEach(option => {
+                if (!option.value) return;
+                option.dataset.label = option.dataset.label || option.textContent;
+                option.textContent = `${option.dataset.label} (${(counts[option.value] || 0).toLocaleString()})`;
+            });
         });
     }
     
     /**
-     * Render the bowser grid with filtered bowsers
+     * Show the grid, or the empty state when no bowser matches the filters
      */
     renderBowserGrid() {
         const container = document.getElementById('bowserGrid');
@@ -262,153 +274,143 @@ class BowserManagement {
         
         if (!container || !emptyState) return;
         
-        // Show/hide empty state
-        if (this.filteredBowsers.length === 0) {
-            container.style.display = 'none';
-            emptyState.style.display = 'flex';
-            return;
-        } else {
-            container.style.display = 'grid';
-            emptyState.style.display = 'none';
-        }
-        
-        // Clear container
-        container.innerHTML = '';
-        
-        // Create bowser cards
-        this.filteredBowsers.forEach(bowser => {
-            const card = document.createElement('div');
-            card.className = 'bowser-card';
-            card.dataset.bowserId = bowser.id;
-            
-            // Get status color
-            const statusClass = this.getStatusClass(bowser.status);
-            
-            // Get water level percentage
-            const waterLevel = Math.round((bowser.currentLevel / bowser.capacity) * 100);
-            
-            // Check if bowser is deployed
-            const deployment = this.dataManager.getDeploymentByBowserId(bowser.id);
-            const isDeployed = deployment !== null;
-            card.dataset.isDeployed = isDeployed;
-            
-            const location = deployment && deployment.locationId ? 
-                this.dataManager.getLocationById(deployment.locationId)?.name || 'Not assigned' : 'Not assigned';
-            
-            // Create the HTML structure for the card
-            let cardHTML = `
-            <div class="bowser-card-header ${statusClass}">
-                <h3>${bowser.number}</h3>
-                <span class="status-badge">${this.formatStatus(bowser.status)}</span>
+        container.style.display = this.totalBowsers === 0 ? 'none' : 'grid';
+        emptyState.style.display = this.totalBowsers === 0 ? 'flex' : 'none';
+    }
+    
+    /**
+     * Create the card of one bowser
+     * @param {Object} bowser - Bowser from the facets endpoint
+     * @returns {Element} The card
+     */
+    createBowserCard(bowser) {
+        const card = document.createElement('div');
+        card.className = 'bowser-card';
+        card.dataset.bowserId = bowser.id;
+        
+        // Get status color
+        const statusClass = this.getStatusClass(bowser.status);
+        
+        // Get water level percentage
+        const waterLevel = Math.round((bowser.current_level / bowser.capacity) * 100);
+        
+        // Deployment state and location come with the page from the server
+        const isDeployed = bowser.deployment === 'deployed';
+        card.dataset.isDeployed = isDeployed;
+        
+        const location = bowser.location_name || 'Not assigned';
+        
+        // Create the HTML structure for the card
+        let cardHTML = `
+        <div class="bowser-card-header ${statusClass}">
+            <h3>${bowser.number}</h3>
+            <span class="status-badge">${this.formatStatus(bowser.status)}</span>
+        </div>
+        <div class="bowser-card-body">
+            <div class="info-row">
+                <i class="fas fa-tint"></i>
+                <span>Capacity: ${bowser.capacity.toLocaleString()} L</span>
             </div>
-            <div class="bowser-card-body">
-                <div class="info-row">
-                    <i class="fas fa-tint"></i>
-                    <span>Capacity: ${bowser.capacity.toLocaleString()} L</span>
-                </div>
-                <div class="info-row">
-                    <i class="fas fa-map-marker-alt"></i>
-                    <span>Location: ${location}</span>
+            <div class="info-row">
+                <i class="fas fa-map-marker-alt"></i>
+                <span>Location: ${location}</span>
+            </div>
+            <div class="info-row">
+                <i class="fas fa-user"></i>
+                <span>Owner: ${bowser.owner || 'Unassigned'}</span>
+            </div>
+            <div class="water-level-container">
+                <div class="water-level-text">
+                    Water Level: ${waterLevel}%
                 </div>
-                <div class="info-row">
-                    <i class="fas fa-user"></i>
-                    <span>Owner: ${bowser.owner || 'Unassigned'}</span>
+                <div class="water-level-bar">
+                    <div class="water-level-fill" style="width: ${waterLevel}%"></div>
                 </div>
-                <div class="water-level-container">
-                    <div class="water-level-text">
-                        Water Level: ${waterLevel}%
-                    </div>
-                    <div class="water-level-bar">
-                        <div class="water-level-fill" style="width: ${waterLevel}%"></div>
-                    </div>
-                    <div class="water-level-amount">
-                        ${bowser.currentLevel.toLocaleString()} / ${bowser.capacity.toLocaleString()} L
-                    </div>
+                <div class="water-level-amount">
+                    ${bowser.current_level.toLocaleString()} / ${bowser.capacity.toLocaleString()} L
                 </div>
             </div>
-            <div class="bowser-card-footer">
-                <button class="btn btn-icon btn-details" title="View Details"><i class="fas fa-info-circle"></i> Details</button>
-                <button class="btn btn-icon btn-edit" title="Edit Bowser"><i class="fas fa-edit"></i> Edit</button>`;
-            
-            // Add deploy or undeploy button based on current status
-            if (isDeployed) {
-                cardHTML += `<button class="btn btn-icon btn-undeploy" title="Undeploy Bowser"><i class="fas fa-truck-loading"></i> Undeploy</button>`;
-            } else {
-                cardHTML += `<button class="btn btn-icon btn-deploy" title="Deploy Bowser"><i class="fas fa-truck"></i> Deploy</button>`;
-            }
-            
-            // Close the footer div
-            cardHTML += `</div>`;
-            
-            // Set the card's HTML
-            card.innerHTML = cardHTML;
-            
-            // Add the card to the container
-            container.appendChild(card);
-        });
+        </div>
+        <div class="bowser-card-footer">
+            <button class="btn btn-icon btn-details" title="View Details"><i class="fas fa-info-circle"></i> Details</button>
+            <button class="btn btn-icon btn-edit" title="Edit Bowser"><i class="fas fa-edit"></i> Edit</button>`;
+        
+        // Add deploy or undeploy button based on current status
+        if (isDeployed) {
+            cardHTML += `<button class="btn btn-icon btn-undeploy" title="Undeploy Bowser"><i class="fas fa-truck-loading"></i> Undeploy</button>`;
+        } else {
+            cardHTML += `<button class="btn btn-icon btn-deploy" title="Deploy Bowser"><i class="fas fa-truck"></i> Deploy</button>`;
+        }
+        
+        // Close the footer div
+        cardHTML += `</div>`;
         
-        // Add event listeners to all card buttons
-        this.addBowserCardEventListeners();
+        // Set the card's HTML
+        card.innerHTML = cardHTML;
+        
+        this.addBowserCardEventListeners(card);
+        return card;
     }
     
     /**
-     * Add event listeners to bowser card buttons
+     * Find a bowser among the grid's loaded pages
+     * @param {string} bowserId - Bowser ID
+     * @returns {Object|undefined} The bowser
      */
-    addBowserCardEventListeners() {
-        // Get all cards
-        const cards = document.querySelectorAll('.bowser-card');
-        console.log(`Adding event listeners to ${cards.length} bowser cards`);
-        
-        // Add event listeners to each card
-        cards.forEach(card => {
-            const bowserId = card.dataset.bowserId;
-            const isDeployed = card.dataset.isDeployed === 'true';
-            console.log(`Setting up card with bowserId: ${bowserId}, isDeployed: ${isDeployed}`);
-            
-            // Details button
-            const detailsBtn = card.querySelector('.btn-details');
-            if (detailsBtn) {
-                detailsBtn.addEventListener('click', (e) => {
-                    e.preventDefault();
-                    e.stopPropagation();
-                    console.log(`Details button clicked for bowser: ${bowserId}`);
-                    this.showBowserDetails(bowserId);
-                });
-            }
-            
-            // Edit button
-            const editBtn = card.querySelector('.btn-edit');
-            if (editBtn) {
-                editBtn.addEventListener('click', (e) => {
-                    e.preventDefault();
-                    e.stopPropagation();
-                    console.log(`Edit button clicked for bowser: ${bowserId}`);
-                    this.openEditBowserModal(bowserId);
-                });
-            }
-            
-            // Deploy button
-            const deployBtn = card.querySelector('.btn-deploy');
-            if (deployBtn) {
-                deployBtn.addEventListener('click', (e) => {
-                    e.preventDefault();
-                    e.stopPropagation();
-                    console.log(`Deploy button clicked for bowser: ${bowserId}`);
-                    this.deployBowser(bowserId);
-                });
-            }
-            
-            // Undeploy button
-            const undeployBtn = card.querySelector('.btn-undeploy');
-            if (undeployBtn) {
-                undeployBtn.addEventListener('click', (e) => {
-                    e.preventDefault();
-                    e.stopPropagation();
-                    console.log(`Undeploy button clicked for bowser: ${bowserId}`);
-                    this.undeployBowser(bowserId);
-                });
-            }
-        });
+    findBowser(bowserId) {
+        return this.bowserList?.find(bowser => bowser.id === bowserId);
+    }
+    
+    /**
+     * Add event listeners to a bowser card's buttons
+     * @param {Element} card - Card from createBowserCard
+     */
+    addBowserCardEventListeners(card) {
+        const bowserId = card.dataset.bowserId;
+        
+        // Details button
+        const detailsBtn = card.querySelector('.btn-details');
+        if (detailsBtn) {
+            detailsBtn.addEventListener('click', (e) => {
+                e.preventDefault();
+                e.stopPropagation();
+                console.log(`Details button clicked for bowser: ${bowserId}`);
+                this.showBowserDetails(bowserId);
+            });
+        }
+        
+        // Edit button
+        const editBtn = card.querySelector('.btn-edit');
+        if (editBtn) {
+            editBtn.addEventListener('click', (e) => {
+                e.preventDefault();
+                e.stopPropagation();
+                console.log(`Edit button clicked for bowser: ${bowserId}`);
+                this.openEditBowserModal(bowserId);
+            });
+        }
+        
+        // Deploy button
+        const deployBtn = card.querySelector('.btn-deploy');
+        if (deployBtn) {
+            deployBtn.addEventListener('click', (e) => {
+                e.preventDefault();
+                e.stopPropagation();
+                console.log(`Deploy button clicked for bowser: ${bowserId}`);
+                this.deployBowser(bowserId);
+            });
+        }
+        
+        // Undeploy button
+        const undeployBtn = card.querySelector('.btn-undeploy');
+        if (undeployBtn) {
+            undeployBtn.addEventListener('click', (e) => {
+                e.preventDefault();
+                e.stopPropagation();
+                console.log(`Undeploy button clicked for bowser: ${bowserId}`);
+                this.undeployBowser(bowserId);
+            });
+        }
     }
     
     /**
@@ -501,7 +503,7 @@ class BowserManagement {
      */
     showBowserDetails(bowserId) {
         // Find the bowser by ID using the database handler
-        const bowser = this.dataManager.getBowserById(bowserId);
+        const bowser = this.findBowser(bowserId);
         if (!bowser) {
             this.showToast('Bowser not found', 'error');
             return;
@@ -725,7 +727,7 @@ class BowserManagement {
                 this.showToast(`Bowser ${id} updated successfully`, 'success');
             } else {
                 // Check if bowser with this ID already exists
-                const existingBowser = this.dataManager.getBowserById(id);
+                const existingBowser = this.findBowser(id);
                 if (existingBowser) {
                     this.showToast(`Bowser with ID ${id} already exists`, 'error');
                     this.showLoading(false);
@@ -758,7 +760,7 @@ class BowserManagement {
             this.showLoading(true);
             
             // Get the bowser
-            const bowser = this.dataManager.getBowserById(bowserId);
+            const bowser = this.findBowser(bowserId);
             if (!bowser) {
                 this.showToast('Bowser not found', 'error');
                 this.showLoading(false);
@@ -806,7 +808,7 @@ class BowserManagement {
             this.showLoading(true);
             
             // Get the bowser
-            const bowser = this.dataManager.getBowserById(bowserId);
+            const bowser = this.findBowser(bowserId);
             if (!bowser) {
                 this.showToast('Bowser not found', 'error');
                 this.showLoading(false);
@@ -872,7 +874,7 @@ class BowserManagement {
             this.showLoading(true);
             
             // Get the bowser
-            const bowser = this.dataManager.getBowserById(bowserId);
+            const bowser = this.findBowser(bowserId);
             if (!bowser) {
                 this.showToast('Bowser not found', 'error');
                 this.showLoading(false);
@@ -956,7 +958,7 @@ class BowserManagement {
             await this.dataManager.createDeployment(deployment);
             
             // Update bowser status
-            const bowser = this.dataManager.getBowserById(bowserId);
+            const bowser = this.findBowser(bowserId);
             if (bowser) {
                 bowser.status = 'deployed';
                 await this.dataManager.updateBowser(bowserId, bowser);
@@ -119,34 +119,28 @@ class PriorityManager {
     }
 
     /**
-     * Get optimal bowser allocation based on priorities
+     * Get the server's allocation plan as a Map of location id to the
+     * bowsers assigned there. The plan is solved for the whole fleet on the
+     * server (utils/allocation.py) and re-solved when bowsers, locations or
+     * deployments change, so every tab sees the same assignment.
      */
-    getOptimalAllocation(availableBowsers, locations) {
+    async getOptimalAllocation() {
         const allocation = new Map();
-        const prioritizedLocations = [...locations]
-            .sort((a, b) => this.calculatePriorityScore(a) - this.calculatePriorityScore(b));
-        
-        const availableBowsersList = [...availableBowsers]
-            .sort((a, b) => b.capacity - a.capacity);
-        
-        for (const location of prioritizedLocations) {
-            if (availableBowsersList.length === 0) break;
-            
-            const requiredCapacity = this.calculateRequiredCapacity(location);
-            let allocatedBowsers = [];
-            let totalAllocatedCapacity = 0;
-            
-            while (totalAllocatedCapacity < requiredCapacity && availableBowsersList.length > 0) {
-                const bowser = availableBowsersList.shift();
-                allocatedBowsers.push(bowser);
-                totalAllocatedCapacity += bowser.capacity;
-            }
-            
-            if (allocatedBowsers.length > 0) {
-                allocation.set(location.id, allocatedBowsers);
+        const response = await fetch('/api/allocation', {
+            credentials: 'same-origin',
+            headers: { 'Accept': 'application/json' }
+        });
+        if (!response.ok) {
+            throw new Error(`Allocation request failed with status ${response.status}`);
+        }
+
+        const result = await response.json();
+        for (const assignment of result.data.assignments) {
+            if (!allocation.has(assignment.location_id)) {
+                allocation.set(assignment.location_id, []);
             }
+            allocation.get(assignment.location_id).push(assignment);
         }
-        
         return allocation;
     }
 
@@ -158,31 +152,25 @@ class PriorityManager {
     }
 
     /**
-     * Check current supply levels against minimum requirements
+     * Load supply alerts raised by the server-side forecast job.
+     * Consumption rates and time-to-empty are computed once per interval on
+     * the server for the whole fleet, so tabs only read the resulting alerts.
      */
     async checkSupplyLevels() {
-        const deployments = await this.getCurrentDeployments();
-        const alerts = [];
-
-        for (const deployment of deployments) {
-            const location = await this.getLocation(deployment.locationId);
-            const type = this.locationTypes[location.type] || 'commercial';
-            const minLevel = this.priorityLevels[type].minSupplyLevel;
-
-            if (deployment.supplyLevel < minLevel) {
-                alerts.push({
-                    type: 'supply',
-                    priority: this.priorityLevels[type].level,
-                    location: location,
-                    currentLevel: deployment.supplyLevel,
-                    minLevel: minLevel,
-                    timeToEmpty: this.calculateTimeToEmpty(deployment)
-                });
-            }
-        }
-
-        if (alerts.length > 0) {
-            this.handleSupplyAlerts(alerts);
+        try {
+            const response = await fetch('/api/alerts?status=active&type=low_level,depletion', {
+                credentials: 'same-origin',
+                headers: { 'Accept': 'application/json' }
+            });
+            if (!response.ok) return;
+
+            const result = await response.json();
+            const supplyAlerts = result.data || [];
+            const otherAlerts = (dataManager.alerts || [])
+                .filter(alert => !['low_level', 'depletion'].includes(alert.alert_type));
+            dataManager.alerts = [...otherAlerts, ...supplyAlerts];
+        } catch (error) {
+            console.error('Error loading supply alerts:', error);
         }
     }
 
@@ -216,32 +204,6 @@ class PriorityManager {
         }
     }
 
-    /**
-     * Handle supply level alerts
-     */
-    async handleSupplyAlerts(alerts) {
-        // Sort alerts by priority
-        alerts.sort((a, b) => a.priority - b.priority);
-
-        for (const alert of alerts) {
-            // Create system alert
-            await this.createAlert({
-                type: 'supply_warning',
-                locationId: alert.location.id,
-                message: `Supply level critical at ${alert.location.name}. Current: ${alert.currentLevel}%, Minimum: ${alert.minLevel}%. Time to empty: ${alert.timeToEmpty} minutes.`,
-                priority: alert.priority
-            });
-
-            // Notify relevant stakeholders
-            await this.notifyStakeholders(alert);
-
-            // Request refill if needed
-            if (alert.timeToEmpty < 120) { // 2 hours
-                await this.requestRefill(alert.location);
-            }
-        }
-    }
-
     /**
      * Handle response time alerts
      */
@@ -268,42 +230,6 @@ class PriorityManager {
         }
     }
 
-    /**
-     * Calculate estimated time until bowser is empty
-     */
-    calculateTimeToEmpty(deployment) {
-        const usageRate = this.estimateUsageRate(deployment);
-        return Math.floor((deployment.supplyLevel / usageRate) * 60);
-    }
-
-    /**
-     * Estimate usage rate (%/hour) based on location type and time of day
-     */
-    estimateUsageRate(deployment) {
-        const location = dataManager.locations.find(l => l.id === deployment.locationId);
-        const type = this.locationTypes[location.type] || 'commercial';
-        const hour = new Date().getHours();
-        
-        // Base rate by type
-        let rate = {
-            healthcare: 5,
-            emergency: 4,
-            critical: 4,
-            residential: 3,
-            commercial: 2
-        }[type];
-
-        // Time of day adjustment
-        if (hour >= 6 && hour <= 9) rate *= 1.5;  // Morning peak
-        if (hour >= 17 && hour <= 20) rate *= 1.3; // Evening peak
-        if (hour >= 23 || hour <= 5) rate *= 0.5;  // Night time
-
-        // Weather adjustment
-        if (this.isExtremeWeather()) rate *= 1.4;
-
-        return rate;
-    }
-
     /**
      * Check for extreme weather conditions
      */
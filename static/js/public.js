@@ -7,16 +7,12 @@ class PublicInterface {
         this.map = null;
         this.markers = {};
         this.currentPostcode = null;
+        this.data = { bowsers: [], locations: [], deployments: [], alerts: [] };
         
         // Initialize everything in sequence to ensure proper loading
         this.initializeMap();
         this.initializeEventListeners();
         
-        // Force data manager to load mock data
-        if (!dataManager.bowsers.length) {
-            dataManager.loadMockData();
-        }
-        
         // Wait for a moment to ensure map is properly initialized
         setTimeout(() => {
             // Test a direct marker first to verify basic functionality
@@ -148,16 +144,24 @@ class PublicInterface {
         try {
             console.log('Loading public data...');
             
-            // Force reload of mock data to ensure freshness
-            if (!dataManager.bowsers.length) {
-                console.log('No data loaded, loading mock data now');
-                dataManager.loadMockData();
+            try {
+                this.data = await this.fetchSnapshot();
+                this.snapshotRetries = 0;
+            } catch (error) {
+                // Keep whatever the map already shows and try again, backing off to once a minute
+                const retries = this.snapshotRetries || 0;
+                const delay = Math.min(60000, 5000 * 2 ** retries);
+                this.snapshotRetries = retries + 1;
+                console.warn(`Public map snapshot unavailable, retrying in ${delay / 1000}s:`, error);
+                this.showNotification('Bowser locations are unavailable right now. Retrying shortly.', 'warning');
+                clearTimeout(this.snapshotRetryTimer);
+                this.snapshotRetryTimer = setTimeout(() => this.loadPublicData(), delay);
+                return;
             }
             
-            // Load active deployments from data manager
-            const deployments = dataManager.deployments.filter(d => d.status === 'active');
-            const locations = dataManager.locations;
-            const alerts = dataManager.alerts;
+            const deployments = this.data.deployments.filter(d => d.status === 'active');
+            const locations = this.data.locations;
+            const alerts = this.data.alerts;
 
             console.log('Found deployments:', deployments.length, deployments);
             console.log('Found locations:', locations.length, locations);
@@ -180,6 +184,42 @@ class PublicInterface {
         }
     }
 
+    // The snapshot is a static GeoJSON file, so a busy public map costs the
+    // server a file read; the browser revalidates it with its ETag
+    async fetchSnapshot() {
+        const mapElement = document.getElementById('publicMap');
+        const response = await fetch(mapElement.dataset.snapshotUrl, { credentials: 'omit' });
+        if (!response.ok) {
+            throw new Error(`Snapshot request failed with status ${response.status}`);
+        }
+        const collection = await response.json();
+        const data = { bowsers: [], locations: [], deployments: [], alerts: [] };
+        const seenLocations = new Set();
+        collection.features.forEach(feature => {
+            const props = feature.properties;
+            const [lng, lat] = feature.geometry.coordinates;
+            data.bowsers.push({ id: props.bowser, number: props.bowser, status: props.bowser_status });
+            if (!seenLocations.has(props.location_id)) {
+                seenLocations.add(props.location_id);
+                data.locations.push({
+                    id: props.location_id,
+                    name: props.name,
+                    address: props.address,
+                    status: props.location_status,
+                    coordinates: [lat, lng]
+                });
+            }
+            data.deployments.push({
+                id: feature.id,
+                bowserId: props.bowser,
+                locationId: props.location_id,
+                supplyLevel: props.fill,
+                status: 'active'
+            });
+        });
+        return data;
+    }
+
     // Helper method to clear all markers from the map
     clearAllMarkers() {
         console.log('Clearing all markers from map');
@@ -242,7 +282,7 @@ class PublicInterface {
             }
 
             const location = locations.find(l => l.id === deployment.locationId);
-            const bowser = dataManager.bowsers.find(b => b.id === deployment.bowserId);
+            const bowser = this.data.bowsers.find(b => b.id === deployment.bowserId);
             
             if (location && bowser && location.coordinates) {
                 console.log(`Adding marker for deployment ${deployment.id} at coordinates:`, location.coordinates);
@@ -481,7 +521,7 @@ class PublicInterface {
         this.clearAllMarkers();
 
         // Get deployments that match the filters
-        const deployments = dataManager.deployments.filter(deployment => {
+        const deployments = this.data.deployments.filter(deployment => {
             // If deployment is active, check if it matches both area and status filters
             if (deployment.status !== 'active') {
                 return false;
@@ -500,13 +540,13 @@ class PublicInterface {
         console.log(`Found ${deployments.length} deployments matching filters`);
 
         // Display the filtered deployments
-        const locations = dataManager.locations;
+        const locations = this.data.locations;
         this.displayBowserLocations(deployments, locations);
     }
 
     getArea(locationId) {
         // Get area from location name or address
-        const location = dataManager.locations.find(l => l.id === locationId);
+        const location = this.data.locations.find(l => l.id === locationId);
         if (location) {
             // Check if location name or address contains the area code
             if (location.name.includes('SW1') || location.address.includes('SW1')) {
@@ -46,11 +46,11 @@ class ReportsManager {
 
     async loadReportData() {
         try {
-            // Fetch data from API
+            // Collections come from the shared store; only the reports themselves are fetched here
             const [bowsers, deployments, maintenance, reports] = await Promise.all([
-                fetch(`${CONFIG.api.base}${CONFIG.api.endpoints.bowsers}`).then(res => res.json()),
-                fetch(`${CONFIG.api.base}${CONFIG.api.endpoints.deployments}`).then(res => res.json()),
-                fetch(`${CONFIG.api.base}${CONFIG.api.endpoints.maintenance}`).then(res => res.json()),
+                dataStore.get('bowsers'),
+                dataStore.get('deployments'),
+                dataStore.get('maintenance'),
                 fetch(`${CONFIG.api.base}${CONFIG.api.endpoints.reports}`).then(res => res.json())
             ]);
             
@@ -138,8 +138,6 @@ class ReportsManager {
         document.getElementById('supplyChange').className = 'metric-change ' + (changes.supply.startsWith('+') ? 'positive' : 'negative');
     }
 
-    createUtilizationChart() {
-
     createUtilizationChart() {
         const ctx = document.getElementById('utilizationChart').getContext('2d');
         
@@ -399,9 +397,22 @@ class ReportsManager {
         return ((deployments.length % 3) + 1).toFixed(1);;
     }
 
-    exportReport(format) {
-        // This would normally handle the export functionality
-        this.showNotification(`Report exported as ${format.toUpperCase()}`, 'success');;
+    /**
+     * Export the deployments of the selected period; the server builds the file
+     * @param {string} format - pdf, excel or csv
+     */
+    async exportReport(format) {
+        const end = new Date();
+        const start = new Date();
+        start.setDate(end.getDate() - this.dateRange);
+        const params = {
+            start: start.toISOString().split('T')[0],
+            end: end.toISOString().split('T')[0]
+        };
+        this.showNotification(`Preparing ${format.toUpperCase()} export...`, 'info');
+        await Utils.exportData('deployments', format, params, progress => {
+            this.showNotification(`Exporting... ${Math.round(progress * 100)}%`, 'info');
+        });
     }
 
     showNotification(message, type = 'info') {
@@ -0,0 +1,429 @@
+/**
+ * Shared client data store for the AquaAlert application
+ * @module DataStore
+ *
+ * Every page reads the API's collections through one store. It keeps each
+ * collection in memory and in IndexedDB with a time-to-live, so a page
+ * opened again starts from the saved copy while a fresh one is fetched
+ * (stale-while-revalidate). Concurrent reads of a collection share one
+ * request. Open tabs share updates over a BroadcastChannel, and only one
+ * of them (the holder of a Web Lock) polls the API for the collections any
+ * tab is watching.
+ *
+ * Each user gets their own database, named after the data-user attribute
+ * of the script tag, and it is deleted on logout. Collections marked
+ * persist: false are only kept in memory.
+ */
+
+// Collections the store serves, with how long a copy stays fresh in milliseconds
+// and whether it may be saved in IndexedDB
+const STORE_COLLECTIONS = {
+    bowsers: { url: '/api/bowsers', ttl: 30000 },
+    locations: { url: '/api/locations', ttl: 300000 },
+    deployments: { url: '/api/deployments', ttl: 30000 },
+    maintenance: { url: '/api/maintenance', ttl: 60000 },
+    users: { url: '/api/users', ttl: 300000, persist: false },
+    alerts: { url: '/api/alerts', ttl: 15000 }
+};
+
+class DataStore {
+    /**
+     * @param {Object} [options]
+     * @param {Object} [options.collections] - Name to {url, ttl} of each collection
+     * @param {string} [options.user='anonymous'] - Id of the logged-in user, which names the store
+     * @param {string} [options.name] - Name of the IndexedDB database, channel and poll lock; defaults to one per user
+     * @param {number} [options.tick=1000] - How often the polling tab checks for due collections
+     */
+    constructor(options = {}) {
+        this.collections = options.collections || STORE_COLLECTIONS;
+        this.name = options.name || `aquaalert-store-${options.user || 'anonymous'}`;
+        this.tick = options.tick || 1000;
+        this.entries = new Map();
+        this.inflight = new Map();
+        this.subscribers = new Map();
+        this.localWatches = new Map();
+        this.remoteWatches = new Map();
+        this.database = null;
+        this.polling = false;
+        this.announceTimer = null;
+
+        this.channel = typeof BroadcastChannel !== 'undefined' ? new BroadcastChannel(this.name) : null;
+        if (this.channel) {
+            this.channel.onmessage = event => this.handleMessage(event.data);
+        }
+    }
+
+    /**
+     * A collection, from memory or IndexedDB while fresh; a stale copy is returned at once and refreshed behind it
+     * @param {string} name - Collection name
+     * @param {Object} [options]
+     * @param {number} [options.maxAge] - Oldest copy to accept, overriding the collection's ttl
+     * @returns {Promise<Array>} The collection
+     */
+    async get(name, { maxAge } = {}) {
+        const entry = this.entries.get(name) || await this.readPersisted(name);
+        if (!entry) {
+            return this.refresh(name);
+        }
+        const ttl = maxAge !== undefined ? maxAge : this.collection(name).ttl;
+        if (Date.now() - entry.fetchedAt > ttl) {
+            this.refresh(name).catch(error => console.warn(`Background refresh of ${name} failed:`, error));
+        }
+        return entry.data;
+    }
+
+    /**
+     * The copy of a collection in memory, without fetching
+     * @param {string} name - Collection name
+     * @returns {Array|undefined} The collection
+     */
+    peek(name) {
+        return this.entries.get(name)?.data;
+    }
+
+    /**
+     * Fetch a collection from the API; calls made while a request is running share it
+     * @param {string} name - Collection name
+     * @returns {Promise<Array>} The collection
+     */
+    refresh(name) {
+        if (this.inflight.has(name)) {
+            return this.inflight.get(name);
+        }
+        const request = (async () => {
+            const response = await fetch(this.collection(name).url, {
+                credentials: 'include',
+                headers: { Accept: 'application/json' }
+            });
+            if (response.status === 401 || response.status === 403) {
+                // The session ended or lost access: stop showing the copy this user may no longer see
+                await this.invalidate(name);
+                this.notify(name, []);
+            }
+            if (!response.ok) {
+                throw new Error(`Failed to fetch ${name}: ${response.status}`);
+            }
+            const body = await response.json();
+            const data = Array.isArray(body) ? body : (body.data || []);
+            await this.store(name, { data, fetchedAt: Date.now() });
+            this.post({ type: 'updated', name });
+            return data;
+        })().finally(() => this.inflight.delete(name));
+        this.inflight.set(name, request);
+        return request;
+    }
+
+    /**
+     * Drop the cached copies of collections in every tab, e.g. after writing to them
+     * @param {...string} names - Collection names
+     */
+    async invalidate(...names) {
+        for (const name of names) {
+            this.entries.delete(name);
+            await this.deletePersisted(name);
+            this.post({ type: 'invalidate', name });
+        }
+    }
+
+    /**
+     * Drop the collection an API path writes to, if the store serves it
+     * @param {string} path - API path such as /bowsers/12 or /api/bowsers/12
+     */
+    invalidatePath(path) {
+        const name = path.replace(/^\/api/, '').split(/[/?]/)[1];
+        if (name in this.collections) {
+            return this.invalidate(name);
+        }
+        return Promise.resolve();
+    }
+
+    /**
+     * Delete this store's database and drop every copy in every tab, e.g. on logout
+     * @returns {Promise<void>} Resolves once the database is deleted, or could not be
+     */
+    async destroy() {
+        this.entries.clear();
+        this.post({ type: 'destroy' });
+        if (this.database) {
+            const database = await this.database;
+            if (database) database.close();
+            this.database = null;
+        }
+        if (typeof indexedDB === 'undefined') return;
+        await new Promise(resolve => {
+            const request = indexedDB.deleteDatabase(this.name);
+            request.onsuccess = request.onerror = request.onblocked = () => resolve();
+        });
+    }
+
+    /**
+     * Call callback with a collection whenever a newer copy arrives, from this tab or another
+     * @param {string} name - Collection name
+     * @param {Function} callback - (data, name) => void
+     * @returns {Function} Unsubscribes
+     */
+    subscribe(name, callback) {
+        if (!this.subscribers.has(name)) {
+            this.subscribers.set(name, new Set());
+        }
+        this.subscribers.get(name).add(callback);
+        return () => this.subscribers.get(name)?.delete(callback);
+    }
+
+    /**
+     * Keep collections refreshed every interval while watched. One tab polls for all of them;
+     * the others announce what they watch and receive its updates.
+     * @param {Array<string>} names - Collection names
+     * @param {number} interval - Milliseconds between refreshes
+     * @returns {Function} Stops watching
+     */
+    watch(names, interval) {
+        const watch = { names, interval };
+        this.localWatches.set(watch, watch);
+        this.announce();
+        this.startPolling();
+        return () => {
+            this.localWatches.delete(watch);
+            this.announce();
+        };
+    }
+
+    collection(name) {
+        const collection = this.collections[name];
+        if (!collection) {
+            throw new Error(`Unknown collection: ${name}`);
+        }
+        return collection;
+    }
+
+    async store(name, entry) {
+        const current = this.entries.get(name);
+        if (current && current.fetchedAt >= entry.fetchedAt) {
+            return;
+        }
+        this.entries.set(name, entry);
+        await this.writePersisted(name, entry);
+        this.notify(name, entry.data);
+    }
+
+    notify(name, data) {
+        (this.subscribers.get(name) || []).forEach(callback => {
+            try {
+                callback(data, name);
+            } catch (error) {
+                console.error(`Error in ${name} subscriber:`, error);
+            }
+        });
+    }
+
+    post(message) {
+        if (this.channel) {
+            this.channel.postMessage(message);
+        }
+    }
+
+    async handleMessage(message) {
+        switch (message.type) {
+            case 'updated': {
+                // The sender saved the new copy before announcing it
+                const entry = await this.readPersisted(message.name, true);
+                if (entry) {
+                    await this.store(message.name, entry);
+                }
+                break;
+            }
+            case 'invalidate':
+                this.entries.delete(message.name);
+                break;
+            case 'destroy':
+                // Close the database so the tab deleting it is not blocked
+                this.entries.clear();
+                if (this.database) {
+                    const database = await this.database;
+                    if (database) database.close();
+                    this.database = null;
+                }
+                break;
+            case 'watch':
+                this.remoteWatches.set(message.tab, {
+                    intervals: message.intervals,
+                    expires: Date.now() + message.ttl
+                });
+                break;
+            case 'unwatch':
+                this.remoteWatches.delete(message.tab);
+                break;
+        }
+    }
+
+    /**
+     * Tell the polling tab which collections this tab watches, again before the announcement expires
+     */
+    announce() {
+        if (!this.channel) return;
+        clearTimeout(this.announceTimer);
+        this.tabId = this.tabId || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        const intervals = this.watchedIntervals(false);
+        if (Object.keys(intervals).length === 0) {
+            this.post({ type: 'unwatch', tab: this.tabId });
+            return;
+        }
+        const period = Math.max(this.tick, Math.min(...Object.values(intervals)));
+        this.post({ type: 'watch', tab: this.tabId, intervals, ttl: period * 3 });
+        this.announceTimer = setTimeout(() => this.announce(), period);
+    }
+
+    /**
+     * Shortest interval each watched collection is wanted at
+     * @param {boolean} includeRemote - Whether to include other tabs' announced watches
+     * @returns {Object} Collection name to interval
+     */
+    watchedIntervals(includeRemote = true) {
+        const intervals = {};
+        const add = (name, interval) => {
+            intervals[name] = Math.min(intervals[name] || Infinity, interval);
+        };
+        this.localWatches.forEach(({ names, interval }) => names.forEach(name => add(name, interval)));
+        if (includeRemote) {
+            const now = Date.now();
+            this.remoteWatches.forEach((watch, tab) => {
+                if (watch.expires < now) {
+                    this.remoteWatches.delete(tab);
+                    return;
+                }
+                Object.entries(watch.intervals).forEach(([name, interval]) => add(name, interval));
+            });
+        }
+        return intervals;
+    }
+
+    /**
+     * Poll from this tab once it holds the poll lock, which passes to another tab when this one closes
+     */
+    startPolling() {
+        if (this.polling) return;
+        this.polling = true;
+        if (typeof navigator !== 'undefined' && navigator.locks && this.channel) {
+            navigator.locks.request(`${this.name}-poll`, () => new Promise(() => this.pollLoop()));
+        } else {
+            // Without locks or a channel every tab polls for itself
+            this.pollLoop();
+        }
+    }
+
+    pollLoop() {
+        const due = Object.entries(this.watchedIntervals())
+            .filter(([name, interval]) => {
+                const entry = this.entries.get(name);
+                return !entry || Date.now() - entry.fetchedAt >= interval;
+            })
+            .map(([name]) => this.refresh(name).catch(error => console.warn(`Polling ${name} failed:`, error)));
+        Promise.all(due).finally(() => setTimeout(() => this.pollLoop(), this.tick));
+    }
+
+    openDatabase() {
+        if (!this.database) {
+            this.database = new Promise(resolve => {
+                if (typeof indexedDB === 'undefined') {
+                    resolve(null);
+                    return;
+                }
+                const request = indexedDB.open(this.name, 1);
+                request.onupgradeneeded = () => request.result.createObjectStore('collections');
+                request.onsuccess = () => {
+                    // Another tab deleting the database on logout closes this connection
+                    request.result.onversionchange = () => request.result.close();
+                    resolve(request.result);
+                };
+                // Private browsing and blocked storage fall back to memory only
+                request.onerror = () => resolve(null);
+            });
+        }
+        return this.database;
+    }
+
+    async transact(mode, operation) {
+        const database = await this.openDatabase();
+        if (!database) return undefined;
+        return new Promise(resolve => {
+            const request = operation(database.transaction('collections', mode).objectStore('collections'));
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(undefined);
+        });
+    }
+
+    /**
+     * The copy of a collection saved in IndexedDB, which is then kept in memory
+     * @param {string} name - Collection name
+     * @param {boolean} [reload=false] - Read even when a copy is in memory
+     * @returns {Promise<Object|undefined>} {data, fetchedAt}
+     */
+    async readPersisted(name, reload = false) {
+        if (this.collection(name).persist === false) {
+            return this.entries.get(name);
+        }
+        const entry = await this.transact('readonly', store => store.get(name));
+        if (entry && (reload || !this.entries.has(name))) {
+            if (!reload) this.entries.set(name, entry);
+            return entry;
+        }
+        return this.entries.get(name);
+    }
+
+    writePersisted(name, entry) {
+        if (this.collection(name).persist === false) {
+            return Promise.resolve();
+        }
+        return this.transact('readwrite', store => store.put(entry, name));
+    }
+
+    deletePersisted(name) {
+        return this.transact('readwrite', store => store.delete(name));
+    }
+}
+
+// One store per page, shared by every script on it; the script tag names the user
+const storeScript = typeof document !== 'undefined' ? document.currentScript : null;
+const dataStore = new DataStore({ user: storeScript && storeScript.dataset.user });
+
+// Logging out deletes the store before leaving the page, so the next user of this browser starts empty
+if (typeof document !== 'undefined') {
+    document.addEventListener('click', event => {
+        const link = event.target.closest && event.target.closest('a[href]');
+        if (!link || new URL(link.href, location.href).pathname !== '/logout') return;
+        event.preventDefault();
+        dataStore.destroy().finally(() => { location.href = link.href; });
+    });
+}
+
+// Pages written against the old global dataManager placeholder keep working
+// until they read through dataStore
+if (typeof window !== 'undefined' && typeof window.dataManager === 'undefined') {
+    window.dataManager = {
+        locations: [],
+        bowsers: [],
+        deployments: [],
+        getLocations() { return this.locations; },
+        getLocationById(id) { return this.locations.find(location => location.id === id); },
+        getBowsers() { return this.bowsers; },
+        getBowserById(id) { return this.bowsers.find(bowser => bowser.id === id); },
+        getDeploymentsByLocation(locationId) {
+            return this.deployments.filter(deployment => deployment.locationId === locationId);
+        },
+        getActiveAlerts() { return []; }
+    };
+}
+
+// Support both module (import/export) and non-module (global variable) usage
+try {
+    if (typeof module !== 'undefined' && module.exports) {
+        // Node.js/CommonJS export
+        module.exports = { DataStore, dataStore };
+    } else if (typeof window !== 'undefined') {
+        // Browser global variables
+        window.DataStore = DataStore;
+        window.dataStore = dataStore;
+    }
+} catch (e) {
+    console.log('Module export not supported in this environment');
+}
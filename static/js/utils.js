@@ -112,6 +112,7 @@ const Utils = {
     showNotification(message, type = 'info', duration = 3000) {
         const notification = document.getElementById('notification');
         const notificationText = document.getElementById('notificationText');
+        if (!notification || !notificationText) return;
         
         notification.className = `notification ${type}`;
         notificationText.textContent = message;
@@ -145,89 +146,66 @@ const Utils = {
     },
 
     /**
-     * Export data in various formats (PDF, Excel, CSV)
-     * @param {Object[]} data - Array of objects to export
+     * Export a report as PDF, Excel or CSV. The server builds the file in a background job,
+     * streaming rows from the database, and reuses it while the data is unchanged.
+     * @param {string} report - Report to export (invoices, partners, mutual_aid, maintenance, deployments)
      * @param {string} format - Format to export (pdf, excel, csv)
-     * @param {string} filename - Name of the file without extension
+     * @param {Object} [params] - start and end dates (YYYY-MM-DD) and a status list
+     * @param {Function} [onProgress] - Called with the fraction of rows written so far
+     * @returns {Promise<boolean>} Whether the file was downloaded
      */
-    async exportData(data, format, filename) {
+    async exportData(report, format, params = {}, onProgress = null) {
+        const formats = { pdf: 'pdf', excel: 'xlsx', xlsx: 'xlsx', csv: 'csv' };
         try {
-            let blob;
-            let extension;
-
-            switch (format.toLowerCase()) {
-                case 'csv':
-                    const csvContent = this.convertToCSV(data);
-                    blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-                    extension = 'csv';
-                    break;
-
-                case 'excel':
-                    const workbook = this.convertToExcel(data);
-                    blob = new Blob([workbook], { type: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' });
-                    extension = 'xlsx';
-                    break;
-
-                case 'pdf':
-                    const pdfContent = await this.convertToPDF(data);
-                    blob = new Blob([pdfContent], { type: 'application/pdf' });
-                    extension = 'pdf';
-                    break;
+            const serverFormat = formats[format.toLowerCase()];
+            if (!serverFormat) {
+                throw new Error('Unsupported format');
+            }
+            const token = document.querySelector('meta[name="csrf-token"]');
+            const response = await fetch('/api/exports', {
+                method: 'POST',
+                credentials: 'include',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': token ? token.getAttribute('content') : ''
+                },
+                body: JSON.stringify({ report, format: serverFormat, params })
+            });
+            const body = await response.json();
+            if (!response.ok || body.status === 'error') {
+                throw new Error(body.message || `HTTP error! status: ${response.status}`);
+            }
 
-                default:
-                    throw new Error('Unsupported format');
+            let job = body.data;
+            while (job.status === 'queued' || job.status === 'running') {
+                await new Promise(resolve => setTimeout(resolve, 500));
+                const poll = await fetch(`/api/jobs/${job.id}`, { credentials: 'include' });
+                if (!poll.ok) {
+                    throw new Error(`HTTP error! status: ${poll.status}`);
+                }
+                job = (await poll.json()).data;
+                if (onProgress && job.result && job.result.progress !== undefined) {
+                    onProgress(job.result.progress);
+                }
+            }
+            if (job.status !== 'succeeded') {
+                throw new Error(job.error || 'Export failed');
             }
 
+            // The server names the file and sends it as an attachment
             const link = document.createElement('a');
-            link.href = window.URL.createObjectURL(blob);
-            link.download = `${filename}.${extension}`;
+            link.href = `/api/exports/${job.id}/file`;
+            link.download = job.result.filename;
             document.body.appendChild(link);
             link.click();
             document.body.removeChild(link);
-            this.showNotification(`Export successful: ${filename}.${extension}`, 'success');
+            this.showNotification(`Export successful: ${job.result.filename}`, 'success');
+            return true;
         } catch (error) {
             console.error('Export failed:', error);
             this.showNotification('Export failed: ' + error.message, 'danger');
+            return false;
         }
-    },
-
-    /**
-     * Convert data to CSV format
-     * @param {Object[]} data - Array of objects to convert
-     * @returns {string} CSV content
-     */
-    convertToCSV(data) {
-        if (!data || !data.length) return '';
-        const headers = Object.keys(data[0]);
-        const csvRows = [
-            headers.join(','),
-            ...data.map(row => headers.map(header => 
-                JSON.stringify(row[header] || '')).join(','))
-        ];
-        return csvRows.join('\n');
-    },
-
-    /**
-     * Convert data to Excel format
-     * @param {Object[]} data - Array of objects to convert
-     * @returns {Uint8Array} Excel workbook
-     */
-    convertToExcel(data) {
-        // This is a placeholder. In a real implementation, you would use a library like SheetJS
-        // For now, we'll return the same as CSV but with an Excel mime type
-        return this.convertToCSV(data);
-    },
-
-    /**
-     * Convert data to PDF format
-     * @param {Object[]} data - Array of objects to convert
-     * @returns {Promise<Uint8Array>} PDF content
-     */
-    async convertToPDF(data) {
-        // This is a placeholder. In a real implementation, you would use a library like jsPDF
-        // For now, we'll return a simple text representation
-        const text = JSON.stringify(data, null, 2);
-        return new TextEncoder().encode(text);
     }
 };
 
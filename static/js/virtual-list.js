@@ -0,0 +1,332 @@
+/**
+ * Windowed rendering of long server-side lists for the AquaAlert application
+ * @module VirtualList
+ *
+ * Lists and grids backed by a window endpoint (offset, limit, total and
+ * data version; see utils/windows.py) keep only the rows in view, plus a
+ * few either side, in the DOM. Windows are fetched in fixed-size blocks as
+ * they scroll into view and at most maxBlocks are kept, so memory stays
+ * bounded however many records match. Spacers above and below the rendered
+ * rows keep the scrollbar the height of the whole list, and elements of
+ * rows still in view are kept from one render to the next.
+ */
+class VirtualList {
+    /**
+     * @param {Object} options
+     * @param {Element} options.content - Element the rows are rendered into (a list, grid or tbody)
+     * @param {Element|Window} [options.viewport=window] - Scrolling element containing content
+     * @param {Function} options.fetchWindow - (offset, limit) => Promise of {items, total, version}
+     * @param {Function} options.renderItem - (item, index) => Element
+     * @param {number} [options.blockSize=50] - Records fetched per request
+     * @param {number} [options.maxBlocks=20] - Blocks kept in memory
+     * @param {number} [options.itemHeight] - Row height in pixels; measured from the first row when omitted
+     * @param {number} [options.overscan=3] - Rows rendered beyond each edge of the viewport
+     * @param {string} [options.rowTag='div'] - Tag of spacers and placeholders ('tr' inside a tbody)
+     * @param {number} [options.debounce=200] - Delay of refresh() in milliseconds
+     * @param {Function} [options.onWindow] - Called with each window response and the list
+     * @param {Function} [options.onError] - Called when a window fails to load
+     */
+    constructor(options) {
+        this.options = Object.assign({
+            viewport: window,
+            blockSize: 50,
+            maxBlocks: 20,
+            itemHeight: null,
+            overscan: 3,
+            rowTag: 'div',
+            debounce: 200,
+            onWindow: null,
+            onError: null
+        }, options);
+        this.content = this.options.content;
+        this.viewport = this.options.viewport;
+        this.blocks = new Map();
+        this.pending = new Map();
+        this.total = null;
+        this.version = null;
+        this.rowHeight = this.options.itemHeight;
+        this.generation = 0;
+        this.renderedKey = null;
+        this.rendered = new Map();
+        this.frame = null;
+        this.refreshTimer = null;
+
+        this.onScroll = () => this.scheduleRender();
+        this.onResize = () => {
+            this.renderedKey = null;
+            this.scheduleRender();
+        };
+        this.viewport.addEventListener('scroll', this.onScroll, { passive: true });
+        window.addEventListener('resize', this.onResize);
+    }
+
+    /**
+     * Drop every cached window and load the list again from the top, e.g. after a filter changed
+     * @returns {Promise} Resolves when the first window has been rendered
+     */
+    reset() {
+        clearTimeout(this.refreshTimer);
+        this.generation++;
+        this.blocks.clear();
+        this.pending.clear();
+        this.total = null;
+        this.version = null;
+        this.renderedKey = null;
+        this.rendered.clear();
+        this.scrollToTop();
+        return this.loadBlock(0);
+    }
+
+    /**
+     * reset() once input has been idle for the debounce delay
+     */
+    refresh() {
+        clearTimeout(this.refreshTimer);
+        this.refreshTimer = setTimeout(() => this.reset(), this.options.debounce);
+    }
+
+    /**
+     * Stop listening for scrolling and release the cached windows
+     */
+    destroy() {
+        clearTimeout(this.refreshTimer);
+        if (this.frame) cancelAnimationFrame(this.frame);
+        this.viewport.removeEventListener('scroll', this.onScroll);
+        window.removeEventListener('resize', this.onResize);
+        this.generation++;
+        this.blocks.clear();
+        this.pending.clear();
+        this.rendered.clear();
+        this.content.innerHTML = '';
+    }
+
+    /**
+     * Loaded item at index, if its block is in memory
+     * @param {number} index - Position in the whole list
+     * @returns {Object|undefined} The item
+     */
+    itemAt(index) {
+        const block = this.blocks.get(Math.floor(index / this.options.blockSize));
+        return block ? block[index % this.options.blockSize] : undefined;
+    }
+
+    /**
+     * First loaded item matching predicate, e.g. the record behind a clicked row
+     * @param {Function} predicate - (item) => boolean
+     * @returns {Object|undefined} The item
+     */
+    find(predicate) {
+        for (const block of this.blocks.values()) {
+            const item = block.find(predicate);
+            if (item) return item;
+        }
+        return undefined;
+    }
+
+    /**
+     * Fetch one block unless it is loaded or on its way
+     * @param {number} index - Block index
+     * @returns {Promise}
+     */
+    loadBlock(index) {
+        if (this.blocks.has(index)) return Promise.resolve();
+        if (this.pending.has(index)) return this.pending.get(index);
+
+        const generation = this.generation;
+        const blockSize = this.options.blockSize;
+        const request = this.options.fetchWindow(index * blockSize, blockSize).then(result => {
+            // Responses for filters that have since changed are dropped
+            if (generation !== this.generation) return;
+            this.pending.delete(index);
+            if (this.version !== null && result.version !== this.version) {
+                // The data changed underneath; windows read earlier may be out of order
+                this.blocks.clear();
+            }
+            this.version = result.version;
+            this.total = result.total;
+            this.blocks.set(index, result.items);
+            this.evictBlocks(index);
+            this.renderedKey = null;
+            if (this.options.onWindow) this.options.onWindow(result, this);
+            this.render();
+        }).catch(error => {
+            if (generation !== this.generation) return;
+            this.pending.delete(index);
+            console.error('Error loading list window:', error);
+            if (this.options.onError) this.options.onError(error, this);
+        });
+        this.pending.set(index, request);
+        return request;
+    }
+
+    /**
+     * Keep at most maxBlocks blocks, dropping those furthest from the one just loaded
+     * @param {number} current - Block index just loaded
+     */
+    evictBlocks(current) {
+        const excess = this.blocks.size - this.options.maxBlocks;
+        if (excess <= 0) return;
+        Array.from(this.blocks.keys())
+            .sort((a, b) => Math.abs(b - current) - Math.abs(a - current))
+            .slice(0, excess)
+            .forEach(index => this.blocks.delete(index));
+    }
+
+    scheduleRender() {
+        if (this.frame) return;
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.render();
+        });
+    }
+
+    scrollToTop() {
+        const offset = this.contentOffset();
+        if (this.viewport === window) {
+            if (window.scrollY > offset) window.scrollTo(0, offset);
+        } else {
+            this.viewport.scrollTop = 0;
+        }
+    }
+
+    /**
+     * Distance from the top of the scrolled area to the top of content
+     * @returns {number} Pixels
+     */
+    contentOffset() {
+        const top = this.content.getBoundingClientRect().top;
+        if (this.viewport === window) return top + window.scrollY;
+        return top - this.viewport.getBoundingClientRect().top + this.viewport.scrollTop;
+    }
+
+    /**
+     * The part of content in view: pixels scrolled past its top and the viewport height
+     * @returns {{top: number, height: number}}
+     */
+    visibleArea() {
+        const scrollTop = this.viewport === window ? window.scrollY : this.viewport.scrollTop;
+        const height = this.viewport === window ? window.innerHeight : this.viewport.clientHeight;
+        return { top: Math.max(0, scrollTop - this.contentOffset()), height };
+    }
+
+    /**
+     * Items per row: the number of tracks when content is a grid, else one
+     * @returns {number}
+     */
+    columnCount() {
+        const style = getComputedStyle(this.content);
+        if (!style.display.endsWith('grid') || style.gridTemplateColumns === 'none') return 1;
+        return Math.max(1, style.gridTemplateColumns.split(/\s+/).filter(Boolean).length);
+    }
+
+    rowGap() {
+        return parseFloat(getComputedStyle(this.content).rowGap) || 0;
+    }
+
+    createSpacer(height) {
+        const spacer = document.createElement(this.options.rowTag);
+        spacer.className = 'virtual-spacer';
+        spacer.style.height = `${height}px`;
+        if (this.options.rowTag === 'tr') {
+            const cell = document.createElement('td');
+            cell.colSpan = 100;
+            spacer.appendChild(cell);
+        } else {
+            // Spacers take a whole row of a grid
+            spacer.style.gridColumn = '1 / -1';
+        }
+        return spacer;
+    }
+
+    createPlaceholder() {
+        const placeholder = this.createSpacer(Math.max(0, this.rowHeight - this.rowGap()));
+        placeholder.className = 'virtual-placeholder';
+        placeholder.style.gridColumn = '';
+        return placeholder;
+    }
+
+    /**
+     * Render the rows in view, requesting any blocks they need
+     */
+    render() {
+        if (this.total === null) return;
+        if (this.total === 0) {
+            this.rendered.clear();
+            this.content.innerHTML = '';
+            this.renderedKey = 'empty';
+            return;
+        }
+
+        const columns = this.columnCount();
+        if (!this.rowHeight) {
+            this.measureRowHeight(columns);
+            if (!this.rowHeight) return;
+        }
+
+        const rows = Math.ceil(this.total / columns);
+        const { top, height } = this.visibleArea();
+        const overscan = this.options.overscan;
+        const firstRow = Math.min(rows - 1, Math.max(0, Math.floor(top / this.rowHeight) - overscan));
+        const lastRow = Math.min(rows, Math.ceil((top + height) / this.rowHeight) + overscan);
+        const start = firstRow * columns;
+        const end = Math.min(this.total, lastRow * columns);
+
+        const blockSize = this.options.blockSize;
+        for (let block = Math.floor(start / blockSize); block <= Math.floor((end - 1) / blockSize); block++) {
+            this.loadBlock(block);
+        }
+
+        const key = `${start}:${end}:${columns}`;
+        if (key === this.renderedKey) return;
+        this.renderedKey = key;
+
+        const gap = this.rowGap();
+        const fragment = document.createDocumentFragment();
+        const previous = this.rendered;
+        this.rendered = new Map();
+        if (firstRow > 0) fragment.appendChild(this.createSpacer(firstRow * this.rowHeight - gap));
+        for (let index = start; index < end; index++) {
+            const item = this.itemAt(index);
+            if (item === undefined) {
+                fragment.appendChild(this.createPlaceholder());
+                continue;
+            }
+            const element = previous.get(item) || this.options.renderItem(item, index);
+            this.rendered.set(item, element);
+            fragment.appendChild(element);
+        }
+        if (lastRow < rows) fragment.appendChild(this.createSpacer((rows - lastRow) * this.rowHeight - gap));
+        this.content.replaceChildren(fragment);
+    }
+
+    /**
+     * Render the first row alone and take its height, plus the row gap, as every row's
+     * @param {number} columns - Items per row
+     */
+    measureRowHeight(columns) {
+        const items = [];
+        for (let index = 0; index < Math.min(columns, this.total); index++) {
+            const item = this.itemAt(index);
+            if (item === undefined) return;
+            const element = this.options.renderItem(item, index);
+            this.rendered.set(item, element);
+            items.push(element);
+        }
+        this.content.replaceChildren(...items);
+        const measured = Math.max(...items.map(element => element.getBoundingClientRect().height));
+        if (measured > 0) this.rowHeight = measured + this.rowGap();
+    }
+}
+
+// Support both module (import/export) and non-module (global variable) usage
+try {
+    if (typeof module !== 'undefined' && module.exports) {
+        // Node.js/CommonJS export
+        module.exports = VirtualList;
+    } else if (typeof window !== 'undefined') {
+        // Browser global variable
+        window.VirtualList = VirtualList;
+    }
+} catch (e) {
+    console.log('Module export not supported in this environment');
+}
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from config import Config
+from database import db
+import models.sql_models  # noqa: F401  registers every table on db.metadata
+
+@pytest.fixture
+def app(tmp_path):
+    """A bare app on a fresh SQLite file, with its instance folder under tmp_path."""
+    app = Flask(__name__, root_path=REPO_ROOT, instance_path=str(tmp_path / 'instance'))
+    app.config.from_object(Config)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        SQLALCHEMY_ENGINE_OPTIONS={},
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
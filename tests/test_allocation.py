@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from utils.allocation import Allocator, priority_weight, required_litres
+
+TYPES = ['hospital', 'fireStation', 'waterTreatment', 'residential', 'office']
+
+def _problem(seed, bowsers=5, locations=3):
+    rng = random.Random(seed)
+    return (
+        [{'id': f'b{i}', 'number': f'BW{i:03d}', 'capacity': 2000.0, 'current_level': float(rng.randint(200, 2000)),
+          'status': 'available', 'latitude': 51.5 + rng.uniform(-0.05, 0.05),
+          'longitude': -0.1 + rng.uniform(-0.05, 0.05), 'position_id': None, 'location_id': None}
+         for i in range(bowsers)],
+        [{'id': f'l{i}', 'name': f'Site {i}', 'type': rng.choice(TYPES), 'latitude': 51.5 + rng.uniform(-0.05, 0.05),
+          'longitude': -0.1 + rng.uniform(-0.05, 0.05)}
+         for i in range(locations)],
+    )
+
+def _allocator(bowsers, locations):
+    allocator = Allocator(distance_cost=50.0, base_demand=1500.0, epsilon=0.5, cell_km=1.0)
+    allocator.load(bowsers, locations)
+    return allocator
+
+def _value(allocator):
+    return sum(allocator.edges[bowser_id][slot][0] for bowser_id, slot in allocator.assigned.items()
+               if slot is not None)
+
+def _brute_force(allocator):
+    """Best total benefit over every assignment of bowsers to distinct slots (or none)."""
+    bowsers = list(allocator.edges)
+
+    def best(i, used):
+        if i == len(bowsers):
+            return 0.0
+        result = best(i + 1, used)
+        for slot, (benefit, _) in allocator.edges[bowsers[i]].items():
+            if slot not in used:
+                result = max(result, benefit + best(i + 1, used | {slot}))
+        return result
+
+    return best(0, frozenset())
+
+def _check_plan(allocator):
+    slots = [slot for slot in allocator.assigned.values() if slot is not None]
+    assert len(slots) == len(set(slots))
+    for bowser_id, slot in allocator.assigned.items():
+        if slot is not None:
+            assert allocator.owner[slot] == bowser_id
+            assert slot not in allocator.retired
+
+def test_priority_weights_and_demand():
+    assert priority_weight('hospital') == 5
+    assert priority_weight('office') == 1
+    assert priority_weight('unknown') == 1
+    assert required_litres('hospital', 1000) == pytest.approx(1800)
+    assert required_litres('office', 1000) == pytest.approx(1000)
+
+@pytest.mark.parametrize('seed', range(12))
+@pytest.mark.parametrize('bowsers,locations', [(5, 3), (6, 1)])
+def test_solve_matches_brute_force_optimum(seed, bowsers, locations):
+    # One location has fewer slots than there are bowsers, so bowsers compete for them
+    allocator = _allocator(*_problem(seed, bowsers, locations))
+    allocator.solve()
+    _check_plan(allocator)
+    # The auction is optimal to within epsilon per bowser
+    assert _value(allocator) >= _brute_force(allocator) - allocator.epsilon * len(allocator.edges)
+
+@pytest.mark.parametrize('seed', range(6))
+def test_update_bowser_matches_a_fresh_solve(seed):
+    bowsers, locations = _problem(seed)
+    allocator = _allocator(bowsers, locations)
+    allocator.solve()
+    allocator.update_bowser('b0', current_level=1900.0)
+    allocator.update_bowser('b1', status='maintenance')
+    _check_plan(allocator)
+    assert 'b1' not in allocator.edges
+
+    bowsers[0]['current_level'] = 1900.0
+    bowsers[1]['status'] = 'maintenance'
+    fresh = _allocator(bowsers, locations)
+    fresh.solve()
+    assert _value(allocator) >= _brute_force(fresh) - allocator.epsilon * len(allocator.edges)
+
+def test_deployed_bowsers_reduce_unmet_demand():
+    bowsers, locations = _problem(0, bowsers=2, locations=1)
+    locations[0]['type'] = 'hospital'
+    bowsers[0].update(status='deployed', location_id='l0', current_level=1000.0)
+    allocator = _allocator(bowsers, locations)
+    summary = allocator.solve()
+    assert allocator.locations['l0']['supplied'] == 1000.0
+    assert summary['weighted_unmet_before'] == pytest.approx(5 * (required_litres('hospital', 1500.0) - 1000.0))
+    assert summary['available_bowsers'] == 1
+    assert summary['weighted_unmet_after'] < summary['weighted_unmet_before']
@@ -0,0 +1,78 @@
+import random
+
+import numpy as np
+import pytest
+
+from utils.distances import DistanceMatrix, MatrixTooLarge
+from utils.geo import haversine_km
+
+def _points(rng, n, prefix='loc'):
+    return {f'{prefix}-{i}': (51.3 + rng.random() * 0.4, -0.5 + rng.random() * 0.7) for i in range(n)}
+
+def _expected(points, positions, point_ids, position_ids):
+    rows = np.array([points[i] for i in point_ids])
+    columns = np.array([positions[i] for i in position_ids])
+    return haversine_km(rows[:, :1], rows[:, 1:], columns[:, 0][None, :], columns[:, 1][None, :])
+
+def _check(matrix, points, positions):
+    point_ids, position_ids = sorted(points), sorted(positions)
+    assert np.allclose(matrix.between(point_ids, position_ids),
+                       _expected(points, positions, point_ids, position_ids), atol=1e-3)
+
+def test_incremental_updates_match_a_fresh_computation(tmp_path):
+    rng = random.Random(1)
+    points = _points(rng, 300)
+    positions = {point_id: points[point_id] for point_id in list(points)[:40]}
+    matrix = DistanceMatrix(str(tmp_path))
+    matrix.update(points, positions)
+    _check(matrix, points, positions)
+    assert matrix.shape == (512, 64)
+
+    generation = matrix.generation
+    assert matrix.update(points, positions)['changed'] == 0
+    assert matrix.generation == generation
+
+    # Move a position, add and remove locations and positions, then outgrow the columns
+    points['loc-0'] = positions['loc-0'] = (51.45, -0.2)
+    del points['loc-299']
+    del positions['loc-39']
+    points.update(_points(rng, 250, prefix='new'))
+    positions.update({point_id: points[point_id] for point_id in list(points)[100:160]})
+    summary = matrix.update(points, positions)
+    assert summary == dict(summary, points=len(points), positions=len(positions))
+    _check(matrix, points, positions)
+    assert matrix.shape == (768, 128)
+    assert not matrix.has_position('loc-39')
+    with pytest.raises(KeyError):
+        matrix.between(['loc-299'], ['loc-0'])
+
+    # Another worker sees the same distances
+    reopened = DistanceMatrix(str(tmp_path))
+    reopened.reload()
+    _check(reopened, points, positions)
+
+def test_nearest_reads_points_around_each_position(tmp_path):
+    points = {'a': (51.50, -0.10), 'b': (51.51, -0.10), 'c': (51.60, -0.10), 'depot': (51.50, -0.12)}
+    matrix = DistanceMatrix(str(tmp_path))
+    matrix.update(points, {'a': points['a'], 'depot': points['depot']})
+    nearest = matrix.nearest(['a', 'depot'], ['a', 'b', 'c'], k=2, max_km=5.0)
+    assert [point_id for point_id, _ in nearest[0]] == ['a', 'b']
+    assert nearest[0][0][1] == 0.0
+    assert [point_id for point_id, _ in nearest[1]] == ['a', 'b']
+    assert matrix.nearest(['a'], ['c'], k=1, max_km=5.0) == [[]]
+
+def test_growing_past_the_limit_raises_and_keeps_the_matrix(tmp_path):
+    rng = random.Random(2)
+    points = _points(rng, 200)
+    positions = {point_id: points[point_id] for point_id in list(points)[:10]}
+    # 256 rows x 64 columns fit, 320 rows do not
+    matrix = DistanceMatrix(str(tmp_path), max_bytes=256 * 64 * 4)
+    matrix.update(points, positions)
+
+    grown = dict(points, **_points(rng, 100, prefix='new'))
+    with pytest.raises(MatrixTooLarge, match='DISTANCE_MATRIX_MAX_MB'):
+        matrix.update(grown, positions)
+    reopened = DistanceMatrix(str(tmp_path))
+    reopened.reload()
+    assert reopened.shape == (256, 64)
+    _check(reopened, points, positions)
@@ -0,0 +1,62 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from database import db
+from models.sql_models import Invoice, Job
+from utils.exports import build_export, export_path, parse_export_params, start_export
+
+def _invoice(number, status='paid'):
+    db.session.add(Invoice(id=f'i{number}', invoice_number=f'INV{number:03d}', client_name='Council',
+                           issue_date=datetime(2026, 3, number), due_date=datetime(2026, 4, number),
+                           amount=100.0 * number, status=status))
+    db.session.commit()
+
+def _build(job):
+    payload = json.loads(job.payload)
+    result = build_export(job.id, **payload)
+    # What the job queue records when the task returns
+    job.status, job.result, job.unique_key = 'succeeded', json.dumps(result), None
+    db.session.commit()
+    return payload['key']
+
+def test_equal_requests_normalise_to_equal_params():
+    assert parse_export_params('invoices', {'status': 'paid,draft,paid', 'start': '2026-03-01T00:00'}) == \
+        parse_export_params('invoices', {'status': ['draft', 'paid'], 'start': '2026-03-01'})
+    with pytest.raises(ValueError):
+        parse_export_params('partners', {'start': '2026-03-01'})
+    with pytest.raises(ValueError):
+        parse_export_params('invoices', {'start': '2026-03-02', 'end': '2026-03-01'})
+
+def test_export_is_shared_while_building_and_reused_once_built(app):
+    _invoice(1)
+    params = parse_export_params('invoices', {'status': 'paid'})
+    job, built = start_export('invoices', 'csv', params)
+    assert not built
+    # A second request joins the queued job rather than building the file again
+    assert start_export('invoices', 'csv', params) == (job, False)
+
+    key = _build(job)
+    assert os.path.isfile(export_path(key, 'csv'))
+    assert start_export('invoices', 'csv', params) == (job, True)
+    assert Job.query.count() == 1
+
+    # Another format or filter is another file
+    assert start_export('invoices', 'xlsx', params)[0].id != job.id
+    assert start_export('invoices', 'csv', {})[0].id != job.id
+
+def test_writing_the_report_table_starts_a_new_export(app):
+    _invoice(1)
+    job, _ = start_export('invoices', 'csv', {})
+    key = _build(job)
+
+    _invoice(2, status='draft')
+    fresh, built = start_export('invoices', 'csv', {})
+    assert not built
+    assert fresh.id != job.id
+    assert json.loads(fresh.payload)['key'] != key
+
+    with open(export_path(_build(fresh), 'csv')) as f:
+        assert len(f.read().splitlines()) == 3
@@ -0,0 +1,90 @@
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models.sql_models import Job
+from utils.jobs import JobQueue
+
+@pytest.fixture
+def queue(app):
+    queue = JobQueue()
+    queue.app = app
+    queue.register('flaky', lambda: None, max_attempts=2)
+    queue.register('once', lambda: None, max_attempts=1)
+    return queue
+
+def _finished(result=None, error=None):
+    future = Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+    return future
+
+def _make_due(job_id):
+    Job.query.filter(Job.id == job_id).update({'run_after': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+def test_failed_job_is_retried_with_backoff_then_failed(queue):
+    job_id = queue.enqueue('flaky').id
+
+    assert queue._claim(5) == [job_id]
+    queue._finish(job_id, _finished(error=RuntimeError('boom')))
+    job = Job.query.get(job_id)
+    assert job.status == 'queued'
+    assert job.error == 'boom'
+    assert job.run_after > datetime.utcnow()
+    assert queue._claim(5) == []
+
+    _make_due(job_id)
+    assert queue._claim(5) == [job_id]
+    queue._finish(job_id, _finished(error=RuntimeError('boom again')))
+    job = Job.query.get(job_id)
+    assert job.status == 'failed'
+    assert job.attempts == 2
+    assert job.finished_at is not None
+
+def test_successful_job_stores_its_result(queue):
+    job_id = queue.enqueue('once').id
+    queue._claim(5)
+    queue._finish(job_id, _finished(result={'rows': 3}))
+    job = Job.query.get(job_id)
+    assert job.status == 'succeeded'
+    assert job.to_dict()['result'] == {'rows': 3}
+
+def test_unique_job_is_reused_until_it_finishes(queue):
+    first_id = queue.enqueue('once', {'a': 1}, unique=True).id
+    assert queue.enqueue('once', {'a': 1}, unique=True).id == first_id
+    assert queue.enqueue('once', {'a': 2}, unique=True).id != first_id
+    assert queue.enqueue('once', {'a': 1}).id != first_id
+
+    queue._claim(5)
+    queue._finish(first_id, _finished(result=None))
+    assert queue.enqueue('once', {'a': 1}, unique=True).id != first_id
+
+def test_unique_key_is_enforced_by_the_database(queue):
+    first = queue.enqueue('once', unique=True)
+    db.session.add(Job(id='duplicate', name='once', payload=first.payload, status='queued',
+                       attempts=0, max_attempts=1, unique_key=first.unique_key))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+def test_requeue_stale_requeues_or_fails_jobs_left_running(queue):
+    retried = queue.enqueue('flaky').id
+    exhausted = queue.enqueue('once', unique=True).id
+    recent = queue.enqueue('flaky', {'recent': True}).id
+    queue._claim(5)
+    stale = datetime.utcnow() - timedelta(seconds=queue.app.config['JOB_TIMEOUT'] + 60)
+    Job.query.filter(Job.id.in_([retried, exhausted])).update({'started_at': stale}, synchronize_session=False)
+    db.session.commit()
+
+    assert queue.requeue_stale() == 1
+    assert Job.query.get(retried).status == 'queued'
+    assert Job.query.get(retried).worker is None
+    assert Job.query.get(exhausted).status == 'failed'
+    assert Job.query.get(exhausted).unique_key is None
+    assert Job.query.get(recent).status == 'running'
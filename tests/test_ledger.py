@@ -0,0 +1,90 @@
+from datetime import date, datetime
+
+import pytest
+
+from database import db
+from models.sql_models import LedgerEntry
+from utils.json_handler import JsonHandler
+from utils.ledger import (OPENING_NOTE, append_entry, balance_as_of, open_ledgers, rebuild_balances, rebuild_ledger,
+                          scheme_balances, to_pence)
+
+def _running(scheme_id='s1'):
+    return [(entry.entry_date.date(), entry.running_balance) for entry in LedgerEntry.query.filter_by(
+        scheme_id=scheme_id).order_by(LedgerEntry.entry_date, LedgerEntry.id)]
+
+def test_amounts_are_whole_pence():
+    assert to_pence('12.345') == 1235
+    assert to_pence(0.1 + 0.2) == 30
+    with pytest.raises(ValueError):
+        to_pence('nan')
+
+def test_backdated_entry_moves_later_running_balances(app):
+    append_entry('s1', 100, date(2026, 1, 1))
+    append_entry('s1', 30, date(2026, 3, 1), 'payout')
+    append_entry('s1', '12.50', date(2026, 2, 1))
+    assert _running() == [(date(2026, 1, 1), 10000), (date(2026, 2, 1), 11250), (date(2026, 3, 1), 8250)]
+    assert scheme_balances() == {'s1': {'balance': 82.5, 'entries': 3, 'last_entry_date': datetime(2026, 3, 1)}}
+
+    with pytest.raises(ValueError):
+        append_entry('s1', -5, date(2026, 4, 1), 'contribution')
+    with pytest.raises(ValueError):
+        append_entry('s1', 0, date(2026, 4, 1), 'adjustment')
+    # Refused entries leave the balances alone
+    assert scheme_balances()['s1']['entries'] == 3
+
+def test_balance_as_of_a_date_or_moment(app):
+    append_entry('s1', 100, datetime(2026, 1, 1, 9, 0))
+    append_entry('s1', 40, datetime(2026, 1, 1, 17, 0), 'payout')
+    append_entry('s2', 5, datetime(2026, 1, 2))
+    assert balance_as_of('s1', date(2025, 12, 31)) == 0
+    assert balance_as_of('s1', datetime(2026, 1, 1, 12, 0)) == 100
+    # A date includes the whole day
+    assert balance_as_of('s1', date(2026, 1, 1)) == 60
+    assert scheme_balances(as_of=date(2026, 1, 1))['s2']['balance'] == 0
+
+def test_entries_cannot_be_changed(app):
+    entry = append_entry('s1', 100, date(2026, 1, 1))
+    entry.amount = 1
+    with pytest.raises(ValueError):
+        db.session.commit()
+    db.session.rollback()
+
+def test_rebuild_balances_repairs_entries_written_outside_append_entry(app):
+    append_entry('s1', 100, date(2026, 1, 1))
+    append_entry('s1', 50, date(2026, 1, 3))
+    # A bulk load that skipped the running balances and the balance row
+    db.session.execute(LedgerEntry.__table__.insert().values(
+        scheme_id='s1', entry_type='payout', amount=-2000, running_balance=0, entry_date=datetime(2026, 1, 2),
+        created_at=datetime.utcnow()))
+    db.session.commit()
+
+    assert rebuild_balances() == 2
+    assert _running() == [(date(2026, 1, 1), 10000), (date(2026, 1, 2), 8000), (date(2026, 1, 3), 13000)]
+    assert scheme_balances()['s1']['balance'] == 130
+    assert scheme_balances()['s1']['entries'] == 3
+    assert rebuild_balances('s1') == 0
+
+def test_recorded_balances_open_each_ledger_once(app):
+    schemes = [{'id': 's1', 'balance': 250.0, 'start_date': '2026-01-01T00:00:00'},
+               {'id': 's2', 'balance': 0, 'start_date': '2026-01-01'},
+               {'id': 's3', 'balance': 75.0, 'start_date': '2026-01-01'}]
+    # s1 took a contribution before its recorded balance was entered; s3 was opened when it was created
+    append_entry('s1', 10, date(2026, 2, 1))
+    append_entry('s3', 75, date(2026, 1, 1), 'adjustment', notes=OPENING_NOTE)
+
+    assert open_ledgers(schemes) == 1
+    assert _running('s1') == [(date(2026, 1, 1), 25000), (date(2026, 2, 1), 26000)]
+    assert set(scheme_balances()) == {'s1', 's3'}
+    assert scheme_balances()['s3']['balance'] == 75
+    assert open_ledgers(schemes) == 0
+
+def test_rebuild_job_opens_ledgers_from_the_json_store(app, tmp_path):
+    handler = JsonHandler(str(tmp_path / 'db.json'))
+    handler.create('mutual_aid_schemes', {'id': 's1', 'balance': 120.0, 'start_date': '2026-01-01'})
+    handler.create('mutual_aid_schemes', {'id': 's2', 'balance': 80.0, 'start_date': '2026-01-01'})
+    app.extensions['json_handler'] = handler
+
+    assert rebuild_ledger('s1') == {'opened': 1, 'corrected': 0}
+    assert set(scheme_balances()) == {'s1'}
+    assert rebuild_ledger() == {'opened': 1, 'corrected': 0}
+    assert scheme_balances()['s2']['balance'] == 80
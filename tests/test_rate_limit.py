@@ -0,0 +1,72 @@
+import pytest
+from flask import Flask
+
+from utils.rate_limit import MemoryStore, RateLimiter, SharedMemoryStore, parse_limits
+
+@pytest.fixture(params=['memory', 'shm'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStore()
+    return SharedMemoryStore(str(tmp_path / 'ratelimit.bin'), slots=64)
+
+def test_parse_limits():
+    assert parse_limits('10 per minute; 100/hour') == [(10, 60), (100, 3600)]
+    assert parse_limits('') == []
+    with pytest.raises(ValueError):
+        parse_limits('10 per fortnight')
+
+def test_bucket_empties_then_refills_over_its_window(store):
+    bucket = [('client', 3, 60)]
+    assert [store.acquire(bucket, now=1000)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = store.acquire(bucket, now=1000)
+    assert not allowed
+    assert retry_after == pytest.approx(20)
+
+    # One token comes back every period / capacity seconds
+    assert not store.acquire(bucket, now=1019)[0]
+    assert store.acquire(bucket, now=1020)[0]
+    assert not store.acquire(bucket, now=1020)[0]
+
+    # After a full window the bucket is full again, but never over capacity
+    assert [store.acquire(bucket, now=2000)[0] for _ in range(4)] == [True, True, True, False]
+
+def test_request_needs_a_token_from_every_bucket(store):
+    buckets = [('client|60', 5, 60), ('client|3600', 2, 3600)]
+    assert store.acquire(buckets, now=0)[0]
+    assert store.acquire(buckets, now=0)[0]
+    allowed, retry_after = store.acquire(buckets, now=0)
+    assert not allowed
+    assert retry_after == pytest.approx(1800)
+
+    # A denied request takes nothing, so the minute bucket still has three tokens
+    assert store.acquire([('client|60', 5, 60)], now=0)[0]
+    assert store.acquire([('client|60', 5, 60)], now=0)[0]
+    assert store.acquire([('client|60', 5, 60)], now=0)[0]
+    assert not store.acquire([('client|60', 5, 60)], now=0)[0]
+
+def test_clients_have_separate_buckets(store):
+    assert store.acquire([('a', 1, 60)], now=0)[0]
+    assert not store.acquire([('a', 1, 60)], now=0)[0]
+    assert store.acquire([('b', 1, 60)], now=0)[0]
+
+@pytest.fixture
+def limiter(tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config.update(
+        RATELIMIT_STORAGE_URL='memory://',
+        RATELIMIT_DEFAULT='2 per minute',
+        RATELIMIT_ROUTES={'/login': '1 per minute', '/public_map': ''},
+    )
+    limiter = RateLimiter()
+    limiter.init_app(app)
+    return limiter
+
+def test_longest_prefix_wins_and_empty_rules_are_unlimited(limiter):
+    assert limiter.limits_for('/login') == ('/login', [(1, 60)])
+    assert limiter.limits_for('/dashboard') == ('*', [(2, 60)])
+    assert all(limiter.check('/public_map/snapshot.geojson', 'ip:10.0.0.1')[0] for _ in range(100))
+
+    assert limiter.check('/login', 'ip:10.0.0.1')[0]
+    assert not limiter.check('/login', 'ip:10.0.0.1')[0]
+    # The login allowance is separate from the rest of the site
+    assert limiter.check('/dashboard', 'ip:10.0.0.1')[0]
@@ -0,0 +1,101 @@
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.routing import DEPOT, RoutePlanner
+
+PLANNED_AT = datetime(2026, 1, 1, 8, 0)
+
+def _planner(positions, levels=None, rates=None, **options):
+    """A planner over stops on a straight road, positions in km from the depot.
+
+    At 60 km/h with no road factor a km takes a minute.
+    """
+    options = dict(dict(vehicles=2, vehicle_capacity=20000.0, speed_kmh=60.0, road_factor=1.0,
+                        service_minutes=10.0, shift_hours=10.0, trigger_percent=50.0), **options)
+    planner = RoutePlanner(**options)
+    bowsers = [{'id': f'b{i}', 'number': f'BW{i:03d}', 'capacity': 5000.0,
+                'current_level': (levels or {}).get(i, 1000.0), 'location_id': f'l{i}',
+                'location_name': f'Site {i}', 'latitude': 51.5, 'longitude': -0.1}
+               for i in range(len(positions))]
+    points = [0.0] + list(positions)
+    km = [[abs(a - b) for b in points] for a in points]
+    nodes = {f'l{i}': i + 1 for i in range(len(positions))}
+    planner.load(bowsers, {f'b{i}': rate for i, rate in (rates or {}).items()}, nodes, km, PLANNED_AT)
+    return planner
+
+def _check_feasible(planner):
+    for r, route in enumerate(planner.routes):
+        assert route
+        assert sum(planner.stops[b]['litres'] for b in route) <= planner.vehicle_capacity
+        begin = planner._begin[r]
+        assert begin[-1] <= planner.shift_minutes
+        for k, bowser_id in enumerate(route, start=1):
+            assert begin[k] <= planner.stops[bowser_id]['due'] + 1e-9
+    assert set(planner.route_of) | set(planner.unserved) == set(planner.stops)
+
+def _route_km(planner, route):
+    nodes = [DEPOT] + [planner.stops[b]['node'] for b in route] + [DEPOT]
+    return sum(planner.km[a][b] for a, b in zip(nodes, nodes[1:]))
+
+def test_only_low_or_soon_empty_bowsers_are_stops():
+    planner = _planner([5, 10, 15], levels={0: 4000.0, 1: 1000.0, 2: 4000.0}, rates={2: 400.0})
+    # b0 is 80% full and not draining, b2 is 80% full but empty in ten hours
+    assert set(planner.stops) == {'b1', 'b2'}
+    assert planner.stops['b1']['litres'] == 4000.0
+    assert planner.stops['b2']['due'] == pytest.approx(600.0)
+
+def test_stops_on_one_road_are_visited_in_order():
+    planner = _planner([20, 5, 10, 15])
+    summary = planner.solve()
+    _check_feasible(planner)
+    assert planner.routes == [['b1', 'b2', 'b3', 'b0']]
+    assert summary['distance_km'] == 40.0
+    schedule = planner.schedule()
+    assert [stop['arrival_at'] for stop in schedule[0]['stops']] == [
+        (PLANNED_AT + timedelta(minutes=minutes)).isoformat() for minutes in (5, 20, 35, 50)]
+
+def test_insertion_respects_due_times():
+    # b1 runs dry 12 minutes out, so it is visited first although b0 is on the way
+    planner = _planner([5, 10], rates={1: 5000.0})
+    planner.solve()
+    _check_feasible(planner)
+    assert planner.routes == [['b1', 'b0']]
+
+def test_full_vehicle_opens_another_and_extra_stops_are_unserved():
+    planner = _planner([5, 10, 15], vehicle_capacity=8000.0, vehicles=1)
+    summary = planner.solve()
+    _check_feasible(planner)
+    assert summary['served'] == 2
+    assert summary['unserved'] == 1
+
+    planner = _planner([5, 10, 15], vehicle_capacity=8000.0, vehicles=2)
+    summary = planner.solve()
+    _check_feasible(planner)
+    assert summary == dict(summary, served=3, unserved=0, vehicles_used=2)
+
+@pytest.mark.parametrize('positions', [[3, 9, 4, 12], [7, 2, 11, 5, 8], [1, 14, 6]])
+def test_single_route_matches_best_visiting_order(positions):
+    planner = _planner(positions, vehicles=1)
+    planner.solve()
+    _check_feasible(planner)
+    best = min(_route_km(planner, list(order)) for order in itertools.permutations(planner.stops))
+    assert _route_km(planner, planner.routes[0]) == pytest.approx(best)
+
+def test_update_bowser_repairs_only_its_stop():
+    planner = _planner([5, 10, 15], vehicle_capacity=8000.0, vehicles=1)
+    planner.solve()
+    unserved = next(iter(planner.unserved))
+    served = planner.routes[0][0]
+
+    # Topping up a served bowser frees room for the stop that was left out
+    planner.update_bowser(served, PLANNED_AT + timedelta(minutes=1), current_level=5000.0)
+    _check_feasible(planner)
+    assert served not in planner.stops
+    assert unserved in planner.route_of
+    assert not planner.unserved
+
+    planner.update_bowser(served, PLANNED_AT + timedelta(minutes=2), current_level=500.0)
+    _check_feasible(planner)
+    assert served in planner.stops
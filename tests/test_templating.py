@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+from flask import render_template_string
+
+from database import db
+from models.sql_models import Bowser, Deployment, Location
+from utils.templating import fragment_cache, init_templating
+
+OPTIONS = ("{% cache 'options', data_version('deployment', 'location') %}"
+           "{% for name in names %}{{ name }};{% endfor %}{% endcache %}")
+
+@pytest.fixture
+def templating(app):
+    init_templating(app)
+    fragment_cache.clear()
+    yield app
+    fragment_cache.clear()
+
+def _render(app, names):
+    # data_version() is read once per request, so each render gets its own app context and g
+    with app.app_context(), app.test_request_context():
+        return render_template_string(OPTIONS, names=names)
+
+def test_fragment_is_reused_until_a_keyed_table_changes(templating):
+    assert _render(templating, ['Central']) == 'Central;'
+    assert _render(templating, ['North']) == 'Central;'
+
+    db.session.add(Bowser(id='b1', number='BW001', capacity=5000, current_level=4000, status='active',
+                          owner='Council'))
+    db.session.commit()
+    assert _render(templating, ['North']) == 'Central;'
+
+    db.session.add(Location(id='l1', name='North', address='1 Road', latitude=51.5, longitude=-0.1,
+                            type='hospital'))
+    db.session.add(Deployment(id='d1', bowser_id='b1', location_id='l1', start_date=datetime.utcnow(),
+                              status='active', priority='high'))
+    db.session.commit()
+    assert _render(templating, ['North']) == 'North;'
+
+def test_deployment_only_write_renders_the_options_afresh(templating):
+    db.session.add(Bowser(id='b1', number='BW001', capacity=5000, current_level=4000, status='active',
+                          owner='Council'))
+    db.session.add(Location(id='l1', name='North', address='1 Road', latitude=51.5, longitude=-0.1,
+                            type='hospital'))
+    db.session.add(Deployment(id='d1', bowser_id='b1', location_id='l1', start_date=datetime.utcnow(),
+                              status='active', priority='high'))
+    db.session.commit()
+    assert _render(templating, ['North']) == 'North;'
+
+    Deployment.query.get('d1').status = 'completed'
+    db.session.commit()
+    assert _render(templating, []) == ''
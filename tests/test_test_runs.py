@@ -0,0 +1,35 @@
+import subprocess
+
+import pytest
+from flask import Flask
+
+from utils.test_runs import current_revision
+
+def _git(path, *args):
+    subprocess.run(['git', *args], cwd=path, check=True, capture_output=True)
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / 'repo'
+    path.mkdir()
+    _git(path, 'init', '-q')
+    (path / 'app.py').write_text('print("hello")\n')
+    (path / 'instance').mkdir()
+    (path / 'instance' / 'aquaalert.db').write_text('v1')
+    _git(path, 'add', '.')
+    _git(path, '-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'initial')
+    return path
+
+def _revision(path):
+    with Flask(__name__, root_path=str(path)).app_context():
+        return current_revision()
+
+def test_runtime_files_do_not_make_the_tree_dirty(repo):
+    (repo / 'instance' / 'aquaalert.db').write_text('v2')
+    (repo / 'instance' / 'ratelimit.bin').write_text('counters')
+    (repo / 'notes.txt').write_text('untracked')
+    assert _revision(repo)
+
+def test_source_edits_make_the_tree_dirty(repo):
+    (repo / 'app.py').write_text('print("changed")\n')
+    assert _revision(repo) is None
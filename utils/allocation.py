@@ -0,0 +1,531 @@
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from database import db
+from models.sql_models import Bowser, Deployment, Location
+from utils.data_versions import data_version
+from utils.distances import DEPOT_ID, latest_deployments, location_distances
+from utils.geo import GridIndex
+
+logger = logging.getLogger(__name__)
+
+ALLOCATION_TABLES = ('bowser', 'location', 'deployment')
+
+# Mirrors PriorityManager in static/js/priority.js: level 1 is the most urgent
+PRIORITY_LEVELS = {
+    'healthcare': 1,
+    'emergency': 2,
+    'critical': 3,
+    'residential': 4,
+    'commercial': 5,
+}
+
+LOCATION_CATEGORIES = {
+    'hospital': 'healthcare',
+    'clinic': 'healthcare',
+    'fireStation': 'emergency',
+    'policeStation': 'emergency',
+    'ambulanceDepot': 'emergency',
+    'powerPlant': 'critical',
+    'waterTreatment': 'critical',
+    'dataCenter': 'critical',
+    'residential': 'residential',
+    'apartment': 'residential',
+    'community': 'residential',
+    'office': 'commercial',
+    'retail': 'commercial',
+}
+
+MAX_SLOTS_PER_LOCATION = 20
+
+def priority_weight(location_type: str) -> int:
+    """5 for healthcare down to 1 for commercial sites."""
+    level = PRIORITY_LEVELS[LOCATION_CATEGORIES.get(location_type, 'commercial')]
+    return 6 - level
+
+def required_litres(location_type: str, base_demand: float) -> float:
+    """Water a location should have on site, scaled like calculateRequiredCapacity."""
+    level = PRIORITY_LEVELS[LOCATION_CATEGORIES.get(location_type, 'commercial')]
+    return base_demand * (1 + (5 - level) * 0.2)
+
+class Allocator:
+    """Assigns available bowsers to locations with unmet demand.
+
+    The objective is priority-weighted litres delivered minus a travel
+    cost per km. Each location's unmet demand is split into slots of one
+    average bowser each, worth less as the location fills up, and every
+    bowser is offered only the slots of its nearest demanding locations
+    (from a grid index), which keeps the assignment problem sparse. It is
+    solved with the auction algorithm and epsilon scaling; the final
+    plan is within epsilon per bowser of the best assignment of bowsers
+    to slots.
+
+    Prices are kept between solves, so after update_bowser() only the
+    bowsers competing for the affected slots bid again.
+
+    Given distances (a utils.distances.DistanceMatrix),
+    bowsers are placed by position_id and candidates are read from the
+    matrix; otherwise they come from grid indexes over the coordinates.
+    """
+
+    def __init__(self, distance_cost: float = 50.0, candidates: int = 8, max_km: float = 50.0,
+                 cell_km: float = 2.0, epsilon: float = 1.0, base_demand: float = 5000.0, distances=None):
+        self.distance_cost = distance_cost
+        self.candidates = candidates
+        self.max_km = max_km
+        self.cell_km = cell_km
+        self.epsilon = epsilon
+        self.base_demand = base_demand
+        self.distances = distances
+        self.bowsers: Dict[str, dict] = {}
+        self.locations: Dict[str, dict] = {}
+        self.versions = None
+
+    # -- problem set-up ------------------------------------------------------
+
+    def load(self, bowsers: Iterable[dict], locations: Iterable[dict]):
+        """Set up the problem.
+
+        bowsers: dicts with id, number, capacity, current_level, status,
+        latitude/longitude and position_id (None when unknown) and
+        location_id of an active deployment, if any. locations: dicts with id, name, type, latitude
+        and longitude.
+        """
+        self.bowsers = {bowser['id']: dict(bowser) for bowser in bowsers}
+        self.locations = {location['id']: dict(location) for location in locations}
+        supplied = defaultdict(float)
+        for bowser in self.bowsers.values():
+            if bowser.get('location_id') in self.locations:
+                supplied[bowser['location_id']] += bowser['current_level'] or 0.0
+        for location_id, location in self.locations.items():
+            location['weight'] = priority_weight(location['type'])
+            location['required'] = required_litres(location['type'], self.base_demand)
+            location['supplied'] = supplied[location_id]
+
+        available = [bowser for bowser in self.bowsers.values() if self._is_available(bowser)]
+        self.slot_size = float(np.mean([b['current_level'] for b in available])) if available else 1.0
+
+        self.slot_location: List[str] = []
+        self.slot_remaining: List[float] = []
+        self.location_slots: Dict[str, List[int]] = {}
+        for location_id in self.locations:
+            self._build_slots(location_id)
+
+        demanding = [location_id for location_id, slots in self.location_slots.items() if slots]
+        self.index_ids = demanding
+        if self.distances is None:
+            self.index = GridIndex([self.locations[l]['latitude'] for l in demanding],
+                                   [self.locations[l]['longitude'] for l in demanding], self.cell_km)
+        self.location_bidders: Dict[str, set] = defaultdict(set)
+        self.edges: Dict[str, List[tuple]] = {}
+        self.nearby: Dict[str, List[tuple]] = {}
+
+        positioned = [b for b in available if self._has_position(b)]
+        self.bowser_index_ids = [b['id'] for b in positioned]
+        if self.distances is None:
+            self.bowser_index = GridIndex([b['latitude'] for b in positioned],
+                                          [b['longitude'] for b in positioned], self.cell_km)
+        for bowser, nearby in zip(positioned, self._nearest_demanding(positioned)):
+            self.nearby[bowser['id']] = nearby
+        for bowser in available:
+            if not self._has_position(bowser):
+                # No known position: every demanding location is a candidate at no travel cost
+                self.nearby[bowser['id']] = [(location_id, 0.0) for location_id in demanding[:self.candidates]]
+            self._build_edges(bowser['id'])
+
+        self.retired = set()
+        self.price: List[float] = [0.0] * len(self.slot_location)
+        self.owner: List[Optional[str]] = [None] * len(self.slot_location)
+        self.assigned: Dict[str, Optional[int]] = {bowser_id: None for bowser_id in self.edges}
+
+    def _is_available(self, bowser: dict) -> bool:
+        return bowser['status'] == 'available' and (bowser['current_level'] or 0) > 0 \
+            and not bowser.get('location_id')
+
+    def _unmet(self, location: dict) -> float:
+        return max(0.0, location['required'] - location['supplied'])
+
+    def _build_slots(self, location_id: str):
+        unmet = self._unmet(self.locations[location_id])
+        count = min(MAX_SLOTS_PER_LOCATION, math.ceil(unmet / self.slot_size)) if unmet > 0 else 0
+        slots = []
+        for k in range(count):
+            slots.append(len(self.slot_location))
+            self.slot_location.append(location_id)
+            self.slot_remaining.append(unmet - k * self.slot_size)
+        self.location_slots[location_id] = slots
+
+    def _build_edges(self, bowser_id: str):
+        bowser = self.bowsers[bowser_id]
+        litres = bowser['current_level'] or 0.0
+        edges = {}
+        for location_id, distance in self.nearby.get(bowser_id, ()):
+            location = self.locations[location_id]
+            self.location_bidders[location_id].add(bowser_id)
+            for slot in self.location_slots.get(location_id, ()):
+                benefit = location['weight'] * min(litres, self.slot_remaining[slot]) - self.distance_cost * distance
+                if benefit > 0:
+                    edges[slot] = (benefit, distance)
+        self.edges[bowser_id] = edges
+
+    # -- auction ---------------------------------------------------------------
+    #
+    # Every bowser may also stay unassigned, worth 0. Forward bids move
+    # bowsers to their best slot and raise its price; a slot left without an
+    # owner at a positive price then runs a reverse step, lowering its price
+    # to win back the bowser that gains most from it. Both keep every bowser
+    # within epsilon of its best choice at current prices, which is what
+    # makes the result optimal to within epsilon per bowser.
+
+    def _profit(self, bowser_id: str) -> float:
+        slot = self.assigned[bowser_id]
+        return 0.0 if slot is None else self.edges[bowser_id][slot][0] - self.price[slot]
+
+    def _forward(self, queue: deque, freed: set, epsilon: float):
+        price, owner, assigned, edges = self.price, self.owner, self.assigned, self.edges
+        while queue:
+            bowser_id = queue.popleft()
+            if bowser_id not in edges:
+                continue
+            current = assigned[bowser_id]
+            best = second = 0.0
+            best_slot = None
+            for slot, (benefit, _) in edges[bowser_id].items():
+                value = benefit - price[slot]
+                if value > best:
+                    second, best, best_slot = best, value, slot
+                elif value > second:
+                    second = value
+            if best_slot == current:
+                continue
+            if current is not None:
+                owner[current] = None
+                freed.add(current)
+            assigned[bowser_id] = best_slot
+            if best_slot is None:
+                continue
+            price[best_slot] += best - second + epsilon
+            previous = owner[best_slot]
+            owner[best_slot] = bowser_id
+            freed.discard(best_slot)
+            if previous is not None:
+                assigned[previous] = None
+                queue.append(previous)
+
+    def _reverse(self, freed: set, epsilon: float):
+        price, owner, assigned, edges = self.price, self.owner, self.assigned, self.edges
+        while freed:
+            slot = freed.pop()
+            if owner[slot] is not None or price[slot] <= 0 or slot in self.retired:
+                continue
+            best = second = -math.inf
+            best_bowser = None
+            for bowser_id in self.location_bidders.get(self.slot_location[slot], ()):
+                edge = edges.get(bowser_id, {}).get(slot)
+                if edge is None:
+                    continue
+                value = edge[0] - self._profit(bowser_id)
+                if value > best:
+                    second, best, best_bowser = best, value, bowser_id
+                elif value > second:
+                    second = value
+            if best_bowser is None or best < epsilon:
+                # Nobody gains more than epsilon from the slot even for free
+                price[slot] = 0.0
+                continue
+            price[slot] = max(0.0, second - epsilon)
+            previous = assigned[best_bowser]
+            if previous is not None:
+                owner[previous] = None
+                freed.add(previous)
+            owner[slot] = best_bowser
+            assigned[best_bowser] = slot
+
+    def _settle(self, queue: deque, freed: set, epsilon: float = None):
+        epsilon = epsilon or self.epsilon
+        self._forward(queue, freed, epsilon)
+        self._reverse(freed, epsilon)
+
+    def solve(self) -> Dict:
+        """Solve from scratch with epsilon scaling; returns the summary.
+
+        Early phases with a coarse epsilon settle prices quickly; each later
+        phase starts from those prices with everyone unassigned.
+        """
+        started = time.perf_counter()
+        self.price = [0.0] * len(self.slot_location)
+        top = max((benefit for edges in self.edges.values() for benefit, _ in edges.values()), default=0.0)
+        epsilon = max(top / 10, self.epsilon)
+        while True:
+            self.owner = [None] * len(self.slot_location)
+            self.assigned = {bowser_id: None for bowser_id in self.edges}
+            freed = set()
+            self._forward(deque(self.edges), freed, epsilon)
+            freed.update(slot for slot, price in enumerate(self.price) if price > 0 and self.owner[slot] is None)
+            self._reverse(freed, epsilon)
+            if epsilon <= self.epsilon:
+                break
+            epsilon = max(epsilon / 4, self.epsilon)
+        return self.summary(time.perf_counter() - started)
+
+    def _unassign(self, bowser_id: str, freed: set):
+        slot = self.assigned.get(bowser_id)
+        if slot is not None:
+            self.owner[slot] = None
+            self.assigned[bowser_id] = None
+            freed.add(slot)
+
+    def update_bowser(self, bowser_id: str, **changes) -> Dict:
+        """Apply changes (current_level, status, capacity) to one bowser and re-solve locally."""
+        started = time.perf_counter()
+        bowser = self.bowsers[bowser_id]
+        bowser.update(changes)
+        freed, queue = set(), deque()
+
+        location_id = bowser.get('location_id')
+        if location_id in self.locations:
+            # A deployed bowser changes its site's unmet demand, so that site's slots are rebuilt
+            self.locations[location_id]['supplied'] = sum(
+                b['current_level'] or 0.0 for b in self.bowsers.values() if b.get('location_id') == location_id)
+            queue.extend(self._rebuild_location(location_id, freed))
+
+        if bowser_id in self.edges:
+            self._unassign(bowser_id, freed)
+            del self.edges[bowser_id]
+            del self.assigned[bowser_id]
+        if self._is_available(bowser):
+            if bowser_id not in self.nearby:
+                self.nearby[bowser_id] = self._nearby(bowser)
+            self._build_edges(bowser_id)
+            self.assigned[bowser_id] = None
+            queue.append(bowser_id)
+        self._settle(queue, freed)
+        return self.summary(time.perf_counter() - started)
+
+    def _has_position(self, bowser: dict) -> bool:
+        if self.distances is not None:
+            return self.distances.has_position(bowser.get('position_id'))
+        return bowser.get('latitude') is not None
+
+    def _nearest_demanding(self, bowsers: List[dict]) -> List[List[tuple]]:
+        """(location id, km) of the demanding locations nearest each positioned bowser."""
+        if not self.index_ids or not bowsers:
+            return [[] for _ in bowsers]
+        if self.distances is not None:
+            # Many bowsers share a position, so each position is looked up once
+            positions = sorted({bowser['position_id'] for bowser in bowsers})
+            found = dict(zip(positions, self.distances.nearest(positions, self.index_ids,
+                                                                self.candidates, self.max_km)))
+            return [found[bowser['position_id']] for bowser in bowsers]
+        nearest = self.index.nearest_many([b['latitude'] for b in bowsers], [b['longitude'] for b in bowsers],
+                                          self.candidates, self.max_km)
+        return [[(self.index_ids[i], float(d)) for i, d in zip(indices, distances)] for indices, distances in nearest]
+
+    def _nearby(self, bowser: dict) -> List[tuple]:
+        if not self.index_ids:
+            return []
+        if not self._has_position(bowser):
+            return [(location_id, 0.0) for location_id in self.index_ids[:self.candidates]]
+        return self._nearest_demanding([bowser])[0]
+
+    def _rebuild_location(self, location_id: str, freed: set) -> List[str]:
+        """Replace a location's slots; returns the bowsers that must bid again."""
+        bidders = [bowser_id for bowser_id in self.location_bidders.get(location_id, ()) if bowser_id in self.edges]
+        for bowser_id in bidders:
+            self._unassign(bowser_id, freed)
+        # Retired slot ids stay in the lists, unowned, but no edge points at them any more
+        for slot in self.location_slots.get(location_id, ()):
+            self.retired.add(slot)
+            freed.discard(slot)
+        before = len(self.slot_location)
+        self._build_slots(location_id)
+        added = len(self.slot_location) - before
+        self.price += [0.0] * added
+        self.owner += [None] * added
+        if self.location_slots[location_id] and location_id not in self.index_ids:
+            bidders += self._attach_location(location_id)
+        for bowser_id in bidders:
+            self._build_edges(bowser_id)
+        return bidders
+
+    def _attach_location(self, location_id: str) -> List[str]:
+        """Offer a location that has just started to need water to the bowsers nearest it."""
+        location = self.locations[location_id]
+        self.index_ids.append(location_id)
+        if self.distances is not None:
+            positions = [self.bowsers[bowser_id]['position_id'] for bowser_id in self.bowser_index_ids]
+            unique = sorted(set(positions))
+            row = dict(zip(unique, self.distances.between([location_id], unique)[0])) if unique else {}
+            distances = np.array([row[position] for position in positions])
+            indices = np.argsort(distances, kind='stable')[:self.candidates]
+            indices = indices[distances[indices] <= self.max_km]
+            distances = distances[indices]
+        else:
+            indices, distances = self.bowser_index.nearest(location['latitude'], location['longitude'],
+                                                           self.candidates, self.max_km)
+        attached = []
+        for i, distance in zip(indices, distances):
+            bowser_id = self.bowser_index_ids[i]
+            if bowser_id in self.edges:
+                self.nearby.setdefault(bowser_id, []).append((location_id, float(distance)))
+                attached.append(bowser_id)
+        return attached
+
+    # -- results -----------------------------------------------------------------
+
+    def assignments(self) -> List[Dict]:
+        plan = []
+        for bowser_id, slot in self.assigned.items():
+            if slot is None:
+                continue
+            bowser = self.bowsers[bowser_id]
+            location = self.locations[self.slot_location[slot]]
+            distance = self.edges[bowser_id][slot][1]
+            plan.append({
+                'bowser_id': bowser_id,
+                'bowser_number': bowser.get('number'),
+                'litres': bowser['current_level'],
+                'location_id': location['id'],
+                'location_name': location.get('name'),
+                'priority_weight': location['weight'],
+                'distance_km': round(distance, 3),
+            })
+        plan.sort(key=lambda item: (-item['priority_weight'], item['location_id'], item['distance_km']))
+        return plan
+
+    def summary(self, elapsed: float = None) -> Dict:
+        """Weighted unmet demand before and after the plan, with actual bowser volumes."""
+        delivered = defaultdict(float)
+        travel = 0.0
+        for bowser_id, slot in self.assigned.items():
+            if slot is not None:
+                delivered[self.slot_location[slot]] += self.bowsers[bowser_id]['current_level']
+                travel += self.edges[bowser_id][slot][1]
+        before = after = 0.0
+        for location_id, location in self.locations.items():
+            unmet = self._unmet(location)
+            before += location['weight'] * unmet
+            after += location['weight'] * max(0.0, unmet - delivered[location_id])
+        return {
+            'available_bowsers': len(self.edges),
+            'assigned_bowsers': sum(slot is not None for slot in self.assigned.values()),
+            'demanding_locations': sum(1 for slots in self.location_slots.values() if slots),
+            'weighted_unmet_before': round(before, 1),
+            'weighted_unmet_after': round(after, 1),
+            'travel_km': round(travel, 2),
+            'solve_ms': None if elapsed is None else round(elapsed * 1000, 2),
+        }
+
+def load_problem() -> tuple:
+    """Bowsers and active locations for Allocator.load(), in four queries.
+
+    A bowser's position is the location of its most recent deployment, or
+    the depot (DEPOT_LATITUDE/DEPOT_LONGITUDE) for bowsers never deployed.
+    """
+    return list(load_bowsers().values()), [dict(row._mapping) for row in db.session.execute(
+        select(Location.id, Location.name, Location.type, Location.latitude, Location.longitude)
+        .where(Location.status == 'active')
+    )]
+
+def load_bowsers() -> Dict[str, dict]:
+    """Every bowser with its position (see load_problem()) and active deployment, by id."""
+    depot = current_app.config.get('DEPOT_LATITUDE'), current_app.config.get('DEPOT_LONGITUDE')
+    depot = (None, None, None) if None in depot else depot + (DEPOT_ID,)
+    bowsers = {row.id: dict(row._mapping, latitude=depot[0], longitude=depot[1], position_id=depot[2],
+                            location_id=None)
+               for row in db.session.execute(select(
+                   Bowser.id, Bowser.number, Bowser.capacity, Bowser.current_level, Bowser.status))}
+
+    for row in db.session.execute(
+        latest_deployments().add_columns(Location.latitude, Location.longitude)
+        .join(Location, Location.id == Deployment.location_id)
+    ):
+        if row.bowser_id in bowsers:
+            bowsers[row.bowser_id].update(latitude=row.latitude, longitude=row.longitude,
+                                          position_id=row.location_id)
+
+    for row in db.session.execute(
+        select(Deployment.bowser_id, Deployment.location_id).where(Deployment.status == 'active')
+    ):
+        if row.bowser_id in bowsers:
+            bowsers[row.bowser_id]['location_id'] = row.location_id
+    return bowsers
+
+def nearest_bowsers(location_id: str, k: int = 5, status: str = None) -> List[Dict]:
+    """Up to k bowsers nearest location_id by position, optionally only those with status."""
+    distances = location_distances.matrix()
+    bowsers = [bowser for bowser in load_bowsers().values()
+               if distances.has_position(bowser['position_id']) and (status is None or bowser['status'] == status)]
+    positions = sorted({bowser['position_id'] for bowser in bowsers})
+    row = dict(zip(positions, distances.between([location_id], positions)[0])) if positions else {}
+    bowsers.sort(key=lambda bowser: row[bowser['position_id']])
+    return [{
+        'bowser_id': bowser['id'],
+        'bowser_number': bowser['number'],
+        'status': bowser['status'],
+        'current_level': bowser['current_level'],
+        'capacity': bowser['capacity'],
+        'position_id': bowser['position_id'],
+        'deployed_at': bowser['location_id'],
+        'distance_km': round(float(row[bowser['position_id']]), 3),
+    } for bowser in bowsers[:k]]
+
+class AllocationService:
+    """Per-process allocation plan, re-solved when the data it reads changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.allocator: Optional[Allocator] = None
+
+    def _new_allocator(self) -> Allocator:
+        config = current_app.config
+        return Allocator(
+            distance_cost=config.get('ALLOCATION_DISTANCE_COST', 50.0),
+            candidates=config.get('ALLOCATION_CANDIDATES', 8),
+            max_km=config.get('ALLOCATION_MAX_KM', 50.0),
+            base_demand=config.get('ALLOCATION_BASE_DEMAND', 5000.0),
+            distances=location_distances.matrix(),
+        )
+
+    def plan(self) -> Dict:
+        versions = data_version(*ALLOCATION_TABLES)
+        with self._lock:
+            if self.allocator is None or self.allocator.versions != versions:
+                allocator = self._new_allocator()
+                allocator.load(*load_problem())
+                summary = allocator.solve()
+                allocator.versions = versions
+                self.allocator = allocator
+                logger.info(f"Allocation solved: {summary}")
+            else:
+                summary = self.allocator.summary()
+            return {'summary': summary, 'assignments': self.allocator.assignments(),
+                    'versions': list(versions)}
+
+    def bowser_changed(self, bowser_id: str, versions_before: tuple, **changes):
+        """Re-solve locally after a write that changed only bowser_id.
+
+        versions_before are the data versions read before the write. The
+        cached plan is updated in place only if it was current and the
+        write was the only change since, otherwise the next plan() call
+        re-solves from scratch.
+        """
+        with self._lock:
+            if self.allocator is None or self.allocator.versions != versions_before \
+                    or bowser_id not in self.allocator.bowsers:
+                return
+            versions = data_version(*ALLOCATION_TABLES)
+            if versions != (versions_before[0] + 1,) + tuple(versions_before[1:]):
+                return
+            self.allocator.update_bowser(bowser_id, **changes)
+            self.allocator.versions = versions
+
+allocation_service = AllocationService()
@@ -0,0 +1,218 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+from typing import Dict, Optional
+
+import click
+from flask import current_app, request, send_from_directory
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip variants are built
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:  # optional; JS is fingerprinted and compressed but not minified
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:  # optional; falls back to _minify_css
+    rcssmin = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ASSET_EXTENSIONS = ('.js', '.css')
+COMPRESSIBLE = ('.js', '.css', '.svg', '.json', '.map')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# import ... from './x.js', import './x.js', export ... from './x.js', import('./x.js')
+MODULE_IMPORT = re.compile(r"""((?:\bfrom|\bimport)\s*\(?\s*)(['"])(\.{1,2}/[^'"]+\.js)\2""")
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+_manifest_cache: Dict[str, tuple] = {}
+
+def _minify_css(source: str) -> str:
+    source = CSS_COMMENT.sub('', source)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+def _minify(path: str, source: str) -> str:
+    if path.endswith('.css'):
+        return rcssmin.cssmin(source) if rcssmin else _minify_css(source)
+    if path.endswith('.js') and rjsmin:
+        return rjsmin.jsmin(source)
+    return source
+
+def _fingerprint(path: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, extension = os.path.splitext(path)
+    return f'{stem}.{digest}{extension}'
+
+def _write_variants(target: str, content: bytes):
+    with open(target, 'wb') as f:
+        f.write(content)
+    if target.endswith(COMPRESSIBLE):
+        with open(target + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(content, quality=11))
+
+def build_assets(static_folder: str) -> Dict[str, str]:
+    """Minify, fingerprint and precompress static assets into static/dist.
+
+    ES module imports between local scripts are rewritten to the
+    fingerprinted names, so each file is processed after the files it
+    imports and a change to a dependency also changes its importers'
+    names. Other files (images, vendored *.min.* files) are fingerprinted
+    as they are. Returns the manifest of original to built paths.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+
+    sources = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist and d != 'tests']
+        for name in files:
+            full_path = os.path.join(root, name)
+            sources[os.path.relpath(full_path, static_folder).replace(os.sep, '/')] = full_path
+
+    manifest: Dict[str, str] = {}
+
+    def resolve(importer: str, specifier: str) -> str:
+        return os.path.normpath(os.path.join(os.path.dirname(importer), specifier)).replace(os.sep, '/')
+
+    def build(path: str, visiting=()):
+        if path in manifest:
+            return
+        with open(sources[path], 'rb') as f:
+            content = f.read()
+        if path.endswith(ASSET_EXTENSIONS) and '.min.' not in path:
+            text = content.decode('utf-8')
+            if path.endswith('.js'):
+                for _, _, specifier in MODULE_IMPORT.findall(text):
+                    dependency = resolve(path, specifier)
+                    if dependency in sources and dependency not in visiting:
+                        build(dependency, visiting + (path,))
+
+                def rewrite(match):
+                    dependency = resolve(path, match.group(3))
+                    if dependency not in manifest:
+                        return match.group(0)
+                    relative = os.path.relpath(manifest[dependency], os.path.dirname(path)).replace(os.sep, '/')
+                    return f"{match.group(1)}{match.group(2)}{relative if relative.startswith('.') else './' + relative}{match.group(2)}"
+
+                text = MODULE_IMPORT.sub(rewrite, text)
+            content = _minify(path, text).encode('utf-8')
+
+        built = _fingerprint(path, content)
+        target = os.path.join(dist, built)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write_variants(target, content)
+        manifest[path] = built
+
+    for path in sorted(sources):
+        build(path)
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def load_manifest(static_folder: str) -> Dict[str, str]:
+    """Read static/dist/manifest.json, reloading it when the file changes."""
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _manifest_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error loading asset manifest: {str(e)}")
+        manifest = {}
+    _manifest_cache[path] = (mtime, manifest)
+    return manifest
+
+def send_precompressed(directory: str, filename: str, cache_control: str, etag: Optional[str] = None):
+    """Send filename from directory, or its .br/.gz variant when the client accepts it.
+
+    With etag, each encoding gets its own strong validator derived from it.
+    """
+    accepted = request.headers.get('Accept-Encoding', '')
+    encoding, path = None, filename
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if candidate in accepted and os.path.isfile(os.path.join(directory, filename + suffix)):
+            encoding, path = candidate, filename + suffix
+            break
+    response = send_from_directory(directory, path, conditional=True,
+                                   etag=f'{etag}-{encoding}' if etag and encoding else (etag or True))
+    if encoding:
+        # The mimetype must come from the original name, not the .br/.gz suffix
+        response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+def serve_static(filename):
+    """Static view that serves precompressed variants of built assets."""
+    if filename.startswith(DIST_DIR + '/'):
+        return send_precompressed(current_app.static_folder, filename, IMMUTABLE)
+    return current_app.send_static_file(filename)
+
+def cache_headers(response):
+    """Cache policy: immutable built assets, revalidated other assets and
+    anonymous pages, and no-store only on authenticated HTML."""
+    if 'Cache-Control' in response.headers:
+        return response
+    if request.endpoint == 'static':
+        response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    elif current_user.is_authenticated and response.mimetype == 'text/html':
+        response.headers['Cache-Control'] = 'no-store'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '-1'
+    elif current_user.is_authenticated:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def init_assets(app):
+    """Serve built assets and point url_for('static', ...) at them.
+
+    Without a build (python -m flask build-assets) or with USE_BUILT_ASSETS
+    off, the original files are served as before.
+    """
+    app.view_functions['static'] = serve_static
+
+    @app.url_defaults
+    def fingerprinted_static_url(endpoint, values):
+        if endpoint != 'static' or not app.config.get('USE_BUILT_ASSETS', True):
+            return
+        built = load_manifest(app.static_folder).get(values.get('filename'))
+        if built:
+            values['filename'] = f'{DIST_DIR}/{built}'
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Minify, fingerprint and precompress files in static/ into static/dist."""
+        manifest = build_assets(app.static_folder)
+        click.echo(f"Built {len(manifest)} assets into {os.path.join(app.static_folder, DIST_DIR)}")
+        if brotli is None:
+            click.echo("brotli is not installed; only gzip variants were written")
@@ -0,0 +1,165 @@
+import logging
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import and_, case, func, or_, select
+
+from database import db
+from models.sql_models import Bowser, Deployment, Location
+from utils.data_versions import data_version
+from utils.search import match_criterion
+from utils.serialization import bowser_schema
+
+logger = logging.getLogger(__name__)
+
+FACET_TABLES = ('bowser', 'deployment')
+FACETS = ('status', 'capacity', 'owner', 'deployment')
+# The management page's capacity filter: small below 5000 L, medium up to 10000 L, large above
+CAPACITY_BUCKETS = ('small', 'medium', 'large')
+SMALL_MAX_LITRES = 5000
+MEDIUM_MAX_LITRES = 10000
+CAPACITY_RANGES = {
+    'small': Bowser.capacity < SMALL_MAX_LITRES,
+    'medium': and_(Bowser.capacity >= SMALL_MAX_LITRES, Bowser.capacity <= MEDIUM_MAX_LITRES),
+    'large': Bowser.capacity > MEDIUM_MAX_LITRES,
+}
+DEPLOYMENT_STATES = ('deployed', 'scheduled', 'undeployed')
+SORT_KEYS = {
+    'number': Bowser.number,
+    'capacity': Bowser.capacity,
+    'level': Bowser.current_level,
+    'status': Bowser.status,
+    'owner': Bowser.owner,
+}
+CUBE_CACHE_SIZE = 64
+
+_cubes: Dict[Tuple, List[Tuple]] = {}
+
+def _deployment_states():
+    # One row per bowser with an active (1) or only scheduled (2) deployment, the
+    # order of DEPLOYMENT_STATES
+    return select(Deployment.bowser_id,
+                  func.min(case((Deployment.status == 'active', 1), else_=2)).label('state')) \
+        .where(Deployment.status.in_(('active', 'scheduled'))) \
+        .group_by(Deployment.bowser_id).subquery()
+
+def capacity_bucket(litres: float) -> str:
+    """The capacity bucket of a bowser; the same rule as CAPACITY_RANGES."""
+    return 'small' if litres < SMALL_MAX_LITRES else 'medium' if litres <= MEDIUM_MAX_LITRES else 'large'
+
+def facet_cube(query: str = '') -> List[Tuple]:
+    """Bowser counts grouped by every facet at once, as (status, capacity, owner, deployment, count) rows.
+
+    Built from two grouped queries rather than one join over the fleet:
+    all bowsers by status, capacity and owner (a scan of ix_bowser_facets),
+    and the bowsers with an open deployment, which are moved out of
+    'undeployed'. The cube answers every combination of filters, so it is
+    cached per search query until bowser or deployment data changes.
+    """
+    key = (data_version(*FACET_TABLES), query)
+    cube = _cubes.get(key)
+    if cube is not None:
+        return cube
+    criterion = match_criterion('bowser', query)
+    fleet = select(Bowser.status, Bowser.capacity, Bowser.owner, func.count()) \
+        .group_by(Bowser.status, Bowser.capacity, Bowser.owner)
+    states = _deployment_states()
+    deployed = select(Bowser.status, Bowser.capacity, Bowser.owner, states.c.state, func.count()) \
+        .select_from(states).join(Bowser, Bowser.id == states.c.bowser_id) \
+        .group_by(Bowser.status, Bowser.capacity, Bowser.owner, states.c.state)
+    if criterion is not None:
+        fleet, deployed = fleet.where(criterion), deployed.where(criterion)
+
+    cells = Counter()
+    for status, capacity, owner, count in db.session.execute(fleet):
+        cells[status, capacity_bucket(capacity), owner, 'undeployed'] += count
+    for status, capacity, owner, state, count in db.session.execute(deployed):
+        cell = (status, capacity_bucket(capacity), owner)
+        cells[cell + ('undeployed',)] -= count
+        cells[cell + (DEPLOYMENT_STATES[state - 1],)] += count
+    cube = [cell + (count,) for cell, count in cells.items() if count]
+    if len(_cubes) >= CUBE_CACHE_SIZE:
+        _cubes.clear()
+    _cubes[key] = cube
+    return cube
+
+def facet_counts(cube: List[Tuple], filters: Dict[str, Sequence[str]]) -> Tuple[Dict[str, Dict[str, int]], int]:
+    """Counts of every facet value and the number of bowsers matching all filters.
+
+    Each facet is counted with the other facets' filters applied but not
+    its own, so a selected status still shows what the other statuses
+    would add.
+    """
+    counts = {facet: Counter() for facet in FACETS}
+    total = 0
+    for *values, count in cube:
+        missed = [facet for facet, value in zip(FACETS, values) if filters.get(facet) and value not in filters[facet]]
+        if len(missed) > 1:
+            continue
+        for facet, value in zip(FACETS, values):
+            if not missed or missed == [facet]:
+                counts[facet][value] += count
+        if not missed:
+            total += count
+    ordered = {facet: dict(sorted(counts[facet].items(), key=lambda item: (-item[1], str(item[0]))))
+               for facet in ('status', 'owner')}
+    ordered['capacity'] = {bucket: counts['capacity'][bucket] for bucket in CAPACITY_BUCKETS}
+    ordered['deployment'] = {state: counts['deployment'][state] for state in DEPLOYMENT_STATES}
+    return {facet: ordered[facet] for facet in FACETS}, total
+
+def bowser_page(query: str, filters: Dict[str, Sequence[str]], page: int, per_page: int,
+                sort: str = 'number') -> List[Dict]:
+    """One page of bowsers matching query and filters, with deployment state and location.
+
+    Ties in the sort key are broken by id so pages never overlap. The
+    deployment subquery is only joined when filtering on it; otherwise the
+    page's states are looked up afterwards.
+    """
+    statement = bowser_schema.query()
+    if filters.get('status'):
+        statement = statement.filter(Bowser.status.in_(filters['status']))
+    if filters.get('capacity'):
+        statement = statement.filter(or_(*[CAPACITY_RANGES[bucket] for bucket in filters['capacity']]))
+    if filters.get('owner'):
+        statement = statement.filter(Bowser.owner.in_(filters['owner']))
+    if filters.get('deployment'):
+        states = _deployment_states()
+        state = case((states.c.state == 1, 'deployed'), (states.c.state == 2, 'scheduled'), else_='undeployed')
+        statement = statement.outerjoin(states, states.c.bowser_id == Bowser.id) \
+            .filter(state.in_(filters['deployment']))
+    criterion = match_criterion('bowser', query)
+    if criterion is not None:
+        statement = statement.filter(criterion)
+    key = SORT_KEYS[sort.lstrip('-')]
+    rows = statement.order_by(key.desc() if sort.startswith('-') else key, Bowser.id) \
+        .offset((page - 1) * per_page).limit(per_page).all()
+
+    deployments = {}
+    if rows:
+        for bowser_id, status, name in db.session.execute(
+            select(Deployment.bowser_id, Deployment.status, Location.name)
+            .join(Location, Location.id == Deployment.location_id)
+            .where(Deployment.status.in_(('active', 'scheduled')), Deployment.bowser_id.in_([row.id for row in rows]))
+        ):
+            if status == 'active' or bowser_id not in deployments:
+                deployments[bowser_id] = ('deployed' if status == 'active' else 'scheduled',
+                                          name if status == 'active' else None)
+    results = bowser_schema.serialize(rows)
+    for result in results:
+        result['deployment'], result['location_name'] = deployments.get(result['id'], ('undeployed', None))
+    return results
+
+def bowser_facets(query: str = '', filters: Dict[str, Sequence[str]] = None, page: int = 1,
+                  per_page: int = 24, sort: str = 'number') -> Dict:
+    """Facet counts and one page of results for the management bowser grid."""
+    filters = {facet: list(values) for facet, values in (filters or {}).items() if values}
+    facets, total = facet_counts(facet_cube(query), filters)
+    return {
+        'facets': facets,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page,
+        'results': bowser_page(query, filters, page, per_page, sort) if total else [],
+        'version': '.'.join(str(version) for version in data_version(*FACET_TABLES)),
+    }
@@ -0,0 +1,68 @@
+from typing import Iterable, Tuple
+
+from flask import g, has_request_context
+from sqlalchemy import event, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from database import db
+from models.sql_models import DataVersion
+
+# High-churn tables that no cached fragment renders
+UNVERSIONED_TABLES = {'data_version', 'job', 'bowser_level_block', 'bowser_level_rollup'}
+
+_table = DataVersion.__table__
+
+def _bump(connection, tables: Iterable[str]):
+    """Increment the version of each table in the caller's transaction."""
+    if has_request_context():
+        g.pop('_data_versions', None)
+    for name in sorted(tables):
+        if connection.dialect.name in ('sqlite', 'postgresql'):
+            dialect_insert = sqlite.insert if connection.dialect.name == 'sqlite' else postgresql.insert
+            connection.execute(
+                dialect_insert(_table).values(table_name=name, version=1).on_conflict_do_update(
+                    index_elements=[_table.c.table_name], set_={'version': _table.c.version + 1}
+                )
+            )
+        else:
+            result = connection.execute(
+                update(_table).where(_table.c.table_name == name).values(version=_table.c.version + 1)
+            )
+            if result.rowcount == 0:
+                connection.execute(_table.insert().values(table_name=name, version=1))
+
+def _changed_tables(session) -> set:
+    objects = list(session.new) + list(session.deleted)
+    objects += [obj for obj in session.dirty if session.is_modified(obj)]
+    tables = {obj.__table__.name for obj in objects if hasattr(obj, '__table__')}
+    return tables - UNVERSIONED_TABLES
+
+@event.listens_for(Session, 'after_flush')
+def _version_flushed_changes(session, flush_context):
+    tables = _changed_tables(session)
+    if tables:
+        _bump(session.connection(), tables)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _version_bulk_changes(orm_execute_state):
+    # Query.update()/delete() skip the flush, so bump on the statement itself
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.local_table.name not in UNVERSIONED_TABLES:
+        _bump(orm_execute_state.session.connection(), [mapper.local_table.name])
+
+def data_version(*tables: str) -> Tuple[int, ...]:
+    """Current versions of tables, read once per request.
+
+    Versions live in the database, so every worker sees a write as soon
+    as it commits.
+    """
+    if has_request_context() and '_data_versions' in g:
+        versions = g._data_versions
+    else:
+        versions = dict(db.session.query(DataVersion.table_name, DataVersion.version).all())
+        if has_request_context():
+            g._data_versions = versions
+    return tuple(versions.get(table, 0) for table in tables)
@@ -0,0 +1,90 @@
+import logging
+import time
+from typing import Any, Dict, Mapping
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DisconnectionError
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PRE_PING_POLICIES = ('always', 'idle', 'never')
+
+# Backend-specific adjustments on top of the DB_POOL_* settings
+BACKEND_OPTIONS = {
+    # MySQL drops connections idle for wait_timeout (8 hours by default)
+    'mysql': {'pool_recycle': 3600},
+}
+
+def pool_options(config: Mapping[str, Any]) -> Dict[str, Any]:
+    """QueuePool arguments for create_engine() from the DB_POOL_* settings."""
+    policy = config.get('DB_POOL_PRE_PING', 'idle')
+    if policy not in PRE_PING_POLICIES:
+        raise ValueError(f"Unknown pre-ping policy '{policy}'")
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_POOL_MAX_OVERFLOW', 5),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_use_lifo': config.get('DB_POOL_LIFO', True),
+        'pool_pre_ping': policy == 'always',
+    }
+
+def engine_options(uri: str, config: Mapping[str, Any]) -> Dict[str, Any]:
+    """create_engine() options for uri.
+
+    Server databases get a QueuePool sized by DB_POOL_*; SQLite keeps
+    Flask-SQLAlchemy's pools (NullPool for files, StaticPool in memory),
+    where pinging or recycling would only add work. Entries in
+    SQLALCHEMY_ENGINE_OPTIONS are applied last and win.
+    """
+    backend = make_url(uri).get_backend_name()
+    options = {} if backend == 'sqlite' else {**pool_options(config), **BACKEND_OPTIONS.get(backend, {})}
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+def instrument_pool(engine, name: str = 'default', ping_idle: float = None):
+    """Report engine's pool to the metrics registry and apply the idle pre-ping.
+
+    With ping_idle set, a connection that sat unused in the pool for longer
+    than that many seconds is pinged on checkout; a failed ping discards it
+    and the pool retries with a fresh connection. Connections reused in
+    quick succession skip the extra round trip that pool_pre_ping costs.
+    """
+    pool = engine.pool
+    capacity = pool.size() + getattr(pool, '_max_overflow', 0) if hasattr(pool, 'size') else None
+    metrics.register_pool(name, pool, capacity)
+
+    @event.listens_for(pool, 'connect')
+    def count_connect(dbapi_connection, connection_record):
+        metrics.observe_pool_event(name, 'connect')
+
+    @event.listens_for(pool, 'checkin')
+    def mark_idle(dbapi_connection, connection_record):
+        connection_record.info['checked_in_at'] = time.monotonic()
+
+    @event.listens_for(pool, 'checkout')
+    def ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        metrics.observe_pool_event(name, 'checkout')
+        checked_in_at = connection_record.info.get('checked_in_at')
+        if ping_idle is None or checked_in_at is None or time.monotonic() - checked_in_at < ping_idle:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        except Exception as e:
+            metrics.observe_pool_event(name, 'invalidated')
+            logger.warning(f"Discarding stale pooled connection: {str(e)}")
+            raise DisconnectionError() from e
+        finally:
+            cursor.close()
+
+def init_pool(app, db):
+    """Instrument the app's engine pool; call once the engine options are set."""
+    with app.app_context():
+        engine = db.get_engine()
+    policy = app.config.get('DB_POOL_PRE_PING', 'idle')
+    ping_idle = app.config.get('DB_POOL_PING_IDLE', 30) if policy == 'idle' and engine.dialect.name != 'sqlite' else None
+    instrument_pool(engine, ping_idle=ping_idle)
@@ -0,0 +1,342 @@
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+
+from database import db
+from models.sql_models import Deployment, Location
+from utils.data_versions import data_version
+from utils.geo import haversine_km
+
+logger = logging.getLogger(__name__)
+
+DEPOT_ID = 'depot'
+MIN_ROWS = 256
+MIN_COLUMNS = 64
+GROWTH = 1.25  # headroom added when an axis runs out of slots
+BLOCK_ROWS = 512  # rows computed per step, bounding the float64 scratch space
+
+class MatrixTooLarge(Exception):
+    """Raised when growing the distance matrix would pass its size limit."""
+
+class Axis:
+    """Slots of one side of a DistanceMatrix: the id and coordinates in each."""
+
+    def __init__(self, index: Optional[dict] = None):
+        index = index or {'capacity': 0, 'ids': [], 'latitudes': [], 'longitudes': []}
+        self.capacity = index['capacity']
+        self.ids: List[Optional[str]] = index['ids']
+        self.latitudes: List[float] = index['latitudes']
+        self.longitudes: List[float] = index['longitudes']
+        self.slot_of: Dict[str, int] = {point_id: slot for slot, point_id in enumerate(self.ids)
+                                        if point_id is not None}
+
+    def to_dict(self) -> dict:
+        return {'capacity': self.capacity, 'ids': self.ids, 'latitudes': self.latitudes,
+                'longitudes': self.longitudes}
+
+    def diff(self, points: Dict[str, Tuple[float, float]]) -> Tuple[List[str], List[str]]:
+        """Ids no longer in points, and ids of points that are new or moved."""
+        removed = [point_id for point_id in self.slot_of if point_id not in points]
+        changed = []
+        for point_id, (latitude, longitude) in points.items():
+            slot = self.slot_of.get(point_id)
+            if slot is None or self.latitudes[slot] != latitude or self.longitudes[slot] != longitude:
+                changed.append(point_id)
+        return removed, changed
+
+    def needed(self, removed: List[str], changed: List[str]) -> int:
+        """Slots in use once removed are freed and the new ids in changed placed."""
+        free = sum(point_id is None for point_id in self.ids) + len(removed)
+        added = sum(point_id not in self.slot_of for point_id in changed)
+        return len(self.ids) + max(0, added - free)
+
+    def apply(self, points: Dict[str, Tuple[float, float]], removed: List[str], changed: List[str]) -> np.ndarray:
+        """Free removed slots and place changed points; returns the slots of changed."""
+        for point_id in removed:
+            self.ids[self.slot_of.pop(point_id)] = None
+        free = [slot for slot, point_id in enumerate(self.ids) if point_id is None]
+        for point_id in changed:
+            if point_id in self.slot_of:
+                continue
+            if free:
+                slot = free.pop(0)
+            else:
+                slot = len(self.ids)
+                self.ids.append(None)
+                self.latitudes.append(0.0)
+                self.longitudes.append(0.0)
+            self.ids[slot] = point_id
+            self.slot_of[point_id] = slot
+        for point_id in changed:
+            slot = self.slot_of[point_id]
+            self.latitudes[slot], self.longitudes[slot] = (float(value) for value in points[point_id])
+        return np.asarray(sorted(self.slot_of[point_id] for point_id in changed), dtype=np.int64)
+
+    def live(self) -> np.ndarray:
+        return np.fromiter(self.slot_of.values(), dtype=np.int64, count=len(self.slot_of))
+
+    def coordinates(self) -> Tuple[np.ndarray, np.ndarray]:
+        return np.asarray(self.latitudes, dtype=np.float64), np.asarray(self.longitudes, dtype=np.float64)
+
+    def slots(self, point_ids: Sequence[str]) -> np.ndarray:
+        try:
+            return np.fromiter((self.slot_of[point_id] for point_id in point_ids), dtype=np.int64,
+                               count=len(point_ids))
+        except KeyError as e:
+            raise KeyError(f"No distances for point {e.args[0]}") from None
+
+def grown_capacity(needed: int, capacity: int, minimum: int) -> int:
+    """capacity, or a larger one with GROWTH headroom when needed does not fit."""
+    if needed <= capacity:
+        return capacity
+    return max(minimum, math.ceil(needed * GROWTH / minimum) * minimum)
+
+class DistanceMatrix:
+    """Great-circle distances (km) from points to positions in a memory-mapped file.
+
+    Rows are the points distances are wanted to (every location and the
+    depot) and columns the positions bowsers stand at, so the float32
+    matrix is points x positions rather than points squared. The slot of
+    each id and its coordinates are kept in a JSON index next to it.
+    update() diffs new points and positions against the index and only
+    recomputes the rows and columns that were added or moved, reusing the
+    slots of removed ids and growing an axis when it runs out of room; it
+    raises MatrixTooLarge rather than grow the file past max_bytes.
+    Every process on the host shares the files; writers take an flock and
+    readers reload the index when its generation changes.
+    """
+
+    def __init__(self, directory: str, name: str = 'locations', max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.matrix_path = os.path.join(directory, f'{name}.f32')
+        self.index_path = os.path.join(directory, f'{name}.json')
+        self.lock_path = os.path.join(directory, f'{name}.lock')
+        self.dirty_path = os.path.join(directory, f'{name}.dirty')
+        os.makedirs(directory, exist_ok=True)
+        self.generation = None
+        self.rows = Axis()
+        self.columns = Axis()
+        self.matrix: Optional[np.memmap] = None
+        # flock excludes other processes; threads in this one share it
+        self._lock = threading.RLock()
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.rows.capacity, self.columns.capacity
+
+    # -- persistence -------------------------------------------------------------
+
+    def _read_index(self) -> Optional[dict]:
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Files written before the matrix had separate rows and columns are rebuilt
+        return index if 'rows' in index else None
+
+    def _write_index(self):
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({'generation': self.generation, 'rows': self.rows.to_dict(),
+                                'columns': self.columns.to_dict()}))
+        os.replace(tmp_path, self.index_path)
+
+    def _open(self, mode: str = 'r+'):
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode=mode,
+                                shape=self.shape) if all(self.shape) else None
+
+    def reload(self):
+        """Pick up the index and matrix written by another process, if they changed."""
+        index = self._read_index()
+        if index is None or os.path.exists(self.dirty_path) or not os.path.exists(self.matrix_path):
+            # Missing, or a writer died part way through: start again from an empty matrix
+            index = {'generation': 0, 'rows': None, 'columns': None}
+        rows, columns = Axis(index['rows']), Axis(index['columns'])
+        if index['generation'] == self.generation and (rows.capacity, columns.capacity) == self.shape:
+            return
+        self.generation = index['generation']
+        self.rows, self.columns = rows, columns
+        self._open()
+
+    def _check_size(self, shape: Tuple[int, int]):
+        size = shape[0] * shape[1] * np.dtype(np.float32).itemsize
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise MatrixTooLarge(
+                f"A {shape[0]}x{shape[1]} distance matrix needs {size / 2 ** 20:.1f} MiB, more than the "
+                f"{self.max_bytes / 2 ** 20:.1f} MiB allowed; raise DISTANCE_MATRIX_MAX_MB to allow it")
+
+    def _grow(self, shape: Tuple[int, int]):
+        tmp_path = f'{self.matrix_path}.tmp'
+        grown = np.memmap(tmp_path, dtype=np.float32, mode='w+', shape=shape)
+        if self.matrix is not None:
+            rows, columns = self.shape
+            for start in range(0, rows, BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, rows)
+                grown[start:stop, :columns] = self.matrix[start:stop]
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.matrix_path)
+        self.rows.capacity, self.columns.capacity = shape
+        self._open()
+
+    # -- updates -------------------------------------------------------------------
+
+    def update(self, points: Dict[str, Tuple[float, float]],
+               positions: Dict[str, Tuple[float, float]]) -> Dict[str, int]:
+        """Make the rows cover exactly points and the columns exactly positions (id -> (latitude, longitude))."""
+        with self._lock, open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.reload()
+                return self._apply(points, positions)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _apply(self, points: Dict[str, Tuple[float, float]],
+               positions: Dict[str, Tuple[float, float]]) -> Dict[str, int]:
+        removed_rows, changed_rows = self.rows.diff(points)
+        removed_columns, changed_columns = self.columns.diff(positions)
+        if not (removed_rows or changed_rows or removed_columns or changed_columns):
+            return {'changed': 0, 'removed': 0, 'points': len(points), 'positions': len(positions)}
+
+        shape = (grown_capacity(self.rows.needed(removed_rows, changed_rows), self.rows.capacity, MIN_ROWS),
+                 grown_capacity(self.columns.needed(removed_columns, changed_columns), self.columns.capacity,
+                                MIN_COLUMNS))
+        # Checked before anything is written, so the matrix on disk stays usable
+        self._check_size(shape)
+
+        self.generation = (self.generation or 0) + 1
+        open(self.dirty_path, 'w').close()
+        if shape != self.shape:
+            self._grow(shape)
+        rows = self.rows.apply(points, removed_rows, changed_rows)
+        columns = self.columns.apply(positions, removed_columns, changed_columns)
+
+        # Every process maps the same pages, so the writes are visible without a flush
+        self._compute(rows, self.columns.live())
+        self._compute(self.rows.live(), columns)
+        self._write_index()
+        os.remove(self.dirty_path)
+        changed, removed = len(changed_rows) + len(changed_columns), len(removed_rows) + len(removed_columns)
+        logger.info(f"Distance matrix updated: {changed} points or positions added or moved, {removed} removed, "
+                    f"{len(points)}x{len(positions)} in total")
+        return {'changed': changed, 'removed': removed, 'points': len(points), 'positions': len(positions)}
+
+    def _compute(self, rows: np.ndarray, columns: np.ndarray):
+        """Fill the cells where rows cross columns."""
+        if not len(rows) or not len(columns):
+            return
+        row_latitudes, row_longitudes = self.rows.coordinates()
+        column_latitudes, column_longitudes = self.columns.coordinates()
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            self.matrix[block[:, None], columns[None, :]] = haversine_km(
+                row_latitudes[block][:, None], row_longitudes[block][:, None],
+                column_latitudes[columns][None, :], column_longitudes[columns][None, :]).astype(np.float32)
+
+    # -- queries -------------------------------------------------------------------
+
+    def has_position(self, position_id) -> bool:
+        return position_id in self.columns.slot_of
+
+    def between(self, point_ids: Sequence[str], position_ids: Sequence[str]) -> np.ndarray:
+        """len(point_ids) x len(position_ids) array of distances in km."""
+        with self._lock:
+            rows, columns = self.rows.slots(point_ids), self.columns.slots(position_ids)
+            if not len(rows) or not len(columns):
+                return np.zeros((len(rows), len(columns)))
+            return self.matrix[rows[:, None], columns[None, :]].astype(np.float64)
+
+    def nearest(self, position_ids: Sequence[str], point_ids: Sequence[str], k: int,
+                max_km: float = math.inf) -> List[List[Tuple[str, float]]]:
+        """For each of position_ids, up to k (id, km) of point_ids within max_km, nearest first."""
+        k = min(k, len(point_ids))
+        if k <= 0:
+            return [[] for _ in position_ids]
+        distances = self.between(point_ids, position_ids).T
+        found = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        found_distances = np.take_along_axis(distances, found, axis=1)
+        order = np.argsort(found_distances, axis=1, kind='stable')
+        found = np.take_along_axis(found, order, axis=1)
+        found_distances = np.take_along_axis(found_distances, order, axis=1)
+        return [[(point_ids[j], float(d)) for j, d in zip(row, row_distances) if d <= max_km]
+                for row, row_distances in zip(found, found_distances)]
+
+def depot_points() -> Dict[str, Tuple[float, float]]:
+    """The configured depot, keyed by DEPOT_ID; empty when it is not set."""
+    depot = current_app.config.get('DEPOT_LATITUDE'), current_app.config.get('DEPOT_LONGITUDE')
+    return {} if None in depot else {DEPOT_ID: depot}
+
+def latest_deployments():
+    """Select of (bowser_id, location_id) for the most recent deployment of each bowser."""
+    latest = select(Deployment.bowser_id, func.max(Deployment.start_date).label('start_date')) \
+        .group_by(Deployment.bowser_id).subquery()
+    return select(Deployment.bowser_id, Deployment.location_id) \
+        .join(latest, (Deployment.bowser_id == latest.c.bowser_id) & (Deployment.start_date == latest.c.start_date))
+
+class LocationDistances:
+    """Distances from every Location row and the depot to where bowsers stand.
+
+    Bowsers stand at the location of their latest deployment, or at the
+    depot, so those locations and the depot are the matrix's positions.
+    The shared matrix is brought up to date whenever the location or
+    deployment data version or the depot changes, so callers always see
+    current locations without recomputing distances that did not change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix: Optional[DistanceMatrix] = None
+        self.key = None
+
+    def directory(self) -> str:
+        return current_app.config.get('DISTANCE_MATRIX_DIR') or os.path.join(current_app.instance_path, 'distances')
+
+    def max_bytes(self) -> int:
+        return int(current_app.config.get('DISTANCE_MATRIX_MAX_MB', 512) * 2 ** 20)
+
+    def _points(self) -> Tuple[Dict[str, Tuple[float, float]], Dict[str, Tuple[float, float]]]:
+        points = {row.id: (row.latitude, row.longitude) for row in db.session.execute(
+            select(Location.id, Location.latitude, Location.longitude))}
+        positioned = latest_deployments().subquery()
+        positions = {row.location_id: points[row.location_id] for row in db.session.execute(
+            select(positioned.c.location_id).distinct()) if row.location_id in points}
+        points.update(depot_points())
+        positions.update(depot_points())
+        return points, positions
+
+    def matrix(self) -> DistanceMatrix:
+        """The matrix, synced with the database first if locations, deployments or the depot changed."""
+        depot = depot_points()
+        key = (data_version('location', 'deployment'), tuple(depot.items()))
+        with self._lock:
+            if self._matrix is None or self._matrix.directory != self.directory():
+                self._matrix = DistanceMatrix(self.directory())
+                self.key = None
+            self._matrix.max_bytes = self.max_bytes()
+            if key != self.key:
+                self._matrix.update(*self._points())
+                self.key = key
+            return self._matrix
+
+    def has_position(self, position_id: str) -> bool:
+        return self.matrix().has_position(position_id)
+
+    def between(self, point_ids: Sequence[str], position_ids: Sequence[str]) -> np.ndarray:
+        return self.matrix().between(point_ids, position_ids)
+
+    def nearest(self, position_ids: Sequence[str], point_ids: Sequence[str], k: int,
+                max_km: float = math.inf) -> List[List[Tuple[str, float]]]:
+        return self.matrix().nearest(position_ids, point_ids, k, max_km)
+
+location_distances = LocationDistances()
@@ -0,0 +1,443 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from flask import current_app
+from sqlalchemy import and_, func, or_, select
+
+from database import db
+from models.sql_models import Bowser, Deployment, Invoice, Job, LedgerEntry, Location, Maintenance, Partner
+from utils.data_versions import data_version
+from utils.jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+# Format name to (file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'pdf': ('pdf', 'application/pdf'),
+}
+
+# Each report streams its columns in order of its date (then id), filtered by
+# an optional date range and statuses; the PDF summarises it by group
+EXPORT_REPORTS = {
+    'invoices': {
+        'title': 'Invoices',
+        'model': Invoice,
+        'tables': ('invoice',),
+        'admin': True,
+        'columns': (('Invoice number', Invoice.invoice_number), ('Client', Invoice.client_name),
+                    ('Issue date', Invoice.issue_date), ('Due date', Invoice.due_date),
+                    ('Amount', Invoice.amount), ('Status', Invoice.status)),
+        'joins': (),
+        'date': Invoice.issue_date,
+        'status': Invoice.status,
+        'group': Invoice.status,
+        'total': Invoice.amount,
+    },
+    'partners': {
+        'title': 'Partners',
+        'model': Partner,
+        'tables': ('partner',),
+        'admin': True,
+        'columns': (('Name', Partner.name), ('Contact', Partner.contact_person), ('Email', Partner.email),
+                    ('Phone', Partner.phone), ('Address', Partner.address), ('Type', Partner.type)),
+        'joins': (),
+        'date': None,
+        'status': None,
+        'group': Partner.type,
+        'total': None,
+    },
+    'mutual_aid': {
+        'title': 'Mutual aid transactions',
+        'model': LedgerEntry,
+        'tables': ('ledger_entry',),
+        'admin': True,
+        'columns': (('Date', LedgerEntry.entry_date), ('Scheme', LedgerEntry.scheme_id),
+                    ('Type', LedgerEntry.entry_type), ('Counterparty', LedgerEntry.counterparty),
+                    ('Reference', LedgerEntry.reference), ('Amount', LedgerEntry.amount / 100.0),
+                    ('Balance', LedgerEntry.running_balance / 100.0)),
+        'joins': (),
+        'date': LedgerEntry.entry_date,
+        'status': LedgerEntry.entry_type,
+        'group': LedgerEntry.entry_type,
+        'total': LedgerEntry.amount / 100.0,
+    },
+    'maintenance': {
+        'title': 'Maintenance',
+        'model': Maintenance,
+        'tables': ('maintenance', 'bowser'),
+        'admin': False,
+        'columns': (('Date', Maintenance.date), ('Bowser', Bowser.number), ('Type', Maintenance.maintenance_type),
+                    ('Status', Maintenance.status), ('Description', Maintenance.description)),
+        'joins': ((Bowser, Bowser.id == Maintenance.bowser_id),),
+        'date': Maintenance.date,
+        'status': Maintenance.status,
+        'group': Maintenance.status,
+        'total': None,
+    },
+    'deployments': {
+        'title': 'Deployments',
+        'model': Deployment,
+        'tables': ('deployment', 'bowser', 'location'),
+        'admin': False,
+        'columns': (('Start date', Deployment.start_date), ('End date', Deployment.end_date),
+                    ('Bowser', Bowser.number), ('Location', Location.name), ('Status', Deployment.status),
+                    ('Priority', Deployment.priority)),
+        'joins': ((Bowser, Bowser.id == Deployment.bowser_id), (Location, Location.id == Deployment.location_id)),
+        'date': Deployment.start_date,
+        'status': Deployment.status,
+        'group': Deployment.status,
+        'total': None,
+    },
+}
+
+PDF_LINES_PER_PAGE = 50
+# Characters XML 1.0, and so spreadsheet cells, cannot hold
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+class ExportError(Exception):
+    """Raised when an export cannot be built."""
+
+def export_dir() -> str:
+    return current_app.config.get('EXPORT_DIR') or os.path.join(current_app.instance_path, 'exports')
+
+def parse_export_params(report: str, args: Mapping) -> Dict:
+    """Normalised parameters of an export request; raises ValueError with the message for a 400.
+
+    Equal requests normalise to equal parameters, so they share a cached file.
+    """
+    spec = EXPORT_REPORTS[report]
+    params = {}
+    for name in ('start', 'end'):
+        if args.get(name):
+            if spec['date'] is None:
+                raise ValueError(f"'{report}' exports cannot be filtered by date")
+            try:
+                params[name] = date.fromisoformat(str(args[name])[:10]).isoformat()
+            except ValueError:
+                raise ValueError(f"'{name}' must be a date (2024-02-11)")
+    if 'start' in params and 'end' in params and params['start'] > params['end']:
+        raise ValueError("'start' must not be after 'end'")
+    statuses = args.get('status') or []
+    if isinstance(statuses, str):
+        statuses = [status for status in statuses.split(',') if status]
+    if statuses:
+        if spec['status'] is None:
+            raise ValueError(f"'{report}' exports cannot be filtered by status")
+        params['status'] = sorted(set(statuses))
+    return params
+
+def _criteria(spec: Dict, params: Dict) -> List:
+    criteria = []
+    if params.get('start'):
+        criteria.append(spec['date'] >= datetime.fromisoformat(params['start']))
+    if params.get('end'):
+        # The end date is inclusive
+        criteria.append(spec['date'] < datetime.fromisoformat(params['end']) + timedelta(days=1))
+    if params.get('status'):
+        criteria.append(spec['status'].in_(params['status']))
+    return criteria
+
+def _select(spec: Dict, *columns):
+    statement = select(*columns).select_from(spec['model'])
+    for target, onclause in spec['joins']:
+        statement = statement.outerjoin(target, onclause)
+    return statement
+
+def count_rows(report: str, params: Dict) -> int:
+    spec = EXPORT_REPORTS[report]
+    statement = select(func.count()).select_from(spec['model']).where(*_criteria(spec, params))
+    return db.session.execute(statement).scalar()
+
+def stream_rows(report: str, params: Dict, chunk_size: int) -> Iterator[List[Tuple]]:
+    """The report's rows in chunks of at most chunk_size, in date then id order.
+
+    Each chunk is one keyset query starting after the last row of the
+    previous one, so memory stays bounded by the chunk and later chunks
+    cost no more than the first, unlike OFFSET.
+    """
+    spec = EXPORT_REPORTS[report]
+    model, order = spec['model'], spec['date']
+    keys = ([order] if order is not None else []) + [model.id]
+    statement = _select(spec, *keys, *(column for _, column in spec['columns'])) \
+        .where(*_criteria(spec, params)).order_by(*keys).limit(chunk_size)
+    last = None
+    while True:
+        chunk = statement
+        if last is not None:
+            if order is None:
+                chunk = chunk.where(model.id > last[0])
+            else:
+                chunk = chunk.where(or_(order > last[0], and_(order == last[0], model.id > last[1])))
+        rows = db.session.execute(chunk).all()
+        if not rows:
+            return
+        last = rows[-1][:len(keys)]
+        yield [row[len(keys):] for row in rows]
+        if len(rows) < chunk_size:
+            return
+
+def summarize(report: str, params: Dict) -> Dict:
+    """Counts, and totals where the report has an amount, per group, aggregated in SQL."""
+    spec = EXPORT_REPORTS[report]
+    columns = [spec['group'], func.count()]
+    if spec['total'] is not None:
+        columns.append(func.coalesce(func.sum(spec['total']), 0))
+    if spec['date'] is not None:
+        columns += [func.min(spec['date']), func.max(spec['date'])]
+    statement = select(*columns).select_from(spec['model']).where(*_criteria(spec, params)) \
+        .group_by(spec['group']).order_by(spec['group'])
+    groups, first, last = [], None, None
+    for row in db.session.execute(statement):
+        group = {'name': row[0] or 'none', 'count': row[1]}
+        if spec['total'] is not None:
+            group['total'] = float(row[2])
+        if spec['date'] is not None:
+            first = min(filter(None, (first, row[-2])), default=None)
+            last = max(filter(None, (last, row[-1])), default=None)
+        groups.append(group)
+    return {
+        'groups': groups,
+        'count': sum(group['count'] for group in groups),
+        'total': sum(group['total'] for group in groups) if spec['total'] is not None else None,
+        'first': first,
+        'last': last,
+    }
+
+def _text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='minutes')
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+def write_csv(path: str, headers: Sequence[str], chunks: Iterator[List[Tuple]], on_chunk: Callable[[int], None]):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for rows in chunks:
+            writer.writerows([_text(value) for value in row] for row in rows)
+            on_chunk(len(rows))
+
+def _xlsx_row(number: int, values: Sequence) -> str:
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value!r}</v></c>')
+        elif value is not None:
+            text = escape(_XML_INVALID.sub('', _text(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+        else:
+            cells.append('<c/>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'),
+}
+
+def write_xlsx(path: str, title: str, headers: Sequence[str], chunks: Iterator[List[Tuple]],
+               on_chunk: Callable[[int], None]):
+    """A one-sheet workbook written straight into the zip as rows arrive.
+
+    Cells hold inline strings rather than a shared string table, which
+    would have to be kept in memory until the end.
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        workbook.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(title[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'))
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                         '<sheetData>' + _xlsx_row(1, headers)).encode('utf-8'))
+            number = 1
+            for rows in chunks:
+                lines = []
+                for row in rows:
+                    number += 1
+                    lines.append(_xlsx_row(number, row))
+                sheet.write(''.join(lines).encode('utf-8'))
+                on_chunk(len(rows))
+            sheet.write(b'</sheetData></worksheet>')
+
+def _pdf_string(text: str) -> bytes:
+    # The standard Helvetica font covers Latin-1 only
+    encoded = text.encode('latin-1', errors='replace')
+    return b'(' + encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+def write_pdf(path: str, lines: Sequence[str]):
+    """A plain text PDF in Helvetica, PDF_LINES_PER_PAGE lines to an A4 page."""
+    pages = [lines[start:start + PDF_LINES_PER_PAGE] for start in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[]]
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>',
+               b'<< /Type /Pages /Kids [' + b' '.join(b'%d 0 R' % (4 + 2 * index) for index in range(len(pages)))
+               + b'] /Count %d >>' % len(pages),
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    for index, page in enumerate(pages):
+        stream = b'BT /F1 10 Tf 14 TL 50 800 Td ' + b' '.join(_pdf_string(line) + b" '" for line in page) + b' ET'
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (5 + 2 * index))
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+
+    content = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(content)
+    content += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    content += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    content += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def summary_lines(report: str, params: Dict, summary: Dict) -> List[str]:
+    spec = EXPORT_REPORTS[report]
+    lines = [f"AquaAlert - {spec['title']} summary",
+             f"Generated {datetime.utcnow().isoformat(sep=' ', timespec='minutes')} UTC", '']
+    if params.get('start') or params.get('end'):
+        lines.append(f"Period: {params.get('start', 'start')} to {params.get('end', 'today')}")
+    if params.get('status'):
+        lines.append(f"Status: {', '.join(params['status'])}")
+    if summary['first'] is not None:
+        lines.append(f"Records dated {_text(summary['first'])[:10]} to {_text(summary['last'])[:10]}")
+    lines += [f"Records: {summary['count']}", '']
+    for group in summary['groups']:
+        line = f"{group['name']:<24} {group['count']:>10}"
+        if 'total' in group:
+            line += f"   {group['total']:>14,.2f}"
+        lines.append(line)
+    if summary['total'] is not None:
+        lines += ['', f"Total: {summary['total']:,.2f}"]
+    return lines
+
+def export_key(report: str, fmt: str, params: Dict) -> str:
+    """Name of the cached file for an export of the current data."""
+    versions = data_version(*EXPORT_REPORTS[report]['tables'])
+    raw = json.dumps([report, fmt, params, versions], sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def export_path(key: str, fmt: str) -> str:
+    return os.path.join(export_dir(), f'{key}.{EXPORT_FORMATS[fmt][0]}')
+
+def download_name(report: str, fmt: str, params: Dict) -> str:
+    period = '_'.join(params[name] for name in ('start', 'end') if params.get(name)) or date.today().isoformat()
+    return f'aquaalert_{report}_{period}.{EXPORT_FORMATS[fmt][0]}'
+
+def start_export(report: str, fmt: str, params: Dict) -> Tuple[Job, bool]:
+    """Queue an export, or reuse one of the same report, parameters and data version.
+
+    Returns the export's job and whether its file is already built.
+    """
+    key = export_key(report, fmt, params)
+    payload = {'report': report, 'format': fmt, 'params': params, 'key': key}
+    if os.path.isfile(export_path(key, fmt)):
+        cached = Job.query.filter(
+            Job.name == 'export',
+            Job.payload == json.dumps(payload, sort_keys=True, default=str),
+            Job.status == 'succeeded'
+        ).order_by(Job.created_at.desc()).first()
+        if cached:
+            return cached, True
+    # A request for an export already being built joins it
+    return job_queue.enqueue('export', payload, unique=True), False
+
+def _record_progress(job_id: str, rows: int, total: int):
+    # The job's result holds its progress until the job stores its outcome
+    progress = {'rows': rows, 'total': total, 'progress': round(rows / total, 3) if total else 1.0}
+    Job.query.filter(Job.id == job_id).update({'result': json.dumps(progress)}, synchronize_session=False)
+    db.session.commit()
+
+def prune_exports(max_age: Optional[int] = None) -> int:
+    """Delete export files not written for max_age seconds; returns how many."""
+    max_age = max_age if max_age is not None else current_app.config.get('EXPORT_MAX_AGE', 86400)
+    cutoff = time.time() - max_age
+    removed = 0
+    directory = export_dir()
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+@job_queue.task('export', max_attempts=1, bind=True)
+def build_export(job_id, report, format, params, key):
+    """Job: write an export file, recording progress after each chunk of rows."""
+    spec = EXPORT_REPORTS[report]
+    path = export_path(key, format)
+    result = {'key': key, 'filename': download_name(report, format, params)}
+    if os.path.isfile(path):
+        return dict(result, progress=1.0, size=os.path.getsize(path))
+
+    os.makedirs(export_dir(), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    rows = 0
+    try:
+        if format == 'pdf':
+            summary = summarize(report, params)
+            rows = summary['count']
+            write_pdf(temp_path, summary_lines(report, params, summary))
+        else:
+            total = count_rows(report, params)
+            _record_progress(job_id, 0, total)
+
+            def on_chunk(count):
+                nonlocal rows
+                rows += count
+                _record_progress(job_id, rows, total)
+
+            chunks = stream_rows(report, params, current_app.config.get('EXPORT_CHUNK_SIZE', 2000))
+            headers = [header for header, _ in spec['columns']]
+            if format == 'csv':
+                write_csv(temp_path, headers, chunks, on_chunk)
+            else:
+                write_xlsx(temp_path, spec['title'], headers, chunks, on_chunk)
+        os.replace(temp_path, path)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise ExportError(f"Error building {report} export: {str(e)}") from e
+    prune_exports()
+    logger.info(f"Built {format} export of {report} ({rows} rows)")
+    return dict(result, progress=1.0, rows=rows, size=os.path.getsize(path))
@@ -0,0 +1,171 @@
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db
+from models.sql_models import Alert, Bowser, BowserLevelRollup
+from utils.jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+FORECAST_ALERT_TYPES = ('low_level', 'depletion')
+EXCLUDED_STATUSES = ('maintenance', 'outOfService', 'retired')
+MIN_POINTS = 3
+
+def estimate_consumption(now: Optional[datetime] = None) -> List[Dict]:
+    """Estimate consumption rate and time-to-empty for every bowser at once.
+
+    Reads the 1-minute level rollups for the forecast window in a single
+    query and fits a least-squares line per bowser using grouped sums, so
+    the cost is one pass over the readings regardless of fleet size.
+    """
+    now = now or datetime.utcnow()
+    window = timedelta(hours=current_app.config.get('FORECAST_WINDOW_HOURS', 6))
+
+    bowsers = db.session.query(
+        Bowser.id, Bowser.number, Bowser.capacity, Bowser.current_level, Bowser.status
+    ).filter(~Bowser.status.in_(EXCLUDED_STATUSES)).all()
+    if not bowsers:
+        return []
+
+    rows = db.session.query(
+        BowserLevelRollup.bowser_id,
+        BowserLevelRollup.bucket_start,
+        BowserLevelRollup.sum_level,
+        BowserLevelRollup.count
+    ).filter(
+        BowserLevelRollup.resolution == '1m',
+        BowserLevelRollup.bucket_start >= now - window
+    ).all()
+
+    index = {bowser.id: i for i, bowser in enumerate(bowsers)}
+    size = len(bowsers)
+    rates = np.full(size, np.nan)
+
+    rows = [row for row in rows if row.bowser_id in index]
+    if rows:
+        group = np.fromiter((index[row.bowser_id] for row in rows), dtype=np.int64, count=len(rows))
+        # Hours relative to now keeps the sums well conditioned
+        x = np.fromiter(((row.bucket_start - now).total_seconds() / 3600.0 for row in rows),
+                        dtype=np.float64, count=len(rows))
+        y = np.fromiter((row.sum_level / row.count for row in rows), dtype=np.float64, count=len(rows))
+
+        n = np.bincount(group, minlength=size).astype(np.float64)
+        sx = np.bincount(group, weights=x, minlength=size)
+        sy = np.bincount(group, weights=y, minlength=size)
+        sxx = np.bincount(group, weights=x * x, minlength=size)
+        sxy = np.bincount(group, weights=x * y, minlength=size)
+
+        denom = n * sxx - sx * sx
+        valid = (n >= MIN_POINTS) & (denom > 1e-12)
+        slope = np.divide(n * sxy - sx * sy, denom, out=np.full(size, np.nan), where=valid)
+        # A falling level is consumption; a flat or rising level never empties.
+        # Round-off on flat series leaves tiny slopes, so those count as flat too.
+        consumption = -slope
+        consumption[~valid | (consumption < 1e-6)] = 0.0
+        rates = np.where(valid, consumption, np.nan)
+
+    levels = np.array([bowser.current_level or 0.0 for bowser in bowsers], dtype=np.float64)
+    capacities = np.array([bowser.capacity or 0.0 for bowser in bowsers], dtype=np.float64)
+    consuming = np.nan_to_num(rates) > 0
+    hours_to_empty = np.divide(levels, rates, out=np.full(size, np.inf), where=consuming)
+    percent = np.divide(levels * 100.0, capacities, out=np.zeros(size), where=capacities > 0)
+
+    return [
+        {
+            'bowser_id': bowser.id,
+            'number': bowser.number,
+            'current_level': float(levels[i]),
+            'percent': float(percent[i]),
+            'rate_per_hour': None if np.isnan(rates[i]) else float(rates[i]),
+            'hours_to_empty': None if np.isinf(hours_to_empty[i]) else float(hours_to_empty[i]),
+        }
+        for i, bowser in enumerate(bowsers)
+    ]
+
+def _evaluate(forecast: Dict, low_percent: float, horizon_hours: float) -> Dict[str, Dict]:
+    """Return the alerts that should be open for one bowser forecast."""
+    triggered = {}
+    if forecast['percent'] < low_percent:
+        triggered['low_level'] = {
+            'title': f"Low water level: {forecast['number']}",
+            'message': f"Bowser {forecast['number']} is at {forecast['percent']:.0f}% capacity "
+                       f"({forecast['current_level']:.0f}L).",
+            'priority': 'high' if forecast['percent'] < low_percent / 2 else 'medium',
+        }
+    hours = forecast['hours_to_empty']
+    if hours is not None and hours < horizon_hours:
+        triggered['depletion'] = {
+            'title': f"Bowser running dry: {forecast['number']}",
+            'message': f"Bowser {forecast['number']} is expected to be empty in {hours * 60:.0f} minutes "
+                       f"at {forecast['rate_per_hour']:.0f}L/hour.",
+            'priority': 'high' if hours < 2 else 'medium',
+        }
+    return triggered
+
+def update_alerts(forecasts: List[Dict], now: Optional[datetime] = None) -> Dict[str, int]:
+    """Create, refresh and resolve forecast alerts in one transaction.
+
+    At most one active alert exists per (bowser, alert type); a repeated
+    forecast updates it in place instead of raising a duplicate.
+    """
+    now = now or datetime.utcnow()
+    low_percent = current_app.config.get('FORECAST_LOW_LEVEL_PERCENT', 20)
+    horizon_hours = current_app.config.get('FORECAST_DEPLETION_HOURS', 12)
+
+    open_alerts = {
+        (alert.bowser_id, alert.alert_type): alert
+        for alert in Alert.query.filter(
+            Alert.status == 'active',
+            Alert.alert_type.in_(FORECAST_ALERT_TYPES)
+        ).all()
+    }
+
+    counts = {'created': 0, 'updated': 0, 'resolved': 0}
+    try:
+        for forecast in forecasts:
+            triggered = _evaluate(forecast, low_percent, horizon_hours)
+            for alert_type in FORECAST_ALERT_TYPES:
+                existing = open_alerts.pop((forecast['bowser_id'], alert_type), None)
+                fields = triggered.get(alert_type)
+                if fields and existing:
+                    existing.update(**fields)
+                    counts['updated'] += 1
+                elif fields:
+                    db.session.add(Alert(
+                        id=str(uuid.uuid4()),
+                        bowser_id=forecast['bowser_id'],
+                        alert_type=alert_type,
+                        status='active',
+                        created_at=now,
+                        **fields
+                    ))
+                    counts['created'] += 1
+                elif existing:
+                    existing.update(status='resolved', resolved_at=now)
+                    counts['resolved'] += 1
+
+        # Bowsers no longer forecast (removed or sent to maintenance) can't stay in alert
+        for alert in open_alerts.values():
+            alert.update(status='resolved', resolved_at=now)
+            counts['resolved'] += 1
+
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Error updating forecast alerts: {str(e)}")
+        raise
+    return counts
+
+@job_queue.task('supply_forecast', max_attempts=1)
+def run_supply_forecast(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Scheduled job: forecast the whole fleet and sync the resulting alerts."""
+    forecasts = estimate_consumption(now)
+    counts = update_alerts(forecasts, now)
+    logger.info(f"Supply forecast for {len(forecasts)} bowsers: {counts}")
+    return counts
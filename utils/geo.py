@@ -0,0 +1,105 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments may be scalars or NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def distance_matrix(latitudes: Sequence[float], longitudes: Sequence[float]) -> np.ndarray:
+    """Pairwise great-circle distances (km) between points, as an n x n array."""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    return haversine_km(latitudes[:, None], longitudes[:, None], latitudes[None, :], longitudes[None, :])
+
+class GridIndex:
+    """Uniform lat/lon grid over a set of points for nearest-neighbour queries.
+
+    Cells are cell_km on a side (longitude scaled at the points' mean
+    latitude), so a query only measures points in the rings of cells
+    around it rather than every point.
+    """
+
+    def __init__(self, latitudes: Sequence[float], longitudes: Sequence[float], cell_km: float = 2.0):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.cell_lat = cell_km / 111.32
+        mean_lat = float(self.latitudes.mean()) if len(self.latitudes) else 0.0
+        self.cell_lon = self.cell_lat / max(math.cos(math.radians(mean_lat)), 0.01)
+        self.cell_km = cell_km
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i, (lat, lon) in enumerate(zip(self.latitudes, self.longitudes)):
+            self.cells[self._cell(lat, lon)].append(i)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_lat)), int(math.floor(lon / self.cell_lon))
+
+    def _ring(self, row: int, column: int, radius: int):
+        if radius == 0:
+            yield row, column
+            return
+        for d in range(-radius, radius + 1):
+            yield row - radius, column + d
+            yield row + radius, column + d
+        for d in range(-radius + 1, radius):
+            yield row + d, column - radius
+            yield row + d, column + radius
+
+    def nearest(self, lat: float, lon: float, k: int, max_km: float = math.inf) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and distances (km) of up to k points within max_km, nearest first."""
+        return self.nearest_many([lat], [lon], k, max_km)[0]
+
+    def nearest_many(self, latitudes: Sequence[float], longitudes: Sequence[float], k: int,
+                     max_km: float = math.inf) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """nearest() for many query points.
+
+        Queries are grouped by grid cell and each group is measured against
+        its candidate points in one vectorised step.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        groups: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for q, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+            groups[self._cell(lat, lon)].append(q)
+
+        results: List[Tuple[np.ndarray, np.ndarray]] = [None] * len(latitudes)
+        empty = (np.empty(0, dtype=np.int64), np.empty(0))
+        for (row, column), queries in groups.items():
+            found: List[int] = []
+            radius = 0
+            while True:
+                for cell in self._ring(row, column, radius):
+                    found.extend(self.cells.get(cell, ()))
+                # Points outside the rings searched so far are at least this far
+                # from any query in the centre cell
+                covered_km = radius * self.cell_km
+                if len(found) == len(self.latitudes) or covered_km >= max_km:
+                    break
+                if len(found) >= k:
+                    distances = self._distances(latitudes[queries], longitudes[queries], found)
+                    if np.partition(distances, k - 1, axis=1)[:, k - 1].max() <= covered_km:
+                        break
+                radius += 1
+            if not found:
+                for q in queries:
+                    results[q] = empty
+                continue
+            indices = np.asarray(found, dtype=np.int64)
+            distances = self._distances(latitudes[queries], longitudes[queries], found)
+            order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+            nearest = np.take_along_axis(distances, order, axis=1)
+            within = nearest <= max_km
+            for q, row_order, row_distances, row_within in zip(queries, order, nearest, within):
+                results[q] = (indices[row_order[row_within]], row_distances[row_within])
+        return results
+
+    def _distances(self, latitudes: np.ndarray, longitudes: np.ndarray, found: List[int]) -> np.ndarray:
+        indices = np.asarray(found, dtype=np.int64)
+        return haversine_km(latitudes[:, None], longitudes[:, None],
+                            self.latitudes[indices][None, :], self.longitudes[indices][None, :])
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from database import db
+from models.sql_models import Job
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """Persistent job queue backed by the job table, with a local worker pool.
+
+    Jobs are rows in the database, so they survive restarts and can be
+    claimed by any process running a pool. A claim is a conditional UPDATE
+    on the row status, which makes it safe for several processes to poll
+    the same table.
+
+    Tasks registered with pool='thread' run in an app context and may use
+    the database. Tasks registered with pool='process' run in a separate
+    process for CPU-heavy work; they only receive their JSON payload and
+    must be importable module-level functions. Tasks registered with
+    bind=True also receive their own job id as job_id.
+    """
+
+    def __init__(self):
+        self.tasks: Dict[str, dict] = {}
+        self.app = None
+        self._threads = None
+        self._processes = None
+        self._running = 0
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def task(self, name: str, pool: str = 'thread', max_attempts: int = 3, bind: bool = False):
+        """Decorator registering a function as a named job."""
+        def decorator(func: Callable):
+            self.register(name, func, pool=pool, max_attempts=max_attempts, bind=bind)
+            return func
+        return decorator
+
+    def register(self, name: str, func: Callable, pool: str = 'thread', max_attempts: int = 3,
+                 bind: bool = False):
+        if pool not in ('thread', 'process'):
+            raise ValueError(f"Unknown pool '{pool}'")
+        self.tasks[name] = {'func': func, 'pool': pool, 'max_attempts': max_attempts, 'bind': bind}
+
+    def enqueue(self, name: str, payload: Optional[dict] = None, unique: bool = False,
+                delay: float = 0) -> Job:
+        """Queue a job by task name and commit it.
+
+        With unique=True an already queued or running job with the same name
+        and payload is returned instead of queueing a duplicate. The job's
+        unique_key is held under a unique index until it finishes, so two
+        processes queueing the same job at once still only insert one row.
+        """
+        if name not in self.tasks:
+            raise ValueError(f"Unknown job '{name}'")
+        payload_json = json.dumps(payload or {}, sort_keys=True, default=str)
+        unique_key = hashlib.sha256(f'{name}\n{payload_json}'.encode('utf-8')).hexdigest() if unique else None
+
+        if unique:
+            existing = Job.query.filter(Job.unique_key == unique_key).first()
+            if existing:
+                return existing
+
+        job = Job(
+            id=str(uuid.uuid4()),
+            name=name,
+            payload=payload_json,
+            status='queued',
+            attempts=0,
+            max_attempts=self.tasks[name]['max_attempts'],
+            run_after=datetime.utcnow() + timedelta(seconds=delay),
+            unique_key=unique_key
+        )
+        try:
+            db.session.add(job)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            existing = Job.query.filter(Job.unique_key == unique_key).first() if unique else None
+            if existing:
+                return existing
+            raise
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Error queueing job '{name}': {str(e)}")
+            raise
+        return job
+
+    def start(self, app):
+        """Start the dispatcher thread and worker pools for this process."""
+        if self._thread is not None:
+            return
+        self.app = app
+        self._threads = ThreadPoolExecutor(
+            max_workers=app.config.get('JOB_THREAD_WORKERS', 4), thread_name_prefix='job-worker'
+        )
+        self._processes = ProcessPoolExecutor(max_workers=app.config.get('JOB_PROCESS_WORKERS', 2))
+        self._stop.clear()
+        with app.app_context():
+            try:
+                self.requeue_stale()
+            except SQLAlchemyError as e:
+                # e.g. the job table is not migrated yet; the dispatcher logs until it is
+                db.session.rollback()
+                logger.error(f"Error requeueing stale jobs: {str(e)}")
+        self._thread = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Job queue started on {self.worker_name}")
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        for pool in (self._threads, self._processes):
+            if pool is not None:
+                pool.shutdown(wait=wait)
+        self._threads = self._processes = None
+
+    def requeue_stale(self) -> int:
+        """Return jobs stuck in 'running' past the timeout to the queue.
+
+        A job whose worker died is retried like a failed one: it is queued
+        again while it has attempts left and marked failed otherwise. Runs at
+        start() and periodically from the scheduler.
+        """
+        timeout = current_app.config.get('JOB_TIMEOUT', 3600)
+        now = datetime.utcnow()
+        stale = [Job.status == 'running', Job.started_at < now - timedelta(seconds=timeout)]
+        failed = Job.query.filter(*stale, Job.attempts >= Job.max_attempts).update({
+            'status': 'failed',
+            'error': f'Timed out after {timeout} seconds',
+            'finished_at': now,
+            'unique_key': None
+        }, synchronize_session=False)
+        count = Job.query.filter(*stale).update({'status': 'queued', 'worker': None}, synchronize_session=False)
+        db.session.commit()
+        if failed:
+            logger.error(f"Failed {failed} stale jobs with no attempts left")
+        if count:
+            logger.warning(f"Requeued {count} stale jobs")
+        return count
+
+    def _capacity(self) -> int:
+        limit = self.app.config.get('JOB_THREAD_WORKERS', 4) + self.app.config.get('JOB_PROCESS_WORKERS', 2)
+        with self._running_lock:
+            return limit - self._running
+
+    def _claim(self, limit: int):
+        """Claim up to limit due jobs for this worker."""
+        now = datetime.utcnow()
+        candidates = db.session.query(Job.id).filter(
+            Job.status == 'queued',
+            Job.run_after <= now,
+            Job.name.in_(list(self.tasks))
+        ).order_by(Job.run_after).limit(limit).all()
+
+        claimed = []
+        for (job_id,) in candidates:
+            updated = Job.query.filter(Job.id == job_id, Job.status == 'queued').update({
+                'status': 'running',
+                'worker': self.worker_name,
+                'started_at': now,
+                'attempts': Job.attempts + 1
+            }, synchronize_session=False)
+            db.session.commit()
+            if updated:
+                claimed.append(job_id)
+        return claimed
+
+    def _dispatch_loop(self):
+        poll = self.app.config.get('JOB_POLL_INTERVAL', 1.0)
+        while not self._stop.is_set():
+            try:
+                free = self._capacity()
+                if free > 0:
+                    with self.app.app_context():
+                        for job_id in self._claim(free):
+                            self._submit(job_id)
+            except Exception as e:
+                logger.error(f"Job dispatcher error: {str(e)}")
+            self._stop.wait(poll)
+
+    def _submit(self, job_id: str):
+        job = Job.query.get(job_id)
+        task = self.tasks[job.name]
+        payload = json.loads(job.payload or '{}')
+        if task['bind']:
+            payload['job_id'] = job.id
+        with self._running_lock:
+            self._running += 1
+        if task['pool'] == 'process':
+            future = self._processes.submit(task['func'], **payload)
+        else:
+            future = self._threads.submit(self._run_in_context, task['func'], payload)
+        future.add_done_callback(lambda f, job_id=job_id: self._finish(job_id, f))
+
+    def _run_in_context(self, func, payload):
+        with self.app.app_context():
+            return func(**payload)
+
+    def _finish(self, job_id, future):
+        with self._running_lock:
+            self._running -= 1
+        with self.app.app_context():
+            job = Job.query.get(job_id)
+            if job is None:
+                return
+            error = future.exception()
+            now = datetime.utcnow()
+            if error is None:
+                job.status = 'succeeded'
+                job.result = json.dumps(future.result(), default=str)
+                job.error = None
+                job.finished_at = now
+                job.unique_key = None
+            elif job.attempts < job.max_attempts:
+                backoff = self.app.config.get('JOB_RETRY_BACKOFF', 30)
+                job.status = 'queued'
+                job.error = str(error)
+                job.worker = None
+                job.run_after = now + timedelta(seconds=backoff * 2 ** (job.attempts - 1))
+                logger.warning(f"Job {job.name} ({job.id}) failed, retrying: {str(error)}")
+            else:
+                job.status = 'failed'
+                job.error = str(error)
+                job.finished_at = now
+                job.unique_key = None
+                logger.error(f"Job {job.name} ({job.id}) failed: {str(error)}")
+            try:
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                logger.error(f"Error saving job result: {str(e)}")
+
+job_queue = JobQueue()
@@ -0,0 +1,252 @@
+import logging
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Dict, Optional, Sequence, Union
+
+from flask import current_app
+from sqlalchemy import case, event, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import db
+from models.sql_models import LedgerBalance, LedgerEntry
+from utils.jobs import job_queue
+from utils.serialization import ledger_schema
+from utils.windows import read_window
+
+logger = logging.getLogger(__name__)
+
+LEDGER_TABLES = ('ledger_entry',)
+OPENING_NOTE = 'Opening balance'
+# Contributions and payouts are recorded as positive amounts and signed by type;
+# adjustments (including opening balances) keep the sign they are given
+ENTRY_SIGNS = {'contribution': 1, 'payout': -1, 'adjustment': None}
+LEDGER_SORT_KEYS = {
+    'date': LedgerEntry.entry_date,
+    'amount': LedgerEntry.amount,
+}
+
+_balances = LedgerBalance.__table__
+
+@event.listens_for(LedgerEntry, 'before_update')
+@event.listens_for(LedgerEntry, 'before_delete')
+def _refuse_changes(mapper, connection, target):
+    raise ValueError('Ledger entries cannot be changed or deleted; append an adjustment instead')
+
+def to_pence(amount: Union[str, int, float, Decimal]) -> int:
+    """An amount in pounds as whole pence, rounding half pennies up; raises ValueError."""
+    try:
+        pounds = Decimal(str(amount))
+    except InvalidOperation:
+        raise ValueError("'amount' must be a number")
+    if not pounds.is_finite():
+        raise ValueError("'amount' must be a number")
+    return int((pounds * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def _end_of(as_of: Union[date, datetime]) -> datetime:
+    """The first moment after as_of; a date includes the whole day."""
+    if isinstance(as_of, datetime):
+        return as_of + timedelta(microseconds=1)
+    return datetime.combine(as_of + timedelta(days=1), datetime.min.time())
+
+def _add_to_balance(scheme_id: str, pence: int, entry_date: datetime):
+    """Add an entry to its scheme's balance row, creating the row for the scheme's first entry."""
+    connection = db.session.connection()
+    last_entry_date = case((_balances.c.last_entry_date > entry_date, _balances.c.last_entry_date), else_=entry_date)
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if connection.dialect.name == 'sqlite' else postgresql.insert
+        connection.execute(
+            dialect_insert(_balances).values(scheme_id=scheme_id, balance=pence, entry_count=1,
+                                             last_entry_date=entry_date).on_conflict_do_update(
+                index_elements=[_balances.c.scheme_id],
+                set_={'balance': _balances.c.balance + pence, 'entry_count': _balances.c.entry_count + 1,
+                      'last_entry_date': last_entry_date}
+            )
+        )
+    else:
+        result = connection.execute(
+            update(_balances).where(_balances.c.scheme_id == scheme_id).values(
+                balance=_balances.c.balance + pence, entry_count=_balances.c.entry_count + 1,
+                last_entry_date=last_entry_date)
+        )
+        if result.rowcount == 0:
+            connection.execute(_balances.insert().values(scheme_id=scheme_id, balance=pence, entry_count=1,
+                                                         last_entry_date=entry_date))
+
+def append_entry(scheme_id: str, amount, entry_date: Union[date, datetime], entry_type: str = 'contribution',
+                 counterparty: Optional[str] = None, reference: Optional[str] = None,
+                 notes: Optional[str] = None) -> LedgerEntry:
+    """Append an entry to a scheme's ledger and commit it with the balances it changes.
+
+    The entry's running balance is the one before it plus its amount, read
+    with one index seek. Entries are normally appended in date order; a
+    backdated entry also adds its amount to the running balances of the
+    scheme's later entries. Raises ValueError for invalid input.
+    """
+    if entry_type not in ENTRY_SIGNS:
+        raise ValueError(f"'type' must be one of: {', '.join(ENTRY_SIGNS)}")
+    pence = to_pence(amount)
+    if ENTRY_SIGNS[entry_type] is not None:
+        if pence <= 0:
+            raise ValueError(f"A {entry_type} must have a positive 'amount'")
+        pence *= ENTRY_SIGNS[entry_type]
+    elif pence == 0:
+        raise ValueError("An adjustment must have a non-zero 'amount'")
+    if not isinstance(entry_date, datetime):
+        entry_date = datetime.combine(entry_date, datetime.min.time())
+
+    try:
+        # The balance row is written first, so appends to one scheme queue behind its lock
+        _add_to_balance(scheme_id, pence, entry_date)
+        previous = db.session.execute(
+            select(LedgerEntry.running_balance)
+            .where(LedgerEntry.scheme_id == scheme_id, LedgerEntry.entry_date <= entry_date)
+            .order_by(LedgerEntry.entry_date.desc(), LedgerEntry.id.desc()).limit(1)
+        ).scalar()
+        entry = LedgerEntry(scheme_id=scheme_id, entry_type=entry_type, amount=pence,
+                            running_balance=(previous or 0) + pence, entry_date=entry_date,
+                            counterparty=counterparty, reference=reference, notes=notes)
+        db.session.add(entry)
+        db.session.flush()
+        shifted = db.session.execute(
+            update(LedgerEntry)
+            .where(LedgerEntry.scheme_id == scheme_id, LedgerEntry.entry_date > entry_date)
+            .values(running_balance=LedgerEntry.running_balance + pence)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if shifted:
+        logger.info(f"Backdated ledger entry for scheme {scheme_id} moved {shifted} later balances")
+    return entry
+
+def record_contribution(contribution) -> LedgerEntry:
+    """Persist a MutualAidContribution as a ledger entry."""
+    return append_entry(contribution.scheme_id, contribution.amount,
+                        contribution.contribution_date or datetime.utcnow(), 'contribution',
+                        counterparty=contribution.contributor_name, reference=contribution.receipt_number,
+                        notes=contribution.notes)
+
+def balance_as_of(scheme_id: str, as_of: Union[date, datetime]) -> float:
+    """A scheme's balance at the end of a date (or at a moment), in pounds.
+
+    The running balance of the scheme's last entry by then, found with one
+    seek on ix_ledger_entry_scheme_date, however long the ledger is.
+    """
+    pence = db.session.execute(
+        select(LedgerEntry.running_balance)
+        .where(LedgerEntry.scheme_id == scheme_id, LedgerEntry.entry_date < _end_of(as_of))
+        .order_by(LedgerEntry.entry_date.desc(), LedgerEntry.id.desc()).limit(1)
+    ).scalar()
+    return (pence or 0) / 100
+
+def scheme_balances(as_of: Optional[Union[date, datetime]] = None) -> Dict[str, Dict]:
+    """Balance, in pounds, and number of entries of every scheme with a ledger.
+
+    Current balances are read from ledger_balance; balances as of a date
+    take one index seek per scheme.
+    """
+    balances = {}
+    for scheme_id, balance, entries, last_entry_date in db.session.execute(
+        select(_balances.c.scheme_id, _balances.c.balance, _balances.c.entry_count, _balances.c.last_entry_date)
+    ):
+        balances[scheme_id] = {
+            'balance': balance / 100 if as_of is None else balance_as_of(scheme_id, as_of),
+            'entries': entries,
+            'last_entry_date': last_entry_date,
+        }
+    return balances
+
+def ledger_window(scheme_id: Optional[str] = None, entry_types: Sequence[str] = (), offset: int = 0,
+                  limit: int = 50, sort: str = '-date') -> Dict:
+    """One window of ledger entries, optionally of one scheme and some entry types, amounts in pounds."""
+    statement = ledger_schema.query()
+    if scheme_id:
+        statement = statement.filter(LedgerEntry.scheme_id == scheme_id)
+    if entry_types:
+        statement = statement.filter(LedgerEntry.entry_type.in_(list(entry_types)))
+
+    def serialize(rows):
+        items = ledger_schema.serialize(rows)
+        for item in items:
+            item['amount'] /= 100
+            item['running_balance'] /= 100
+        return items
+
+    return read_window(statement, LedgerEntry, LEDGER_SORT_KEYS, sort, offset, limit, LEDGER_TABLES, serialize)
+
+def rebuild_balances(scheme_id: Optional[str] = None) -> int:
+    """Recompute running balances and ledger_balance from the entries themselves.
+
+    Only needed to repair a ledger written outside append_entry; walks each
+    scheme's entries once in order. Returns the number of entries corrected.
+    """
+    schemes = [scheme_id] if scheme_id else [row[0] for row in db.session.execute(
+        select(LedgerEntry.scheme_id).distinct())]
+    corrected = 0
+    for scheme in schemes:
+        total, count, last_date, fixes = 0, 0, None, []
+        for entry_id, amount, running_balance, entry_date in db.session.execute(
+            select(LedgerEntry.id, LedgerEntry.amount, LedgerEntry.running_balance, LedgerEntry.entry_date)
+            .where(LedgerEntry.scheme_id == scheme).order_by(LedgerEntry.entry_date, LedgerEntry.id)
+        ):
+            total, count, last_date = total + amount, count + 1, entry_date
+            if running_balance != total:
+                fixes.append({'entry_id': entry_id, 'running_balance': total})
+        table = LedgerEntry.__table__
+        for fix in fixes:
+            db.session.execute(update(table).where(table.c.id == fix['entry_id'])
+                               .values(running_balance=fix['running_balance']))
+        db.session.execute(_balances.delete().where(_balances.c.scheme_id == scheme))
+        if count:
+            db.session.execute(_balances.insert().values(scheme_id=scheme, balance=total, entry_count=count,
+                                                         last_entry_date=last_date))
+        corrected += len(fixes)
+    db.session.commit()
+    if corrected:
+        logger.warning(f"Corrected {corrected} ledger running balances")
+    return corrected
+
+def _opening_date(scheme: Dict, first_entry: Optional[datetime]) -> datetime:
+    """When a scheme's opening balance is entered: its start, or its first entry if that is earlier."""
+    try:
+        start = datetime.fromisoformat(str(scheme.get('start_date'))[:19])
+    except ValueError:
+        start = None
+    dates = [value for value in (start, first_entry) if value is not None]
+    return min(dates) if dates else datetime.utcnow()
+
+def open_ledgers(schemes: Sequence[Dict]) -> int:
+    """Enter each scheme's recorded balance as its ledger's opening adjustment, once.
+
+    Balances were kept on the JSON schemes before the ledger, so a scheme
+    whose ledger has no opening entry gets one for its JSON balance, dated
+    before its other entries so their running balances include it.
+    Returns the number of ledgers opened.
+    """
+    opened = {row[0] for row in db.session.execute(
+        select(LedgerEntry.scheme_id).where(LedgerEntry.entry_type == 'adjustment',
+                                            LedgerEntry.notes == OPENING_NOTE).distinct())}
+    first_entries = dict(db.session.execute(
+        select(LedgerEntry.scheme_id, func.min(LedgerEntry.entry_date)).group_by(LedgerEntry.scheme_id)).all())
+    count = 0
+    for scheme in schemes:
+        if scheme['id'] in opened or not to_pence(scheme.get('balance') or 0):
+            continue
+        append_entry(scheme['id'], scheme['balance'], _opening_date(scheme, first_entries.get(scheme['id'])),
+                     'adjustment', notes=OPENING_NOTE)
+        count += 1
+    if count:
+        logger.info(f"Opened {count} scheme ledgers with their recorded balances")
+    return count
+
+@job_queue.task('ledger_rebuild', max_attempts=1)
+def rebuild_ledger(scheme_id=None):
+    """Job: open ledgers of schemes with a recorded balance, then recompute running balances."""
+    # The app registers its JSON store; without one there are no recorded balances to open
+    handler = current_app.extensions.get('json_handler')
+    schemes = handler.get_all('mutual_aid_schemes') if handler else []
+    if scheme_id:
+        schemes = [scheme for scheme in schemes if scheme['id'] == scheme_id]
+    return {'opened': open_ledgers(schemes), 'corrected': rebuild_balances(scheme_id)}
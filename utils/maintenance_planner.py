@@ -0,0 +1,225 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db
+from models.sql_models import Bowser, Deployment, Maintenance, MaintenancePlan
+from utils.data_versions import data_version
+from utils.jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+PLAN_TABLES = ('bowser', 'maintenance', 'deployment')
+OPEN_STATUSES = ('scheduled', 'in_progress')
+BLOCKING_DEPLOYMENTS = ('active', 'scheduled')
+UNPLANNED_BOWSER_STATUSES = ('retired',)
+
+_state = {'key': None}
+
+def _day(value: Optional[datetime]):
+    return np.datetime64(value.date() if isinstance(value, datetime) else value, 'D') if value else np.datetime64('NaT')
+
+def due_occurrences(today: date, last_done: np.ndarray, intervals: np.ndarray,
+                    horizon_days: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Every maintenance occurrence due up to horizon_days from today, for the whole fleet at once.
+
+    last_done is a bowsers x types datetime64[D] array (NaT for never) and
+    intervals the days between each type. Work already overdue becomes a
+    single catch-up occurrence today, with later ones counted from there.
+    Returns the bowser index, type index, date and overdue flag of each
+    occurrence.
+    """
+    today = np.datetime64(today, 'D')
+    end = today + np.timedelta64(horizon_days, 'D')
+    intervals = intervals.astype('timedelta64[D]')
+    due = np.where(np.isnat(last_done), today, last_done + intervals[None, :])
+    start = np.maximum(due, today)
+    repeats = int(horizon_days // max(int(intervals.min().astype(int)), 1)) + 1 if len(intervals) else 0
+    dates = start[:, :, None] + np.arange(repeats)[None, None, :] * intervals[None, :, None]
+    bowser, kind, k = np.nonzero(dates <= end)
+    overdue = (k == 0) & (due[bowser, kind] < today)
+    return bowser, kind, dates[bowser, kind, k], overdue
+
+def _free_day(day: date, windows: List[Tuple[date, date]], today: date, end: date) -> Tuple[Optional[date], bool]:
+    """The day to use instead of day if a deployment window covers it, and whether it moved.
+
+    Prefers the day before the window, so the work is done early rather
+    than late, then the first day after it; None if every option up to
+    end is deployed.
+    """
+    def blocking(candidate):
+        return next(((start, stop) for start, stop in windows if start <= candidate <= stop), None)
+
+    window = blocking(day)
+    if window is None:
+        return day, False
+    before = window[0] - timedelta(days=1)
+    if before >= today and blocking(before) is None:
+        return before, True
+    candidate = window[1] + timedelta(days=1)
+    while candidate <= end:
+        window = blocking(candidate)
+        if window is None:
+            return candidate, True
+        candidate = window[1] + timedelta(days=1)
+    return None, True
+
+def plan_maintenance(today: Optional[date] = None) -> List[Dict]:
+    """MaintenancePlan rows for the fleet: open records as they are, plus the planned visits.
+
+    Due dates come from each bowser's last completed maintenance of every
+    type in MAINTENANCE_INTERVALS, falling back to Bowser.last_maintenance,
+    in one vectorised pass. Occurrences for one bowser falling within
+    MAINTENANCE_BATCH_DAYS of the first are batched into a single visit
+    on the earliest due date, and a visit that lands in an active or
+    scheduled deployment is moved out of it.
+    """
+    config = current_app.config
+    today = today or datetime.utcnow().date()
+    intervals_config = config.get('MAINTENANCE_INTERVALS', {})
+    horizon_days = config.get('MAINTENANCE_PLAN_WEEKS', 12) * 7
+    batch_days = config.get('MAINTENANCE_BATCH_DAYS', 14)
+    end = today + timedelta(days=horizon_days)
+
+    bowsers = db.session.execute(
+        select(Bowser.id, Bowser.number, Bowser.last_maintenance)
+        .where(~Bowser.status.in_(UNPLANNED_BOWSER_STATUSES))
+    ).all()
+    index = {bowser.id: i for i, bowser in enumerate(bowsers)}
+    types = list(intervals_config)
+    type_index = {name: j for j, name in enumerate(types)}
+
+    # Latest completed maintenance of each type, or the bowser's last maintenance of any kind
+    last_done = np.repeat(np.array([_day(bowser.last_maintenance) for bowser in bowsers],
+                                   dtype='datetime64[D]')[:, None], len(types), axis=1)
+    completed = db.session.execute(
+        select(Maintenance.bowser_id, Maintenance.maintenance_type, func.max(Maintenance.date))
+        .where(Maintenance.status == 'completed', Maintenance.maintenance_type.in_(types))
+        .group_by(Maintenance.bowser_id, Maintenance.maintenance_type)
+    ).all()
+    open_records = db.session.execute(
+        select(Maintenance.id, Maintenance.bowser_id, Maintenance.maintenance_type, Maintenance.date)
+        .where(Maintenance.status.in_(OPEN_STATUSES))
+    ).all()
+    # An open record stands in for the next occurrence of its type
+    done = [(bowser_id, kind, when) for bowser_id, kind, when in completed] + \
+           [(record.bowser_id, record.maintenance_type, record.date) for record in open_records
+            if record.maintenance_type in type_index]
+    done = [(index[bowser_id], type_index[kind], _day(when)) for bowser_id, kind, when in done if bowser_id in index]
+    if done:
+        rows, columns, days = (np.array(values) for values in zip(*done))
+        np.fmax.at(last_done, (rows, columns), days.astype('datetime64[D]'))
+
+    intervals = np.array([intervals_config[name] for name in types], dtype='timedelta64[D]')
+    bowser_idx, type_idx, dates, overdue = due_occurrences(today, last_done, intervals, horizon_days)
+
+    windows = defaultdict(list)
+    for row in db.session.execute(
+        select(Deployment.bowser_id, Deployment.start_date, Deployment.end_date)
+        .where(Deployment.status.in_(BLOCKING_DEPLOYMENTS),
+               (Deployment.end_date.is_(None)) | (Deployment.end_date >= datetime.combine(today, datetime.min.time())))
+    ):
+        windows[row.bowser_id].append((row.start_date.date(), row.end_date.date() if row.end_date else end))
+
+    entries = [{
+        'date': record.date.date(),
+        'bowser_id': record.bowser_id,
+        'bowser_number': bowsers[index[record.bowser_id]].number,
+        'kind': 'scheduled',
+        'maintenance_id': record.id,
+        'types': record.maintenance_type,
+        'due_date': record.date.date(),
+        'overdue': record.date.date() < today,
+        'moved': False,
+    } for record in open_records if record.bowser_id in index]
+
+    visit = None
+    for i in np.lexsort((dates, bowser_idx)):
+        b, day = int(bowser_idx[i]), dates[i].item()
+        if visit is None or visit['b'] != b or (day - visit['due_date']).days > batch_days:
+            visit = {'b': b, 'due_date': day, 'types': [], 'overdue': False}
+            entries.append(visit)
+        if types[type_idx[i]] not in visit['types']:
+            visit['types'].append(types[type_idx[i]])
+        visit['overdue'] = visit['overdue'] or bool(overdue[i])
+
+    planned = 0
+    for entry in entries:
+        if 'b' not in entry:
+            continue
+        bowser = bowsers[entry.pop('b')]
+        day, moved = _free_day(entry['due_date'], sorted(windows.get(bowser.id, ())), today, end)
+        if day is None:
+            # Deployed for the whole horizon: leave it on the due date for a dispatcher to resolve
+            day, moved = entry['due_date'], False
+        entry.update(date=day, bowser_id=bowser.id, bowser_number=bowser.number, kind='planned',
+                     maintenance_id=None, types=','.join(entry['types']), moved=moved)
+        planned += 1
+    logger.info(f"Maintenance plan: {planned} visits for {len(bowsers)} bowsers, {len(open_records)} open records")
+    return entries
+
+def rebuild_plan(today: Optional[date] = None) -> Dict[str, int]:
+    """Replace the stored maintenance plan."""
+    entries = plan_maintenance(today)
+    try:
+        db.session.query(MaintenancePlan).delete()
+        for start in range(0, len(entries), 5000):
+            db.session.bulk_insert_mappings(MaintenancePlan, entries[start:start + 5000])
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Error storing maintenance plan: {str(e)}")
+        raise
+    return {'entries': len(entries)}
+
+def refresh_maintenance_plan(force: bool = False) -> bool:
+    """Rebuild the plan if maintenance, bowser or deployment data changed, or the day rolled over."""
+    key = (data_version(*PLAN_TABLES), datetime.utcnow().date())
+    if not force and key == _state['key']:
+        return False
+    rebuild_plan(key[1])
+    _state['key'] = key
+    return True
+
+@job_queue.task('maintenance_plan', max_attempts=1)
+def run_maintenance_plan():
+    """Job: rebuild the maintenance plan regardless of data versions."""
+    return refresh_maintenance_plan(force=True)
+
+def week_start(value: Optional[str], today: Optional[date] = None) -> date:
+    """First day of the requested week.
+
+    value is an ISO week ('2024-W07', starting Monday), a date the week
+    starts on ('2024-02-11'), or empty for the current ISO week.
+    """
+    if not value:
+        today = today or datetime.utcnow().date()
+        return today - timedelta(days=today.weekday())
+    if '-W' in value:
+        year, week = value.split('-W')
+        return date.fromisocalendar(int(year), int(week), 1)
+    return date.fromisoformat(value)
+
+def calendar_week(start: date) -> Dict:
+    """The plan for the seven days from start, grouped by day, in one query."""
+    end = start + timedelta(days=7)
+    rows = MaintenancePlan.query.filter(MaintenancePlan.date >= start, MaintenancePlan.date < end) \
+        .order_by(MaintenancePlan.date, MaintenancePlan.bowser_number).all()
+    if not rows and _state['key'] is None and not db.session.query(MaintenancePlan.id).first():
+        # Nothing planned yet in this database
+        refresh_maintenance_plan()
+        return calendar_week(start)
+    days = {start + timedelta(days=offset): [] for offset in range(7)}
+    for row in rows:
+        days[row.date].append(row.to_dict())
+    return {
+        'start': start.isoformat(),
+        'end': (end - timedelta(days=1)).isoformat(),
+        'days': [{'date': day.isoformat(), 'events': events} for day, events in days.items()],
+    }
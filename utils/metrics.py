@@ -0,0 +1,386 @@
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('slow_query')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def add(self, counts, total, count):
+        """Add another histogram's counts, e.g. from another worker's snapshot."""
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+def _labels(**values):
+    return ','.join(f'{key}="{str(value)}"' for key, value in values.items())
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class MetricsRegistry:
+    """Request and SQL metrics, summed over every worker process on the host.
+
+    Each gunicorn worker counts in memory and writes a snapshot to its own
+    file in the metrics directory at most every flush_interval seconds; a
+    scrape, whichever worker serves it, merges all the files. Counters of
+    workers that have exited are folded into one archive file so totals
+    never go backwards. Without a directory only this process is reported.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools: Dict[str, tuple] = {}
+        self.directory: Optional[str] = None
+        self.flush_interval = 1.0
+        self._flushed = 0.0
+        self._pid = None
+        self._file_name = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency: Dict[Tuple[str, str], Histogram] = {}
+            self.statements: Dict[str, Histogram] = {}
+            self.requests = defaultdict(int)
+            self.sql_time = defaultdict(float)
+            self.n_plus_one = defaultdict(int)
+            self.slow_queries = 0
+            self.pool_events = defaultdict(int)
+
+    def observe_request(self, endpoint, method, status, duration, statement_count, sql_time):
+        with self._lock:
+            key = (endpoint, method)
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.latency[key].observe(duration)
+            if endpoint not in self.statements:
+                self.statements[endpoint] = Histogram(STATEMENT_BUCKETS)
+            self.statements[endpoint].observe(statement_count)
+            self.requests[(endpoint, method, status)] += 1
+            self.sql_time[endpoint] += sql_time
+
+    def observe_n_plus_one(self, endpoint):
+        with self._lock:
+            self.n_plus_one[endpoint] += 1
+
+    def observe_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def register_pool(self, name, pool, capacity=None):
+        """Report pool's size and checked-out connections as gauges."""
+        with self._lock:
+            self.pools[name] = (pool, capacity)
+
+    def observe_pool_event(self, name, kind):
+        with self._lock:
+            self.pool_events[(name, kind)] += 1
+
+    def snapshot(self) -> Dict:
+        """This process's metrics as JSON-serialisable lists."""
+        with self._lock:
+            pools = [[name, pool.checkedout(), pool.checkedin(), max(0, pool.overflow()), capacity]
+                     for name, (pool, capacity) in self.pools.items() if hasattr(pool, 'checkedout')]
+            return {
+                'latency': [[endpoint, method, h.counts, h.sum, h.count]
+                            for (endpoint, method), h in self.latency.items()],
+                'statements': [[endpoint, h.counts, h.sum, h.count] for endpoint, h in self.statements.items()],
+                'requests': [[*key, count] for key, count in self.requests.items()],
+                'sql_time': list(self.sql_time.items()),
+                'n_plus_one': list(self.n_plus_one.items()),
+                'slow_queries': self.slow_queries,
+                'pool_events': [[*key, count] for key, count in self.pool_events.items()],
+                'pools': pools,
+            }
+
+    def flush(self, force: bool = False):
+        """Write this process's snapshot to its file, at most every flush_interval seconds."""
+        if not self.directory or (not force and time.monotonic() - self._flushed < self.flush_interval):
+            return
+        self._flushed = time.monotonic()
+        if self._pid != os.getpid():
+            # Named per process start, so a reused pid doesn't overwrite an exited worker's counts;
+            # checked here as workers forked from a preloaded app share this registry's attributes
+            self._pid = os.getpid()
+            self._file_name = f'{self._pid}-{time.time_ns()}.json'
+        path = os.path.join(self.directory, self._file_name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f'{path}.tmp', 'w') as file:
+                json.dump(self.snapshot(), file)
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            logger.error(f"Error writing metrics snapshot: {str(e)}")
+
+    def _collect(self) -> Tuple[List[Dict], List[Dict]]:
+        """Snapshots of live workers and the counters of exited ones, folding exited workers into the archive."""
+        self.flush(force=True)
+        archive_path = os.path.join(self.directory, 'archive.json')
+        live, archived = [], []
+        with open(os.path.join(self.directory, 'archive.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                archive = _read_snapshot(archive_path)
+                exited = []
+                for name in os.listdir(self.directory):
+                    if not name.endswith('.json') or name == 'archive.json':
+                        continue
+                    snapshot = _read_snapshot(os.path.join(self.directory, name))
+                    if snapshot is None:
+                        continue
+                    if _pid_alive(int(name.split('-')[0])):
+                        live.append(snapshot)
+                    else:
+                        exited.append((name, snapshot))
+                if exited:
+                    archive = _merge([snapshot for snapshot in [archive] if snapshot]
+                                     + [snapshot for _, snapshot in exited], counters_only=True)
+                    with open(f'{archive_path}.tmp', 'w') as file:
+                        json.dump(archive, file)
+                    os.replace(f'{archive_path}.tmp', archive_path)
+                    for name, _ in exited:
+                        os.remove(os.path.join(self.directory, name))
+                if archive:
+                    archived.append(archive)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return live, archived
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        if self.directory:
+            try:
+                live, archived = self._collect()
+                return _render(_merge(live + archived), _merge(live)['pools'])
+            except OSError as e:
+                logger.error(f"Error merging worker metrics, reporting this worker only: {str(e)}")
+        snapshot = self.snapshot()
+        return _render(snapshot, snapshot['pools'])
+
+def _read_snapshot(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        logger.warning(f"Ignoring unreadable metrics snapshot {path}")
+        return None
+
+def _merge(snapshots: List[Dict], counters_only: bool = False) -> Dict:
+    """Sum snapshots; pool gauges are summed per pool unless counters_only."""
+    latency, statements = {}, {}
+    requests, sql_time, n_plus_one, pool_events = defaultdict(int), defaultdict(float), defaultdict(int), defaultdict(int)
+    pools = {}
+    slow_queries = 0
+    for snapshot in snapshots:
+        for endpoint, method, counts, total, count in snapshot['latency']:
+            latency.setdefault((endpoint, method), Histogram(LATENCY_BUCKETS)).add(counts, total, count)
+        for endpoint, counts, total, count in snapshot['statements']:
+            statements.setdefault(endpoint, Histogram(STATEMENT_BUCKETS)).add(counts, total, count)
+        for endpoint, method, status, count in snapshot['requests']:
+            requests[(endpoint, method, status)] += count
+        for endpoint, total in snapshot['sql_time']:
+            sql_time[endpoint] += total
+        for endpoint, count in snapshot['n_plus_one']:
+            n_plus_one[endpoint] += count
+        for name, kind, count in snapshot['pool_events']:
+            pool_events[(name, kind)] += count
+        slow_queries += snapshot['slow_queries']
+        if not counters_only:
+            for name, checked_out, idle, overflow, capacity in snapshot['pools']:
+                totals = pools.setdefault(name, [0, 0, 0, 0])
+                for index, value in enumerate((checked_out, idle, overflow, capacity or 0)):
+                    totals[index] += value
+    return {
+        'latency': [[endpoint, method, h.counts, h.sum, h.count] for (endpoint, method), h in latency.items()],
+        'statements': [[endpoint, h.counts, h.sum, h.count] for endpoint, h in statements.items()],
+        'requests': [[*key, count] for key, count in requests.items()],
+        'sql_time': list(sql_time.items()),
+        'n_plus_one': list(n_plus_one.items()),
+        'slow_queries': slow_queries,
+        'pool_events': [[*key, count] for key, count in pool_events.items()],
+        'pools': [[name, *totals] for name, totals in pools.items()],
+    }
+
+def _render(snapshot: Dict, pools: List) -> str:
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by route.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for endpoint, method, counts, total, count in sorted(snapshot['latency']):
+        histogram = Histogram(LATENCY_BUCKETS)
+        histogram.add(counts, total, count)
+        lines += histogram.render('http_request_duration_seconds', _labels(endpoint=endpoint, method=method))
+
+    lines += ['# HELP http_requests_total Requests by route and status.',
+              '# TYPE http_requests_total counter']
+    for endpoint, method, status, count in sorted(snapshot['requests']):
+        lines.append(f'http_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} {count}')
+
+    lines += ['# HELP db_statements_per_request SQL statements issued per request.',
+              '# TYPE db_statements_per_request histogram']
+    for endpoint, counts, total, count in sorted(snapshot['statements']):
+        histogram = Histogram(STATEMENT_BUCKETS)
+        histogram.add(counts, total, count)
+        lines += histogram.render('db_statements_per_request', _labels(endpoint=endpoint))
+
+    lines += ['# HELP db_statement_seconds_total Time spent in SQL by route.',
+              '# TYPE db_statement_seconds_total counter']
+    for endpoint, total in sorted(snapshot['sql_time']):
+        lines.append(f'db_statement_seconds_total{{{_labels(endpoint=endpoint)}}} {total}')
+
+    lines += ['# HELP db_n_plus_one_total Requests that repeated one statement past the N+1 threshold.',
+              '# TYPE db_n_plus_one_total counter']
+    for endpoint, count in sorted(snapshot['n_plus_one']):
+        lines.append(f'db_n_plus_one_total{{{_labels(endpoint=endpoint)}}} {count}')
+
+    lines += ['# HELP db_slow_queries_total Statements slower than SLOW_QUERY_THRESHOLD.',
+              '# TYPE db_slow_queries_total counter',
+              f'db_slow_queries_total {snapshot["slow_queries"]}']
+
+    lines += ['# HELP db_pool_connections Pooled connections by state, summed over live workers.',
+              '# TYPE db_pool_connections gauge']
+    utilisation = []
+    for name, checked_out, idle, overflow, capacity in sorted(pools):
+        lines.append(f'db_pool_connections{{{_labels(pool=name, state="checked_out")}}} {checked_out}')
+        lines.append(f'db_pool_connections{{{_labels(pool=name, state="idle")}}} {idle}')
+        lines.append(f'db_pool_connections{{{_labels(pool=name, state="overflow")}}} {overflow}')
+        if capacity:
+            utilisation.append(f'db_pool_utilisation{{{_labels(pool=name)}}} {checked_out / capacity}')
+    lines += ['# HELP db_pool_utilisation Checked-out connections over pool_size + max_overflow.',
+              '# TYPE db_pool_utilisation gauge'] + utilisation
+
+    lines += ['# HELP db_pool_events_total Pool checkouts, new connections and invalidated connections.',
+              '# TYPE db_pool_events_total counter']
+    for name, kind, count in sorted(snapshot['pool_events']):
+        lines.append(f'db_pool_events_total{{{_labels(pool=name, event=kind)}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+
+def _explain(conn, statement, parameters):
+    """Return the query plan for a SELECT, using a raw cursor so no events fire."""
+    if not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN failed: {str(e)}'
+    finally:
+        cursor.close()
+
+def init_metrics(app):
+    """Install request timing hooks and SQL statement listeners on app."""
+    slow_threshold = app.config.get('SLOW_QUERY_THRESHOLD', 0.1)
+    metrics.directory = app.config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+    metrics.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1.0)
+    atexit.register(metrics.flush, force=True)
+    n_plus_one_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 10)
+    if app.config.get('SLOW_QUERY_LOG'):
+        handler = logging.FileHandler(app.config['SLOW_QUERY_LOG'])
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_query_logger.addHandler(handler)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+        g.sql_statements = defaultdict(int)
+        g.n_plus_one_reported = False
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('request_started')
+        if started is not None:
+            metrics.observe_request(
+                request.endpoint or '<unmatched>',
+                request.method,
+                response.status_code,
+                time.perf_counter() - started,
+                g.sql_count,
+                g.sql_time
+            )
+            metrics.flush()
+        return response
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_started'].pop()
+
+        if duration >= slow_threshold:
+            metrics.observe_slow_query()
+            plan = _explain(conn, statement, parameters)
+            endpoint = request.endpoint if has_request_context() else None
+            slow_query_logger.warning(
+                f"Slow query ({duration * 1000:.1f} ms, endpoint={endpoint}): {statement} "
+                f"params={parameters}\nPlan:\n{plan}"
+            )
+
+        if not has_request_context() or 'sql_statements' not in g:
+            return
+        g.sql_count += 1
+        g.sql_time += duration
+        g.sql_statements[statement] += 1
+        # Parameters are bound separately, so a query repeated per row of a
+        # parent result shows up as the same statement text many times
+        if g.sql_statements[statement] == n_plus_one_threshold and not g.n_plus_one_reported:
+            g.n_plus_one_reported = True
+            metrics.observe_n_plus_one(request.endpoint or '<unmatched>')
+            logger.warning(
+                f"Possible N+1 query in {request.endpoint}: statement executed "
+                f"{n_plus_one_threshold}+ times in one request: {statement}"
+            )
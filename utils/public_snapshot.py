@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+from flask import current_app
+
+from models.sql_models import Deployment
+from utils.assets import brotli
+from utils.data_versions import data_version
+from utils.jobs import job_queue
+from utils.read_models import read_all
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = 'map.geojson'
+META_NAME = 'map.meta.json'
+SNAPSHOT_TABLES = ('bowser', 'location', 'deployment')
+COORDINATE_PRECISION = 5  # about 1 m
+
+mimetypes.add_type('application/geo+json', '.geojson')
+
+_meta_cache: Dict[str, tuple] = {}
+
+def snapshot_dir() -> str:
+    return current_app.config.get('PUBLIC_SNAPSHOT_DIR') or os.path.join(current_app.instance_path, 'public')
+
+def build_feature_collection() -> dict:
+    """GeoJSON for the public map: one point per active deployment."""
+    deployments = read_all(
+        Deployment, Deployment.status == 'active',
+        fields=('id',),
+        related={'bowser': ('number', 'capacity', 'current_level', 'status'),
+                 'location': ('id', 'name', 'address', 'latitude', 'longitude', 'status')},
+    )
+    features = []
+    for deployment in deployments:
+        bowser, location = deployment.bowser, deployment.location
+        if bowser is None or location is None:
+            continue
+        fill = round(100 * bowser.current_level / bowser.capacity) if bowser.capacity else 0
+        features.append({
+            'type': 'Feature',
+            'id': deployment.id,
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [round(location.longitude, COORDINATE_PRECISION),
+                                round(location.latitude, COORDINATE_PRECISION)],
+            },
+            'properties': {
+                'bowser': bowser.number,
+                'fill': max(0, min(100, fill)),
+                'bowser_status': bowser.status,
+                'location_id': location.id,
+                'name': location.name,
+                'address': location.address,
+                'location_status': location.status,
+            },
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+def _write_atomic(path: str, content: bytes):
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+def load_meta(directory: Optional[str] = None) -> Optional[dict]:
+    """Read the snapshot's sidecar, reloading it when the file changes."""
+    path = os.path.join(directory or snapshot_dir(), META_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _meta_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error loading public snapshot metadata: {str(e)}")
+        return None
+    _meta_cache[path] = (mtime, meta)
+    return meta
+
+def refresh_public_snapshot(force: bool = False) -> bool:
+    """Rebuild the public map snapshot if the tables it reads have changed.
+
+    Writes map.geojson with .gz (and .br when brotli is installed)
+    variants, then the sidecar holding the data versions and ETag; each
+    file is replaced atomically, so workers serving it never read a
+    partial file. Returns whether the snapshot was rebuilt.
+    """
+    directory = snapshot_dir()
+    versions = list(data_version(*SNAPSHOT_TABLES))
+    meta = load_meta(directory)
+    if not force and meta is not None and meta.get('versions') == versions \
+            and os.path.isfile(os.path.join(directory, SNAPSHOT_NAME)):
+        return False
+
+    content = json.dumps(build_feature_collection(), separators=(',', ':')).encode('utf-8')
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, SNAPSHOT_NAME)
+    _write_atomic(target + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_atomic(target + '.br', brotli.compress(content, quality=11))
+    _write_atomic(target, content)
+    _write_atomic(os.path.join(directory, META_NAME), json.dumps({
+        'versions': versions,
+        'etag': hashlib.sha256(content).hexdigest()[:16],
+        'generated_at': datetime.utcnow().isoformat(),
+    }).encode('utf-8'))
+    logger.info(f"Public map snapshot rebuilt ({len(content)} bytes)")
+    return True
+
+@job_queue.task('public_snapshot', max_attempts=1)
+def rebuild_public_snapshot():
+    """Job: rebuild the public map snapshot regardless of data versions."""
+    return refresh_public_snapshot(force=True)
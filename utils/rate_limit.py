@@ -0,0 +1,266 @@
+import fcntl
+import hashlib
+import hmac
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from flask import jsonify, request, session
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:  # optional; redis:// storage falls back to the shared memory store
+    redis = None
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+LIMIT_PATTERN = re.compile(r'^\s*(\d+)\s*(?:per|/)\s*(second|minute|hour|day)s?\s*$')
+
+# A bucket is (key, capacity, seconds to refill from empty)
+Bucket = Tuple[str, int, float]
+
+def parse_limits(spec: str) -> List[Tuple[int, int]]:
+    """Parse '10 per minute;100 per hour' into [(10, 60), (100, 3600)]."""
+    limits = []
+    for part in (spec or '').split(';'):
+        if not part.strip():
+            continue
+        match = LIMIT_PATTERN.match(part.lower())
+        if not match:
+            raise ValueError(f"Invalid rate limit '{part.strip()}'")
+        limits.append((int(match.group(1)), PERIODS[match.group(2)]))
+    return limits
+
+def _refill(tokens: float, updated: float, capacity: int, period: float, now: float) -> float:
+    return min(capacity, tokens + (now - updated) * capacity / period)
+
+class MemoryStore:
+    """Token buckets in a dict; per process, for development and tests."""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, buckets: Sequence[Bucket], now: Optional[float] = None) -> Tuple[bool, float]:
+        now = time.time() if now is None else now
+        with self._lock:
+            levels = [_refill(*self._buckets.get(key, (capacity, now)), capacity, period, now)
+                      for key, capacity, period in buckets]
+            allowed = all(level >= 1 for level in levels)
+            for (key, _, _), level in zip(buckets, levels):
+                self._buckets[key] = (level - 1 if allowed else level, now)
+        return allowed, _retry_after(buckets, levels)
+
+class SharedMemoryStore:
+    """Token buckets in a memory-mapped file shared by every worker on a host.
+
+    The file is a fixed-size open-addressing table of (key hash, tokens,
+    updated) slots, so a check is a handful of slot reads under an flock
+    regardless of how many clients there are. When all probed slots are
+    taken the least recently updated one is reused; a recycled bucket
+    starts full, which only ever errs towards allowing a request.
+    """
+    SLOT = struct.Struct('<Qdd')
+    PROBES = 8
+
+    def __init__(self, path: str, slots: int = 65536):
+        self.path = path
+        self.slots = slots
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a+b')
+        size = slots * self.SLOT.size
+        if os.fstat(self._file.fileno()).st_size != size:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                self._file.truncate(size)
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        # flock excludes other processes; threads in this one share it
+        self._lock = threading.Lock()
+
+    def _find_slot(self, key_hash: int) -> Tuple[int, bool]:
+        start = key_hash % self.slots
+        oldest, oldest_updated = start, math.inf
+        for probe in range(self.PROBES):
+            index = (start + probe) % self.slots
+            slot_hash, _, updated = self.SLOT.unpack_from(self._map, index * self.SLOT.size)
+            if slot_hash == key_hash:
+                return index, True
+            if slot_hash == 0:
+                return index, False
+            if updated < oldest_updated:
+                oldest, oldest_updated = index, updated
+        return oldest, False
+
+    def acquire(self, buckets: Sequence[Bucket], now: Optional[float] = None) -> Tuple[bool, float]:
+        now = time.time() if now is None else now
+        hashes = [int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+                  for key, _, _ in buckets]
+        with self._lock:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                slots, levels = [], []
+                for key_hash, (_, capacity, period) in zip(hashes, buckets):
+                    index, found = self._find_slot(key_hash)
+                    if found:
+                        _, tokens, updated = self.SLOT.unpack_from(self._map, index * self.SLOT.size)
+                        level = _refill(tokens, updated, capacity, period, now)
+                    else:
+                        level = capacity
+                    # Claim the slot now so two new buckets in one check cannot share it
+                    self.SLOT.pack_into(self._map, index * self.SLOT.size, key_hash, level, now)
+                    slots.append(index)
+                    levels.append(level)
+                allowed = all(level >= 1 for level in levels)
+                if allowed:
+                    for index, key_hash, level in zip(slots, hashes, levels):
+                        self.SLOT.pack_into(self._map, index * self.SLOT.size, key_hash, level - 1, now)
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+        return allowed, _retry_after(buckets, levels)
+
+class RedisStore:
+    """Token buckets in Redis, for limits shared between hosts."""
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local allowed = 1
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local period = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    levels[i] = math.min(capacity, tokens + (now - updated) * capacity / period)
+    if levels[i] < 1 then allowed = 0 end
+end
+for i, key in ipairs(KEYS) do
+    local level = levels[i]
+    if allowed == 1 then level = level - 1 end
+    redis.call('HSET', key, 'tokens', tostring(level), 'updated', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(tonumber(ARGV[i * 2 + 1])))
+    levels[i] = tostring(levels[i])
+end
+return {allowed, levels}
+"""
+
+    def __init__(self, url: str):
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def acquire(self, buckets: Sequence[Bucket], now: Optional[float] = None) -> Tuple[bool, float]:
+        now = time.time() if now is None else now
+        args = [now]
+        for _, capacity, period in buckets:
+            args += [capacity, period]
+        allowed, levels = self._script(keys=[f'ratelimit:{key}' for key, _, _ in buckets], args=args)
+        return bool(allowed), _retry_after(buckets, [float(level) for level in levels])
+
+def _retry_after(buckets: Sequence[Bucket], levels: Sequence[float]) -> float:
+    """Seconds until every bucket holds a token again."""
+    return max([(1 - level) * period / capacity for (_, capacity, period), level in zip(buckets, levels)
+                if level < 1] or [0])
+
+def create_store(url: str, instance_path: str):
+    """Store for RATELIMIT_STORAGE_URL: memory://, shm://[path] or redis://."""
+    scheme = urlparse(url).scheme
+    if scheme == 'memory':
+        return MemoryStore()
+    if scheme in ('redis', 'rediss'):
+        if redis is not None:
+            return RedisStore(url)
+        logger.error("redis is not installed; rate limits use the shared memory store")
+    elif scheme != 'shm':
+        raise ValueError(f"Unsupported rate limit storage '{url}'")
+    path = urlparse(url).path if scheme == 'shm' else ''
+    return SharedMemoryStore(path or os.path.join(instance_path, 'ratelimit.bin'))
+
+class RateLimiter:
+    """Token-bucket limits per client, matched on request path prefix.
+
+    Clients are identified by logged-in user, else by a known bearer
+    token, else by remote address. Each path rule has its own buckets, so
+    using up the /login allowance does not affect the API; a rule with no
+    limits exempts its prefix.
+    """
+
+    def __init__(self):
+        self.store = None
+        self.rules: List[Tuple[str, List[Tuple[int, int]]]] = []
+        self.default: List[Tuple[int, int]] = []
+        self.tokens: Dict[str, str] = {}
+
+    def init_app(self, app):
+        self.store = create_store(app.config.get('RATELIMIT_STORAGE_URL', 'shm://'), app.instance_path)
+        # Only configured tokens get buckets of their own; any other bearer header counts as its address
+        self.tokens = {name: app.config[key] for name, key in (('metrics', 'METRICS_TOKEN'),) if app.config.get(key)}
+        self.default = parse_limits(app.config.get('RATELIMIT_DEFAULT', ''))
+        # Longest prefix first so '/api/login' can override '/api/'
+        self.rules = sorted(((prefix, parse_limits(spec))
+                             for prefix, spec in app.config.get('RATELIMIT_ROUTES', {}).items()),
+                            key=lambda rule: len(rule[0]), reverse=True)
+
+        @app.before_request
+        def enforce_rate_limit():
+            if not app.config.get('RATELIMIT_ENABLED', True) or request.endpoint == 'static':
+                return None
+            allowed, retry_after = self.check(request.path, self.identity())
+            if allowed:
+                return None
+            logger.warning(f"Rate limit exceeded for {self.identity()} on {request.path}")
+            if request.path.startswith('/api/'):
+                response = jsonify({'status': 'error', 'message': 'Too many requests'})
+            else:
+                response = app.response_class('Too many requests', mimetype='text/plain')
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            return response
+
+    def limits_for(self, path: str) -> Tuple[str, List[Tuple[int, int]]]:
+        for prefix, limits in self.rules:
+            if path.startswith(prefix):
+                return prefix, limits
+        return '*', self.default
+
+    def identity(self) -> str:
+        """The current request's client: its user, a configured bearer token, or its address."""
+        user_id = session.get('_user_id')
+        if user_id:
+            return f'user:{user_id}'
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            presented = authorization[7:].encode('utf-8')
+            for name, token in self.tokens.items():
+                if hmac.compare_digest(presented, token.encode('utf-8')):
+                    return f'token:{name}'
+        return f'ip:{request.remote_addr}'
+
+    def check(self, path: str, identity: str) -> Tuple[bool, float]:
+        """Take one token from each of identity's buckets for path."""
+        rule, limits = self.limits_for(path)
+        if not limits:
+            return True, 0.0
+        buckets = [(f'{rule}|{identity}|{period}', capacity, period) for capacity, period in limits]
+        try:
+            return self.store.acquire(buckets)
+        except Exception as e:
+            # A broken store must not take the site down with it
+            logger.error(f"Rate limit store error: {str(e)}")
+            return True, 0.0
+
+rate_limiter = RateLimiter()
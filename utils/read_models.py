@@ -0,0 +1,97 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import aliased, joinedload, selectinload
+
+from database import db
+
+_row_classes: Dict[Tuple[type, Tuple[str, ...]], type] = {}
+
+LOADER_STRATEGIES = {
+    'selectin': selectinload,
+    'joined': joinedload,
+}
+
+class ReadRow:
+    """Base for read-only row classes; subclasses define __slots__."""
+    __slots__ = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {getattr(self, "id", "")}>'
+
+def row_class(model, fields: Sequence[str] = None, related: Sequence[str] = ()) -> type:
+    """Return a __slots__ class exposing fields of model as plain attributes.
+
+    Classes are built once per (model, fields) with a generated __init__,
+    so templates can use row.name exactly as with ORM objects. Names in
+    related get a slot each for nested rows.
+    """
+    fields = tuple(fields or (column.key for column in model.__table__.columns)) + tuple(related)
+    key = (model, fields)
+    if key not in _row_classes:
+        body = '\n'.join(f'    self.{field} = {field}' for field in fields) or '    pass'
+        namespace: Dict[str, Any] = {}
+        exec(compile(f"def __init__(self, {', '.join(fields)}):\n{body}\n",
+                     f'<{model.__name__}Row>', 'exec'), namespace)
+        _row_classes[key] = type(f'{model.__name__}Row', (ReadRow,),
+                                 {'__slots__': fields, '__init__': namespace['__init__']})
+    return _row_classes[key]
+
+def read_all(model, *criteria, order_by=None, fields: Sequence[str] = None,
+             related: Dict[str, Sequence[str]] = None) -> List[ReadRow]:
+    """Load rows for read-only views without ORM hydration.
+
+    Runs a Core select over the model's columns and wraps each row in a
+    row_class() instance. The rows are not tracked by the session and
+    cannot be modified or flushed back.
+
+    related maps many-to-one relationship names to the columns needed
+    from the target, e.g. {'bowser': ('id', 'number')}. They are outer
+    joined into the same statement and exposed as nested rows (None when
+    there is no match), so a page costs one query however many rows it has.
+    """
+    related = related or {}
+    cls = row_class(model, fields, related)
+    own_fields = cls.__slots__[:len(cls.__slots__) - len(related)]
+    columns = [getattr(model, field) for field in own_fields]
+    joins, nested = [], []
+    for name, related_fields in related.items():
+        relationship = getattr(model, name)
+        target = aliased(relationship.property.mapper.class_)
+        nested_cls = row_class(relationship.property.mapper.class_, related_fields)
+        nested.append((nested_cls, len(columns), len(columns) + len(related_fields)))
+        columns += [getattr(target, field) for field in related_fields]
+        joins.append(relationship.of_type(target))
+
+    statement = select(*columns)
+    for join in joins:
+        statement = statement.outerjoin(join)
+    if criteria:
+        statement = statement.where(*criteria)
+    if order_by is not None:
+        statement = statement.order_by(*(order_by if isinstance(order_by, (list, tuple)) else (order_by,)))
+
+    if not nested:
+        return [cls(*row) for row in db.session.execute(statement)]
+    split = len(own_fields)
+    rows = []
+    for row in db.session.execute(statement):
+        children = [nested_cls(*row[start:end]) if any(v is not None for v in row[start:end]) else None
+                    for nested_cls, start, end in nested]
+        rows.append(cls(*row[:split], *children))
+    return rows
+
+def related_options(*relationships, strategy: str = None) -> list:
+    """Eager loader options for ORM queries that render related objects.
+
+    strategy is 'selectin' (one extra query per relationship) or 'joined'
+    (a single LEFT OUTER JOIN); it defaults to RELATIONSHIP_LOADING.
+    """
+    strategy = strategy or current_app.config.get('RELATIONSHIP_LOADING', 'selectin')
+    if strategy not in LOADER_STRATEGIES:
+        raise ValueError(f"Unknown loading strategy '{strategy}'")
+    return [LOADER_STRATEGIES[strategy](relationship) for relationship in relationships]
@@ -0,0 +1,437 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import select
+
+from database import db
+from models.sql_models import Bowser, Deployment, Location
+from utils.data_versions import data_version
+from utils.forecasting import EXCLUDED_STATUSES, estimate_consumption
+from utils.geo import distance_matrix
+
+logger = logging.getLogger(__name__)
+
+ROUTING_TABLES = ('bowser', 'location', 'deployment')
+DEPOT = 0  # matrix index of the depot
+
+class RoutePlanner:
+    """Refill routes for tankers leaving from and returning to the depot.
+
+    Every deployed bowser that is below trigger_percent, or forecast to run
+    dry within horizon_hours, is a stop that must be topped up before its
+    predicted time-to-empty. Vehicles carry vehicle_capacity litres and
+    must be back within the shift. Routes are built by inserting the most
+    urgent stops first at their cheapest feasible position (by distance),
+    opening another vehicle only when no route can take a stop in time,
+    then improved by relocating stops while that shortens the total.
+
+    Each route keeps the start time and the latest feasible start time of
+    every position, so checking an insertion costs O(1) and a single
+    bowser's change is repaired by removing and re-inserting its stop.
+    """
+
+    def __init__(self, vehicles: int = 4, vehicle_capacity: float = 20000.0, speed_kmh: float = 40.0,
+                 service_minutes: float = 15.0, shift_hours: float = 10.0, road_factor: float = 1.3,
+                 trigger_percent: float = 50.0, horizon_hours: float = 24.0, late_grace_minutes: float = 60.0,
+                 improve_passes: int = 3):
+        self.vehicles = vehicles
+        self.vehicle_capacity = vehicle_capacity
+        self.speed_kmh = speed_kmh
+        self.service_minutes = service_minutes
+        self.shift_minutes = shift_hours * 60
+        self.road_factor = road_factor
+        self.trigger_percent = trigger_percent
+        self.horizon_hours = horizon_hours
+        self.late_grace_minutes = late_grace_minutes
+        self.improve_passes = improve_passes
+        self.versions = None
+
+    # -- problem set-up ------------------------------------------------------
+
+    def load(self, bowsers: List[dict], rates: Dict[str, Optional[float]], nodes: Dict[str, int],
+             km: List[List[float]], planned_at: datetime):
+        """Set up the problem.
+
+        bowsers: dicts with id, number, capacity, current_level, location_id,
+        location_name, latitude and longitude of every deployed bowser.
+        rates: litres per hour each bowser is consumed at. nodes maps
+        location ids to rows of km, the road-agnostic distance matrix whose
+        row DEPOT is the depot.
+        """
+        self.bowsers = {bowser['id']: dict(bowser) for bowser in bowsers}
+        self.rates = rates
+        self.nodes = nodes
+        self.km = km
+        minutes_per_km = self.road_factor / self.speed_kmh * 60
+        self.minutes = [[d * minutes_per_km for d in row] for row in km]
+        self.planned_at = planned_at
+
+        self.stops: Dict[str, dict] = {}
+        for bowser_id in self.bowsers:
+            stop = self._make_stop(bowser_id, 0.0)
+            if stop:
+                self.stops[bowser_id] = stop
+        self.routes: List[List[str]] = []
+        self.route_of: Dict[str, int] = {}
+        self.unserved: Dict[str, str] = {}
+        self._begin: List[List[float]] = []
+        self._latest: List[List[float]] = []
+        self._load: List[float] = []
+
+    def _make_stop(self, bowser_id: str, offset: float) -> Optional[dict]:
+        """The stop for a bowser, or None if it does not need a refill yet.
+
+        offset is minutes since planned_at; due times count from planned_at.
+        """
+        bowser = self.bowsers[bowser_id]
+        capacity = bowser['capacity'] or 0.0
+        level = bowser['current_level'] or 0.0
+        need = capacity - level
+        if need < 1.0 or bowser['location_id'] not in self.nodes:
+            return None
+        rate = self.rates.get(bowser_id) or 0.0
+        hours_to_empty = level / rate if rate > 0 else None
+        percent = level * 100.0 / capacity
+        if percent > self.trigger_percent and (hours_to_empty is None or hours_to_empty > self.horizon_hours):
+            return None
+
+        node = self.nodes[bowser['location_id']]
+        due = offset + (hours_to_empty * 60 if hours_to_empty is not None else self.shift_minutes)
+        due = min(due, self.shift_minutes)
+        earliest = offset + self.minutes[DEPOT][node]
+        late = due < earliest
+        if late:
+            # Cannot be reached before it runs dry: serve it as soon as a vehicle can
+            due = earliest + self.late_grace_minutes
+        return {
+            'bowser_id': bowser_id,
+            'node': node,
+            'litres': min(need, self.vehicle_capacity),
+            'hours_to_empty': hours_to_empty,
+            'due': due,
+            'late': late,
+        }
+
+    # -- route schedules ---------------------------------------------------------
+
+    def _route_nodes(self, r: int) -> List[int]:
+        return [DEPOT] + [self.stops[bowser_id]['node'] for bowser_id in self.routes[r]] + [DEPOT]
+
+    def _reschedule(self, r: int):
+        """Recompute start and latest start times for every position of route r."""
+        stops = [self.stops[bowser_id] for bowser_id in self.routes[r]]
+        nodes = self._route_nodes(r)
+        minutes, service = self.minutes, self.service_minutes
+        begin = [0.0]
+        for k in range(1, len(nodes)):
+            begin.append(begin[-1] + (service if k > 1 else 0.0) + minutes[nodes[k - 1]][nodes[k]])
+        latest = [0.0] * len(nodes)
+        latest[-1] = self.shift_minutes
+        for k in range(len(nodes) - 2, 0, -1):
+            latest[k] = min(stops[k - 1]['due'], latest[k + 1] - service - minutes[nodes[k]][nodes[k + 1]])
+        latest[0] = latest[1] - minutes[DEPOT][nodes[1]] if len(nodes) > 2 else self.shift_minutes
+        self._begin[r] = begin
+        self._latest[r] = latest
+        self._load[r] = sum(stop['litres'] for stop in stops)
+
+    def _best_insertion(self, stop: dict) -> Optional[Tuple[float, int, int]]:
+        """Cheapest feasible (added km, route, position) for stop, opening a new route if needed."""
+        u, litres, due = stop['node'], stop['litres'], stop['due']
+        km, minutes, service = self.km, self.minutes, self.service_minutes
+        best = None
+        for r in range(len(self.routes)):
+            if self._load[r] + litres > self.vehicle_capacity:
+                continue
+            nodes = self._route_nodes(r)
+            begin, latest = self._begin[r], self._latest[r]
+            for p in range(len(nodes) - 1):
+                a, b = nodes[p], nodes[p + 1]
+                start = begin[p] + (service if p > 0 else 0.0) + minutes[a][u]
+                if start > due:
+                    # Later positions only start later
+                    break
+                if start + service + minutes[u][b] > latest[p + 1]:
+                    continue
+                cost = km[a][u] + km[u][b] - km[a][b]
+                if best is None or cost < best[0]:
+                    best = (cost, r, p)
+        if best is None and len(self.routes) < self.vehicles and litres <= self.vehicle_capacity \
+                and minutes[DEPOT][u] <= due and minutes[DEPOT][u] + service + minutes[u][DEPOT] <= self.shift_minutes:
+            best = (km[DEPOT][u] + km[u][DEPOT], len(self.routes), 0)
+        return best
+
+    def _insert(self, bowser_id: str, r: int, p: int):
+        if r == len(self.routes):
+            self.routes.append([])
+            self._begin.append([])
+            self._latest.append([])
+            self._load.append(0.0)
+        self.routes[r].insert(p, bowser_id)
+        self._reschedule(r)
+        for other in self.routes[r]:
+            self.route_of[other] = r
+
+    def _remove(self, bowser_id: str) -> Tuple[int, int]:
+        """Take a stop out of its route; removing a stop never makes a route infeasible."""
+        r = self.route_of.pop(bowser_id)
+        p = self.routes[r].index(bowser_id)
+        del self.routes[r][p]
+        self._reschedule(r)
+        return r, p
+
+    def _place(self, bowser_id: str) -> bool:
+        best = self._best_insertion(self.stops[bowser_id])
+        if best is None:
+            self.unserved[bowser_id] = 'no vehicle can reach it in time with enough water'
+            return False
+        self.unserved.pop(bowser_id, None)
+        self._insert(bowser_id, best[1], best[2])
+        return True
+
+    def _removal_saving(self, bowser_id: str) -> float:
+        r = self.route_of[bowser_id]
+        nodes = self._route_nodes(r)
+        p = self.routes[r].index(bowser_id) + 1
+        a, u, b = nodes[p - 1], nodes[p], nodes[p + 1]
+        return self.km[a][u] + self.km[u][b] - self.km[a][b]
+
+    # -- solving -------------------------------------------------------------------
+
+    def solve(self) -> Dict:
+        """Build routes from scratch; returns the summary."""
+        started = time.perf_counter()
+        self.routes, self.route_of, self.unserved = [], {}, {}
+        self._begin, self._latest, self._load = [], [], []
+        for bowser_id in sorted(self.stops, key=lambda b: (self.stops[b]['due'], -self.stops[b]['litres'])):
+            self._place(bowser_id)
+        self._improve()
+        return self.summary(time.perf_counter() - started)
+
+    def _improve(self):
+        """Relocate stops to their cheapest position while that shortens the routes."""
+        for _ in range(self.improve_passes):
+            moved = 0
+            for bowser_id in list(self.route_of):
+                saving = self._removal_saving(bowser_id)
+                r, p = self._remove(bowser_id)
+                best = self._best_insertion(self.stops[bowser_id])
+                if best is not None and best[0] < saving - 1e-9 and best[1] < len(self.routes):
+                    self._insert(bowser_id, best[1], best[2])
+                    moved += 1
+                else:
+                    self._insert(bowser_id, r, p)
+            for bowser_id in list(self.unserved):
+                self._place(bowser_id)
+            if not moved:
+                break
+        self._drop_empty_routes()
+
+    def _drop_empty_routes(self):
+        keep = [r for r, route in enumerate(self.routes) if route]
+        if len(keep) == len(self.routes):
+            return
+        self.routes = [self.routes[r] for r in keep]
+        self._begin = [self._begin[r] for r in keep]
+        self._latest = [self._latest[r] for r in keep]
+        self._load = [self._load[r] for r in keep]
+        self.route_of = {bowser_id: r for r, route in enumerate(self.routes) for bowser_id in route}
+
+    def update_bowser(self, bowser_id: str, now: datetime, **changes) -> Dict:
+        """Apply changes (current_level, capacity) to one bowser and repair its stop only."""
+        started = time.perf_counter()
+        self.bowsers[bowser_id].update(changes)
+        freed = bowser_id in self.route_of
+        if freed:
+            self._remove(bowser_id)
+        self.unserved.pop(bowser_id, None)
+        self.stops.pop(bowser_id, None)
+
+        stop = self._make_stop(bowser_id, (now - self.planned_at).total_seconds() / 60)
+        if stop:
+            self.stops[bowser_id] = stop
+            self._place(bowser_id)
+        if freed:
+            # The stop's old vehicle may now have room for a stop that was left out
+            for other in sorted(self.unserved, key=lambda b: self.stops[b]['due']):
+                if other != bowser_id:
+                    self._place(other)
+        self._drop_empty_routes()
+        return self.summary(time.perf_counter() - started)
+
+    # -- results -------------------------------------------------------------------
+
+    def _at(self, minutes: float) -> str:
+        return (self.planned_at + timedelta(minutes=minutes)).isoformat()
+
+    def _stop_view(self, bowser_id: str) -> Dict:
+        stop, bowser = self.stops[bowser_id], self.bowsers[bowser_id]
+        return {
+            'bowser_id': bowser_id,
+            'bowser_number': bowser.get('number'),
+            'location_id': bowser['location_id'],
+            'location_name': bowser.get('location_name'),
+            'latitude': bowser['latitude'],
+            'longitude': bowser['longitude'],
+            'current_level': bowser['current_level'],
+            'litres': round(stop['litres'], 1),
+            'hours_to_empty': None if stop['hours_to_empty'] is None else round(stop['hours_to_empty'], 2),
+            'due_at': self._at(stop['due']),
+            'late': stop['late'],
+        }
+
+    def schedule(self) -> List[Dict]:
+        """Each vehicle's stops in visiting order, with arrival times."""
+        plan = []
+        for r, route in enumerate(self.routes):
+            nodes = self._route_nodes(r)
+            stops = []
+            for k, bowser_id in enumerate(route, start=1):
+                view = self._stop_view(bowser_id)
+                view['arrival_at'] = self._at(self._begin[r][k])
+                view['leg_km'] = round(self.km[nodes[k - 1]][nodes[k]], 3)
+                stops.append(view)
+            plan.append({
+                'vehicle': r + 1,
+                'stops': stops,
+                'litres': round(self._load[r], 1),
+                'distance_km': round(sum(self.km[a][b] for a, b in zip(nodes, nodes[1:])), 3),
+                'return_at': self._at(self._begin[r][-1]),
+            })
+        return plan
+
+    def refills(self) -> List[Dict]:
+        """Every bowser needing a refill, most urgent first, with its vehicle or why it has none."""
+        listing = []
+        for bowser_id, stop in sorted(self.stops.items(), key=lambda item: item[1]['due']):
+            view = self._stop_view(bowser_id)
+            r = self.route_of.get(bowser_id)
+            view['vehicle'] = None if r is None else r + 1
+            view['arrival_at'] = None if r is None else self._at(self._begin[r][self.routes[r].index(bowser_id) + 1])
+            view['unserved_reason'] = self.unserved.get(bowser_id)
+            listing.append(view)
+        return listing
+
+    def summary(self, elapsed: float = None) -> Dict:
+        distance = sum(self.km[a][b] for r in range(len(self.routes))
+                       for a, b in zip(self._route_nodes(r), self._route_nodes(r)[1:]))
+        return {
+            'stops': len(self.stops),
+            'served': len(self.route_of),
+            'unserved': len(self.unserved),
+            'late': sum(1 for stop in self.stops.values() if stop['late']),
+            'vehicles_used': len(self.routes),
+            'vehicles': self.vehicles,
+            'distance_km': round(distance, 2),
+            'planned_at': self.planned_at.isoformat(),
+            'solve_ms': None if elapsed is None else round(elapsed * 1000, 2),
+        }
+
+def load_problem() -> List[dict]:
+    """Deployed bowsers with their location, for RoutePlanner.load(), in one query."""
+    return [dict(row._mapping) for row in db.session.execute(
+        select(Bowser.id, Bowser.number, Bowser.capacity, Bowser.current_level,
+               Deployment.location_id, Location.name.label('location_name'), Location.latitude, Location.longitude)
+        .join(Deployment, Deployment.bowser_id == Bowser.id)
+        .join(Location, Location.id == Deployment.location_id)
+        .where(Deployment.status == 'active', ~Bowser.status.in_(EXCLUDED_STATUSES),
+               Location.latitude.isnot(None), Location.longitude.isnot(None))
+    )]
+
+def location_set(bowsers: List[dict]) -> tuple:
+    """Sorted (id, latitude, longitude) of the locations bowsers are deployed at."""
+    return tuple(sorted({(b['location_id'], b['latitude'], b['longitude']) for b in bowsers}))
+
+def build_distances(depot: tuple, locations: tuple) -> tuple:
+    """Node numbers of locations and the distance matrix over the depot (node DEPOT) and them."""
+    matrix = distance_matrix([depot[0]] + [lat for _, lat, _ in locations],
+                             [depot[1]] + [lon for _, _, lon in locations])
+    nodes = {location_id: i for i, (location_id, _, _) in enumerate(locations, start=1)}
+    return nodes, matrix.tolist()
+
+class RefillService:
+    """Per-process refill plan, rebuilt when the data it reads changes or REFILL_PLAN_TTL passes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.planner: Optional[RoutePlanner] = None
+        self._matrix_key = None
+        self._matrix = None
+
+    def _new_planner(self) -> RoutePlanner:
+        config = current_app.config
+        return RoutePlanner(
+            vehicles=config.get('REFILL_VEHICLES', 4),
+            vehicle_capacity=config.get('REFILL_VEHICLE_CAPACITY', 20000.0),
+            speed_kmh=config.get('REFILL_SPEED_KMH', 40.0),
+            service_minutes=config.get('REFILL_SERVICE_MINUTES', 15.0),
+            shift_hours=config.get('REFILL_SHIFT_HOURS', 10.0),
+            road_factor=config.get('REFILL_ROAD_FACTOR', 1.3),
+            trigger_percent=config.get('REFILL_TRIGGER_PERCENT', 50.0),
+            horizon_hours=config.get('REFILL_HORIZON_HOURS', 24.0),
+        )
+
+    def _distances(self, depot: tuple, bowsers: List[dict]) -> tuple:
+        """Distances for the bowsers' locations, kept until the set of locations changes."""
+        key = (depot, location_set(bowsers))
+        if key != self._matrix_key:
+            self._matrix = build_distances(*key)
+            self._matrix_key = key
+        return self._matrix
+
+    def _build(self, versions: tuple, now: datetime) -> Dict:
+        depot = current_app.config.get('DEPOT_LATITUDE'), current_app.config.get('DEPOT_LONGITUDE')
+        if None in depot:
+            raise ValueError('Set DEPOT_LATITUDE and DEPOT_LONGITUDE to plan refill routes')
+        bowsers = load_problem()
+        rates = {forecast['bowser_id']: forecast['rate_per_hour'] for forecast in estimate_consumption(now)}
+        nodes, km = self._distances(depot, bowsers)
+        planner = self._new_planner()
+        planner.load(bowsers, rates, nodes, km, now)
+        summary = planner.solve()
+        planner.versions = versions
+        self.planner = planner
+        logger.info(f"Refill routes planned: {summary}")
+        return summary
+
+    def _current(self) -> RoutePlanner:
+        """The current planner, rebuilt first if it is stale; call with the lock held."""
+        versions = data_version(*ROUTING_TABLES)
+        now = datetime.utcnow()
+        ttl = timedelta(seconds=current_app.config.get('REFILL_PLAN_TTL', 300))
+        if self.planner is None or self.planner.versions != versions or now - self.planner.planned_at > ttl:
+            self._build(versions, now)
+        return self.planner
+
+    # bowser_changed() repairs the planner in place, so views are read under the same lock
+
+    def schedule(self) -> Dict:
+        with self._lock:
+            planner = self._current()
+            return {'summary': planner.summary(), 'routes': planner.schedule()}
+
+    def refills(self) -> Dict:
+        with self._lock:
+            planner = self._current()
+            return {'summary': planner.summary(), 'refills': planner.refills()}
+
+    def bowser_changed(self, bowser_id: str, versions_before: tuple, **changes):
+        """Repair the cached plan after a write that changed only bowser_id.
+
+        Follows AllocationService.bowser_changed(): the plan is patched only
+        if it was current before the write and nothing else changed since.
+        """
+        with self._lock:
+            if self.planner is None or self.planner.versions != versions_before \
+                    or bowser_id not in self.planner.bowsers:
+                return
+            versions = data_version(*ROUTING_TABLES)
+            if versions != (versions_before[0] + 1,) + tuple(versions_before[1:]):
+                return
+            self.planner.update_bowser(bowser_id, datetime.utcnow(), **changes)
+            self.planner.versions = versions
+
+refill_service = RefillService()
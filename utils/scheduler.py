@@ -0,0 +1,90 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+class PeriodicScheduler:
+    """Runs registered tasks at fixed intervals on a background thread.
+
+    Only one process per host runs the scheduler: start() takes an exclusive
+    lock on a file in the instance folder, so with several gunicorn workers
+    each periodic task still runs once per interval rather than once per
+    worker.
+    """
+
+    def __init__(self):
+        self.tasks: Dict[str, dict] = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock_file = None
+        self.app = None
+
+    def add_periodic(self, name: str, interval: float, func: Callable, run_at_start: bool = False):
+        """Register func to run every interval seconds inside an app context."""
+        self.tasks[name] = {
+            'func': func,
+            'interval': interval,
+            'next_run': 0 if run_at_start else time.monotonic() + interval,
+            'last_error': None,
+        }
+
+    def _acquire_lock(self, app) -> bool:
+        path = app.config.get('SCHEDULER_LOCK_FILE') or os.path.join(app.instance_path, 'scheduler.lock')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock_file = open(path, 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+
+    def start(self, app) -> bool:
+        """Start the scheduler thread if no other process on this host owns it."""
+        if self._thread is not None:
+            return True
+        if not self._acquire_lock(app):
+            logger.info("Scheduler already running in another process")
+            return False
+        self.app = app
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='periodic-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"Scheduler started with tasks: {', '.join(self.tasks)}")
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def run_task(self, name: str):
+        """Run a registered task immediately in the scheduler's app context."""
+        task = self.tasks[name]
+        with self.app.app_context():
+            try:
+                task['func']()
+                task['last_error'] = None
+            except Exception as e:
+                task['last_error'] = str(e)
+                logger.error(f"Scheduled task '{name}' failed: {str(e)}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for name, task in self.tasks.items():
+                if now >= task['next_run']:
+                    self.run_task(name)
+                    task['next_run'] = time.monotonic() + task['interval']
+            self._stop.wait(1)
+
+scheduler = PeriodicScheduler()
@@ -0,0 +1,243 @@
+import logging
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from flask import current_app
+from sqlalchemy import and_, bindparam, event, func, or_, select, text
+
+from database import db
+from models.sql_models import Bowser, Invoice, Location, Maintenance
+from utils.jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+# Indexed columns of each searchable type with their bm25 weights, and the
+# columns shown for a hit
+SEARCH_SOURCES = {
+    'bowser': {'model': Bowser, 'columns': {'number': 10.0, 'owner': 4.0, 'notes': 1.0},
+               'title': 'number', 'subtitle': 'owner'},
+    'location': {'model': Location, 'columns': {'name': 8.0, 'address': 3.0},
+                 'title': 'name', 'subtitle': 'address'},
+    'maintenance': {'model': Maintenance, 'columns': {'description': 1.0},
+                    'title': 'maintenance_type', 'subtitle': 'description'},
+    'invoice': {'model': Invoice, 'columns': {'invoice_number': 10.0, 'client_name': 6.0, 'notes': 1.0},
+                'title': 'invoice_number', 'subtitle': 'client_name'},
+}
+MAX_TERMS = 8
+
+_sources_by_table = {source['model'].__tablename__: source for source in SEARCH_SOURCES.values()}
+_ready = set()
+
+def _index_ddl(table: str, columns: Sequence[str]) -> List[str]:
+    """Statements creating the external-content FTS5 index of table and the triggers keeping it in sync.
+
+    The index stores no copy of the text; its rowids are the table's. The
+    update trigger only fires when an indexed column is written, so level
+    and status updates never touch it.
+    """
+    fts = f'{table}_fts'
+    names = ', '.join(columns)
+    insert = (f"INSERT INTO {fts}(rowid, {names}) "
+              f"VALUES (new.rowid, {', '.join(f'new.{column}' for column in columns)});")
+    delete = (f"INSERT INTO {fts}({fts}, rowid, {names}) "
+              f"VALUES ('delete', old.rowid, {', '.join(f'old.{column}' for column in columns)});")
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+        f"prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+def _create_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        for statement in _index_ddl(target.name, list(_sources_by_table[target.name]['columns'])):
+            connection.execute(text(statement))
+
+def _drop_index(target, connection, **kw):
+    # The triggers go with the table, but the index would outlive it with stale rows
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f"DROP TABLE IF EXISTS {target.name}_fts"))
+
+for _source in SEARCH_SOURCES.values():
+    event.listen(_source['model'].__table__, 'after_create', _create_index)
+    event.listen(_source['model'].__table__, 'before_drop', _drop_index)
+
+def init_search_index() -> bool:
+    """Create any missing FTS5 index or trigger and fill it from its table.
+
+    Tables created through create_all get their index from the DDL events
+    above; this covers databases created before the index existed. Returns
+    False on backends without FTS5, where search falls back to LIKE.
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return False
+    key = str(engine.url)
+    if key in _ready:
+        return True
+    complete = True
+    with engine.begin() as connection:
+        existing = {row[0] for row in connection.execute(text("SELECT name FROM sqlite_master"))}
+        for table, source in _sources_by_table.items():
+            if table not in existing:
+                complete = False
+                continue
+            fts = f'{table}_fts'
+            if {fts, f'{fts}_insert', f'{fts}_delete', f'{fts}_update'} <= existing:
+                continue
+            for statement in _index_ddl(table, list(source['columns'])):
+                connection.execute(text(statement))
+            connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            logger.info(f"Built search index {fts}")
+    if complete:
+        _ready.add(key)
+    return True
+
+@job_queue.task('search_index', max_attempts=1)
+def rebuild_search_index():
+    """Job: rebuild every search index from its table, e.g. after a VACUUM renumbered rowids."""
+    if not init_search_index():
+        return {}
+    counts = {}
+    with db.engine.begin() as connection:
+        for table in _sources_by_table:
+            fts = f'{table}_fts'
+            connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('optimize')"))
+            counts[table] = connection.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+    return counts
+
+def search_terms(query: str) -> List[str]:
+    """Lower-cased word tokens of query, at most MAX_TERMS of them."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+def _match_query(terms: List[str]) -> str:
+    # Every term must match, each as a prefix; quoting keeps FTS5 syntax out of user input
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def _search_fts(kinds: Sequence[str], terms: List[str], limit: int,
+                window: int) -> Tuple[List[Tuple[float, str, int]], Dict[str, int]]:
+    """The best limit (rank, kind, rowid) matches over kinds and the match count of each."""
+    match = _match_query(terms)
+    ranked, counts = [], {}
+    for kind in kinds:
+        source = SEARCH_SOURCES[kind]
+        fts = f"{source['model'].__tablename__}_fts"
+        weights = ', '.join(str(weight) for weight in source['columns'].values())
+        # bm25 costs about a microsecond a match, so a short prefix matching
+        # most of a table only ranks the first window matches in index order
+        rows = db.session.execute(text(
+            f"SELECT rowid, rank FROM ("
+            f"  SELECT rowid, rank FROM {fts} WHERE {fts} MATCH :match AND rank MATCH 'bm25({weights})'"
+            f"  LIMIT :window"
+            f") ORDER BY rank LIMIT :limit"
+        ), {'match': match, 'window': max(window, limit), 'limit': limit}).all()
+        counts[kind] = db.session.execute(
+            text(f"SELECT count(*) FROM {fts} WHERE {fts} MATCH :match"), {'match': match}
+        ).scalar()
+        ranked += [(row.rank, kind, row.rowid) for row in rows]
+    ranked.sort()
+    return ranked, counts
+
+def _snippet(values: Sequence[Optional[str]], terms: List[str], words: int = 12) -> Optional[str]:
+    """About words words of the first value with a word starting with one of terms, centred on it."""
+    for value in values:
+        tokens = (value or '').split()
+        for i, token in enumerate(tokens):
+            if any(word.startswith(term) for word in re.findall(r'\w+', token.lower()) for term in terms):
+                start = max(0, min(i - words // 2, len(tokens) - words))
+                excerpt = ' '.join(tokens[start:start + words])
+                return ('…' if start else '') + excerpt + ('…' if start + words < len(tokens) else '')
+    return None
+
+def _fts_hits(ranked: List[Tuple[float, str, int]], terms: List[str]) -> List[Dict]:
+    """Display fields and snippets for one page of ranked (rank, kind, rowid) matches.
+
+    Read by rowid from the tables rather than through FTS5's snippet(),
+    which would evaluate the whole prefix query again for every row.
+    """
+    rowids = {}
+    for _, kind, rowid in ranked:
+        rowids.setdefault(kind, []).append(rowid)
+    details = {}
+    for kind, ids in rowids.items():
+        source = SEARCH_SOURCES[kind]
+        columns = ', '.join(source['columns'])
+        for row in db.session.execute(text(
+            f"SELECT rowid, id, {source['title']} AS title, {source['subtitle']} AS subtitle, {columns} "
+            f"FROM {source['model'].__tablename__} WHERE rowid IN :rowids"
+        ).bindparams(bindparam('rowids', expanding=True)), {'rowids': ids}):
+            details[kind, row.rowid] = {
+                'type': kind, 'id': row.id, 'title': row.title, 'subtitle': row.subtitle,
+                'snippet': _snippet([row._mapping[column] for column in source['columns']], terms),
+            }
+    return [dict(details[kind, rowid], score=round(-rank, 4))
+            for rank, kind, rowid in ranked if (kind, rowid) in details]
+
+def _like_criteria(source: Dict, terms: List[str]) -> list:
+    # Unranked substring match: every term must appear somewhere in the indexed columns
+    columns = [func.lower(getattr(source['model'], column)) for column in source['columns']]
+    return [or_(*[column.contains(term, autoescape=True) for column in columns]) for term in terms]
+
+def _search_like(kinds: Sequence[str], terms: List[str], limit: int) -> Tuple[List[Dict], Dict[str, int]]:
+    hits, counts = [], {}
+    for kind in kinds:
+        source = SEARCH_SOURCES[kind]
+        model = source['model']
+        criteria = _like_criteria(source, terms)
+        title, subtitle = getattr(model, source['title']), getattr(model, source['subtitle'])
+        counts[kind] = db.session.execute(select(func.count()).select_from(model).where(*criteria)).scalar()
+        rows = db.session.execute(
+            select(model.id, title.label('title'), subtitle.label('subtitle')).where(*criteria).order_by(title).limit(limit)
+        ).all()
+        hits += [{'type': kind, 'id': row.id, 'title': row.title, 'subtitle': row.subtitle,
+                  'snippet': _snippet([row.subtitle], terms), 'score': 0.0} for row in rows]
+    hits.sort(key=lambda hit: str(hit['title']))
+    return hits, counts
+
+def match_criterion(kind: str, query: str):
+    """SQL criterion keeping the rows of kind's table that query matches, or None for an empty query.
+
+    Uses the FTS5 index where there is one, so other list endpoints can
+    combine search with their own filters in a single statement.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return None
+    source = SEARCH_SOURCES[kind]
+    table = source['model'].__tablename__
+    if init_search_index():
+        return text(f"{table}.rowid IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH :match)") \
+            .bindparams(match=_match_query(terms))
+    return and_(*_like_criteria(source, terms))
+
+def search(query: str, kinds: Optional[Sequence[str]] = None, page: int = 1, per_page: int = 20) -> Dict:
+    """One page of bowsers, locations, maintenance records and invoices matching query.
+
+    Every word of query must match the start of a word in the record, so
+    partial input finds results as it is typed. On SQLite hits are ranked
+    by bm25 with each type's column weights; each type contributes at most
+    page * per_page hits before the merged list is paginated.
+    """
+    kinds = list(kinds or SEARCH_SOURCES)
+    terms = search_terms(query)
+    if not terms:
+        hits, counts = [], {kind: 0 for kind in kinds}
+    elif init_search_index():
+        ranked, counts = _search_fts(kinds, terms, page * per_page,
+                                     current_app.config.get('SEARCH_RANK_WINDOW', 5000))
+        hits = _fts_hits(ranked[(page - 1) * per_page:page * per_page], terms)
+    else:
+        hits, counts = _search_like(kinds, terms, page * per_page)
+        hits = hits[(page - 1) * per_page:page * per_page]
+    total = sum(counts.values())
+    return {
+        'query': query,
+        'results': hits,
+        'counts': counts,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page,
+    }
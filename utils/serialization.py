@@ -0,0 +1,90 @@
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Sequence
+
+from flask import current_app
+from sqlalchemy import Date, DateTime
+
+from database import db
+from models.sql_models import User, Bowser, Location, Maintenance, Deployment, Invoice, Alert, LedgerEntry
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def fast_json_enabled() -> bool:
+    """True when orjson is installed and not disabled with FAST_JSON=False."""
+    return orjson is not None and current_app.config.get('FAST_JSON', True)
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj as compact JSON with orjson when available, else the stdlib encoder."""
+    if fast_json_enabled():
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode('utf-8')
+
+def json_response(obj: Any, status: int = 200):
+    return current_app.response_class(dumps(obj), status=status, mimetype='application/json')
+
+class RowSchema:
+    """Serializes selected model columns straight from result tuples.
+
+    Queries built with query() select only the schema's columns, so rows
+    come back as tuples without ORM objects or identity-map bookkeeping.
+    Each schema compiles two row-to-dict functions once: one for orjson,
+    which encodes datetimes natively, and one that calls isoformat() for
+    the stdlib encoder. Field names and formats match the models' to_dict().
+    """
+
+    def __init__(self, model, fields: Sequence[str]):
+        self.model = model
+        self.fields = tuple(fields)
+        self.columns = [getattr(model, field) for field in self.fields]
+        self._native_row = self._compile(convert_dates=False)
+        self._iso_row = self._compile(convert_dates=True)
+
+    def _compile(self, convert_dates: bool) -> Callable:
+        items = []
+        for index, (field, column) in enumerate(zip(self.fields, self.columns)):
+            value = f'row[{index}]'
+            if convert_dates and isinstance(column.type, (DateTime, Date)):
+                value = f'({value}.isoformat() if {value} is not None else None)'
+            items.append(f'{field!r}: {value}')
+        source = f"def row_to_dict(row):\n    return {{{', '.join(items)}}}\n"
+        namespace: Dict[str, Any] = {}
+        exec(compile(source, f'<RowSchema {self.model.__name__}>', 'exec'), namespace)
+        return namespace['row_to_dict']
+
+    def query(self):
+        """Column query for this schema; filter and order it like Model.query."""
+        return db.session.query(*self.columns)
+
+    def serialize(self, rows) -> List[Dict]:
+        row_to_dict = self._native_row if fast_json_enabled() else self._iso_row
+        return [row_to_dict(row) for row in rows]
+
+    def all(self, query=None) -> List[Dict]:
+        return self.serialize((query if query is not None else self.query()).all())
+
+# List endpoint schemas; fields mirror each model's to_dict()
+bowser_schema = RowSchema(Bowser, ['id', 'number', 'capacity', 'current_level', 'status', 'owner',
+                                   'last_maintenance', 'notes'])
+location_schema = RowSchema(Location, ['id', 'name', 'address', 'latitude', 'longitude', 'type', 'status'])
+deployment_schema = RowSchema(Deployment, ['id', 'bowser_id', 'location_id', 'start_date', 'end_date',
+                                           'status', 'priority', 'notes'])
+maintenance_schema = RowSchema(Maintenance, ['id', 'bowser_id', 'maintenance_type', 'description', 'date',
+                                             'status'])
+user_schema = RowSchema(User, ['id', 'username', 'email', 'role', 'last_login', 'failed_login_attempts',
+                               'account_locked_until', 'created_at', 'updated_at'])
+alert_schema = RowSchema(Alert, ['id', 'bowser_id', 'title', 'message', 'alert_type', 'priority', 'status',
+                                 'created_at', 'resolved_at'])
+invoice_schema = RowSchema(Invoice, ['id', 'invoice_number', 'client_name', 'issue_date', 'due_date', 'amount',
+                                     'status', 'notes'])
+# Amounts in pence; utils.ledger converts them to pounds as to_dict() does
+ledger_schema = RowSchema(LedgerEntry, ['id', 'scheme_id', 'entry_type', 'amount', 'running_balance', 'entry_date',
+                                        'counterparty', 'reference', 'notes', 'created_at'])
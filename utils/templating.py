@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import click
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from utils.data_versions import data_version
+
+logger = logging.getLogger(__name__)
+
+class FragmentCache:
+    """Per-process LRU of rendered template fragments with a time limit."""
+
+    def __init__(self, max_entries=500, timeout=300):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.timeout:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+fragment_cache = FragmentCache()
+
+class FragmentCacheExtension(Extension):
+    """{% cache 'name', data_version('bowser') %}...{% endcache %}
+
+    Renders the body once per distinct key and serves it from
+    fragment_cache afterwards. Key on data_version() of the tables the
+    body reads so a write to any of them renders it afresh; the body must
+    not depend on the current user or request.
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache_enabled=True)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.List(key)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key, caller):
+        if not self.environment.fragment_cache_enabled:
+            return caller()
+        cache_key = repr(tuple(key))
+        rendered = fragment_cache.get(cache_key)
+        if rendered is None:
+            rendered = caller()
+            fragment_cache.set(cache_key, rendered)
+        return rendered
+
+class Lazy:
+    """Defers a query until a template actually iterates or tests it.
+
+    Passed to templates in place of a list so a fragment-cache hit skips
+    the query altogether.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._value = None
+        self._loaded = False
+
+    def _load(self):
+        if not self._loaded:
+            self._value = list(self._loader())
+            self._loaded = True
+        return self._value
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
+
+def precompile_templates(app) -> int:
+    """Compile every template into the bytecode cache; returns the count."""
+    count = 0
+    for name in app.jinja_env.list_templates():
+        if not name.endswith(('.html', '.txt', '.xml')):
+            continue
+        try:
+            app.jinja_env.get_template(name)
+            count += 1
+        except Exception as e:
+            logger.error(f"Error compiling template {name}: {str(e)}")
+    return count
+
+def init_templating(app):
+    """Configure template loading for app.
+
+    Auto-reload follows TEMPLATES_AUTO_RELOAD (Flask enables it in debug
+    mode when unset). Compiled templates are kept in a bytecode cache on
+    disk so new workers skip parsing, and the {% cache %} tag and
+    data_version() are made available to templates.
+    """
+    env = app.jinja_env
+    env.auto_reload = app.templates_auto_reload
+
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    fragment_cache.max_entries = app.config.get('FRAGMENT_CACHE_SIZE', 500)
+    fragment_cache.timeout = app.config.get('FRAGMENT_CACHE_TIMEOUT', 300)
+    env.add_extension(FragmentCacheExtension)
+    env.fragment_cache_enabled = app.config.get('FRAGMENT_CACHE_ENABLED', True)
+    env.globals['data_version'] = data_version
+
+    @app.cli.command('compile-templates')
+    def compile_templates_command():
+        """Precompile all templates into the bytecode cache."""
+        click.echo(f"Compiled {precompile_templates(app)} templates")
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import subprocess
+import time
+from typing import Iterator, Optional, Tuple
+
+from flask import current_app
+
+from database import db
+from models.sql_models import Job
+from utils.jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+TEST_COMMANDS = {
+    'core': ['python', 'run_tests.py', 'core'],
+    'financial_api': ['python', '-m', 'unittest', 'test_financial_api.py'],
+    'all': ['python', 'run_tests.py']
+}
+
+class TooManyRuns(Exception):
+    """Raised when the concurrent test run limit is reached."""
+
+def _runs_dir() -> str:
+    path = current_app.config.get('TEST_RUN_DIR') or os.path.join(current_app.instance_path, 'test_runs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def log_path(run_id: str) -> str:
+    return os.path.join(_runs_dir(), f'{run_id}.log')
+
+def current_revision() -> Optional[str]:
+    """Return the git revision of a clean working tree, or None.
+
+    Results are only cached for clean trees: with local edits the same
+    revision can produce different results. Untracked files and the
+    instance folder, where the app writes its runtime files, do not count
+    as edits.
+    """
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=current_app.root_path,
+            capture_output=True, text=True, timeout=10
+        )
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no', '--', '.', ':(exclude)instance'],
+            cwd=current_app.root_path,
+            capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if revision.returncode != 0 or dirty.returncode != 0 or dirty.stdout.strip():
+        return None
+    return revision.stdout.strip()
+
+def start_run(test_type: str) -> Tuple[Job, bool]:
+    """Start a test run in the background, or reuse a finished run of the same revision.
+
+    Returns the run's job and whether it came from the cache.
+    """
+    if test_type not in TEST_COMMANDS:
+        raise ValueError('Invalid test type')
+
+    revision = current_revision()
+    if revision:
+        cached = Job.query.filter(
+            Job.name == 'test_run',
+            Job.payload == json.dumps({'revision': revision, 'test_type': test_type}, sort_keys=True),
+            Job.status.in_(['queued', 'running', 'succeeded'])
+        ).order_by(Job.created_at.desc()).first()
+        if cached and os.path.exists(log_path(cached.id)):
+            return cached, cached.status == 'succeeded'
+
+    limit = current_app.config.get('TEST_RUN_MAX_CONCURRENT', 2)
+    active = Job.query.filter(Job.name == 'test_run', Job.status.in_(['queued', 'running'])).count()
+    if active >= limit:
+        raise TooManyRuns(f'{active} test runs already in progress')
+
+    job = job_queue.enqueue('test_run', {'revision': revision, 'test_type': test_type})
+    # Create the log up front so the stream can attach before the process starts
+    open(log_path(job.id), 'a').close()
+    return job, False
+
+@job_queue.task('test_run', max_attempts=1, bind=True)
+def run_tests(job_id, test_type, revision=None):
+    """Job: run a test suite as a subprocess, writing output straight to its log file."""
+    with open(log_path(job_id), 'ab', buffering=0) as log:
+        process = subprocess.Popen(
+            TEST_COMMANDS[test_type],
+            cwd=current_app.root_path,
+            stdout=log,
+            stderr=subprocess.STDOUT
+        )
+        try:
+            returncode = process.wait(timeout=current_app.config.get('TEST_RUN_TIMEOUT', 1800))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            returncode = process.wait()
+            log.write(b'\nTest run timed out\n')
+    return {'success': returncode == 0, 'returncode': returncode, 'revision': revision}
+
+def read_output(run_id: str, offset: int = 0) -> Tuple[str, int]:
+    """Read run output from a byte offset; returns the text and the next offset."""
+    try:
+        with open(log_path(run_id), 'rb') as log:
+            log.seek(offset)
+            data = log.read()
+    except FileNotFoundError:
+        return '', offset
+    return data.decode('utf-8', errors='replace'), offset + len(data)
+
+def stream_events(run_id: str, offset: int = 0) -> Iterator[str]:
+    """Yield server-sent events with new output until the run finishes or the stream's time is up.
+
+    Each event's id is the output offset after it, so a client reconnecting
+    with Last-Event-ID resumes where it left off. Streams close after
+    TEST_RUN_STREAM_MAX_AGE seconds so a long run doesn't hold a sync worker;
+    EventSource reconnects by itself after the retry delay.
+    """
+    poll = current_app.config.get('TEST_RUN_POLL_INTERVAL', 0.5)
+    deadline = time.monotonic() + current_app.config.get('TEST_RUN_STREAM_MAX_AGE', 30)
+    yield f"retry: {int(poll * 1000)}\n\n"
+    while True:
+        row = db.session.query(Job.status, Job.result).filter(Job.id == run_id).first()
+        if row is None:
+            yield f"event: done\ndata: {json.dumps({'success': False, 'error': 'Test run not found'})}\n\n"
+            return
+        status, result = row
+        chunk, offset = read_output(run_id, offset)
+        if chunk:
+            yield f"id: {offset}\ndata: {json.dumps(chunk)}\n\n"
+        if status in ('succeeded', 'failed'):
+            # Pick up anything written between the last read and the status change
+            chunk, offset = read_output(run_id, offset)
+            if chunk:
+                yield f"id: {offset}\ndata: {json.dumps(chunk)}\n\n"
+            outcome = json.loads(result) if result else {'success': False}
+            yield f"event: done\ndata: {json.dumps(outcome)}\n\n"
+            return
+        if time.monotonic() >= deadline:
+            return
+        db.session.rollback()
+        time.sleep(poll)
@@ -0,0 +1,307 @@
+import array
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db
+from models.sql_models import BowserLevelBlock, BowserLevelRollup
+from utils.jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Rollup resolutions in seconds, finest first
+RESOLUTIONS = {
+    '1m': 60,
+    '1h': 3600,
+    '1d': 86400,
+}
+
+DEFAULT_RETENTION = {
+    'raw': timedelta(days=7),
+    '1m': timedelta(days=30),
+    '1h': timedelta(days=400),
+    '1d': None,
+}
+
+def to_epoch(value: datetime) -> float:
+    """Convert a naive UTC datetime to epoch seconds."""
+    return (value - EPOCH).total_seconds()
+
+def from_epoch(seconds: float) -> datetime:
+    """Convert epoch seconds to a naive UTC datetime."""
+    return EPOCH + timedelta(seconds=seconds)
+
+def bucket_start(value: datetime, resolution: str) -> datetime:
+    """Return the start of the rollup bucket containing value."""
+    step = RESOLUTIONS[resolution]
+    return from_epoch(int(to_epoch(value) // step) * step)
+
+def _retention() -> Dict[str, Optional[timedelta]]:
+    return current_app.config.get('LEVEL_HISTORY_RETENTION', DEFAULT_RETENTION)
+
+def _unpack(block: BowserLevelBlock) -> Tuple[array.array, array.array]:
+    timestamps = array.array('d')
+    levels = array.array('d')
+    timestamps.frombytes(block.timestamps or b'')
+    levels.frombytes(block.levels or b'')
+    return timestamps, levels
+
+class LevelStore:
+    """Compact time-series store for bowser level readings.
+
+    Raw readings are kept as packed float arrays, one block per bowser per
+    UTC day, and are folded into 1-minute, 1-hour and 1-day rollups
+    (min/max/avg/last) as they are written. Queries read only the rollup
+    that matches the requested resolution.
+    """
+
+    def record(self, bowser_id: str, level: float, timestamp: Optional[datetime] = None):
+        """Record a single level reading."""
+        self.record_many([(bowser_id, level, timestamp or datetime.utcnow())])
+
+    def record_many(self, readings: Iterable[Tuple[str, float, datetime]]) -> int:
+        """Record a batch of (bowser_id, level, timestamp) readings.
+
+        Readings are grouped so each day block and rollup bucket is written
+        once per batch. The caller's session is committed.
+        """
+        by_block = defaultdict(list)
+        count = 0
+        for bowser_id, level, timestamp in readings:
+            by_block[(bowser_id, timestamp.date())].append((to_epoch(timestamp), float(level)))
+            count += 1
+        if not count:
+            return 0
+
+        try:
+            for (bowser_id, day), points in by_block.items():
+                self._append_block(bowser_id, day, points)
+            for resolution in RESOLUTIONS:
+                self._merge_rollups(resolution, by_block)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Error recording bowser levels: {str(e)}")
+            raise
+        return count
+
+    def _append_block(self, bowser_id, day, points):
+        block = BowserLevelBlock.query.get((bowser_id, day))
+        if block is None:
+            block = BowserLevelBlock(bowser_id=bowser_id, day=day, count=0)
+            db.session.add(block)
+        timestamps, levels = _unpack(block)
+        points = sorted(points)
+        # Readings normally arrive in order; only re-sort the block when they don't
+        if len(timestamps) and points[0][0] < timestamps[-1]:
+            merged = sorted(list(zip(timestamps, levels)) + points)
+            timestamps = array.array('d', (t for t, _ in merged))
+            levels = array.array('d', (v for _, v in merged))
+        else:
+            timestamps.extend(t for t, _ in points)
+            levels.extend(v for _, v in points)
+        block.timestamps = timestamps.tobytes()
+        block.levels = levels.tobytes()
+        block.count = len(timestamps)
+
+    def _merge_rollups(self, resolution, by_block):
+        step = RESOLUTIONS[resolution]
+        buckets = {}
+        for (bowser_id, _), points in by_block.items():
+            for t, level in points:
+                key = (bowser_id, from_epoch(int(t // step) * step))
+                stats = buckets.get(key)
+                if stats is None:
+                    buckets[key] = [level, level, level, 1, level, t]
+                    continue
+                stats[0] = min(stats[0], level)
+                stats[1] = max(stats[1], level)
+                stats[2] += level
+                stats[3] += 1
+                if t >= stats[5]:
+                    stats[4], stats[5] = level, t
+
+        for (bowser_id, start), (low, high, total, count, last, last_t) in buckets.items():
+            rollup = BowserLevelRollup.query.get((bowser_id, resolution, start))
+            last_at = from_epoch(last_t)
+            if rollup is None:
+                db.session.add(BowserLevelRollup(
+                    bowser_id=bowser_id,
+                    resolution=resolution,
+                    bucket_start=start,
+                    min_level=low,
+                    max_level=high,
+                    sum_level=total,
+                    count=count,
+                    last_level=last,
+                    last_at=last_at
+                ))
+                continue
+            rollup.min_level = min(rollup.min_level, low)
+            rollup.max_level = max(rollup.max_level, high)
+            rollup.sum_level += total
+            rollup.count += count
+            if last_at >= rollup.last_at:
+                rollup.last_level = last
+                rollup.last_at = last_at
+
+    def choose_resolution(self, start: datetime, end: datetime, now: Optional[datetime] = None) -> str:
+        """Pick the finest resolution that keeps the series under the point budget
+        and is still retained for the requested start."""
+        now = now or datetime.utcnow()
+        max_points = current_app.config.get('LEVEL_HISTORY_MAX_POINTS', 1000)
+        retention = _retention()
+        span = max((end - start).total_seconds(), 1)
+        for resolution, step in RESOLUTIONS.items():
+            keep = retention.get(resolution)
+            if keep is not None and start < now - keep:
+                continue
+            if span / step <= max_points:
+                return resolution
+        return '1d'
+
+    def query(self, bowser_id: str, start: datetime, end: datetime, resolution: Optional[str] = None) -> Dict:
+        """Return the level series between start and end as columnar arrays.
+
+        resolution is one of 'raw', '1m', '1h', '1d' or None to choose
+        automatically from the requested span.
+        """
+        if not resolution or resolution == 'auto':
+            resolution = self.choose_resolution(start, end)
+        if resolution == 'raw':
+            return self._query_raw(bowser_id, start, end)
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution '{resolution}'")
+
+        rows = db.session.query(
+            BowserLevelRollup.bucket_start,
+            BowserLevelRollup.min_level,
+            BowserLevelRollup.max_level,
+            BowserLevelRollup.sum_level,
+            BowserLevelRollup.count,
+            BowserLevelRollup.last_level
+        ).filter(
+            BowserLevelRollup.bowser_id == bowser_id,
+            BowserLevelRollup.resolution == resolution,
+            BowserLevelRollup.bucket_start >= bucket_start(start, resolution),
+            BowserLevelRollup.bucket_start <= end
+        ).order_by(BowserLevelRollup.bucket_start).all()
+
+        return {
+            'bowser_id': bowser_id,
+            'resolution': resolution,
+            't': [row.bucket_start.isoformat() for row in rows],
+            'min': [row.min_level for row in rows],
+            'max': [row.max_level for row in rows],
+            'avg': [row.sum_level / row.count for row in rows],
+            'last': [row.last_level for row in rows]
+        }
+
+    def _query_raw(self, bowser_id, start, end):
+        blocks = BowserLevelBlock.query.filter(
+            BowserLevelBlock.bowser_id == bowser_id,
+            BowserLevelBlock.day >= start.date(),
+            BowserLevelBlock.day <= end.date()
+        ).order_by(BowserLevelBlock.day).all()
+
+        lo, hi = to_epoch(start), to_epoch(end)
+        times: List[str] = []
+        values: List[float] = []
+        for block in blocks:
+            timestamps, levels = _unpack(block)
+            for t, level in zip(timestamps, levels):
+                if lo <= t <= hi:
+                    times.append(from_epoch(t).isoformat())
+                    values.append(level)
+        return {
+            'bowser_id': bowser_id,
+            'resolution': 'raw',
+            't': times,
+            'level': values
+        }
+
+    def rebuild_rollups(self, bowser_id: Optional[str] = None, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None) -> int:
+        """Recompute rollups from the raw blocks still within raw retention.
+
+        Buckets are only rebuilt where raw data exists, so ranges older than
+        the raw retention window keep their existing rollups.
+        """
+        query = BowserLevelBlock.query
+        if bowser_id:
+            query = query.filter(BowserLevelBlock.bowser_id == bowser_id)
+        if start:
+            query = query.filter(BowserLevelBlock.day >= start.date())
+        if end:
+            query = query.filter(BowserLevelBlock.day <= end.date())
+
+        rebuilt = 0
+        try:
+            for block in query.all():
+                timestamps, levels = _unpack(block)
+                by_block = {(block.bowser_id, block.day): list(zip(timestamps, levels))}
+                day_start = datetime.combine(block.day, datetime.min.time())
+                BowserLevelRollup.query.filter(
+                    BowserLevelRollup.bowser_id == block.bowser_id,
+                    BowserLevelRollup.resolution.in_(['1m', '1h']),
+                    BowserLevelRollup.bucket_start >= day_start,
+                    BowserLevelRollup.bucket_start < day_start + timedelta(days=1)
+                ).delete(synchronize_session='fetch')
+                BowserLevelRollup.query.filter_by(
+                    bowser_id=block.bowser_id, resolution='1d', bucket_start=day_start
+                ).delete(synchronize_session='fetch')
+                for resolution in RESOLUTIONS:
+                    self._merge_rollups(resolution, by_block)
+                rebuilt += 1
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Error rebuilding level rollups: {str(e)}")
+            raise
+        return rebuilt
+
+    def apply_retention(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Delete raw blocks and rollups older than their retention period."""
+        now = now or datetime.utcnow()
+        removed = {}
+        try:
+            for resolution, keep in _retention().items():
+                if keep is None:
+                    continue
+                cutoff = now - keep
+                if resolution == 'raw':
+                    removed['raw'] = BowserLevelBlock.query.filter(
+                        BowserLevelBlock.day < cutoff.date()
+                    ).delete(synchronize_session=False)
+                else:
+                    removed[resolution] = BowserLevelRollup.query.filter(
+                        BowserLevelRollup.resolution == resolution,
+                        BowserLevelRollup.bucket_start < cutoff
+                    ).delete(synchronize_session=False)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Error applying level retention: {str(e)}")
+            raise
+        return removed
+
+level_store = LevelStore()
+
+@job_queue.task('level_retention', max_attempts=1)
+def apply_level_retention():
+    return level_store.apply_retention()
+
+@job_queue.task('rebuild_level_rollups')
+def rebuild_level_rollups(bowser_id=None, start=None, end=None):
+    """Job wrapper taking ISO-8601 strings for the optional range."""
+    return level_store.rebuild_rollups(
+        bowser_id,
+        datetime.fromisoformat(start) if start else None,
+        datetime.fromisoformat(end) if end else None
+    )
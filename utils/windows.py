@@ -0,0 +1,119 @@
+import logging
+from datetime import date, datetime
+from typing import Callable, Dict, List, Mapping, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+
+from database import db
+from models.sql_models import Bowser, Invoice, Maintenance
+from utils.data_versions import data_version
+from utils.maintenance_planner import OPEN_STATUSES
+from utils.search import match_criterion
+from utils.serialization import invoice_schema, maintenance_schema
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_TABLES = ('maintenance',)
+MAINTENANCE_STATUSES = ('scheduled', 'in_progress', 'completed', 'overdue')
+MAINTENANCE_SORT_KEYS = {
+    'date': Maintenance.date,
+    'status': Maintenance.status,
+    'type': Maintenance.maintenance_type,
+}
+INVOICE_TABLES = ('invoice',)
+INVOICE_SORT_KEYS = {
+    'issue_date': Invoice.issue_date,
+    'due_date': Invoice.due_date,
+    'amount': Invoice.amount,
+    'invoice_number': Invoice.invoice_number,
+    'client_name': Invoice.client_name,
+}
+
+def parse_window(args: Mapping, sort_keys: Mapping, default_sort: str, max_limit: int) -> Tuple[int, int, str]:
+    """The offset, limit and sort of a window request; raises ValueError with the message for a 400."""
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', 50))
+    except (TypeError, ValueError):
+        raise ValueError("'offset' and 'limit' must be integers")
+    if offset < 0 or not 1 <= limit <= max_limit:
+        raise ValueError(f"'offset' must not be negative and 'limit' must be between 1 and {max_limit}")
+    sort = args.get('sort', default_sort)
+    if sort.lstrip('-') not in sort_keys:
+        raise ValueError(f"'sort' must be one of: {', '.join(sort_keys)}, optionally prefixed with '-'")
+    return offset, limit, sort
+
+def read_window(statement, model, sort_keys: Mapping, sort: str, offset: int, limit: int,
+                tables: Sequence[str], serialize: Callable[[List], List[Dict]]) -> Dict:
+    """One slice of statement's rows in a stable order, with the total and the data version it was read at.
+
+    Ties in the sort key are broken by id, so consecutive windows neither
+    overlap nor skip rows while the data is unchanged. Clients keep the
+    version and drop their cached windows when a later one differs.
+    """
+    key = sort_keys[sort.lstrip('-')]
+    # Ties go in the key's direction too, so one (key, id) index serves both directions
+    order = (key.desc(), model.id.desc()) if sort.startswith('-') else (key, model.id)
+    total = statement.order_by(None).count()
+    rows = []
+    if offset < total:
+        # Skip ahead on ids alone, which the (key, id) indexes cover, then read only the window's rows
+        ids = [row[0] for row in statement.with_entities(model.id).order_by(*order).offset(offset).limit(limit)]
+        rows = statement.filter(model.id.in_(ids)).order_by(*order).all()
+    return {
+        'items': serialize(rows),
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'sort': sort,
+        'version': '.'.join(str(version) for version in data_version(*tables)),
+    }
+
+def maintenance_window(query: str = '', filters: Dict[str, Sequence[str]] = None, offset: int = 0,
+                       limit: int = 50, sort: str = '-date') -> Dict:
+    """One window of maintenance records matching query and filters, each with its bowser's number.
+
+    'overdue' in the status filter selects open records dated before today,
+    whatever their stored status.
+    """
+    filters = filters or {}
+    statement = maintenance_schema.query()
+    statuses = list(filters.get('status') or [])
+    if statuses:
+        stored = [status for status in statuses if status != 'overdue']
+        criteria = [Maintenance.status.in_(stored)] if stored else []
+        if 'overdue' in statuses:
+            criteria.append(and_(Maintenance.status.in_(OPEN_STATUSES),
+                                 Maintenance.date < datetime.combine(date.today(), datetime.min.time())))
+        statement = statement.filter(or_(*criteria))
+    if filters.get('type'):
+        statement = statement.filter(Maintenance.maintenance_type.in_(filters['type']))
+    if filters.get('bowser_id'):
+        statement = statement.filter(Maintenance.bowser_id.in_(filters['bowser_id']))
+    criterion = match_criterion('maintenance', query)
+    if criterion is not None:
+        statement = statement.filter(criterion)
+
+    def serialize(rows):
+        # Numbers are looked up for the window's bowsers only, so counting needs no join
+        numbers = dict(db.session.query(Bowser.id, Bowser.number)
+                       .filter(Bowser.id.in_({row.bowser_id for row in rows})).all()) if rows else {}
+        items = maintenance_schema.serialize(rows)
+        for item in items:
+            item['bowser_number'] = numbers.get(item['bowser_id'])
+        return items
+
+    return read_window(statement, Maintenance, MAINTENANCE_SORT_KEYS, sort, offset, limit,
+                       MAINTENANCE_TABLES, serialize)
+
+def invoice_window(query: str = '', statuses: Sequence[str] = (), offset: int = 0, limit: int = 50,
+                   sort: str = '-issue_date') -> Dict:
+    """One window of invoices matching query and statuses."""
+    statement = invoice_schema.query()
+    if statuses:
+        statement = statement.filter(Invoice.status.in_(list(statuses)))
+    criterion = match_criterion('invoice', query)
+    if criterion is not None:
+        statement = statement.filter(criterion)
+    return read_window(statement, Invoice, INVOICE_SORT_KEYS, sort, offset, limit,
+                       INVOICE_TABLES, invoice_schema.serialize)
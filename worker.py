@@ -0,0 +1,33 @@
+"""Standalone background worker.
+
+Runs the periodic scheduler and the job pool outside the web server, so
+gunicorn workers only serve requests. Start the web server with
+SCHEDULER_ENABLED=0 and JOB_WORKERS_ENABLED=0 and run this script
+alongside it:
+
+    SCHEDULER_ENABLED=0 JOB_WORKERS_ENABLED=0 gunicorn app:app
+    python worker.py
+"""
+import os
+import signal
+import threading
+
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['JOB_WORKERS_ENABLED'] = '0'
+
+from app import app
+from utils.scheduler import scheduler
+from utils.jobs import job_queue
+
+if __name__ == '__main__':
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+
+    if not scheduler.start(app):
+        print("Scheduler is owned by another process; running the job pool only")
+    job_queue.start(app)
+    print("Worker started. Press Ctrl+C to stop.")
+    stop.wait()
+    job_queue.stop()
+    scheduler.stop()